@@ -0,0 +1,126 @@
+# final/archive.py
+from __future__ import annotations
+import gzip
+import json
+import os
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .json_stream import CHUNK_SIZE
+from .locks import lock_for
+from .models import Task
+from .serializers import get_codec
+from .storage import _load_json, _replace_json
+
+
+class TaskArchive:
+    """Cold tier for finished tasks: an append-only gzip file of JSON lines.
+
+    Every append adds one gzip member and never rewrites what is already
+    there; gzip readers see the members as one stream. A small sidecar
+    `<name>.meta.json` records the archive's valid length, record count and
+    highest id, so insert_task never has to open the archive and a member
+    torn by a crash is cut off before the next append. A lost or unreadable
+    sidecar is rebuilt by reading the archive's gzip members back.
+
+    Nothing is read until iter_tasks() is called.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.meta_path = path.with_suffix("").with_suffix(".meta.json")
+
+    def meta(self) -> Dict[str, Any]:
+        meta = _load_json(self.meta_path)
+        if not meta and self.path.exists():
+            with lock_for(self.path).exclusive():
+                meta = _load_json(self.meta_path) or self._rebuild_meta()
+        return {"bytes": 0, "count": 0, "max_id": 0, **meta}
+
+    def _rebuild_meta(self) -> Dict[str, Any]:
+        """Scan the archive's complete gzip members (stopping at a torn
+        tail) for its valid length, count and highest id, and save them."""
+        meta = {"bytes": 0, "count": 0, "max_id": 0}
+        count = max_id = offset = 0
+        member, tail = zlib.decompressobj(wbits=31), b""
+        with self.path.open("rb") as f:
+            data = b""
+            while True:
+                if not data:
+                    data = f.read(CHUNK_SIZE)
+                    offset += len(data)
+                    if not data:
+                        break
+                try:
+                    *lines, tail = (tail + member.decompress(data)).split(b"\n")
+                    for line in filter(None, lines):
+                        max_id = max(max_id, json.loads(line)["id"])
+                        count += 1
+                except (zlib.error, ValueError, KeyError, TypeError):
+                    break
+                data = b""
+                if member.eof:
+                    data = member.unused_data
+                    meta = {"bytes": offset - len(data), "count": count, "max_id": max_id}
+                    member, tail = zlib.decompressobj(wbits=31), b""
+        _replace_json(self.meta_path, meta, get_codec("json-compact"))
+        return meta
+
+    def max_id(self) -> int:
+        return self.meta()["max_id"]
+
+    def count(self) -> int:
+        return self.meta()["count"]
+
+    def append(self, tasks: List[Task]) -> None:
+        if not tasks:
+            return
+        lines = "".join(json.dumps(t.to_dict(), ensure_ascii=False) + "\n" for t in tasks)
+        member = gzip.compress(lines.encode("utf-8"))
+        with lock_for(self.path).exclusive():
+            meta = self.meta()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("ab") as f:
+                if f.tell() < meta["bytes"]:  # not the file the sidecar describes
+                    meta = self._rebuild_meta()
+                if f.tell() > meta["bytes"]:
+                    f.truncate(meta["bytes"])  # drop a torn tail
+                    f.seek(meta["bytes"])
+                f.write(member)
+                f.flush()
+                os.fsync(f.fileno())
+                meta["bytes"] = f.tell()
+            meta["count"] += len(tasks)
+            meta["max_id"] = max(meta["max_id"], *(t.id for t in tasks))
+            _replace_json(self.meta_path, meta, get_codec("json-compact"))
+
+    def iter_tasks(self) -> Iterator[Task]:
+        """Stream archived tasks, oldest first.
+
+        Appends only ever add bytes after the end, so this runs without the
+        lock; a torn or unreadable tail ends the stream.
+        """
+        if not self.path.exists():
+            return
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    yield Task.from_dict(json.loads(line))
+        except (EOFError, OSError, zlib.error, ValueError):
+            return
+
+
+def is_archivable(task: Task, cutoff: datetime) -> bool:
+    """Done, with a completion time before `cutoff`."""
+    if task.status != "done" or not task.completed_at:
+        return False
+    try:
+        return datetime.fromisoformat(task.completed_at) < cutoff
+    except (ValueError, TypeError):  # unparseable, or has a UTC offset
+        return False
+
+
+def archive_cutoff(older_than_days: int, now: Optional[datetime] = None) -> datetime:
+    return (now or datetime.now()) - timedelta(days=older_than_days)
@@ -0,0 +1,241 @@
+# final/bench.py
+"""Storage micro-benchmarks.
+
+    python -m final.bench codecs [--copies N]
+    python -m final.bench compression [--copies N] [--content-bytes B]
+    python -m final.bench models [--copies N]
+
+Every benchmark runs on a copy of final/data (optionally repeated N times
+to make a bigger store) in a temporary directory, so the real data is
+never touched.
+"""
+from __future__ import annotations
+import argparse
+import json
+import random
+import re
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from . import compression
+from .models import Note, Task, now_iso
+from .serializers import CODECS, FastJsonCodec, get_codec
+from .storage import NOTES_FILE, TASKS_FILE, _load_json
+
+
+def _timeit(fn: Callable[[], Any], repeat: int = 5) -> float:
+    """Best wall time of `repeat` runs, in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def _dataset(copies: int) -> Dict[str, Any]:
+    """notes.json + tasks.json, each record repeated `copies` times with fresh ids."""
+    data: Dict[str, List[Dict[str, Any]]] = {"notes": [], "tasks": []}
+    for key, path in (("notes", NOTES_FILE), ("tasks", TASKS_FILE)):
+        items = _load_json(path).get(key, [])
+        for c in range(copies):
+            for i, d in enumerate(items):
+                data[key].append(dict(d, id=c * len(items) + i + 1))
+    return data
+
+
+def _print_table(headers: List[str], rows: List[List[str]]) -> None:
+    widths = [max(len(h), *(len(r[i]) for r in rows)) for i, h in enumerate(headers)]
+    print("  ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    print("  ".join("-" * w for w in widths))
+    for r in rows:
+        print("  ".join(c.ljust(w) for c, w in zip(r, widths)))
+
+
+def bench_codecs(copies: int) -> None:
+    data = _dataset(copies)
+    print(f"Dataset: {len(data['notes'])} notes, {len(data['tasks'])} tasks")
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, codec in CODECS.items():
+            path = Path(tmp) / f"store.{name}"
+            save_ms = _timeit(lambda: path.write_bytes(codec.dumps(data)))
+            load_ms = _timeit(lambda: codec.loads(path.read_bytes()))
+            label = name
+            if isinstance(codec, FastJsonCodec):
+                label += f" ({codec.backend})"
+            rows.append([label, f"{path.stat().st_size:,}", f"{save_ms:.2f}", f"{load_ms:.2f}"])
+    _print_table(["codec", "bytes", "save ms", "load ms"], rows)
+
+
+def bench_compression(copies: int, content_bytes: int) -> None:
+    data = _dataset(copies)
+    # The real notes are short, so pad each one with words drawn from the
+    # whole dataset to get art-note-sized content that compresses like text.
+    words = re.findall(r"\w+", " ".join(
+        f"{d.get('title', '')} {d.get('content', '')} {d.get('description', '')}"
+        for d in data["notes"] + data["tasks"]
+    )) or ["sketch"]
+    rng = random.Random(0)
+    notes = []
+    for d in data["notes"]:
+        extra = []
+        size = len(d["content"])
+        while size < content_bytes:
+            w = rng.choice(words)
+            extra.append(w)
+            size += len(w) + 1
+        notes.append(Note.from_dict(dict(d, content=(d["content"] + " " + " ".join(extra)).strip())))
+    print(f"Dataset: {len(notes)} notes of ~{content_bytes} bytes each")
+
+    codec = get_codec("json-pretty")
+    saved = compression.METHOD
+    rows = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for method in (None, "zlib", "lzma"):
+                compression.METHOD = method
+                path = Path(tmp) / f"notes.{method or 'plain'}.json"
+                path.write_bytes(codec.dumps({"notes": [n.to_dict() for n in notes]}))
+
+                def load() -> List[Note]:
+                    return [Note.from_dict(d) for d in codec.loads(path.read_bytes())["notes"]]
+
+                def list_tags() -> None:
+                    for n in load():
+                        n.tags
+
+                def read_content() -> None:
+                    for n in load():
+                        n.content
+
+                rows.append([
+                    method or "none",
+                    f"{path.stat().st_size:,}",
+                    f"{_timeit(list_tags):.2f}",
+                    f"{_timeit(read_content):.2f}",
+                ])
+    finally:
+        compression.METHOD = saved
+    _print_table(["compression", "bytes", "load+list ms", "load+read content ms"], rows)
+
+
+# The models as they were before they became slotted classes, to compare
+# against: plain dataclasses, asdict() to encode, now_iso() defaults
+# evaluated for every record.
+
+@dataclass
+class _DataclassNote:
+    id: int
+    title: str
+    content: str
+    tags: List[str]
+    created_at: str
+    updated_at: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "_DataclassNote":
+        return cls(
+            id=data["id"],
+            title=data["title"],
+            content=data.get("content", ""),
+            tags=data.get("tags", []),
+            created_at=data.get("created_at", now_iso()),
+            updated_at=data.get("updated_at", now_iso()),
+        )
+
+
+@dataclass
+class _DataclassTask:
+    id: int
+    title: str
+    description: str
+    priority: str
+    status: str
+    category: Optional[str]
+    due_date: Optional[str]
+    created_at: str
+    completed_at: Optional[str]
+    updated_at: str = ""
+    tip: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "_DataclassTask":
+        return cls(
+            id=data["id"],
+            title=data["title"],
+            description=data.get("description", ""),
+            priority=data.get("priority", "medium"),
+            status=data.get("status", "todo"),
+            category=data.get("category"),
+            due_date=data.get("due_date"),
+            created_at=data.get("created_at", now_iso()),
+            completed_at=data.get("completed_at"),
+            updated_at=data.get("updated_at", now_iso()),
+        )
+
+
+def _bytes_per_object(build: Callable[[], List[Any]]) -> float:
+    """Memory still held by the objects `build` returns, per object."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objs = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / max(len(objs), 1)
+
+
+def bench_models(copies: int) -> None:
+    data = _dataset(copies)
+    print(f"Dataset: {len(data['notes'])} notes, {len(data['tasks'])} tasks")
+    rows = []
+    for key, name, models in (
+        ("notes", "Note", (("dataclass", _DataclassNote), ("slots", Note))),
+        ("tasks", "Task", (("dataclass", _DataclassTask), ("slots", Task))),
+    ):
+        items = data[key]
+        raw = get_codec("json-compact").dumps({key: items})
+        n = max(len(items), 1)
+        for label, cls in models:
+            records = [cls.from_dict(d) for d in items]
+            decode_us = _timeit(lambda: [cls.from_dict(d) for d in items]) * 1000 / n
+            encode_us = _timeit(lambda: [r.to_dict() for r in records]) * 1000 / n
+            # Decoded from the file each time, so strings the records keep
+            # are counted and the parsed dicts are freed again.
+            size = _bytes_per_object(lambda: [cls.from_dict(d) for d in json.loads(raw)[key]])
+            rows.append([f"{name} ({label})", f"{decode_us:.2f}", f"{encode_us:.2f}", f"{size:.0f}"])
+    _print_table(["model", "from_dict us/rec", "to_dict us/rec", "bytes/object"], rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m final.bench", description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="bench", required=True)
+    p = sub.add_parser("codecs", help="size and load/save time per serializer")
+    p.add_argument("--copies", type=int, default=100, help="repeat the real data N times")
+    p = sub.add_parser("compression", help="note content compression: size and load time")
+    p.add_argument("--copies", type=int, default=20, help="repeat the real data N times")
+    p.add_argument("--content-bytes", type=int, default=4000, help="pad each note to about this size")
+    p = sub.add_parser("models", help="per-record encode/decode cost and memory of the models")
+    p.add_argument("--copies", type=int, default=100, help="repeat the real data N times")
+    args = parser.parse_args()
+
+    if args.bench == "codecs":
+        bench_codecs(args.copies)
+    elif args.bench == "compression":
+        bench_compression(args.copies, args.content_bytes)
+    elif args.bench == "models":
+        bench_models(args.copies)
+
+
+if __name__ == "__main__":
+    main()
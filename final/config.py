@@ -5,4 +5,70 @@ import os
 #   macOS/Linux:  export OPENAI_API_KEY="sk-..."
 #   Windows PS:   $env:OPENAI_API_KEY="sk-..."
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
-OPENAI_MODEL = "gpt-4o"
\ No newline at end of file
+OPENAI_MODEL = "gpt-4o"
+
+# Storage engine used by final/storage.py:
+#   "json"    - notes.json / tasks.json (default)
+#   "sqlite"  - final/data/artgrow.db (run `python -m final.sqlite_store` once to migrate)
+#   "sharded" - one content file per note under final/data/notes/ plus a
+#               manifest (run `python -m final.sharded_store` once to migrate)
+#   "journal" - notes.json / tasks.json as snapshots plus an append-only
+#               *.journal file per type; edits append one line each
+STORAGE_BACKEND = os.environ.get("ARTGROW_STORAGE", "json").lower()
+
+# Codec for notes.json / tasks.json (and journal snapshots), per store:
+#   "json-pretty"  - indent=2 JSON (default, the historical format)
+#   "json-compact" - JSON without whitespace
+#   "json-fast"    - compact JSON via orjson/ujson when installed
+#   "binary"       - compact tagged binary records
+# Files keep their names; readers detect the codec from the content, so
+# switching only changes how the next save is written.
+NOTES_CODEC = os.environ.get("ARTGROW_NOTES_CODEC", "json-pretty").lower()
+TASKS_CODEC = os.environ.get("ARTGROW_TASKS_CODEC", "json-pretty").lower()
+
+# Compress long note content inside the notes store ("zlib" or "lzma"; empty
+# disables it). Content is only decompressed when something reads it, so
+# listing, tag filtering and id lookups never pay for it.
+NOTE_COMPRESSION = os.environ.get("ARTGROW_NOTE_COMPRESSION", "").lower()
+NOTE_COMPRESSION_MIN_BYTES = int(os.environ.get("ARTGROW_NOTE_COMPRESSION_MIN_BYTES", "512"))
+
+# `archive-tasks` moves tasks that have been done for longer than this many
+# days out of tasks.json into the compressed final/data/tasks.archive.jsonl.gz.
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARTGROW_ARCHIVE_DAYS", "30"))
+
+# Full-text search (search-notes): stem words (plurals, -ing, -ed) and skip
+# common stopwords. Changing either rebuilds the saved search index.
+SEARCH_STEMMING = os.environ.get("ARTGROW_SEARCH_STEM", "1") != "0"
+SEARCH_STOPWORDS = os.environ.get("ARTGROW_SEARCH_STOPWORDS", "1") != "0"
+SEARCH_TOP_K = int(os.environ.get("ARTGROW_SEARCH_TOP_K", "20"))
+# Results per page of `search` (notes and tasks together).
+SEARCH_PAGE_SIZE = int(os.environ.get("ARTGROW_SEARCH_PAGE_SIZE", "10"))
+# related-notes / related-tasks compare TF-IDF vectors. Above 0 (and with
+# NumPy installed) they are first reduced to this many LSA dimensions,
+# which also relates notes that share context rather than exact words.
+RELATED_DIMS = int(os.environ.get("ARTGROW_RELATED_DIMS", "0"))
+# Embeddings behind `semantic` (final/embeddings.py): "openai" asks the
+# OpenAI API, "hashing" is a deterministic local stand-in that needs no
+# key or network. Vectors are saved in final/data/*.vec and recomputed only
+# for records whose updated_at changed; switching embedders starts over.
+EMBEDDER = os.environ.get("ARTGROW_EMBEDDER", "openai" if OPENAI_API_KEY else "hashing").lower()
+EMBEDDING_MODEL = os.environ.get("ARTGROW_EMBEDDING_MODEL", "text-embedding-3-small")
+# `dedupe` reports notes or tasks whose MinHash similarity (roughly the
+# share of 4-letter pieces of text they have in common) is at least this.
+DEDUPE_THRESHOLD = float(os.environ.get("ARTGROW_DEDUPE_THRESHOLD", "0.7"))
+
+# Fold the journal into a new snapshot once it grows past this many bytes.
+JOURNAL_COMPACT_BYTES = int(os.environ.get("ARTGROW_JOURNAL_COMPACT_BYTES", 256 * 1024))
+
+# Keep parsed notes/tasks in memory between REPL commands and reload them only
+# when the files on disk change. Set ARTGROW_CACHE=0 to always re-read.
+CACHE_RECORDS = os.environ.get("ARTGROW_CACHE", "1") != "0"
+
+# When cached edits are written back to disk (needs ARTGROW_CACHE):
+#   "immediate" - on every change
+#   "command"   - once per REPL command (default)
+#   "idle"      - after ARTGROW_FLUSH_IDLE seconds without further changes
+#   "exit"      - only when the program exits
+# Pending changes are always flushed on exit.
+FLUSH_POLICY = os.environ.get("ARTGROW_FLUSH", "command").lower()
+FLUSH_IDLE_SECONDS = float(os.environ.get("ARTGROW_FLUSH_IDLE", "2.0"))
@@ -0,0 +1,96 @@
+# final/dates.py
+from __future__ import annotations
+import re
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+
+# Stored timestamps are naive local ISO strings (see models.now_iso); epochs
+# computed from them are local-time based too. Due dates are calendar days,
+# kept as proleptic Gregorian ordinals (date.toordinal()).
+
+
+def parse_epoch(value: Optional[str]) -> Optional[float]:
+    """Seconds since the epoch for an ISO timestamp or date, None if it isn't one."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.strip()).timestamp()
+    except (ValueError, TypeError, OverflowError, OSError):
+        return None
+
+
+def parse_ordinal(value: Optional[str]) -> Optional[int]:
+    """Day ordinal for an ISO date (a time part is ignored), None if it isn't one."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return date.fromisoformat(value[:10]).toordinal()
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).date().toordinal()
+    except ValueError:
+        return None
+
+
+def ordinal_iso(ordinal: int) -> str:
+    return date.fromordinal(ordinal).isoformat()
+
+
+def epoch_iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch).isoformat(timespec="seconds")
+
+
+_RELATIVE = re.compile(r"^(\d+)\s*([mhdw])$")
+_UNIT_SECONDS = {"m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def parse_since(value: str, now: Optional[datetime] = None) -> Optional[float]:
+    """Epoch for `since` arguments: an ISO date/time, `today`, `yesterday`,
+    or a relative span such as `30m`, `12h`, `3d`, `2w`."""
+    value = value.strip().lower()
+    now = now or datetime.now()
+    if value == "today":
+        return datetime.combine(now.date(), datetime.min.time()).timestamp()
+    if value == "yesterday":
+        return datetime.combine(now.date() - timedelta(days=1), datetime.min.time()).timestamp()
+    m = _RELATIVE.match(value)
+    if m:
+        return now.timestamp() - int(m.group(1)) * _UNIT_SECONDS[m.group(2)]
+    return parse_epoch(value)
+
+
+def due_range(args: List[str], today: Optional[date] = None) -> Tuple[Optional[int], Optional[int], str]:
+    """(first day, last day, label) for the arguments of the `due` command.
+
+        due                  the next 7 days, today included
+        due today | week | month
+        due overdue          everything due before today
+        due <date>           everything due on or before <date>
+        due <from> <to>      an inclusive range
+
+    Raises ValueError for anything else.
+    """
+    today = today or date.today()
+    t = today.toordinal()
+    if not args:
+        return t, t + 6, "in the next 7 days"
+    word = args[0].lower()
+    if len(args) == 1:
+        if word == "today":
+            return t, t, "today"
+        if word == "week":
+            return t, t + 6, "in the next 7 days"
+        if word == "month":
+            return t, t + 29, "in the next 30 days"
+        if word == "overdue":
+            return None, t - 1, "before today"
+        end = parse_ordinal(args[0])
+        if end is None:
+            raise ValueError(f"not a date: {args[0]!r}")
+        return None, end, f"by {ordinal_iso(end)}"
+    start, end = parse_ordinal(args[0]), parse_ordinal(args[1])
+    if start is None or end is None:
+        raise ValueError(f"not a date range: {' '.join(args[:2])!r}")
+    return start, end, f"between {ordinal_iso(start)} and {ordinal_iso(end)}"
@@ -0,0 +1,309 @@
+# final/dedupe.py
+from __future__ import annotations
+import json
+import operator
+import re
+from array import array
+from copy import copy
+from hashlib import blake2b
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .task_table import _little_endian
+
+MAGIC = b"AGMH2\n"
+
+# Records are sets of SHINGLE-character pieces of their casefolded words,
+# which survives typos and re-capitalisation ("tutroial" / "Tutorial").
+SHINGLE = 4
+
+# PERMUTATIONS min-hashes per record, cut into BANDS bands for LSH: two
+# records become candidates when any band matches entirely, which happens
+# almost surely above 0.7 similarity and rarely below 0.3. Candidates are
+# then kept only if their estimated similarity reaches the threshold.
+PERMUTATIONS = 64
+BANDS = 16
+# A record is compared with at most this many group representatives of a
+# bucket, which bounds the work when one bucket holds thousands of records.
+REPRESENTATIVES = 16
+
+_BIN_BITS = 6             # log2(PERMUTATIONS)
+_VALUE_SPAN = 1 << (32 - _BIN_BITS)
+_EMPTY = 0xFFFFFFFF
+
+_WORD = re.compile(r"\w+")
+
+
+def shingles(text: str) -> Set[str]:
+    """The record's shingles; texts shorter than SHINGLE are one shingle, blank ones none."""
+    text = " ".join(_WORD.findall(text.casefold()))
+    if len(text) <= SHINGLE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE] for i in range(len(text) - SHINGLE + 1)}
+
+
+def _hash(piece: str) -> int:
+    return int.from_bytes(blake2b(piece.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def signature(pieces: Set[str]) -> Optional[array]:
+    """The MinHash signature of a set of shingles, None for an empty set.
+
+    One hash per shingle, split into PERMUTATIONS bins by its low bits
+    (one-permutation hashing), keeping each bin's smallest value: the same
+    estimator as PERMUTATIONS separate hash functions at 1/PERMUTATIONS of
+    the cost. A bin no shingle fell into copies the next filled bin to its
+    right, offset by the distance (densification), so short texts still
+    fill every bin consistently.
+    """
+    if not pieces:
+        return None
+    sig = array("I", [_EMPTY]) * PERMUTATIONS
+    for piece in pieces:
+        h = _hash(piece)
+        b, value = h & (PERMUTATIONS - 1), h >> _BIN_BITS
+        if value < sig[b]:
+            sig[b] = value
+    filled = [b for b in range(PERMUTATIONS) if sig[b] != _EMPTY]
+    if len(filled) < PERMUTATIONS:
+        for b in range(PERMUTATIONS):
+            if sig[b] == _EMPTY:
+                source = next((f for f in filled if f > b), filled[0] + PERMUTATIONS)
+                sig[b] = sig[source % PERMUTATIONS] + (source - b) * _VALUE_SPAN
+    return sig
+
+
+def similarity(a: array, b: array) -> float:
+    """Estimated Jaccard similarity: the share of min-hashes two signatures agree on."""
+    return sum(map(operator.eq, a, b)) / PERMUTATIONS
+
+
+class SignatureStore:
+    """MinHash signatures of one kind of record, saved between runs.
+
+    The file holds a JSON header listing (id, updated_at) per row and
+    then the signatures as raw uint32s; sync() only re-signs records whose
+    updated_at changed or that changed() was told about (our own writes,
+    which can land within the second updated_at is precise to), so a
+    second `dedupe` reads the file and hashes nothing. Records with no text have no signature and are never
+    duplicates.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.signatures: Dict[int, array] = {}
+        self._versions: Dict[int, str] = {}
+        self._dirty: Set[int] = set()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            raw = self.path.read_bytes()
+        except FileNotFoundError:
+            return
+        end = raw.find(b"\n", len(MAGIC))
+        if not raw.startswith(MAGIC) or end < 0:
+            return
+        try:
+            header = json.loads(raw[len(MAGIC):end])
+        except ValueError:
+            return
+        rows = header.get("rows", [])
+        if header.get("permutations") != PERMUTATIONS or header.get("shingle") != SHINGLE:
+            return
+        values = array("I")
+        body = raw[end + 1:end + 1 + len(rows) * PERMUTATIONS * values.itemsize]
+        if len(body) != len(rows) * PERMUTATIONS * values.itemsize:
+            return  # torn: sign everything again
+        values.frombytes(body)
+        values = _little_endian(values)
+        for n, (record_id, version) in enumerate(rows):
+            self._versions[record_id] = version
+            self.signatures[record_id] = values[n * PERMUTATIONS:(n + 1) * PERMUTATIONS]
+        # records without text are remembered with no signature
+        for record_id, version in header.get("empty", []):
+            self._versions[record_id] = version
+
+    def changed(self, record_ids: Iterable[int]) -> None:
+        """Have the next sync() re-sign these records whatever their updated_at."""
+        self._dirty.update(record_ids)
+
+    def sync(self, versions: Iterable[Tuple[int, str]], text_of: Callable[[int], Optional[str]]) -> int:
+        """Bring the signatures in line with the records: `versions` gives
+        every record's (id, updated_at), `text_of(id)` its text. Returns
+        how many records were signed."""
+        seen = set()
+        signed = 0
+        for record_id, version in versions:
+            seen.add(record_id)
+            if self._versions.get(record_id, ...) == version and record_id not in self._dirty:
+                continue
+            text = text_of(record_id)
+            if text is None:
+                continue
+            sig = signature(shingles(text))
+            self._versions[record_id] = version
+            if sig is None:
+                self.signatures.pop(record_id, None)
+            else:
+                self.signatures[record_id] = sig
+            signed += 1
+        self._dirty.clear()
+        gone = [i for i in self._versions if i not in seen]
+        for record_id in gone:
+            del self._versions[record_id]
+            self.signatures.pop(record_id, None)
+        if signed or gone:
+            self._save()
+        return signed
+
+    def _save(self) -> None:
+        from .storage import _replace_bytes
+
+        ids = sorted(self.signatures)
+        header = {
+            "permutations": PERMUTATIONS,
+            "shingle": SHINGLE,
+            "rows": [[i, self._versions[i]] for i in ids],
+            "empty": [[i, v] for i, v in self._versions.items() if i not in self.signatures],
+        }
+        values = array("I")
+        for i in ids:
+            values.extend(self.signatures[i])
+        body = _little_endian(values).tobytes()
+        _replace_bytes(self.path, b"".join([MAGIC, json.dumps(header, separators=(",", ":")).encode("utf-8"), b"\n", body]))
+
+
+def clusters(signatures: Dict[int, array], threshold: float) -> List[List[Tuple[int, float]]]:
+    """Groups of records whose signatures are at least `threshold` similar,
+    largest first, each as [(id, similarity to the group's first id)]
+    sorted by id.
+
+    LSH buckets records by each band of their signature, so only records
+    sharing a band are ever compared; within a bucket a record is
+    compared with the bucket's first REPRESENTATIVES group representatives,
+    not with every member, so a thousand copies of one task cost a
+    thousand comparisons.
+    """
+    rows = PERMUTATIONS // BANDS
+    parent: Dict[int, int] = {}
+
+    def find(i: int) -> int:
+        root = i
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while i != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    for band in range(BANDS):
+        buckets: Dict[bytes, List[int]] = {}
+        start = band * rows
+        for record_id, sig in signatures.items():
+            buckets.setdefault(sig[start:start + rows].tobytes(), []).append(record_id)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            reps: List[int] = []
+            for record_id in members:
+                if find(record_id) in {find(rep) for rep in reps}:
+                    continue
+                sig = signatures[record_id]
+                for rep in reps:
+                    if similarity(signatures[rep], sig) >= threshold:
+                        parent[find(record_id)] = find(rep)
+                        break
+                else:
+                    if len(reps) < REPRESENTATIVES:
+                        reps.append(record_id)
+
+    groups: Dict[int, List[int]] = {}
+    for record_id in signatures:
+        groups.setdefault(find(record_id), []).append(record_id)
+    result = []
+    for members in groups.values():
+        if len(members) > 1:
+            members.sort()
+            first = signatures[members[0]]
+            result.append([(i, similarity(first, signatures[i])) for i in members])
+    result.sort(key=lambda g: (-len(g), g[0][0]))
+    return result
+
+
+# ---------- Merging ----------
+
+_PRIORITY_RANK = {"low": 0, "medium": 1, "high": 2}
+_STATUS_RANK = {"todo": 0, "in-progress": 1, "done": 2}
+
+
+def merge_notes(notes: List[Any]) -> Any:
+    """Fold near-duplicate notes into (a copy of) the oldest: every tag, the longest content."""
+    from .models import now_iso
+
+    keep = copy(min(notes, key=lambda n: n.id))
+    tags = list(keep.tags)
+    for n in notes:
+        tags += [t for t in n.tags if t not in tags]
+    keep.tags = tags
+    keep.content = max((n.content for n in notes), key=len)
+    keep.updated_at = now_iso()
+    return keep
+
+
+def merge_tasks(tasks: List[Any]) -> Any:
+    """Fold near-duplicate tasks into (a copy of) the oldest: the furthest
+    status, the highest priority, the earliest due date, the longest
+    description."""
+    from .models import now_iso
+
+    keep = copy(min(tasks, key=lambda t: t.id))
+    furthest = max(tasks, key=lambda t: _STATUS_RANK.get(t.status, 0))
+    keep.status, keep.completed_at = furthest.status, furthest.completed_at
+    keep.priority = max((t.priority for t in tasks), key=lambda p: _PRIORITY_RANK.get(p, 1))
+    keep.category = keep.category or next((t.category for t in tasks if t.category), None)
+    due = [t.due_date for t in tasks if t.due_date]
+    keep.due_date = min(due) if due else None
+    keep.description = max((t.description for t in tasks), key=len)
+    keep.updated_at = now_iso()
+    return keep
+
+
+def print_dedupe(kind: str, titles: bool = False, merge: bool = False) -> None:
+    """Report (and with `merge`, offer to fold) near-duplicate notes or tasks."""
+    from .config import DEDUPE_THRESHOLD
+    from .storage import delete_note, delete_task, get_note, get_task, signature_store, unit_of_work, upsert_note, upsert_task
+
+    fetch = get_task if kind == "tasks" else get_note
+    groups = clusters(signature_store(kind, titles).signatures, DEDUPE_THRESHOLD)
+    what = f"{kind[:-1]} titles" if titles else kind
+    if not groups:
+        print(f"No near-duplicate {what} (similarity >= {DEDUPE_THRESHOLD:.0%}).")
+        return
+
+    print(f"Near-duplicate {what} (similarity >= {DEDUPE_THRESHOLD:.0%}):")
+    for group in groups:
+        found = [(r, score) for r, score in ((fetch(i), score) for i, score in group) if r is not None]
+        if len(found) < 2:
+            continue
+        records = [r for r, _ in found]
+        print()
+        for r, score in found:
+            extra = f"({r.status}) " if kind == "tasks" else ""
+            print(f"  [{r.id}] {extra}{r.title} {score:.0%}")
+        if not merge:
+            continue
+
+        print(f"Merge these {len(records)} into #{records[0].id}? (y/n): ", end="")
+        if input().strip().lower() != "y":
+            print("Skipped.")
+            continue
+        with unit_of_work():
+            if kind == "tasks":
+                upsert_task(merge_tasks(records))
+                for r in records[1:]:
+                    delete_task(r.id)
+            else:
+                upsert_note(merge_notes(records))
+                for r in records[1:]:
+                    delete_note(r.id)
+        print(f"Merged into #{records[0].id}.")
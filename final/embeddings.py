@@ -0,0 +1,414 @@
+# final/embeddings.py
+from __future__ import annotations
+import heapq
+import json
+import math
+import mmap
+import operator
+import zlib
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .task_table import _little_endian
+
+try:  # optional: vectorized scoring and the IVF index; brute force works without
+    import numpy as np
+except ImportError:
+    np = None
+
+# Stores with at least this many vectors are searched through an IVF index
+# (when NumPy is installed): the vectors are split into about sqrt(n)
+# clusters and a query only scores the PROBE_FRACTION closest clusters.
+IVF_MIN_ROWS = 5000
+PROBE_FRACTION = 0.1
+# The clusters are retrained once the store has doubled or halved since.
+RETRAIN_FACTOR = 2
+
+# Records sent to the embedder per call.
+BATCH = 128
+
+_ITEM = 4  # float32
+
+
+# ---------- Embedders ----------
+
+class HashingEmbedder:
+    """A deterministic local embedder: analyzed words and word pairs
+    hashed into `dims` signed buckets, weighted 1 + log(count).
+
+    Needs no model or network and gives the same vector for the same text
+    in every run, so it stands in for a real embedder in tests and
+    offline. Its neighbours share words rather than meaning.
+    """
+
+    def __init__(self, dims: int = 256):
+        from .text_index import default_analyzer
+
+        self.dims = dims
+        self.key = f"hashing-{dims}"
+        self._analyzer = default_analyzer()
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        vectors = []
+        for text in texts:
+            terms = [t for _, t in self._analyzer.tokens(text)]
+            features = Counter(terms)
+            features.update(f"{a} {b}" for a, b in zip(terms, terms[1:]))
+            vector = [0.0] * self.dims
+            for feature, count in features.items():
+                h = zlib.crc32(feature.encode("utf-8"))
+                weight = 1 + math.log(count)
+                vector[h % self.dims] += weight if h & 0x80000000 else -weight
+            vectors.append(vector)
+        return vectors
+
+
+class OpenAIEmbedder:
+    """Embeddings from the OpenAI API (needs OPENAI_API_KEY and the network)."""
+
+    def __init__(self, model: str):
+        from openai import OpenAI
+
+        from .config import OPENAI_API_KEY
+
+        self.model = model
+        self.key = f"openai-{model}"
+        self._client = OpenAI(api_key=OPENAI_API_KEY)
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        resp = self._client.embeddings.create(model=self.model, input=[t or " " for t in texts])
+        return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+
+def _openai_embedder() -> OpenAIEmbedder:
+    from .config import EMBEDDING_MODEL
+
+    return OpenAIEmbedder(EMBEDDING_MODEL)
+
+
+# name -> factory; an embedder has a `key` naming its vector space and
+# embed(texts) -> one list of floats per text.
+EMBEDDERS: Dict[str, Callable[[], Any]] = {
+    "hashing": HashingEmbedder,
+    "openai": _openai_embedder,
+}
+
+
+def get_embedder(name: Optional[str] = None):
+    from .config import EMBEDDER
+
+    name = (name or EMBEDDER).lower()
+    if name not in EMBEDDERS:
+        raise ValueError(f"Unknown embedder {name!r} (expected one of: {', '.join(EMBEDDERS)})")
+    return EMBEDDERS[name]()
+
+
+def _unit(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else list(vector)
+
+
+# ---------- Store ----------
+
+class EmbeddingStore:
+    """Unit-length embeddings of one kind of record, kept on disk.
+
+    `path` holds a float32 matrix, one row per record, which is
+    memory-mapped rather than read, so opening the store costs nothing
+    and a search only touches the pages it scores. `<path>.json` maps
+    rows to record ids and the updated_at each row was computed from;
+    sync() embeds only records whose updated_at differs or that changed()
+    was told about (our own writes, which can land within the second
+    updated_at is precise to), and reuses the rows of deleted ones.
+    Changing the embedder starts the store over.
+
+    search() scores every row for small stores; from IVF_MIN_ROWS on (with
+    NumPy) an IVF index saved in `<path>.ivf` narrows it to the rows in
+    the clusters closest to the query, which is approximate.
+    """
+
+    def __init__(self, path: Path, embedder: Any):
+        self.path = path
+        self.map_path = path.with_name(path.name + ".json")
+        self.ivf_path = path.with_name(path.name + ".ivf")
+        self.embedder = embedder
+        self.dims: Optional[int] = None
+        self._ids: List[Optional[int]] = []          # row -> record id, None when free
+        self._versions: List[Optional[str]] = []
+        self._row_of: Dict[int, int] = {}
+        self._free: List[int] = []
+        self._serial = 0                             # bumped per save; the .ivf must match
+        self._mm: Optional[mmap.mmap] = None
+        self._matrix = None                          # NumPy view of _mm
+        self._ivf: Optional[_Partitions] = None
+        self._dirty: Set[int] = set()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def _load(self) -> None:
+        try:
+            saved = json.loads(self.map_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            saved = None
+        rows = saved.get("rows", []) if isinstance(saved, dict) else []
+        size = self.path.stat().st_size if self.path.exists() else 0
+        if not saved or saved.get("embedder") != self.embedder.key or size < len(rows) * saved["dims"] * _ITEM:
+            self._reset()
+            return
+        self.dims = saved["dims"]
+        self._serial = saved.get("serial", 0)
+        for row, entry in enumerate(rows):
+            record_id, version = entry if entry else (None, None)
+            self._ids.append(record_id)
+            self._versions.append(version)
+            if record_id is None:
+                self._free.append(row)
+            else:
+                self._row_of[record_id] = row
+        if rows:
+            self._map(len(rows))
+        if np is not None:
+            self._ivf = _Partitions.load(self.ivf_path, self._serial, len(rows))
+
+    def _reset(self) -> None:
+        self._close()
+        self.dims, self._ids, self._versions, self._row_of, self._free = None, [], [], {}, []
+        self._ivf = None
+        for path in (self.path, self.map_path, self.ivf_path):
+            path.unlink(missing_ok=True)
+
+    # ---------- Memory map ----------
+
+    def _map(self, rows: int) -> None:
+        """Map the matrix file, growing it (by doubling) to hold `rows` rows."""
+        need = rows * self.dims * _ITEM
+        size = self.path.stat().st_size if self.path.exists() else 0
+        if self._mm is not None and size >= need:
+            return
+        self._close()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.touch()
+        with open(self.path, "r+b") as f:
+            if size < need:
+                f.truncate(max(need, 2 * size, 64 * self.dims * _ITEM))
+            f.flush()
+            self._mm = mmap.mmap(f.fileno(), 0)
+        if np is not None:
+            self._matrix = np.frombuffer(self._mm, dtype="<f4").reshape(-1, self.dims)
+
+    def _close(self) -> None:
+        self._matrix = None  # drop the view first: a mapping with live views can't close
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def _write(self, row: int, vector: Sequence[float]) -> None:
+        if self._matrix is not None:
+            self._matrix[row] = vector
+        else:
+            start = row * self.dims * _ITEM
+            self._mm[start:start + self.dims * _ITEM] = _little_endian(array("f", vector)).tobytes()
+
+    def _read(self, row: int) -> array:
+        start = row * self.dims * _ITEM
+        values = array("f")
+        values.frombytes(self._mm[start:start + self.dims * _ITEM])
+        return _little_endian(values)
+
+    # ---------- Updates ----------
+
+    def changed(self, record_ids: Iterable[int]) -> None:
+        """Have the next sync() embed these records again whatever their updated_at."""
+        self._dirty.update(record_ids)
+
+    def sync(self, versions: Iterable[Tuple[int, str]], text_of: Callable[[int], Optional[str]]) -> int:
+        """Bring the store in line with the records: `versions` gives every
+        record's (id, updated_at), `text_of(id)` the text to embed. Only new
+        and changed records are embedded; returns how many were."""
+        seen = set()
+        todo = []
+        for record_id, version in versions:
+            seen.add(record_id)
+            row = self._row_of.get(record_id)
+            if row is None or self._versions[row] != version or record_id in self._dirty:
+                todo.append((record_id, version))
+        gone = [i for i in self._row_of if i not in seen]
+        for record_id in gone:
+            self._remove(record_id)
+
+        embedded = 0
+        for start in range(0, len(todo), BATCH):
+            batch = [(i, v, text_of(i)) for i, v in todo[start:start + BATCH]]
+            batch = [b for b in batch if b[2] is not None]
+            if not batch:
+                continue
+            vectors = [_unit(v) for v in self.embedder.embed([text for _, _, text in batch])]
+            if self.dims is None:
+                self.dims = len(vectors[0])
+            for (record_id, version, _), vector in zip(batch, vectors):
+                if len(vector) != self.dims:
+                    raise ValueError(f"embedder returned {len(vector)} dimensions, the store has {self.dims}")
+                self._put(record_id, version, vector)
+            embedded += len(batch)
+        self._dirty.clear()
+
+        if self._retrain() or embedded or gone:
+            self._save()
+        return embedded
+
+    def _put(self, record_id: int, version: str, vector: List[float]) -> None:
+        row = self._row_of.get(record_id)
+        if row is None:
+            row = self._free.pop() if self._free else len(self._ids)
+            if row == len(self._ids):
+                self._ids.append(None)
+                self._versions.append(None)
+                self._map(len(self._ids))
+            self._ids[row] = record_id
+            self._row_of[record_id] = row
+        self._versions[row] = version
+        self._write(row, vector)
+        if self._ivf is not None:
+            self._ivf.put(row, self._matrix[row])
+
+    def _remove(self, record_id: int) -> None:
+        row = self._row_of.pop(record_id)
+        self._ids[row] = self._versions[row] = None
+        self._free.append(row)
+        if self._ivf is not None:
+            self._ivf.remove(row)
+
+    def _retrain(self) -> bool:
+        """(Re)build or drop the IVF index as the store's size calls for; True if it did."""
+        if np is None:
+            return False
+        n = len(self._row_of)
+        if n < IVF_MIN_ROWS:
+            dropped, self._ivf = self._ivf is not None, None
+            return dropped
+        if self._ivf is None or not self._ivf.trained / RETRAIN_FACTOR <= n <= self._ivf.trained * RETRAIN_FACTOR:
+            live = np.fromiter(self._row_of.values(), dtype=np.int64, count=n)
+            self._ivf = _Partitions.train(self._matrix, live, len(self._ids))
+            return True
+        return False
+
+    def _save(self) -> None:
+        from .storage import _replace_bytes, _replace_text
+
+        if self._mm is not None:
+            self._mm.flush()  # the rows must be on disk before a map that points at them
+        self._serial += 1
+        if self._ivf is not None:
+            _replace_bytes(self.ivf_path, self._ivf.to_bytes(self._serial))
+        else:
+            self.ivf_path.unlink(missing_ok=True)
+        rows = [[i, v] if i is not None else None for i, v in zip(self._ids, self._versions)]
+        saved = {"embedder": self.embedder.key, "dims": self.dims, "serial": self._serial, "rows": rows}
+        _replace_text(self.map_path, json.dumps(saved, separators=(",", ":")))
+
+    # ---------- Search ----------
+
+    def search(self, query: Sequence[float], k: int = 20) -> List[Tuple[int, float]]:
+        """The k records closest to a query embedding, as (id, cosine).
+        Only records with a positive cosine count, so a zero query (a text
+        with no terms) matches nothing."""
+        if not self._row_of or k <= 0:
+            return []
+        q = _unit(query)
+        if len(q) != self.dims:
+            raise ValueError(f"query has {len(q)} dimensions, the store has {self.dims}")
+        if not any(q):
+            return []
+        if np is None:
+            scored = ((sum(map(operator.mul, self._read(row), q)), record_id) for record_id, row in self._row_of.items())
+            return [(record_id, score) for score, record_id in heapq.nlargest(k, scored) if score > 0]
+
+        q = np.asarray(q, dtype=np.float32)
+        if self._ivf is not None:
+            rows = self._ivf.candidates(q)
+        else:
+            rows = np.fromiter(self._row_of.values(), dtype=np.int64, count=len(self._row_of))
+        scores = self._matrix[rows] @ q
+        if len(rows) > k:
+            top = np.argpartition(-scores, k)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return [(self._ids[int(rows[i])], float(scores[i])) for i in order if scores[i] > 0]
+
+
+class _Partitions:
+    """An IVF index: centroids from spherical k-means over the store's
+    vectors, and each row's cluster (-1 for free rows)."""
+
+    MAGIC = b"AGIVF1\n"
+
+    def __init__(self, centroids, assigned, trained: int):
+        self.centroids = centroids
+        self.assigned = assigned
+        self.trained = trained
+
+    @classmethod
+    def train(cls, matrix, live, capacity: int, iterations: int = 10) -> "_Partitions":
+        rng = np.random.default_rng(0)
+        lists = max(1, int(math.sqrt(len(live))))
+        sample = matrix[np.sort(rng.choice(live, min(len(live), 64 * lists), replace=False))]
+        centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+        for _ in range(iterations):
+            nearest = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, nearest, sample)
+            empty = ~sums.any(axis=1)
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+        assigned = np.full(capacity, -1, dtype=np.int32)
+        for block in np.array_split(live, max(1, len(live) // 4096)):
+            assigned[block] = np.argmax(matrix[block] @ centroids.T, axis=1)
+        return cls(centroids.astype(np.float32), assigned, len(live))
+
+    def put(self, row: int, vector) -> None:
+        if row >= len(self.assigned):
+            self.assigned = np.concatenate([self.assigned, np.full(max(row + 1, 2 * len(self.assigned)) - len(self.assigned), -1, dtype=np.int32)])
+        self.assigned[row] = int(np.argmax(self.centroids @ vector))
+
+    def remove(self, row: int) -> None:
+        self.assigned[row] = -1
+
+    def candidates(self, q):
+        """The rows in the PROBE_FRACTION clusters nearest to `q`."""
+        probes = max(1, math.ceil(PROBE_FRACTION * len(self.centroids)))
+        nearest = np.argpartition(-(self.centroids @ q), probes - 1)[:probes]
+        return np.flatnonzero(np.isin(self.assigned, nearest))
+
+    def to_bytes(self, serial: int) -> bytes:
+        header = {"serial": serial, "trained": self.trained, "lists": len(self.centroids),
+                  "dims": self.centroids.shape[1], "rows": len(self.assigned)}
+        return b"".join([
+            self.MAGIC, json.dumps(header).encode("utf-8"), b"\n",
+            self.centroids.astype("<f4").tobytes(), self.assigned.astype("<i4").tobytes(),
+        ])
+
+    @classmethod
+    def load(cls, path: Path, serial: int, rows: int) -> Optional["_Partitions"]:
+        """The saved index, or None if it's missing or doesn't match the store's last save."""
+        try:
+            raw = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        end = raw.find(b"\n", len(cls.MAGIC))
+        if not raw.startswith(cls.MAGIC) or end < 0:
+            return None
+        try:
+            header = json.loads(raw[len(cls.MAGIC):end])
+        except ValueError:
+            return None
+        if header.get("serial") != serial or header.get("rows", 0) < rows:
+            return None
+        lists, dims = header["lists"], header["dims"]
+        start = end + 1
+        centroids = np.frombuffer(raw, dtype="<f4", count=lists * dims, offset=start).reshape(lists, dims)
+        assigned = np.frombuffer(raw, dtype="<i4", count=header["rows"], offset=start + lists * dims * _ITEM).copy()
+        return cls(centroids, assigned, header["trained"])
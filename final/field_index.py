@@ -0,0 +1,97 @@
+# final/field_index.py
+from __future__ import annotations
+from fnmatch import fnmatchcase
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .sorted_index import SortedIndex
+
+
+def fold(value: Optional[str]) -> Optional[str]:
+    """How field values are compared: casefolded, None for a missing or blank one."""
+    if value is None:
+        return None
+    value = value.strip().casefold()
+    return value or None
+
+
+class FieldIndex:
+    """Secondary indexes over a few fields of one kind of record.
+
+    `values` fields (status, priority, category) map each casefolded value
+    to the set of ids that have it; `ranges` fields (dates) are
+    SortedIndexes. Both are keyed by functions of the record, so notes,
+    note summaries and lazy tasks index alike. put() and remove() keep
+    everything current one record at a time.
+    """
+
+    def __init__(
+        self,
+        values: Dict[str, Callable[[Any], Optional[str]]],
+        ranges: Dict[str, Callable[[Any], Optional[float]]],
+    ):
+        self._value_of = values
+        self._ids: Dict[str, Dict[str, Set[int]]] = {name: {} for name in values}
+        self._values_by_id: Dict[int, Tuple[Optional[str], ...]] = {}
+        self._ranges = {name: SortedIndex(key_of) for name, key_of in ranges.items()}
+
+    def __len__(self) -> int:
+        return len(self._values_by_id)
+
+    @classmethod
+    def build(
+        cls,
+        records: Iterable[Any],
+        values: Dict[str, Callable[[Any], Optional[str]]],
+        ranges: Dict[str, Callable[[Any], Optional[float]]],
+    ) -> "FieldIndex":
+        index = cls(values, ranges)
+        records = list(records)
+        for r in records:
+            index._put_values(r)
+        for sorted_index in index._ranges.values():
+            sorted_index.build(records)  # one sort instead of an insort per record
+        return index
+
+    def put(self, record: Any) -> None:
+        self.remove(record.id)
+        self._put_values(record)
+        for sorted_index in self._ranges.values():
+            sorted_index.put(record)
+
+    def _put_values(self, record: Any) -> None:
+        values = tuple(fold(value_of(record)) for value_of in self._value_of.values())
+        for ids, v in zip(self._ids.values(), values):
+            if v is not None:
+                ids.setdefault(v, set()).add(record.id)
+        self._values_by_id[record.id] = values
+
+    def remove(self, record_id: int) -> None:
+        values = self._values_by_id.pop(record_id, None)
+        if values is None:
+            return
+        for ids, v in zip(self._ids.values(), values):
+            if v is not None:
+                group = ids[v]
+                group.discard(record_id)
+                if not group:
+                    del ids[v]
+        for sorted_index in self._ranges.values():
+            sorted_index.remove(record_id)
+
+    # ---------- Lookups ----------
+
+    def ids(self) -> Set[int]:
+        return set(self._values_by_id)
+
+    def values(self, field: str, pattern: str) -> List[str]:
+        """The indexed values of `field` matching a glob (`anatomy*`), casefolded."""
+        pattern = fold(pattern) or ""
+        if not any(c in pattern for c in "*?["):
+            return [pattern] if pattern in self._ids[field] else []
+        return sorted(v for v in self._ids[field] if fnmatchcase(v, pattern))
+
+    def with_value(self, field: str, value: str) -> Set[int]:
+        return self._ids[field].get(value, set())
+
+    def range(self, field: str) -> SortedIndex:
+        return self._ranges[field]
@@ -0,0 +1,277 @@
+# final/journal_store.py
+from __future__ import annotations
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .models import Note, Task
+from .locks import lock_for
+from .storage import JsonBackend, _load_json, _replace_json
+
+
+class JournaledCollection:
+    """Snapshot file + append-only journal for one record type.
+
+    The snapshot has the layout of notes.json / tasks.json plus a
+    "generation" that every new snapshot increments. Each mutation appends
+    one JSON line to the journal, tagged with the generation it applies to:
+
+        {"op": "put", "gen": 3, "data": {...}}   create or update
+        {"op": "del", "gen": 3, "id": 12}        delete
+
+    Loading replays the journal's entries for the snapshot's generation on
+    top of it; entries for an older one (a journal that a crash left behind
+    after its replacement snapshot was written) are skipped. Once the
+    journal grows past `compact_bytes`, a background thread folds it into
+    a fresh snapshot and truncates it.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        snapshot_path: Path,
+        journal_path: Path,
+        from_dict: Callable[[Dict[str, Any]], Any],
+        compact_bytes: int,
+        codec=None,
+    ):
+        self.key = key
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.from_dict = from_dict
+        self.compact_bytes = compact_bytes
+        self.codec = codec
+        # Guards snapshot + journal together: a reader must never see the new
+        # snapshot's predecessor after compaction has dropped the journal.
+        self.lock = lock_for(snapshot_path)
+        self._compactor: Optional[threading.Thread] = None
+        self._snapshot_stamp: Optional[tuple] = None
+        self._generation = 0
+
+    # ---------- Reading ----------
+
+    def _stamp(self) -> Optional[tuple]:
+        try:
+            st = self.snapshot_path.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _current_generation(self) -> int:
+        """The snapshot's generation; the file is only read again once it changed."""
+        stamp = self._stamp()
+        if stamp != self._snapshot_stamp:
+            self._generation = _load_json(self.snapshot_path).get("generation", 0) if stamp else 0
+            self._snapshot_stamp = stamp
+        return self._generation
+
+    def _replay(self) -> Dict[int, Dict[str, Any]]:
+        stamp = self._stamp()
+        snapshot = _load_json(self.snapshot_path)
+        self._snapshot_stamp, self._generation = stamp, snapshot.get("generation", 0)
+        state = {d["id"]: d for d in snapshot.get(self.key, [])}
+        if not self.journal_path.exists():
+            return state
+        with self.journal_path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line torn by a crash mid-append; the records
+                    # around it are intact.
+                    continue
+                if entry.get("gen", 0) != self._generation:
+                    continue
+                if entry.get("op") == "put":
+                    state[entry["data"]["id"]] = entry["data"]
+                elif entry.get("op") == "del":
+                    state.pop(entry["id"], None)
+        return state
+
+    def load(self) -> List[Any]:
+        with self.lock.shared():
+            state = self._replay()
+        return [self.from_dict(state[i]) for i in sorted(state)]
+
+    def get(self, record_id: int) -> Optional[Any]:
+        with self.lock.shared():
+            data = self._replay().get(record_id)
+        return self.from_dict(data) if data is not None else None
+
+    # ---------- Writing ----------
+
+    def _append(self, entries: List[Dict[str, Any]]) -> None:
+        with self.lock.exclusive():
+            gen = self._current_generation()
+            lines = "".join(
+                json.dumps({**e, "gen": gen}, ensure_ascii=False, separators=(",", ":")) + "\n"
+                for e in entries
+            )
+            self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.journal_path.open("a", encoding="utf-8") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+        self._maybe_compact()
+
+    def put(self, record: Any) -> None:
+        self._append([{"op": "put", "data": record.to_dict()}])
+
+    def apply(self, puts: List[Any], deletes: List[int]) -> None:
+        """Append a whole batch with a single write + fsync."""
+        entries = [{"op": "del", "id": i} for i in deletes]
+        entries += [{"op": "put", "data": r.to_dict()} for r in puts]
+        if entries:
+            self._append(entries)
+
+    def delete(self, record_id: int) -> bool:
+        with self.lock.exclusive():
+            if record_id not in self._replay():
+                return False
+            self._append([{"op": "del", "id": record_id}])
+        return True
+
+    def save_all(self, records: List[Any]) -> None:
+        """Replace everything: write a new snapshot and drop the journal."""
+        with self.lock.exclusive():
+            self._write_snapshot([r.to_dict() for r in records])
+
+    def _write_snapshot(self, items: List[Dict[str, Any]]) -> None:
+        gen = self._current_generation() + 1
+        _replace_json(self.snapshot_path, {"generation": gen, self.key: items}, self.codec)
+        self._snapshot_stamp, self._generation = self._stamp(), gen
+        # Only drop the journal after the new snapshot is in place. If a
+        # crash keeps it, its entries carry the old generation and replay
+        # skips them, so records save_all removed don't come back.
+        if self.journal_path.exists():
+            self.journal_path.unlink()
+
+    # ---------- Compaction ----------
+
+    def journal_size(self) -> int:
+        try:
+            return self.journal_path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def compact(self) -> None:
+        with self.lock.exclusive():
+            if not self.journal_path.exists():
+                return
+            state = self._replay()
+            self._write_snapshot([state[i] for i in sorted(state)])
+
+    def _maybe_compact(self) -> None:
+        if self.journal_size() < self.compact_bytes:
+            return
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(
+            target=self.compact, name=f"compact-{self.key}", daemon=False
+        )
+        self._compactor.start()
+
+    def wait(self) -> None:
+        if self._compactor is not None:
+            self._compactor.join()
+
+
+class JournalBackend(JsonBackend):
+    """Journaled JSON storage: O(record) writes, snapshot + replay reads.
+
+    The tag/status/due-date scans are inherited from JsonBackend and run over
+    the replayed state.
+    """
+
+    name = "journal"
+    per_record_writes = True
+
+    def __init__(
+        self,
+        notes_file: Path,
+        notes_journal: Path,
+        tasks_file: Path,
+        tasks_journal: Path,
+        compact_bytes: int,
+        notes_codec=None,
+        tasks_codec=None,
+    ):
+        self.notes = JournaledCollection(
+            "notes", notes_file, notes_journal, Note.from_dict, compact_bytes, notes_codec
+        )
+        self.tasks = JournaledCollection(
+            "tasks", tasks_file, tasks_journal, Task.from_dict, compact_bytes, tasks_codec
+        )
+
+    def notes_lock(self):
+        return self.notes.lock
+
+    def tasks_lock(self):
+        return self.tasks.lock
+
+    def note_paths(self) -> List[Path]:
+        return [self.notes.snapshot_path, self.notes.journal_path]
+
+    def task_paths(self) -> List[Path]:
+        return [self.tasks.snapshot_path, self.tasks.journal_path]
+
+    # The snapshot alone isn't the current state, so no side index.
+
+    def notes_index(self):
+        return None
+
+    def tasks_index(self):
+        return None
+
+    # ---------- Notes ----------
+
+    def load_notes(self) -> List[Note]:
+        return self.notes.load()
+
+    def save_notes(self, notes: List[Note]) -> None:
+        self.notes.save_all(notes)
+
+    def iter_notes(self) -> Iterator[Note]:
+        # The journal can override any snapshot record, so replay first.
+        return iter(self.load_notes())
+
+    def apply_notes(self, puts: List[Note], deletes: List[int]) -> None:
+        self.notes.apply(puts, deletes)
+
+    def get_note(self, note_id: int) -> Optional[Note]:
+        return self.notes.get(note_id)
+
+    def upsert_note(self, note: Note) -> None:
+        self.notes.put(note)
+
+    def delete_note(self, note_id: int) -> bool:
+        return self.notes.delete(note_id)
+
+    # ---------- Tasks ----------
+
+    def load_tasks(self) -> List[Task]:
+        return self.tasks.load()
+
+    def save_tasks(self, tasks: List[Task]) -> None:
+        self.tasks.save_all(tasks)
+
+    def iter_tasks(self) -> Iterator[Task]:
+        return iter(self.load_tasks())
+
+    def apply_tasks(self, puts: List[Task], deletes: List[int]) -> None:
+        self.tasks.apply(puts, deletes)
+
+    def get_task(self, task_id: int) -> Optional[Task]:
+        return self.tasks.get(task_id)
+
+    def upsert_task(self, task: Task) -> None:
+        self.tasks.put(task)
+
+    def delete_task(self, task_id: int) -> bool:
+        return self.tasks.delete(task_id)
+
+    def compact(self) -> None:
+        self.notes.compact()
+        self.tasks.compact()
@@ -0,0 +1,144 @@
+# final/json_stream.py
+from __future__ import annotations
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterator, TextIO, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WS = " \t\r\n"
+
+
+class _Reader:
+    """A sliding text buffer over a file; only unparsed text is kept.
+
+    With `track_bytes` it also keeps the UTF-8 byte offset of a moving mark
+    so callers can ask where in the file a value started and ended. Each
+    character is encoded at most once for that.
+    """
+
+    def __init__(self, f: TextIO, chunk_size: int, track_bytes: bool = False):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.track_bytes = track_bytes
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self._mark = 0          # index into buf ...
+        self._mark_bytes = 0    # ... and its byte offset in the file
+
+    def byte_offset(self, index: int) -> int:
+        """File byte offset of buf[index]; index must not move backwards."""
+        self._mark_bytes += len(self.buf[self._mark:index].encode("utf-8"))
+        self._mark = index
+        return self._mark_bytes
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        if self.track_bytes:
+            self.byte_offset(self.pos)
+            self._mark = 0
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ("" at end of file)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"expected {char!r}, found {found!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decode one complete JSON value, reading more text as needed."""
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the very end of the buffer may continue in the
+            # next chunk; containers and strings can't be cut that way.
+            if end == len(self.buf) and not self.eof and self.buf[self.pos] not in '{["':
+                if self._fill():
+                    continue
+            self.pos = end
+            return obj
+
+
+def iter_array(path: Path, key: str, chunk_size: int = CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """Yield the items of `{key: [...]}` one at a time.
+
+    Only the item being decoded is held in memory, so a multi-hundred-MB
+    notes.json streams with flat memory use. Other top-level keys are
+    skipped. A missing file yields nothing; malformed JSON raises ValueError
+    (json.JSONDecodeError is a subclass).
+    """
+    for item, _, _ in _iter(path, key, chunk_size, track_bytes=False):
+        yield item
+
+
+def iter_array_spans(
+    path: Path, key: str, chunk_size: int = CHUNK_SIZE
+) -> Iterator[Tuple[Dict[str, Any], int, int]]:
+    """Like iter_array, but yield (item, start, end) byte offsets too.
+
+    `raw[start:end]` of the file is exactly the item's JSON text, so it can
+    be re-read later with one seek instead of another full parse.
+    """
+    return _iter(path, key, chunk_size, track_bytes=True)
+
+
+def _iter(path: Path, key: str, chunk_size: int, track_bytes: bool):
+    if not path.exists():
+        return
+    # newline="" keeps \r\n as two characters so byte offsets stay exact.
+    with path.open("r", encoding="utf-8", newline="") as f:
+        r = _Reader(f, chunk_size, track_bytes)
+        if r.peek() == "":
+            return
+        r.expect("{")
+        if r.peek() == "}":
+            return
+        while True:
+            name = r.value()
+            r.expect(":")
+            if name != key:
+                r.value()
+            else:
+                r.expect("[")
+                if r.peek() == "]":
+                    r.pos += 1
+                else:
+                    while True:
+                        if not track_bytes:
+                            yield r.value(), 0, 0
+                        else:
+                            r.peek()
+                            start = r.byte_offset(r.pos)
+                            item = r.value()
+                            yield item, start, r.byte_offset(r.pos)
+                        if r.peek() == "]":
+                            r.pos += 1
+                            break
+                        r.expect(",")
+            if r.peek() == "}":
+                return
+            r.expect(",")
@@ -0,0 +1,317 @@
+# final/link_graph.py
+from __future__ import annotations
+import json
+import re
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+# [[Note title]], also [[Note title#Heading]] and [[Note title|shown text]]
+_WIKILINK = re.compile(r"\[\[\s*([^\[\]|#]+?)\s*(?:#[^\[\]|]*)?(?:\|[^\[\]]*)?\]\]")
+# #task-12, not inside a longer word like abc#task-12
+_TASK_REF = re.compile(r"(?<![\w#-])#task-(\d+)\b", re.IGNORECASE)
+
+
+def title_key(title: str) -> str:
+    """How [[links]] match note titles: casefolded, whitespace collapsed."""
+    return " ".join(title.split()).casefold()
+
+
+def references(text: str) -> Tuple[FrozenSet[str], FrozenSet[int]]:
+    """The note titles (as title_key) and task ids a text links to."""
+    titles = frozenset(title_key(m) for m in _WIKILINK.findall(text))
+    tasks = frozenset(int(m) for m in _TASK_REF.findall(text))
+    return titles, tasks
+
+
+class LinkGraph:
+    """Links between notes and tasks, from `[[Note title]]` and `#task-12`
+    in note content and task descriptions.
+
+    Nodes are shared keys (storage.note_key / task_key: note #n is 2n,
+    task #n is 2n + 1). Each record's parsed references are saved in a
+    JSON file with the updated_at they were read at; sync() only reads
+    the content of records whose updated_at changed, or that changed()
+    was told about (our own writes, which can land within the second
+    updated_at is precise to). A [[title]] is
+    kept as the title and resolved when asked, so a link to a note that
+    doesn't exist yet starts working once the note is created, and
+    renaming a note moves its backlinks with it.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._refs: Dict[int, Tuple[str, FrozenSet[str], FrozenSet[int]]] = {}  # key -> (version, titles, task ids)
+        self._linking_title: Dict[str, Set[int]] = {}   # title key -> keys linking to it
+        self._linking_task: Dict[int, Set[int]] = {}    # task id -> keys linking to it
+        self._notes_titled: Dict[str, Set[int]] = {}    # title key -> note ids
+        self._note_title: Dict[int, str] = {}           # note id -> title key
+        self._tasks: Set[int] = set()
+        self._dirty: Set[int] = set()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            saved = json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return
+        for key, (version, titles, tasks) in saved.get("refs", {}).items():
+            self._set(int(key), version, frozenset(titles), frozenset(tasks))
+
+    def _set(self, key: int, version: str, titles: FrozenSet[str], tasks: FrozenSet[int]) -> None:
+        self._drop(key)
+        self._refs[key] = (version, titles, tasks)
+        for t in titles:
+            self._linking_title.setdefault(t, set()).add(key)
+        for t in tasks:
+            self._linking_task.setdefault(t, set()).add(key)
+
+    def _drop(self, key: int) -> None:
+        old = self._refs.pop(key, None)
+        if old is None:
+            return
+        for index, targets in ((self._linking_title, old[1]), (self._linking_task, old[2])):
+            for t in targets:
+                keys = index[t]
+                keys.discard(key)
+                if not keys:
+                    del index[t]
+
+    def changed(self, keys: Iterable[int]) -> None:
+        """Have the next sync() re-read these records whatever their updated_at."""
+        self._dirty.update(keys)
+
+    def sync(self, notes: Iterable[Any], tasks: Iterable[Any], text_of: Callable[[int], Optional[str]]) -> int:
+        """Bring the graph in line with the records: `notes` are note
+        summaries (id, title, updated_at), `tasks` tasks (id, updated_at),
+        `text_of(key)` the text of a changed one. Returns how many records
+        were re-read."""
+        from .storage import note_key, task_key
+
+        self._notes_titled, self._note_title, self._tasks = {}, {}, set()
+        current: Dict[int, str] = {}
+        for n in notes:
+            t = title_key(n.title)
+            self._note_title[n.id] = t
+            self._notes_titled.setdefault(t, set()).add(n.id)
+            current[note_key(n.id)] = n.updated_at or n.created_at
+        for task in tasks:
+            self._tasks.add(task.id)
+            current[task_key(task.id)] = task.updated_at or task.created_at
+
+        read = 0
+        for key, version in current.items():
+            saved = self._refs.get(key)
+            if saved is not None and saved[0] == version and key not in self._dirty:
+                continue
+            text = text_of(key)
+            if text is None:
+                continue
+            self._set(key, version, *references(text))
+            read += 1
+        self._dirty.clear()
+        gone = [key for key in self._refs if key not in current]
+        for key in gone:
+            self._drop(key)
+        if read or gone:
+            self._save()
+        return read
+
+    def _save(self) -> None:
+        from .storage import _replace_text
+
+        refs = {str(key): [version, sorted(titles), sorted(tasks)] for key, (version, titles, tasks) in self._refs.items()}
+        _replace_text(self.path, json.dumps({"refs": refs}, separators=(",", ":")))
+
+    # ---------- Queries ----------
+
+    def exists(self, key: int) -> bool:
+        return (key >> 1) in (self._tasks if key & 1 else self._note_title)
+
+    def links(self, key: int) -> Set[int]:
+        """The keys a note or task links to (only ones that exist)."""
+        from .storage import note_key, task_key
+
+        refs = self._refs.get(key)
+        if refs is None:
+            return set()
+        _, titles, tasks = refs
+        out = {note_key(n) for t in titles for n in self._notes_titled.get(t, ())}
+        out.update(task_key(t) for t in tasks if t in self._tasks)
+        out.discard(key)
+        return out
+
+    def backlinks(self, key: int) -> Set[int]:
+        """The keys of the notes and tasks linking to this one."""
+        if key & 1:
+            keys = self._linking_task.get(key >> 1, set())
+        else:
+            keys = self._linking_title.get(self._note_title.get(key >> 1), set())
+        return {k for k in keys if k != key and k in self._refs}
+
+    def _adjacent(self, key: int) -> Set[int]:
+        return self.links(key) | self.backlinks(key)
+
+    def neighbourhood(self, key: int, hops: int = 2) -> Dict[int, int]:
+        """Every key within `hops` links of `key` (either direction), with its distance."""
+        seen = {key: 0}
+        frontier = [key]
+        for distance in range(1, hops + 1):
+            nxt = []
+            for k in frontier:
+                for other in self._adjacent(k):
+                    if other not in seen:
+                        seen[other] = distance
+                        nxt.append(other)
+            if not nxt:
+                break
+            frontier = nxt
+        del seen[key]
+        return seen
+
+    def shortest_path(self, start: int, goal: int) -> Optional[List[int]]:
+        """The fewest links (either direction) from `start` to `goal`, as
+        the keys along the way, or None if they aren't connected.
+
+        Searches breadth-first from both ends, always widening the smaller
+        side, so it touches far fewer records than a one-sided search."""
+        if start == goal:
+            return [start]
+        before: Dict[int, Optional[int]] = {start: None}   # key -> previous key from start
+        after: Dict[int, Optional[int]] = {goal: None}     # key -> next key towards goal
+        ahead, behind = [start], [goal]
+        while ahead and behind:
+            forward = len(ahead) <= len(behind)
+            frontier, came, other = (ahead, before, after) if forward else (behind, after, before)
+            nxt = []
+            for k in frontier:
+                for adj in self._adjacent(k):
+                    if adj in came:
+                        continue
+                    came[adj] = k
+                    if adj in other:
+                        return _join(adj, before, after)
+                    nxt.append(adj)
+            if forward:
+                ahead = nxt
+            else:
+                behind = nxt
+        return None
+
+    def orphans(self) -> List[int]:
+        """Ids of the notes with no links in or out."""
+        from .storage import note_key
+
+        return sorted(n for n in self._note_title if not self._adjacent(note_key(n)))
+
+
+def _join(meet: int, before: Dict[int, Optional[int]], after: Dict[int, Optional[int]]) -> List[int]:
+    path = []
+    k: Optional[int] = meet
+    while k is not None:
+        path.append(k)
+        k = before[k]
+    path.reverse()
+    k = after[meet]
+    while k is not None:
+        path.append(k)
+        k = after[k]
+    return path
+
+
+# ---------- Commands ----------
+
+_NODE = re.compile(r"#?(?:(note|task)-?)?(\d+)", re.IGNORECASE)
+
+
+def parse_node(text: str) -> Optional[int]:
+    """The key for `12` or `note-12` (a note) or `task-12` / `#task-12` (a task)."""
+    from .storage import note_key, task_key
+
+    m = _NODE.fullmatch(text.strip())
+    if not m:
+        return None
+    record_id = int(m.group(2))
+    return task_key(record_id) if (m.group(1) or "").lower() == "task" else note_key(record_id)
+
+
+def _describe(key: int) -> str:
+    from .storage import get_note, get_task
+
+    if key & 1:
+        t = get_task(key >> 1)
+        return f"task [{t.id}] ({t.status}) {t.title}" if t else f"task [{key >> 1}] (missing)"
+    n = get_note(key >> 1)
+    return f"note [{n.id}] {n.title}" if n else f"note [{key >> 1}] (missing)"
+
+
+def _node(graph: LinkGraph, text: str) -> Optional[int]:
+    key = parse_node(text)
+    if key is None:
+        print(f"Not a note or task: {text!r} (use 12 for a note, task-12 for a task).")
+    elif not graph.exists(key):
+        print(f"No {'task' if key & 1 else 'note'} found with id {key >> 1}.")
+        key = None
+    return key
+
+
+def print_links(text: str, backlinks: bool = False) -> None:
+    from .storage import link_graph
+
+    graph = link_graph()
+    key = _node(graph, text)
+    if key is None:
+        return
+    keys = graph.backlinks(key) if backlinks else graph.links(key)
+    what = "Links to" if backlinks else "Links from"
+    if not keys:
+        print(f"{what} {_describe(key)}: none.")
+        return
+    print(f"{what} {_describe(key)}:")
+    for k in sorted(keys):
+        print(f"- {_describe(k)}")
+
+
+def print_neighbourhood(text: str, hops: int = 2) -> None:
+    from .storage import link_graph
+
+    graph = link_graph()
+    key = _node(graph, text)
+    if key is None:
+        return
+    near = graph.neighbourhood(key, hops)
+    if not near:
+        print(f"Nothing within {hops} link(s) of {_describe(key)}.")
+        return
+    print(f"Within {hops} link(s) of {_describe(key)}:")
+    for k, distance in sorted(near.items(), key=lambda kv: (kv[1], kv[0])):
+        print(f"  {distance}  {_describe(k)}")
+
+
+def print_path(start_text: str, goal_text: str) -> None:
+    from .storage import link_graph
+
+    graph = link_graph()
+    start, goal = _node(graph, start_text), _node(graph, goal_text)
+    if start is None or goal is None:
+        return
+    path = graph.shortest_path(start, goal)
+    if path is None:
+        print(f"No chain of links between {_describe(start)} and {_describe(goal)}.")
+        return
+    print(f"{len(path) - 1} link(s):")
+    for k in path:
+        print(f"  {_describe(k)}")
+
+
+def print_orphans() -> None:
+    from .storage import get_note, link_graph
+
+    orphans = link_graph().orphans()
+    if not orphans:
+        print("No orphan notes: every note links or is linked.")
+        return
+    print(f"Notes with no links in or out ({len(orphans)}):")
+    for note_id in orphans:
+        n = get_note(note_id)
+        if n is not None:
+            print(f"- [{n.id}] {n.title}")
@@ -0,0 +1,152 @@
+# final/locks.py
+from __future__ import annotations
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class RWFileLock:
+    """Cross-process reader/writer lock on a sidecar `<file>.lock`.
+
+    POSIX uses flock(): many processes may hold the shared lock at once,
+    a writer holding the exclusive lock keeps everyone else out. Windows
+    has no shared byte-range mode in msvcrt, so there both modes are
+    exclusive.
+
+    flock() locks belong to the open file, so each process keeps one
+    descriptor per lock, held while any of its threads holds the lock.
+    Inside the process, shared holds are a reader count under a Condition,
+    so threads read side by side; only exclusive holds take the RLock,
+    which also makes them reentrant. A waiting writer keeps new readers
+    out. Nested use in the same thread is free; asking for exclusive
+    inside shared upgrades the lock once the other threads' readers are
+    done.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._mutex = threading.RLock()     # held for exclusive holds only
+        self._cond = threading.Condition()  # guards the fields below
+        self._fd: Optional[int] = None
+        self._mode: Optional[str] = None
+        self._readers = 0                   # shared holds, all threads
+        self._writer: Optional[int] = None  # thread holding the exclusive lock
+        self._writer_depth = 0
+        self._writers_waiting = 0
+        self._local = threading.local()     # .shared: this thread's shared holds
+
+    def _os_lock(self, mode: str) -> None:
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX if mode == "ex" else fcntl.LOCK_SH)
+        else:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+
+    def _os_unlock(self) -> None:
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+
+    def _acquire_os(self, mode: str) -> None:
+        """Take (or convert) the process's file lock; call with _cond held."""
+        if self._fd is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._os_lock(mode)
+        elif mode != self._mode and fcntl is not None:
+            # flock() converts in place; msvcrt's lock is exclusive already.
+            self._os_lock(mode)
+        self._mode = mode
+
+    def _release_os(self) -> None:
+        self._os_unlock()
+        os.close(self._fd)
+        self._fd = None
+        self._mode = None
+
+    def _my_shared(self) -> int:
+        return getattr(self._local, "shared", 0)
+
+    @contextmanager
+    def shared(self) -> Iterator[None]:
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me:
+                # A thread already reading goes ahead even with a writer
+                # waiting, or the two would wait on each other.
+                while self._writer is not None or (self._writers_waiting and not self._my_shared()):
+                    self._cond.wait()
+                if self._fd is None:
+                    self._acquire_os("sh")
+            self._readers += 1
+            self._local.shared = self._my_shared() + 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                self._local.shared -= 1
+                if self._readers == 0 and self._writer is None:
+                    self._release_os()
+                self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        me = threading.get_ident()
+        with self._mutex:
+            with self._cond:
+                if self._writer != me:
+                    self._writers_waiting += 1
+                    try:
+                        while self._readers > self._my_shared():
+                            self._cond.wait()
+                    finally:
+                        self._writers_waiting -= 1
+                    self._writer = me
+                    self._acquire_os("ex")
+                self._writer_depth += 1
+            try:
+                yield
+            finally:
+                with self._cond:
+                    self._writer_depth -= 1
+                    if self._writer_depth == 0:
+                        self._writer = None
+                        if self._readers:
+                            self._acquire_os("sh")  # back to this thread's shared hold
+                        else:
+                            self._release_os()
+                        self._cond.notify_all()
+
+
+class NullLock:
+    """For engines that do their own locking (SQLite)."""
+
+    @contextmanager
+    def shared(self) -> Iterator[None]:
+        yield
+
+    exclusive = shared
+
+
+_locks: Dict[Path, RWFileLock] = {}
+_locks_guard = threading.Lock()
+
+
+def lock_for(path: Path) -> RWFileLock:
+    """The process-wide lock guarding `path` (one per file, created on demand)."""
+    lock_path = path.with_name(path.name + ".lock")
+    with _locks_guard:
+        if lock_path not in _locks:
+            _locks[lock_path] = RWFileLock(lock_path)
+        return _locks[lock_path]
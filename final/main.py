@@ -5,7 +5,9 @@ import cmd
 from . import pkms, task_manager
 from .pkms import find_note_by_id
 from .ai_agents import summarize_note_for_artist, suggest_practice_routine
-from .storage import log_command
+from .storage import log_command, command_finished, flush
+from .config import ARCHIVE_AFTER_DAYS
+from .dates import due_range, parse_since
 
 
 
@@ -22,12 +24,30 @@ def print_help() -> None:
     print("""
 Commands:
 
+  # Everything
+  search <query> [--page N]   - notes and tasks together, best match first, a page at a time
+  semantic <query>            - notes and tasks closest in meaning (embeddings, see ARTGROW_EMBEDDER)
+  dedupe [notes|tasks] [--titles] [--merge]
+                              - near-duplicate notes/tasks (--titles compares titles only;
+                                --merge offers to fold each group into its oldest record)
+
   # Notes (PKMS): Your Brain, Dump theory, observations, class notes, anatomy breakdown, etc.
   add-note                    - create a new note
   list-notes                  - list all notes
   view-note <id>              - show one note
-  search-notes <query>        - search title/content/tags
-  filter-notes tag <name>     - list notes that contain a specific tag
+  search-notes <query> [--top N] [--explain]
+                              - ranked search of title/content/tags ("quoted words" = phrase);
+                                narrow with tag:anatomy updated>2025-06-01 created<30d -tag:old
+  filter-notes tag <expr>     - notes by tag: `anatomy AND gesture NOT hands`, `(a OR b)`;
+                                `anatomy` also matches nested tags like `anatomy/hips`
+  tags                        - every tag with its note count
+  related-notes <id> [N]      - the N notes most similar to this one (default 10, offline)
+  links <id>                  - what a note links to with [[Note title]] / #task-12
+  backlinks <id>              - the notes and tasks linking to a note
+                                (<id> is a note id, or task-12 for a task, in all link commands)
+  neighbours <id> [hops]      - everything within N links of a note or task (default 2)
+  path <from> <to>            - the shortest chain of links between two notes/tasks
+  orphans                     - notes with no links in or out
   delete-note <id>            - delete a note (with confirmation)
   edit-note <id>              - edit a note
 
@@ -35,12 +55,22 @@ Commands:
 
   # Tasks: Your drawing assignments, practice routines, challenges, etc.
   add-task                    - create a new task
-  list-tasks [status]         - list tasks (optionally filter by todo/in-progress/done)
+  list-tasks [status|query]   - list tasks (optionally filter by todo/in-progress/done or a query)
   complete-task <id>          - mark a task as done
   start-task <id>             - mark a task as in-progress
   delete-task <id>            - delete a task
-  search-tasks <query>        - search tasks by title/description  
+  search-tasks <query> [--explain]
+                              - search tasks by title/description, narrowed with fields:
+                                status:todo priority:high,medium category:"Anatomy*"
+                                due<2025-12-01 updated>3d -status:done;
+                                --explain shows which indexes answered each part
   edit-task <id>              - edit a task
+  related-tasks <id> [N]      - the N active tasks most similar to this one (default 10)
+  archive-tasks [days]        - move tasks done more than N days ago (default 30) to the archive
+  due [today|week|month|overdue|<date>|<from> <to>]
+                              - open tasks by due date (default: the next 7 days)
+  since <date|3d|12h|today>   - notes and tasks changed since then
+  stats [weeks]               - completion rate, time to done, backlog by category and week
 
   # AI helpers: Make things easier with AI
   ai-summarize-note <id>      - summarize a note as a short tip
@@ -73,6 +103,43 @@ def handle_command(line: str) -> bool:
         print_help()
         return True
 
+    if cmd == "search":
+        page = 1
+        if len(args) >= 2 and args[-2] == "--page":
+            try:
+                page = max(int(args[-1]), 1)
+            except ValueError:
+                print("--page needs a number.")
+                return True
+            args = args[:-2]
+        if not args:
+            print("Usage: search <query> [--page N]")
+            return True
+        from .search import print_search
+        print_search(" ".join(args), page)
+        return True
+
+    if cmd == "dedupe":
+        flags = {a for a in args if a.startswith("--")}
+        kinds = [a for a in args if not a.startswith("--")] or ["notes", "tasks"]
+        if flags - {"--titles", "--merge"} or any(k not in ("notes", "tasks") for k in kinds):
+            print("Usage: dedupe [notes|tasks] [--titles] [--merge]")
+            return True
+        from .dedupe import print_dedupe
+        for n, kind in enumerate(kinds):
+            if n:
+                print()
+            print_dedupe(kind, "--titles" in flags, "--merge" in flags)
+        return True
+
+    if cmd == "semantic":
+        if not args:
+            print("Usage: semantic <query>")
+            return True
+        from .search import print_semantic
+        print_semantic(" ".join(args))
+        return True
+
     # ----- Notes -----
     if cmd == "add-note":
         pkms.add_note_interactive()
@@ -106,11 +173,21 @@ def handle_command(line: str) -> bool:
         return True
 
     if cmd == "search-notes":
+        explain = "--explain" in args
+        args = [a for a in args if a != "--explain"]
+        top = None
+        if len(args) >= 2 and args[-2] == "--top":
+            try:
+                top = max(int(args[-1]), 1)
+            except ValueError:
+                print("--top needs a number.")
+                return True
+            args = args[:-2]
         if not args:
-            print("Usage: search-notes <query>")
+            print("Usage: search-notes <query> [--top N] [--explain]")
             return True
         query = " ".join(args)
-        pkms.search_notes(query)
+        pkms.search_notes(query, top, explain)
         return True
     
     # ----- Delete Note -----
@@ -130,13 +207,62 @@ def handle_command(line: str) -> bool:
     # ----- Filter Notes by Tag -----
     if cmd == "filter-notes":
         if len(args) < 2 or args[0] != "tag":
-            print("Usage: filter-notes tag <tagname>")
+            print("Usage: filter-notes tag <tag> [AND|OR|NOT <tag> ...]")
             return True
 
         tag = " ".join(args[1:])
         pkms.filter_notes_by_tag(tag)
         return True
 
+    if cmd == "tags":
+        pkms.list_tags()
+        return True
+
+    if cmd in ("links", "backlinks"):
+        if len(args) != 1:
+            print(f"Usage: {cmd} <id>  (a note id, or task-12)")
+            return True
+        from .link_graph import print_links
+        print_links(args[0], backlinks=cmd == "backlinks")
+        return True
+
+    if cmd == "neighbours":
+        try:
+            hops = max(int(args[1]), 1) if len(args) > 1 else 2
+            target = args[0]
+        except (IndexError, ValueError):
+            print("Usage: neighbours <id> [hops]")
+            return True
+        from .link_graph import print_neighbourhood
+        print_neighbourhood(target, hops)
+        return True
+
+    if cmd == "path":
+        if len(args) != 2:
+            print("Usage: path <from> <to>")
+            return True
+        from .link_graph import print_path
+        print_path(args[0], args[1])
+        return True
+
+    if cmd == "orphans":
+        from .link_graph import print_orphans
+        print_orphans()
+        return True
+
+    if cmd in ("related-notes", "related-tasks"):
+        try:
+            record_id = int(args[0])
+            k = max(int(args[1]), 1) if len(args) > 1 else 10
+        except (IndexError, ValueError):
+            print(f"Usage: {cmd} <id> [N]")
+            return True
+        if cmd == "related-notes":
+            pkms.related_notes(record_id, k)
+        else:
+            task_manager.related_tasks(record_id, k)
+        return True
+
 
     # ----- Tasks -----
     if cmd == "add-task":
@@ -158,7 +284,7 @@ def handle_command(line: str) -> bool:
 
 
     if cmd == "list-tasks":
-        status = args[0] if args else None
+        status = " ".join(args) if args else None
         task_manager.list_tasks(status_filter=status)
         return True
 
@@ -198,11 +324,50 @@ def handle_command(line: str) -> bool:
         return True
 
     if cmd == "search-tasks":
+        explain = "--explain" in args
+        args = [a for a in args if a != "--explain"]
         if not args:
-            print("Usage: search-tasks <query>")
+            print("Usage: search-tasks <query> [--explain]")
             return True
         query = " ".join(args)
-        task_manager.search_tasks(query)
+        task_manager.search_tasks(query, explain)
+        return True
+
+    if cmd == "archive-tasks":
+        try:
+            days = int(args[0]) if args else ARCHIVE_AFTER_DAYS
+        except ValueError:
+            print("Usage: archive-tasks [days]")
+            return True
+        task_manager.archive_tasks(days)
+        return True
+
+    if cmd == "due":
+        try:
+            start, end, label = due_range(args)
+        except ValueError as e:
+            print(f"{e}. Usage: due [today|week|month|overdue|<date>|<from> <to>]")
+            return True
+        task_manager.list_due(start, end, label)
+        return True
+
+    if cmd == "since":
+        since = parse_since(" ".join(args)) if args else None
+        if since is None:
+            print("Usage: since <YYYY-MM-DD[THH:MM]|today|yesterday|3d|12h|2w>")
+            return True
+        pkms.list_notes_since(since)
+        print()
+        task_manager.list_tasks_since(since)
+        return True
+
+    if cmd == "stats":
+        try:
+            weeks = int(args[0]) if args else 8
+        except ValueError:
+            print("Usage: stats [weeks]")
+            return True
+        task_manager.show_stats(max(weeks, 1))
         return True
 
     # ----- AI -----
@@ -358,15 +523,20 @@ def handle_command(line: str) -> bool:
 def main() -> None:
     print(BANNER)
     print_help()
-    while True:
-        try:
-            line = input("> ")
-        except (EOFError, KeyboardInterrupt):
-            print("\nGoodbye!")
-            break
-        if not handle_command(line):
-            print("Goodbye!")
-            break
+    try:
+        while True:
+            try:
+                line = input("> ")
+            except (EOFError, KeyboardInterrupt):
+                print("\nGoodbye!")
+                break
+            keep_going = handle_command(line)
+            command_finished()
+            if not keep_going:
+                print("Goodbye!")
+                break
+    finally:
+        flush()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,164 @@
+# final/meta_index.py
+from __future__ import annotations
+import functools
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .json_stream import iter_array, iter_array_spans
+from .locks import lock_for
+from .models import Note, Task, hydrate, is_loaded, lazy_record
+from .repository import file_stamp
+from .serializers import get_codec
+from .storage import _load_json, _replace_json, _streamable
+
+# The fields listing and filtering need; everything else stays on disk
+# until a lazy record is asked for it.
+HOT_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "notes": ("id", "title", "tags", "created_at", "updated_at"),
+    "tasks": (
+        "id", "title", "priority", "status", "category", "due_date",
+        "created_at", "completed_at", "updated_at",
+    ),
+}
+RECORD_TYPES = {"notes": Note, "tasks": Task}
+INDEX_VERSION = 1
+
+
+class MetaIndex:
+    """Hot fields and byte spans of every record in a JSON store file.
+
+    Kept next to the store as `<name>.meta.json`:
+
+        {"version": 1, "stamp": [mtime_ns, size], "fields": [...],
+         "records": [[start, end, <hot field values>...], ...]}
+
+    The stamp is that of the store when the index was built. A store that
+    changed since (our own save or anyone else's edit) gets the index
+    rebuilt from one streaming pass on the next read; otherwise reading the
+    index is all it takes to list every record.
+
+    records() hands out lazy records whose cold fields (note content, task
+    description and tip) are read back with a single seek to their span.
+    """
+
+    def __init__(self, store: Path, key: str):
+        self.store = store
+        self.key = key
+        self.fields = HOT_FIELDS[key]
+        self.cls = RECORD_TYPES[key]
+        self.path = store.with_name(f"{store.stem}.meta.json")
+        self._rows: Optional[List[List[Any]]] = None
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    # ---------- Index ----------
+
+    def _fresh_rows(self) -> Tuple[Optional[List[List[Any]]], Any]:
+        """(rows, store stamp); rows is None when the store can't be indexed."""
+        with lock_for(self.store).shared(), self._lock:
+            stamp = file_stamp([self.store])[0]
+            if stamp is None:
+                return [], None
+            if self._rows is not None and self._stamp == stamp:
+                return self._rows, stamp
+            if not _streamable(self.store):
+                return None, stamp
+            saved = _load_json(self.path)
+            if (
+                saved.get("version") == INDEX_VERSION
+                and saved.get("stamp") == list(stamp)
+                and saved.get("fields") == list(self.fields)
+            ):
+                rows = saved["records"]
+            else:
+                rows = self._build()
+                _replace_json(
+                    self.path,
+                    {"version": INDEX_VERSION, "stamp": list(stamp), "fields": list(self.fields), "records": rows},
+                    get_codec("json-compact"),
+                )
+            self._rows, self._stamp = rows, stamp
+            return rows, stamp
+
+    def _build(self) -> List[List[Any]]:
+        try:
+            return [
+                [start, end, *(d.get(f) for f in self.fields)]
+                for d, start, end in iter_array_spans(self.store, self.key)
+            ]
+        except ValueError:
+            return []
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._rows = self._stamp = None
+
+    # ---------- Records ----------
+
+    def hot_dicts(self) -> Optional[Iterator[Dict[str, Any]]]:
+        """The hot fields of every record, or None if the store isn't indexable."""
+        rows, _ = self._fresh_rows()
+        if rows is None:
+            return None
+        fields = self.fields
+        return (dict(zip(fields, row[2:])) for row in rows)
+
+    def records(self) -> Optional[List[Any]]:
+        """Lazy records for the whole store, or None if it isn't indexable."""
+        rows, stamp = self._fresh_rows()
+        if rows is None:
+            return None
+        fields, cls = self.fields, self.cls
+        return [
+            lazy_record(
+                cls,
+                dict(zip(fields, row[2:])),
+                functools.partial(self._fetch, row[2], row[0], row[1], stamp),
+            )
+            for row in rows
+        ]
+
+    def _fetch(self, record_id: int, start: int, end: int, stamp) -> Optional[Dict[str, Any]]:
+        with lock_for(self.store).shared():
+            if file_stamp([self.store])[0] == stamp:
+                with self.store.open("rb") as f:
+                    f.seek(start)
+                    return json.loads(f.read(end - start))
+            # Rewritten since the span was taken; find the record by id.
+            try:
+                return next((d for d in iter_array(self.store, self.key) if d.get("id") == record_id), None)
+            except ValueError:
+                return None
+
+    def hydrate_all(self, records: List[Any]) -> None:
+        """Load every lazy record in `records` in one pass over the store.
+
+        Cheaper than a seek per record before a whole-file save. Call it
+        with the store locked.
+        """
+        pending = {r.id: r for r in records if not is_loaded(r)}
+        if not pending or not _streamable(self.store):
+            return
+        try:
+            for d in iter_array(self.store, self.key):
+                r = pending.pop(d.get("id"), None)
+                if r is not None:
+                    hydrate(r, d)
+        except ValueError:
+            return  # left lazy; each falls back to its own span
+        for r in pending.values():  # no longer in the store
+            hydrate(r, {})
+
+
+_indexes: Dict[Path, MetaIndex] = {}
+_indexes_guard = threading.Lock()
+
+
+def index_for(store: Path, key: str) -> MetaIndex:
+    """The process-wide side index of `store` (one per file, created on demand)."""
+    with _indexes_guard:
+        if store not in _indexes:
+            _indexes[store] = MetaIndex(store, key)
+        return _indexes[store]
@@ -1,22 +1,56 @@
 
 from __future__ import annotations
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import Any, Callable, Dict, List, Optional
+
+from . import compression
+from .dates import parse_epoch, parse_ordinal
+from .vocab import VOCAB
 
 
 def now_iso() -> str:
     return datetime.now().isoformat(timespec="seconds")
 
 
-@dataclass
+# Note and Task are hand-written slotted classes rather than dataclasses:
+# no per-instance __dict__, and to_dict/from_dict build plain dicts directly
+# instead of going through dataclasses.asdict's recursive deep copy. Their
+# constructors, attributes, equality and repr match the dataclasses they
+# replaced.
+#
+# Tags, status, priority and category are kept as codes into the shared
+# vocabulary (final/vocab.py); the string properties translate on access
+# and filters compare the codes directly.
+
+# Marks a cold field of a lazy record (see lazy_record) not read from disk yet.
+_UNLOADED: Any = type("Unloaded", (), {"__repr__": lambda self: "<unloaded>"})()
+
+
 class Note:
-    id: int
-    title: str
-    content: str
-    tags: List[str]
-    created_at: str
-    updated_at: str
+    __slots__ = (
+        "id", "title", "_content", "_packed", "_tags", "created_at", "updated_at", "_source",
+        "_created_at_epoch", "_updated_at_epoch",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        title: str,
+        content: str,
+        tags: List[str],
+        created_at: str,
+        updated_at: str,
+    ):
+        self.id = id
+        self.title = title
+        self._content = content
+        self._packed = None
+        self.tags = tags
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self._source = None
+        self._created_at_epoch = self._updated_at_epoch = None
 
     @classmethod
     def create(cls, note_id: int, title: str, content: str, tags: List[str]) -> "Note":
@@ -31,37 +65,229 @@ class Note:
             updated_at=ts,
         )
 
+    # content is only inflated (compressed notes) or read from disk (lazy
+    # notes) on first access.
+
+    @property
+    def content(self) -> str:
+        if self._content is _UNLOADED:
+            hydrate(self)
+        if self._packed is not None:
+            self._content = compression.unpack_text(*self._packed)
+            self._packed = None
+        return self._content
+
+    @content.setter
+    def content(self, value: str) -> None:
+        self._content = value
+        self._packed = None
+
+    @property
+    def tags(self) -> List[str]:
+        strings = VOCAB.strings
+        return [strings[c] for c in self._tags]
+
+    @tags.setter
+    def tags(self, value: List[str]) -> None:
+        self._tags = tuple(VOCAB.code(t) for t in value)
+
+    @property
+    def tag_codes(self) -> tuple:
+        return self._tags
+
+    def has_tag(self, tag: str) -> bool:
+        """Case-insensitive exact tag match."""
+        return self.has_tag_code(VOCAB.find_folded(tag.strip()))
+
+    def has_tag_code(self, folded_code: Optional[int]) -> bool:
+        """has_tag for a tag already looked up with VOCAB.find_folded."""
+        if folded_code is None:
+            return False
+        folded = VOCAB.folded
+        return any(folded[c] == folded_code for c in self._tags)
+
+    def content_is_loaded(self) -> bool:
+        return self._content is not _UNLOADED and self._packed is None
+
     def to_dict(self) -> Dict[str, Any]:
-        return asdict(self)
+        if self._content is _UNLOADED:
+            hydrate(self)
+        # Content that was never read is written back still compressed.
+        packed = self._packed
+        if packed is None or compression.METHOD is None:
+            packed = compression.pack_text(self.content)
+        d: Dict[str, Any] = {"id": self.id, "title": self.title}
+        if packed is None:
+            d["content"] = self.content
+        else:
+            d["content_codec"], d["content_z"] = packed
+        d["tags"] = self.tags
+        d["created_at"] = self.created_at
+        d["updated_at"] = self.updated_at
+        return d
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "Note":
-        return cls(
-            id=data["id"],
-            title=data["title"],
-            content=data["content"],
-            tags=data.get("tags", []),
-            created_at=data.get("created_at", now_iso()),
-            updated_at=data.get("updated_at", now_iso()),
+        get = data.get
+        note = cls.__new__(cls)
+        note.id = data["id"]
+        note.title = data["title"]
+        z = get("content_z")
+        if z is None:
+            note._content = get("content", "")
+            note._packed = None
+        else:
+            note._content = ""
+            note._packed = (data["content_codec"], z)
+        code = VOCAB.code
+        note._tags = tuple(code(t) for t in get("tags", ()))
+        # Stored records always carry their timestamps; only records missing
+        # one pay for a clock read.
+        ts = now_iso() if "created_at" not in data or "updated_at" not in data else None
+        note.created_at = get("created_at", ts)
+        note.updated_at = get("updated_at", ts)
+        note._source = None
+        note._created_at_epoch = note._updated_at_epoch = None
+        return note
+
+    def _fields(self) -> tuple:
+        return (self.id, self.title, self.content, self.tags, self.created_at, self.updated_at)
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    __hash__ = None  # mutable, like the dataclass it replaced
+
+    def __repr__(self) -> str:
+        return (
+            f"Note(id={self.id!r}, title={self.title!r}, content={self.content!r}, "
+            f"tags={self.tags!r}, created_at={self.created_at!r}, updated_at={self.updated_at!r})"
         )
 
 
 @dataclass
-class Task:
+class NoteSummary:
+    """The listing fields of a note, without its content."""
     id: int
     title: str
-    description: str
-    priority: str
-    status: str         # todo | in-progress | done
-    category: Optional[str]
-    due_date: Optional[str]
+    tags: List[str]
     created_at: str
-    completed_at: Optional[str]
-    updated_at: str = ""
-    tip: Optional[str] | None = None  # Optional field for AI-generated tip
+    updated_at: str
+
+
+class Task:
+    __slots__ = (
+        "id", "title", "_description", "_priority", "_status", "_category", "due_date",
+        "created_at", "completed_at", "updated_at", "_tip", "_source",
+        "_created_at_epoch", "_updated_at_epoch", "_completed_at_epoch", "_due_ordinal",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        title: str,
+        description: str,
+        priority: str,
+        status: str,          # todo | in-progress | done
+        category: Optional[str],
+        due_date: Optional[str],
+        created_at: str,
+        completed_at: Optional[str],
+        updated_at: str = "",
+        tip: Optional[str] = None,  # Optional field for AI-generated tip
+    ):
+        self.id = id
+        self.title = title
+        self._description = description
+        self.priority = priority
+        self.status = status
+        self.category = category
+        self.due_date = due_date
+        self.created_at = created_at
+        self.completed_at = completed_at
+        self.updated_at = updated_at
+        self._tip = tip
+        self._source = None
+        self._created_at_epoch = self._updated_at_epoch = None
+        self._completed_at_epoch = self._due_ordinal = None
+
+    # description and tip are read from disk on first access for lazy tasks.
+
+    @property
+    def description(self) -> str:
+        if self._description is _UNLOADED:
+            hydrate(self)
+        return self._description
+
+    @description.setter
+    def description(self, value: str) -> None:
+        self._description = value
+
+    @property
+    def tip(self) -> Optional[str]:
+        if self._tip is _UNLOADED:
+            hydrate(self)
+        return self._tip
+
+    @tip.setter
+    def tip(self, value: Optional[str]) -> None:
+        self._tip = value
+
+    @property
+    def priority(self) -> str:
+        return VOCAB.strings[self._priority]
+
+    @priority.setter
+    def priority(self, value: str) -> None:
+        self._priority = VOCAB.code(value)
+
+    @property
+    def status(self) -> str:
+        return VOCAB.strings[self._status]
+
+    @status.setter
+    def status(self, value: str) -> None:
+        self._status = VOCAB.code(value)
+
+    @property
+    def category(self) -> Optional[str]:
+        return None if self._category is None else VOCAB.strings[self._category]
+
+    @category.setter
+    def category(self, value: Optional[str]) -> None:
+        self._category = None if value is None else VOCAB.code(value)
+
+    @property
+    def priority_code(self) -> int:
+        return self._priority
+
+    @property
+    def status_code(self) -> int:
+        return self._status
+
+    @property
+    def category_code(self) -> Optional[int]:
+        return self._category
+
+    def has_status(self, status: str) -> bool:
+        return self._status == VOCAB.find(status.lower().strip())
 
     def to_dict(self) -> Dict[str, Any]:
-        return asdict(self)
+        return {
+            "id": self.id,
+            "title": self.title,
+            "description": self.description,
+            "priority": self.priority,
+            "status": self.status,
+            "category": self.category,
+            "due_date": self.due_date,
+            "created_at": self.created_at,
+            "completed_at": self.completed_at,
+            "updated_at": self.updated_at,
+            "tip": self.tip,
+        }
 
     @classmethod
     def create(
@@ -102,15 +328,113 @@ class Task:
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "Task":
-        return cls(
-        id=data["id"],
-        title=data["title"],
-        description=data.get("description", ""),
-        priority=data.get("priority", "medium"),
-        status=data.get("status", "todo"),
-        category=data.get("category"),
-        due_date=data.get("due_date"),
-        created_at=data.get("created_at", now_iso()),
-        completed_at=data.get("completed_at"),
-        updated_at=data.get("updated_at", now_iso()),
-    )
+        get = data.get
+        task = cls.__new__(cls)
+        task.id = data["id"]
+        task.title = data["title"]
+        task._description = get("description", "")
+        code = VOCAB.code
+        task._priority = code(get("priority", "medium"))
+        task._status = code(get("status", "todo"))
+        category = get("category")
+        task._category = None if category is None else code(category)
+        task.due_date = get("due_date")
+        ts = now_iso() if "created_at" not in data or "updated_at" not in data else None
+        task.created_at = get("created_at", ts)
+        task.completed_at = get("completed_at")
+        task.updated_at = get("updated_at", ts)
+        task._tip = get("tip")
+        task._source = None
+        task._created_at_epoch = task._updated_at_epoch = None
+        task._completed_at_epoch = task._due_ordinal = None
+        return task
+
+    def _fields(self) -> tuple:
+        return (
+            self.id, self.title, self.description, self.priority, self.status, self.category,
+            self.due_date, self.created_at, self.completed_at, self.updated_at, self.tip,
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        names = (
+            "id", "title", "description", "priority", "status", "category",
+            "due_date", "created_at", "completed_at", "updated_at", "tip",
+        )
+        return "Task(" + ", ".join(f"{n}={v!r}" for n, v in zip(names, self._fields())) + ")"
+
+
+# ---------- Parsed dates ----------
+#
+# The *_epoch / due_ordinal properties parse the ISO strings on first use
+# and cache the result next to the string it came from; assigning a new
+# string (t.updated_at = now_iso()) makes the next read parse again.
+
+def _parsed(record: Any, slot: str, value: Optional[str], parse: Callable[[Optional[str]], Any]):
+    cached = getattr(record, slot)
+    if cached is None or cached[0] is not value:
+        cached = (value, parse(value))
+        setattr(record, slot, cached)
+    return cached[1]
+
+
+def _epoch_property(field: str) -> property:
+    slot = f"_{field}_epoch"
+    return property(lambda self: _parsed(self, slot, getattr(self, field), parse_epoch))
+
+
+Note.created_epoch = _epoch_property("created_at")
+Note.updated_epoch = _epoch_property("updated_at")
+Task.created_epoch = _epoch_property("created_at")
+Task.updated_epoch = _epoch_property("updated_at")
+Task.completed_epoch = _epoch_property("completed_at")
+Task.due_ordinal = property(lambda self: _parsed(self, "_due_ordinal", self.due_date, parse_ordinal))
+
+
+# ---------- Lazy records ----------
+#
+# A lazy record is built from its listing ("hot") fields only. Its cold
+# fields below hold _UNLOADED until first access, when `_source()` is called
+# for the record's full dict.
+
+COLD_FIELDS: Dict[type, Dict[str, Any]] = {
+    Note: {"_content": "", "_packed": None},
+    Task: {"_description": "", "_tip": None},
+}
+
+
+def lazy_record(cls, hot: Dict[str, Any], source: Callable[[], Optional[Dict[str, Any]]]):
+    """A `cls` record from its hot fields whose cold fields load on demand."""
+    record = cls.from_dict(hot)
+    for name in COLD_FIELDS[cls]:
+        setattr(record, name, _UNLOADED)
+    record._source = source
+    return record
+
+
+def is_loaded(record: Any) -> bool:
+    return record._source is None
+
+
+def hydrate(record: Any, data: Optional[Dict[str, Any]] = None) -> None:
+    """Fill in the cold fields a lazy record hasn't got yet.
+
+    `data` is the record's full dict when the caller already has it (bulk
+    loads); otherwise it comes from the record's source. Fields assigned
+    since the record was built are kept.
+    """
+    source = record._source
+    if data is None and source is not None:
+        data = source()
+    cls = type(record)
+    full = cls.from_dict({"id": record.id, "title": "", **data}) if data else None
+    for name, default in COLD_FIELDS[cls].items():
+        if getattr(record, name) is _UNLOADED:
+            setattr(record, name, getattr(full, name) if full is not None else default)
+    record._source = None
@@ -1,15 +1,22 @@
 # final/pkms.py
 from __future__ import annotations
-from typing import List, Optional
-
-from .models import Note
-from .storage import load_notes, save_notes, next_note_id
+from copy import copy
+from typing import Iterable, List, Optional, Tuple
+
+from .models import Note, NoteSummary
+from .storage import (
+    get_note,
+    insert_note,
+    upsert_note,
+    delete_note,
+    iter_note_summaries,
+    notes_updated_since,
+    note_search_index,
+    note_tag_index,
+)
 
 
 def add_note_interactive() -> Note:
-    notes = load_notes()
-    nid = next_note_id(notes)
-
     print(">>> Creating a new note")
     title = input("Title: ").strip()
     print("Content (finish with an empty line):")
@@ -24,31 +31,40 @@ def add_note_interactive() -> Note:
     tags_str = input("Tags (comma-separated, e.g., anatomy, gesture): ").strip()
     tags = [t.strip() for t in tags_str.split(",")] if tags_str else []
 
-    note = Note.create(nid, title, content, tags)
-    notes.append(note)
-    save_notes(notes)
+    # The id is assigned when the note is stored.
+    note = insert_note(Note.create(0, title, content, tags))
 
     print(f"Saved note #{note.id}")
     return note
 
 
-def list_notes() -> None:
-    notes = load_notes()
-    if not notes:
-        print("No notes yet. Add one with `add-note`.")
-        return
-    print("Your notes:")
+def _print_notes(notes: Iterable[NoteSummary], header: str, empty: str, show_updated: bool = False) -> None:
+    """Print notes as they arrive, so a streamed store starts printing at once."""
+    any_printed = False
     for n in notes:
+        if not any_printed:
+            print(header)
+            any_printed = True
         tags_str = ", ".join(n.tags) if n.tags else "-"
-        print(f"- [{n.id}] {n.title} (tags: {tags_str}, updated: {n.updated_at})")
+        if show_updated:
+            print(f"- [{n.id}] {n.title} (tags: {tags_str}, updated: {n.updated_at})")
+        else:
+            print(f"- [{n.id}] {n.title} (tags: {tags_str})")
+    if not any_printed:
+        print(empty)
+
+
+def list_notes() -> None:
+    _print_notes(
+        iter_note_summaries(),
+        "Your notes:",
+        "No notes yet. Add one with `add-note`.",
+        show_updated=True,
+    )
 
 
 def find_note_by_id(note_id: int) -> Optional[Note]:
-    notes = load_notes()
-    for n in notes:
-        if n.id == note_id:
-            return n
-    return None
+    return get_note(note_id)
 
 
 def view_note(note_id: int) -> None:
@@ -67,16 +83,14 @@ def view_note(note_id: int) -> None:
     print("=" * 40)
 
 def edit_note_interactive(note_id: int) -> None:
-    notes = load_notes()
-    target = None
-    for n in notes:
-        if n.id == note_id:
-            target = n
-            break
+    target = get_note(note_id)
 
     if not target:
         print(f"No note found with id {note_id}")
         return
+    # Edit a copy: with the record cache the stored object can be flushed
+    # (idle policy) while we wait for input, and must never be half-edited.
+    target = copy(target)
 
     print(f"Editing Note #{note_id}")
     print("Leave any field blank to keep the current value.\n")
@@ -112,54 +126,180 @@ def edit_note_interactive(note_id: int) -> None:
     target.updated_at = now_iso()
 
     # --- Save changes ---
-    save_notes(notes)
+    upsert_note(target)
     print(f"\n✔ Note #{note_id} updated successfully!")
 
 
 
-def search_notes(query: str) -> None:
-    query = query.lower().strip()
-    notes = load_notes()
-    matches = [
-        n for n in notes
-        if query in n.title.lower()
-        or query in n.content.lower()
-        or any(query in t.lower() for t in n.tags)
-    ]
-    if not matches:
-        print(f"No notes matched '{query}'.")
+def list_notes_since(since: float) -> None:
+    from .dates import epoch_iso
+
+    _print_notes(
+        notes_updated_since(since),
+        f"Notes changed since {epoch_iso(since)}:",
+        f"No notes changed since {epoch_iso(since)}.",
+        show_updated=True,
+    )
+
+
+def ranked_notes(query: str, k: Optional[int] = None) -> List[Tuple[Note, float]]:
+    """The top `k` notes for `query` by BM25 score, best first.
+
+    Words are matched after stemming (`gestures` finds `gesture`), and a
+    "quoted phrase" only matches those words in that order.
+    """
+    from .config import SEARCH_TOP_K
+
+    hits = note_search_index().search(query, k or SEARCH_TOP_K)
+    notes = [(get_note(i), score) for i, score in hits]
+    return [(n, score) for n, score in notes if n is not None]
+
+
+def query_notes(query: str, k: Optional[int] = None) -> Tuple[List[Tuple[Note, Optional[float]]], list]:
+    """Notes matching a structured query, and the plan steps (final/query.py)
+    that found them:
+
+        tag:anatomy updated>2025-06-01 gesture "line of action"
+
+    Fields are tag (nested tags included, `*` wildcards, `a,b`
+    alternatives) and created, updated (`:`, `<`, `<=`, `>`, `>=` a date,
+    `3d`, `12h` or `today`); a leading `-` negates a clause. The rest is
+    text: with some, the top `k` matches come back best first with their
+    BM25 scores; without, every match by id, with no score.
+    Raises ValueError for a clause that doesn't make sense.
+    """
+    from .config import SEARCH_TOP_K
+    from .query import NOTE_FIELDS, NOTE_RANGES, RankedTextPredicate, Step, TagPredicate, field_predicates, parse, run
+    from .storage import note_field_index
+
+    q = parse(query, NOTE_FIELDS)
+    fields = note_field_index()
+    preds = field_predicates(q.clauses, fields, {}, NOTE_RANGES)
+    tag_clauses = [c for c in q.clauses if c.field == "tag"]
+    if tag_clauses:
+        tags = note_tag_index()
+        preds += [TagPredicate(c, tags) for c in tag_clauses]
+
+    text = q.text
+    if not text:
+        ids, steps = run(preds, fields.ids, get_note)
+        hits: List[Tuple[int, Optional[float]]] = [(i, None) for i in sorted(ids)]
+    else:
+        index = note_search_index()
+        ranked = RankedTextPredicate(text, index)
+        k = k or SEARCH_TOP_K
+        if preds:
+            ids, steps = run(preds + [ranked], fields.ids, get_note)
+            hits = index.search(text, k, among=ids) if ids else []
+            steps.append(Step("BM25 top k", "rank", len(ids), len(hits)))
+        else:
+            # Text alone: BM25 finds the top k without listing every match.
+            hits = index.search(text, k)
+            steps = [Step(ranked.label, "rank", ranked.estimate(), len(hits))]
+
+    notes = [(get_note(i), score) for i, score in hits]
+    return [(n, score) for n, score in notes if n is not None], steps
+
+
+def search_notes(query: str, k: Optional[int] = None, explain: bool = False) -> None:
+    from .query import NOTE_FIELDS, parse, print_plan
+    from .storage import note_index_handle
+
+    query = query.strip()
+    try:
+        hits, steps = query_notes(query, k)
+    except ValueError as e:
+        print(f"Invalid query: {e}")
+        return
+    if explain:
+        print_plan(query, steps)
+        print()
+    notes = [n for n, _ in hits]
+    header = f"Notes matching '{query}':"
+    if not notes and not parse(query, NOTE_FIELDS).clauses:
+        notes, header = _fragment_or_typo_notes(query, k)
+    if note_index_handle().rebuilding:
+        print("(The notes changed on disk; the search index is being rebuilt, so results may lag.)")
+    _print_notes(notes, header, f"No notes matched '{query}'.")
+
+
+def _fragment_or_typo_notes(query: str, k: Optional[int]) -> Tuple[List[Note], str]:
+    """No whole word matched: try the query as a fragment of the text
+    (`foreshort`), then as a misspelling (`perspecitve`), through the
+    notes' trigram index."""
+    from .config import SEARCH_TOP_K
+    from .storage import note_trigram_index, _note_text
+    from .text_index import fuzzy_docs, substring_docs
+
+    k = k or SEARCH_TOP_K
+    index = note_trigram_index()
+    text = query.replace('"', " ")
+    ids = sorted(substring_docs(index, text))[:k]
+    if ids:
+        return [n for n in map(get_note, ids) if n is not None], f"Notes containing '{text.strip()}':"
+
+    def text_of(note_id: int) -> Optional[str]:
+        n = get_note(note_id)
+        return " ".join(_note_text(n)) if n is not None else None
+
+    fuzzy = fuzzy_docs(index, text, text_of, k)
+    if not fuzzy:
+        return [], ""
+    words = " ".join(fuzzy[0][2])
+    notes = [n for n in (get_note(i) for i, _, _ in fuzzy) if n is not None]
+    return notes, f"No exact matches for '{text.strip()}'. Did you mean '{words}'?"
+
+
+def related_notes(note_id: int, k: int = 10) -> None:
+    """The notes most like this one, by TF-IDF cosine similarity; works
+    offline (no AI client needed)."""
+    from .storage import related_index
+
+    note = get_note(note_id)
+    if not note:
+        print(f"No note found with id {note_id}")
+        return
+    related = [(get_note(i), score) for i, score in related_index("notes").related(note_id, k)]
+    related = [(n, score) for n, score in related if n is not None]
+    if not related:
+        print(f"No notes related to #{note_id} ({note.title}).")
         return
-    print(f"Notes matching '{query}':")
-    for n in matches:
+    print(f"Notes related to #{note_id} ({note.title}):")
+    for n, score in related:
         tags_str = ", ".join(n.tags) if n.tags else "-"
-        print(f"- [{n.id}] {n.title} (tags: {tags_str})")
-
-def filter_notes_by_tag(tag: str) -> None:
-    tag = tag.lower().strip()
-    notes = load_notes()
+        print(f"- [{n.id}] {n.title} (tags: {tags_str}) {score:.0%}")
+
+
+def filter_notes_by_tag(expr: str) -> None:
+    """Notes matching a tag expression: `anatomy AND gesture NOT hands`,
+    `(color OR value) NOT study`; a tag also matches the tags nested under
+    it (`anatomy` finds `anatomy/hips`). See TagIndex.query."""
+    expr = expr.strip()
+    try:
+        ids = note_tag_index().query(expr)
+    except ValueError as e:
+        print(f"Invalid tag expression: {e}")
+        return
+    _print_notes(
+        (n for n in map(get_note, ids) if n is not None),
+        f"Notes with tag '{expr}':",
+        f"No notes found with tag '{expr}'.",
+    )
 
-    matches = [
-        n for n in notes
-        if any(tag == t.lower() for t in n.tags)
-    ]
 
-    if not matches:
-        print(f"No notes found with tag '{tag}'.")
+def list_tags() -> None:
+    rows = note_tag_index().counts()
+    if not rows:
+        print("No tags yet.")
         return
-
-    print(f"Notes with tag '{tag}':")
-    for n in matches:
-        tags_str = ", ".join(n.tags) if n.tags else "-"
-        print(f"- [{n.id}] {n.title} (tags: {tags_str})")
+    print("Tags (notes with the tag / including nested tags):")
+    for tag, own, total in rows:
+        depth = tag.count("/")
+        name = "  " * depth + tag.rsplit("/", 1)[-1]
+        print(f"  {name:<30} {own}" + (f" / {total}" if total != own else ""))
 
 def delete_note_interactive(note_id: int) -> None:
-    notes = load_notes()
-
-    note = None
-    for n in notes:
-        if n.id == note_id:
-            note = n
-            break
+    note = get_note(note_id)
 
     if not note:
         print(f"No note found with id {note_id}.")
@@ -173,41 +313,36 @@ def delete_note_interactive(note_id: int) -> None:
         return
 
     # Remove the note
-    notes = [n for n in notes if n.id != note_id]
-    save_notes(notes)
+    delete_note(note_id)
 
     print(f"Note #{note_id} deleted successfully.")
 
 def edit_note(note_id: int) -> None:
-    notes = load_notes()
     from .models import now_iso
-    found = False
-
-    for n in notes:
-        if n.id == note_id:
-            found = True
-            print("Editing Note...")
-            print(f"Current title: {n.title}")
-            new_title = input("New title (leave empty to keep): ").strip()
-            if new_title:
-                n.title = new_title
-
-            print(f"Current content:\n{n.content}")
-            new_content = input("New content (leave empty to keep): ").strip()
-            if new_content:
-                n.content = new_content
-
-            print(f"Current tags: {', '.join(n.tags)}")
-            new_tags = input("New comma-separated tags (leave empty to keep): ").strip()
-            if new_tags:
-                n.tags = [t.strip() for t in new_tags.split(",") if t.strip()]
-
-            n.updated_at = now_iso()
-            break
 
-    if not found:
+    n = get_note(note_id)
+    if not n:
         print(f"No note found with id {note_id}.")
         return
+    n = copy(n)  # see edit_note_interactive
+
+    print("Editing Note...")
+    print(f"Current title: {n.title}")
+    new_title = input("New title (leave empty to keep): ").strip()
+    if new_title:
+        n.title = new_title
+
+    print(f"Current content:\n{n.content}")
+    new_content = input("New content (leave empty to keep): ").strip()
+    if new_content:
+        n.content = new_content
+
+    print(f"Current tags: {', '.join(n.tags)}")
+    new_tags = input("New comma-separated tags (leave empty to keep): ").strip()
+    if new_tags:
+        n.tags = [t.strip() for t in new_tags.split(",") if t.strip()]
+
+    n.updated_at = now_iso()
 
-    save_notes(notes)
+    upsert_note(n)
     print(f"Note #{note_id} updated successfully.")
@@ -0,0 +1,389 @@
+# final/query.py
+from __future__ import annotations
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from fnmatch import fnmatchcase
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .dates import parse_epoch, parse_ordinal, parse_since
+from .field_index import FieldIndex, fold
+from .tag_index import popcount
+
+# A clause is `field:value`, `field<value` (also <=, >, >=), or any of
+# those with a leading `-` to negate it; a value may be "quoted" and may
+# use * and ? wildcards, or list alternatives with commas
+# (`status:todo,in-progress`). Anything else is text to search for.
+_TOKEN = re.compile(r'(-?)([a-z]+)(<=|>=|<|>|:)("[^"]*"|[^\s"]+)|"([^"]*)"|(\S+)')
+
+# What the record fields are indexed by (final/field_index.py). Tasks'
+# parsed dates are cached on the record; note summaries have none, so
+# notes are parsed here.
+TASK_VALUES: Dict[str, Callable[[Any], Optional[str]]] = {
+    "status": lambda t: t.status,
+    "priority": lambda t: t.priority,
+    "category": lambda t: t.category,
+}
+TASK_RANGES: Dict[str, Callable[[Any], Optional[float]]] = {
+    "due": lambda t: t.due_ordinal,
+    "created": lambda t: t.created_epoch,
+    "updated": lambda t: t.updated_epoch,
+    "completed": lambda t: t.completed_epoch,
+}
+NOTE_RANGES: Dict[str, Callable[[Any], Optional[float]]] = {
+    "created": lambda n: parse_epoch(n.created_at),
+    "updated": lambda n: parse_epoch(n.updated_at),
+}
+
+# The fields each kind of query knows; notes' tags go through the TagIndex.
+TASK_FIELDS = tuple(TASK_VALUES) + tuple(TASK_RANGES)
+NOTE_FIELDS = ("tag",) + tuple(NOTE_RANGES)
+
+# Range fields counted in days (ordinals); the others are epochs.
+DAY_FIELDS = frozenset({"due"})
+
+# Checking a clause on one candidate record costs about as much as
+# reading this many entries of its index. A clause whose index would
+# hand back more than that per remaining candidate is checked on the
+# candidates instead.
+FILTER_COST = 8
+
+
+@dataclass
+class Clause:
+    field: str
+    op: str          # ":", "<", "<=", ">" or ">="
+    value: str
+    negated: bool = False
+
+    def __str__(self) -> str:
+        value = f'"{self.value}"' if not self.value or " " in self.value else self.value
+        return f"{'-' if self.negated else ''}{self.field}{self.op}{value}"
+
+
+@dataclass
+class Query:
+    clauses: List[Clause] = field(default_factory=list)
+    words: List[str] = field(default_factory=list)
+    phrases: List[str] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        """The text part, as a search query of its own."""
+        return " ".join(self.words + [f'"{p}"' for p in self.phrases])
+
+
+def parse(query: str, fields: Iterable[str]) -> Query:
+    """Split `query` into clauses on `fields` and text.
+
+        status:todo priority:high category:"Anatomy*" due<2025-12-01 gesture
+
+    A clause on a field not in `fields` (`http://...`) is text.
+    """
+    fields = set(fields)
+    q = Query()
+    for m in _TOKEN.finditer(query):
+        negated, name, op, value, phrase, word = m.groups()
+        if name is not None and name in fields:
+            q.clauses.append(Clause(name, op, value.strip('"'), bool(negated)))
+        elif phrase is not None:
+            if phrase.strip():
+                q.phrases.append(phrase.strip())
+        else:
+            q.words.append(word if word is not None else m.group(0))
+    return q
+
+
+# ---------- Predicates ----------
+
+class Predicate(ABC):
+    """One clause: a lookup in its index (ids) and the same test on a record.
+
+    estimate() is what the lookup would return, or a cheap upper bound on
+    it, and is what the planner orders clauses by.
+    """
+
+    filterable = True  # False: can only be answered by its index
+
+    def __init__(self, label: str, negated: bool = False):
+        self.label = label
+        self.negated = negated
+
+    @abstractmethod
+    def estimate(self) -> int: ...
+
+    @abstractmethod
+    def ids(self) -> Set[int]: ...
+
+    @abstractmethod
+    def test(self, record: Any) -> bool: ...
+
+    def matches(self, record_id: int, fetch: Callable[[int], Any]) -> bool:
+        """test() for the record with this id, fetching it only if needed."""
+        record = fetch(record_id)
+        return record is not None and self.test(record)
+
+
+class ValuePredicate(Predicate):
+    """field:value, field:glob* or field:a,b on a `values` field of a FieldIndex."""
+
+    def __init__(self, clause: Clause, index: FieldIndex, value_of: Callable[[Any], Optional[str]]):
+        super().__init__(str(clause), clause.negated)
+        if clause.op != ":":
+            raise ValueError(f"{clause.field} only takes {clause.field}:<value>")
+        self.field = clause.field
+        self.patterns = [fold(p) for p in clause.value.split(",") if fold(p)]
+        if not self.patterns:
+            raise ValueError(f"{clause.field}: needs a value")
+        self.value_of = value_of
+        self.index = index
+        self._values = sorted({v for p in self.patterns for v in index.values(self.field, p)})
+
+    def estimate(self) -> int:
+        return sum(len(self.index.with_value(self.field, v)) for v in self._values)
+
+    def ids(self) -> Set[int]:
+        ids: Set[int] = set()
+        for v in self._values:
+            ids |= self.index.with_value(self.field, v)
+        return ids
+
+    def accepts(self, value: str) -> bool:
+        value = fold(value)
+        return value is not None and any(fnmatchcase(value, p) for p in self.patterns)
+
+    def test(self, record: Any) -> bool:
+        return self.accepts(self.value_of(record))
+
+
+class RangePredicate(Predicate):
+    """due<2025-12-01, updated>=3d, created:2025-06-01 ... on a `ranges` field."""
+
+    def __init__(self, clause: Clause, index: FieldIndex, key_of: Callable[[Any], Optional[float]]):
+        super().__init__(str(clause), clause.negated)
+        self.key_of = key_of
+        self.sorted = index.range(clause.field)
+        if clause.field in DAY_FIELDS:
+            day = _parse_day(clause.value)
+            if day is None:
+                raise ValueError(f"{clause.field}: not a date: {clause.value!r}")
+            value_range = (day, day, False)
+        else:
+            value_range = _parse_time(clause.value)
+            if value_range is None:
+                raise ValueError(f"{clause.field}: not a date or time: {clause.value!r}")
+        self.bounds = _bounds(clause.op, *value_range)
+
+    def estimate(self) -> int:
+        return self.sorted.count(*self.bounds)
+
+    def ids(self) -> Set[int]:
+        return set(self.sorted.range(*self.bounds))
+
+    def test(self, record: Any) -> bool:
+        key = self.key_of(record)
+        if key is None:
+            return False
+        lo, hi, strict_lo, strict_hi = self.bounds
+        if lo is not None and (key <= lo if strict_lo else key < lo):
+            return False
+        return hi is None or (key < hi if strict_hi else key <= hi)
+
+
+class TagPredicate(Predicate):
+    """tag:anatomy (with nested tags such as anatomy/hips), tag:anat*, tag:a,b."""
+
+    def __init__(self, clause: Clause, index: Any):
+        super().__init__(str(clause), clause.negated)
+        if clause.op != ":":
+            raise ValueError("tag only takes tag:<tag>")
+        self.patterns = [fold(p) for p in clause.value.split(",") if fold(p)]
+        if not self.patterns:
+            raise ValueError("tag: needs a value")
+        bits = 0
+        for p in self.patterns:
+            bits |= index.matching(p)
+        self.index = index
+        self.bits = bits
+
+    def estimate(self) -> int:
+        return popcount(self.bits)
+
+    def ids(self) -> Set[int]:
+        return set(self.index.ids(self.bits))
+
+    def test(self, record: Any) -> bool:
+        return self.index.has(self.bits, record.id)
+
+    def matches(self, record_id: int, fetch: Callable[[int], Any]) -> bool:
+        return self.index.has(self.bits, record_id)
+
+
+class SubstringPredicate(Predicate):
+    """Text that has to appear in the record, through a trigram index."""
+
+    def __init__(self, text: str, index: Any, fields_of: Callable[[Any], Iterable[str]]):
+        super().__init__(f'"{text}"')
+        self.index = index
+        self.text = text
+        self.needle = index.analyzer.normalize(text)
+        self.fields_of = fields_of
+
+    def estimate(self) -> int:
+        grams = {t for _, t in self.index.analyzer.tokens(self.needle)}
+        if not grams:
+            return len(self.index)  # too short for a trigram: every term is looked at
+        return min(self.index.doc_freq(g) for g in grams)
+
+    def ids(self) -> Set[int]:
+        from .text_index import substring_docs
+
+        return substring_docs(self.index, self.text)
+
+    def test(self, record: Any) -> bool:
+        normalize = self.index.analyzer.normalize
+        return any(self.needle in normalize(f) for f in self.fields_of(record))
+
+
+class RankedTextPredicate(Predicate):
+    """Words for the BM25 index: a record matches when it has any of them
+    (and every "quoted phrase"); the planner's caller ranks the matches."""
+
+    filterable = False
+
+    def __init__(self, text: str, index: Any):
+        from .text_index import parse_query
+
+        super().__init__(f"text {text!r}")
+        self.index = index
+        self.text = text
+        self.terms, self.phrases = parse_query(text, index.analyzer)
+
+    def estimate(self) -> int:
+        return min(sum(self.index.doc_freq(t) for t in set(self.terms)), len(self.index))
+
+    def ids(self) -> Set[int]:
+        ids: Set[int] = set()
+        for t in set(self.terms):
+            p = self.index.postings(t)
+            if p is not None:
+                ids.update(p.docs)
+        for phrase in self.phrases:
+            if not ids:
+                break
+            ids &= self.index.phrase_docs(phrase)
+        return ids
+
+    def test(self, record: Any) -> bool:
+        raise TypeError("text is only answered by its index")
+
+
+def field_predicates(
+    clauses: Iterable[Clause],
+    index: FieldIndex,
+    values: Dict[str, Callable[[Any], Optional[str]]],
+    ranges: Dict[str, Callable[[Any], Optional[float]]],
+) -> List[Predicate]:
+    """Predicates for the clauses on `values` and `ranges` fields; raises
+    ValueError for a clause that doesn't make sense."""
+    preds: List[Predicate] = []
+    for c in clauses:
+        if c.field in values:
+            preds.append(ValuePredicate(c, index, values[c.field]))
+        elif c.field in ranges:
+            preds.append(RangePredicate(c, index, ranges[c.field]))
+    return preds
+
+
+def _parse_day(value: str) -> Optional[int]:
+    today = date.today().toordinal()
+    relative = {"today": today, "tomorrow": today + 1, "yesterday": today - 1}
+    return relative.get(value.lower(), parse_ordinal(value))
+
+
+def _parse_time(value: str) -> Optional[Tuple[float, float, bool]]:
+    """(start, end, end is exclusive) of a time value: a date (or `today`)
+    covers that whole day; `3d`, `12h` and a full timestamp are an instant."""
+    day = _parse_day(value) if len(value) <= 10 else None
+    if day is not None:
+        start = datetime.combine(date.fromordinal(day), datetime.min.time())
+        return start.timestamp(), (start + timedelta(days=1)).timestamp(), True
+    t = parse_since(value)
+    return None if t is None else (t, t, False)
+
+
+def _bounds(op: str, start: float, end: float, end_exclusive: bool) -> Tuple[Optional[float], Optional[float], bool, bool]:
+    """SortedIndex.range() arguments for `op` against a value covering start..end."""
+    if op == ":":
+        return start, end, False, end_exclusive
+    if op == "<":
+        return None, start, False, True
+    if op == "<=":
+        return None, end, False, end_exclusive
+    if op == ">":
+        return end, None, not end_exclusive, False
+    return start, None, False, False  # ">="
+
+
+# ---------- Planning ----------
+
+@dataclass
+class Step:
+    """One line of `explain`: how a clause was answered, how many index
+    entries or records it touched, and how many candidates were left."""
+    label: str
+    method: str      # "index", "filter", "scan" or "rank"
+    rows: int
+    left: int
+
+
+def run(
+    predicates: List[Predicate],
+    all_ids: Callable[[], Set[int]],
+    fetch: Callable[[int], Any],
+) -> Tuple[Set[int], List[Step]]:
+    """Ids matching every predicate, and the steps taken to find them.
+
+    The clause with the smallest estimate is looked up first; every
+    later one either intersects its own lookup with the candidates or,
+    once the candidates are few next to what its index would return,
+    is checked on the candidate records. Negated clauses go last.
+    """
+    plan = sorted(predicates, key=lambda p: (p.negated, p.estimate()))
+    steps: List[Step] = []
+    if plan and not plan[0].negated:
+        first = plan.pop(0)
+        candidates = set(first.ids())
+        steps.append(Step(first.label, "index", len(candidates), len(candidates)))
+    else:
+        candidates = set(all_ids())
+        steps.append(Step("every record", "scan", len(candidates), len(candidates)))
+
+    records: Dict[int, Any] = {}
+
+    def fetch_once(record_id: int) -> Any:
+        if record_id not in records:
+            records[record_id] = fetch(record_id)
+        return records[record_id]
+
+    for p in plan:
+        if not candidates:
+            break
+        if not p.filterable or p.estimate() <= FILTER_COST * len(candidates):
+            ids = p.ids()
+            candidates = candidates - ids if p.negated else candidates & ids
+            steps.append(Step(p.label, "index", len(ids), len(candidates)))
+            continue
+        checked = len(candidates)
+        candidates = {i for i in candidates if p.matches(i, fetch_once) != p.negated}
+        steps.append(Step(p.label, "filter", checked, len(candidates)))
+    return candidates, steps
+
+
+def print_plan(query: str, steps: List[Step]) -> None:
+    print(f"Plan for '{query}':")
+    width = max(len(s.label) for s in steps)
+    for n, s in enumerate(steps, 1):
+        touched = "records" if s.method in ("filter", "scan") else "entries"
+        print(f"  {n}. {s.label:<{width}}  {s.method:<6}  {s.rows:>7} {touched:<7} -> {s.left} left")
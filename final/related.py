@@ -0,0 +1,374 @@
+# final/related.py
+from __future__ import annotations
+import heapq
+import math
+from array import array
+from bisect import insort
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+try:  # optional: LSA (truncated SVD) needs it; plain TF-IDF uses it when there
+    import numpy as np
+except ImportError:
+    np = None
+
+# A document's vector keeps its TERMS_PER_DOC heaviest tf-idf terms. Once
+# there are MAX_DF_MIN_DOCS documents, terms in more than MAX_DF of them
+# are left out altogether, since they make everything look related and
+# cost the most to compare; below that IDF alone weighs them down, or a
+# small store would have no shared terms left.
+TERMS_PER_DOC = 32
+MAX_DF = 0.25
+MAX_DF_MIN_DOCS = 1000
+
+# Neighbours kept per document: related() returns at most this many.
+NEIGHBOURS = 20
+
+# Weights (and the LSA space) are recomputed with fresh IDFs once this
+# share of the documents changed since they were.
+REWEIGHT_FRACTION = 0.1
+
+# Rows of the tf-idf matrix multiplied at a time while computing the SVD.
+_CHUNK = 2048
+
+
+class RelatedIndex:
+    """TF-IDF vectors of one kind of record, and each one's most similar
+    others by cosine.
+
+    A document is its bag of analyzed terms (the search index's terms),
+    weighted (1 + log tf) * idf, cut to TERMS_PER_DOC and L2-normalized.
+    With `dims` > 0 and NumPy installed the vectors are instead the
+    documents' coordinates on the top `dims` singular vectors of the
+    tf-idf matrix (LSA), so notes sharing context but not words can still
+    match; a document changed later is folded into that space.
+
+    Neighbour lists are computed on first request and cached. put() and
+    remove() update the cache in place: cosine is symmetric, so the
+    similarities of a changed document to everyone else are also what
+    everyone else's lists need.
+    """
+
+    def __init__(self, analyzer: Any, text_of: Callable[[Any], Sequence[str]], dims: int = 0):
+        self.analyzer = analyzer
+        self.text_of = text_of
+        self.dims = dims if np is not None else 0
+        self._vocab: Dict[str, int] = {}
+        self._df: List[int] = []
+        self._bags: Dict[int, Tuple[array, array]] = {}       # id -> (term ids, counts)
+        self._vectors: Dict[int, Dict[int, float]] = {}       # id -> {term id: weight}
+        self._postings: Optional[Dict[int, Dict[int, float]]] = None
+        self._posting_arrays: Dict[int, Tuple[Any, Any]] = {}  # term id -> (ids, weights) as NumPy arrays
+        self._space: Optional[_LsaSpace] = None
+        self._neighbours: Dict[int, List[Tuple[float, int]]] = {}  # id -> [(-score, other)], best first
+        self._cited: Dict[int, Set[int]] = {}                  # other -> ids whose list has it
+        self._changes = 0
+
+    def __len__(self) -> int:
+        return len(self._bags)
+
+    @classmethod
+    def from_index(
+        cls,
+        index: Any,
+        id_of: Callable[[int], Optional[int]],
+        text_of: Callable[[Any], Sequence[str]],
+        dims: int = 0,
+    ) -> "RelatedIndex":
+        """The bags of words of an InvertedIndex's documents, read off its
+        postings rather than from the records. `id_of(doc id)` is the
+        record id to use, or None to leave the document out."""
+        related = cls(index.analyzer, text_of, dims)
+        terms: Dict[int, array] = {}
+        counts: Dict[int, array] = {}
+        for term in sorted(index.terms()):
+            p = index.postings(term)
+            if p is None:
+                continue
+            tid = None
+            for doc, tf in zip(p.docs, p.tfs):
+                record_id = id_of(doc)
+                if record_id is None:
+                    continue
+                if tid is None:
+                    tid = related._term_id(term)
+                if record_id not in terms:
+                    terms[record_id], counts[record_id] = array("I"), array("I")
+                terms[record_id].append(tid)
+                counts[record_id].append(tf)
+                related._df[tid] += 1
+        related._bags = {i: (terms[i], counts[i]) for i in terms}
+        return related
+
+    def _term_id(self, term: str) -> int:
+        tid = self._vocab.get(term)
+        if tid is None:
+            tid = self._vocab[term] = len(self._df)
+            self._df.append(0)
+        return tid
+
+    # ---------- Changes ----------
+
+    def put(self, record: Any) -> None:
+        self._drop(record.id)
+        self._changes += 1
+        counts: Dict[int, int] = {}
+        for _, term in self.analyzer.fields(self.text_of(record)):
+            tid = self._term_id(term)
+            counts[tid] = counts.get(tid, 0) + 1
+        for tid in counts:
+            self._df[tid] += 1
+        self._bags[record.id] = (array("I", counts.keys()), array("I", counts.values()))
+        if self._stale():
+            return
+        scores = self._similar(record.id)
+        self._add_similarities(record.id, scores)
+        self._set_list(record.id, scores)
+
+    def remove(self, record_id: int) -> None:
+        if self._drop(record_id):
+            self._changes += 1
+            self._stale()
+
+    def _drop(self, record_id: int) -> bool:
+        bag = self._bags.pop(record_id, None)
+        if bag is None:
+            return False
+        for tid in bag[0]:
+            self._df[tid] -= 1
+        vec = self._vectors.pop(record_id, None)
+        if vec is not None and self._postings is not None:
+            for tid in vec:
+                self._postings[tid].pop(record_id, None)
+                self._posting_arrays.pop(tid, None)
+        if self._space is not None:
+            self._space.remove(record_id)
+        self._forget_list(record_id)
+        for other in self._cited.pop(record_id, ()):
+            entries = self._neighbours[other]
+            if len(entries) >= NEIGHBOURS:
+                # Something further down might belong in the list now.
+                self._forget_list(other)
+            else:
+                entries[:] = [e for e in entries if e[1] != record_id]
+        return True
+
+    def _stale(self) -> bool:
+        """Start over from fresh IDFs (lazily) once enough has changed."""
+        if self._changes <= REWEIGHT_FRACTION * max(len(self._bags), 1):
+            return False
+        self._vectors.clear()
+        self._postings = None
+        self._posting_arrays.clear()
+        self._space = None
+        self._neighbours.clear()
+        self._cited.clear()
+        self._changes = 0
+        return True
+
+    def _forget_list(self, record_id: int) -> None:
+        for _, other in self._neighbours.pop(record_id, ()):
+            cited = self._cited.get(other)
+            if cited is not None:
+                cited.discard(record_id)
+
+    def _add_similarities(self, record_id: int, scores: Dict[int, float]) -> None:
+        """A changed document's similarities, merged into the cached lists."""
+        for other, score in scores.items():
+            entries = self._neighbours.get(other)
+            if entries is None or (len(entries) >= NEIGHBOURS and -score >= entries[-1][0]):
+                continue
+            insort(entries, (-score, record_id))
+            self._cited.setdefault(record_id, set()).add(other)
+            if len(entries) > NEIGHBOURS:
+                _, dropped = entries.pop()
+                self._cited[dropped].discard(other)
+
+    # ---------- Lookups ----------
+
+    def related(self, record_id: int, k: int = 10) -> List[Tuple[int, float]]:
+        """Up to `k` (other id, cosine similarity) pairs, most similar first."""
+        if record_id not in self._bags:
+            return []
+        entries = self._neighbours.get(record_id)
+        if entries is None:
+            entries = self._set_list(record_id, self._similar(record_id))
+        return [(i, -s) for s, i in entries[:k]]
+
+    def _set_list(self, record_id: int, scores: Dict[int, float]) -> List[Tuple[float, int]]:
+        entries = sorted((-s, i) for s, i in heapq.nlargest(NEIGHBOURS, ((s, i) for i, s in scores.items())))
+        self._neighbours[record_id] = entries
+        for _, other in entries:
+            self._cited.setdefault(other, set()).add(record_id)
+        return entries
+
+    def _similar(self, record_id: int) -> Dict[int, float]:
+        """Cosine similarity of `record_id` to every document it shares anything with."""
+        if self.dims:
+            space = self._lsa_space()
+            if space is not None:
+                return space.similar(record_id, self._weights(self._bags[record_id], prune=False))
+        vec = self._vector(record_id)
+        postings = self._term_postings()
+        if np is not None and vec:
+            return self._similar_np(record_id, vec)
+        scores: Dict[int, float] = {}
+        get = scores.get
+        for tid, w in vec.items():
+            for other, w2 in postings.get(tid, {}).items():
+                scores[other] = get(other, 0.0) + w * w2
+        scores.pop(record_id, None)
+        return scores
+
+    def _similar_np(self, record_id: int, vec: Dict[int, float]) -> Dict[int, float]:
+        """_similar's sum over the postings, done on NumPy arrays."""
+        ids, weights = [], []
+        for tid, w in vec.items():
+            docs, ws = self._posting_array(tid)
+            ids.append(docs)
+            weights.append(ws * w)
+        others, at = np.unique(np.concatenate(ids), return_inverse=True)
+        sums = np.bincount(at, weights=np.concatenate(weights))
+        scores = dict(zip(others.tolist(), sums.tolist()))
+        scores.pop(record_id, None)
+        return scores
+
+    def _posting_array(self, tid: int) -> Tuple[Any, Any]:
+        arrays = self._posting_arrays.get(tid)
+        if arrays is None:
+            posting = self._postings.get(tid, {})
+            arrays = self._posting_arrays[tid] = (
+                np.fromiter(posting.keys(), dtype=np.int64, count=len(posting)),
+                np.fromiter(posting.values(), dtype=np.float64, count=len(posting)),
+            )
+        return arrays
+
+    def _weights(self, bag: Tuple[array, array], prune: bool = True) -> Dict[int, float]:
+        n = len(self._bags)
+        limit = MAX_DF * n if n >= MAX_DF_MIN_DOCS else n
+        df = self._df
+        weights = {
+            tid: (1 + math.log(tf)) * (math.log((1 + n) / (1 + df[tid])) + 1)
+            for tid, tf in zip(*bag)
+            if df[tid] <= limit
+        }
+        if prune and len(weights) > TERMS_PER_DOC:
+            weights = dict(heapq.nlargest(TERMS_PER_DOC, weights.items(), key=lambda e: e[1]))
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        return {t: w / norm for t, w in weights.items()} if norm else {}
+
+    def _vector(self, record_id: int) -> Dict[int, float]:
+        vec = self._vectors.get(record_id)
+        if vec is None:
+            vec = self._vectors[record_id] = self._weights(self._bags[record_id])
+            if self._postings is not None:
+                for tid, w in vec.items():
+                    self._postings.setdefault(tid, {})[record_id] = w
+                    self._posting_arrays.pop(tid, None)
+        return vec
+
+    def _term_postings(self) -> Dict[int, Dict[int, float]]:
+        if self._postings is None:
+            postings: Dict[int, Dict[int, float]] = {}
+            for record_id in self._bags:
+                for tid, w in self._vector(record_id).items():
+                    postings.setdefault(tid, {})[record_id] = w
+            self._postings = postings
+            self._posting_arrays.clear()
+        return self._postings
+
+    def _lsa_space(self) -> Optional["_LsaSpace"]:
+        if self._space is None and len(self._bags) > 2:
+            ids = list(self._bags)
+            self._space = _LsaSpace.build(ids, [self._weights(self._bags[i], prune=False) for i in ids], len(self._df), self.dims)
+        return self._space
+
+
+class _LsaSpace:
+    """Documents as rows of U * S from a truncated SVD of the tf-idf matrix,
+    normalized, with the term basis kept to fold in changed documents."""
+
+    def __init__(self, basis, rows, ids: List[int]):
+        self.basis = basis                       # terms x dims
+        self.rows = rows                         # documents x dims, unit length (or zero)
+        self.ids: List[Optional[int]] = list(ids)
+        self.row_of = {i: r for r, i in enumerate(ids)}
+
+    @classmethod
+    def build(cls, ids: List[int], weights: List[Dict[int, float]], n_terms: int, dims: int) -> Optional["_LsaSpace"]:
+        n = len(ids)
+        dims = min(dims, n - 1, n_terms - 1)
+        if dims < 2:
+            return None
+        doc_index = np.repeat(np.arange(n), [len(w) for w in weights])
+        term_index = np.fromiter((t for w in weights for t in w), dtype=np.int64, count=len(doc_index))
+        values = np.fromiter((v for w in weights for v in w.values()), dtype=np.float32, count=len(doc_index))
+        by_doc = _csr(doc_index, term_index, values, n)
+        by_term = _csr(term_index, doc_index, values, n_terms)
+
+        # Randomized range finder with two power iterations (Halko et al.).
+        rng = np.random.default_rng(0)
+        y = _dot(by_doc, rng.standard_normal((n_terms, dims + 10)).astype(np.float32))
+        for _ in range(2):
+            y, _ = np.linalg.qr(y)
+            y = _dot(by_doc, _dot(by_term, y))
+        q, _ = np.linalg.qr(y)
+        u, s, vt = np.linalg.svd(_dot(by_term, q).T, full_matrices=False)
+        rows = (q @ u[:, :dims]) * s[:dims]
+        return cls(vt[:dims].T.astype(np.float32), _unit_rows(rows.astype(np.float32)), ids)
+
+    def _fold_in(self, weights: Dict[int, float]):
+        known = [(t, w) for t, w in weights.items() if t < len(self.basis)]
+        if not known:
+            return np.zeros(self.basis.shape[1], dtype=np.float32)
+        terms = np.fromiter((t for t, _ in known), dtype=np.int64, count=len(known))
+        values = np.fromiter((w for _, w in known), dtype=np.float32, count=len(known))
+        return _unit_rows((values @ self.basis[terms])[None, :])[0]
+
+    def similar(self, record_id: int, weights: Dict[int, float]) -> Dict[int, float]:
+        row = self.row_of.get(record_id)
+        if row is None:  # new since the SVD: fold it in
+            row = self.row_of[record_id] = len(self.ids)
+            self.ids.append(record_id)
+            if row >= len(self.rows):
+                grown = np.zeros((max(2 * len(self.rows), 16), self.rows.shape[1]), dtype=np.float32)
+                grown[:len(self.rows)] = self.rows
+                self.rows = grown
+            self.rows[row] = self._fold_in(weights)
+        elif not self.rows[row].any():
+            self.rows[row] = self._fold_in(weights)  # changed since the SVD
+        sims = self.rows[:len(self.ids)] @ self.rows[row]
+        sims[row] = 0.0
+        hits = np.flatnonzero(sims > 0)
+        return {self.ids[r]: float(sims[r]) for r in hits}
+
+    def remove(self, record_id: int) -> None:
+        """Zero the document's row; put() folds its new text back in."""
+        row = self.row_of.get(record_id)
+        if row is not None:
+            self.rows[row] = 0.0
+
+
+def _csr(major, minor, values, n: int):
+    order = np.argsort(major, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(major, minlength=n), out=indptr[1:])
+    return indptr, minor[order], values[order]
+
+
+def _dot(matrix, dense):
+    """A CSR matrix (indptr, indices, values) times a dense one, a block of rows at a time."""
+    indptr, indices, values = matrix
+    out = np.zeros((len(indptr) - 1, dense.shape[1]), dtype=np.float32)
+    nonempty = np.flatnonzero(np.diff(indptr))
+    for block in np.array_split(nonempty, max(1, len(nonempty) // _CHUNK)):
+        if not len(block):
+            continue
+        lo, hi = indptr[block[0]], indptr[block[-1] + 1]
+        products = values[lo:hi, None] * dense[indices[lo:hi]]
+        out[block] = np.add.reduceat(products, indptr[block] - lo, axis=0)
+    return out
+
+
+def _unit_rows(m):
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    return np.divide(m, norms, out=np.zeros_like(m), where=norms > 0)
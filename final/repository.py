@@ -0,0 +1,367 @@
+# final/repository.py
+from __future__ import annotations
+from pathlib import Path
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .dates import parse_ordinal
+from .sorted_index import SortedIndex
+from .vocab import VOCAB
+
+
+Stamp = Tuple[Optional[Tuple[int, int]], ...]
+
+
+def file_stamp(paths: List[Path]) -> Stamp:
+    """(mtime_ns, size) for each path, None for files that don't exist yet."""
+    stamp = []
+    for p in paths:
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            stamp.append(None)
+        else:
+            stamp.append((st.st_mtime_ns, st.st_size))
+    return tuple(stamp)
+
+
+class RecordCache:
+    """Parsed records of one type plus an id -> record map.
+
+    The records are reloaded only when the stamp of the files behind them
+    changes (another process wrote) - our own writes refresh the stamp.
+    Changes that haven't been flushed yet are kept as a dirty overlay and
+    re-applied on top of any reload.
+    """
+
+    def __init__(self, load: Callable[[], List[Any]], paths: Callable[[], List[Path]]):
+        self._load = load
+        self._paths = paths
+        self._by_id: Optional[Dict[int, Any]] = None
+        self._stamp: Optional[Stamp] = None
+        self.loads = 0  # bumped whenever the records are replaced wholesale
+        self.loaded_stamp: Optional[Stamp] = None  # the files' stamp at that load
+        # Pending changes carry a generation number so a flush only clears
+        # what it actually wrote, not changes made while it was writing.
+        self._gen = 0
+        self._dirty: Dict[int, Tuple[int, Any]] = {}
+        self._deleted: Dict[int, int] = {}
+
+    def by_id(self) -> Dict[int, Any]:
+        stamp = file_stamp(self._paths())
+        if self._by_id is None or stamp != self._stamp:
+            by_id = {r.id: r for r in self._load()}
+            for record_id in self._deleted:
+                by_id.pop(record_id, None)
+            by_id.update((i, r) for i, (_, r) in self._dirty.items())
+            self._by_id = by_id
+            self._stamp = self.loaded_stamp = stamp
+            self.loads += 1
+        return self._by_id
+
+    def records(self) -> List[Any]:
+        return list(self.by_id().values())
+
+    def is_warm(self) -> bool:
+        """True when serving from memory won't need a reload."""
+        if self._by_id is None:
+            return False
+        return self.has_pending() or file_stamp(self._paths()) == self._stamp
+
+    def is_current(self) -> bool:
+        """True when the loaded records match the files (nothing to reload)."""
+        return self._by_id is not None and file_stamp(self._paths()) == self._stamp
+
+    def generation(self) -> int:
+        """`loads`, after reloading if the files changed since the last
+        load, so a write from elsewhere always shows as a new generation."""
+        if self._by_id is not None and not self.is_current():
+            self.by_id()
+        return self.loads
+
+    def inserted(self, record: Any, was_current: bool) -> None:
+        """Take in a record the backend has just written itself. If the
+        cache was current before that write it stays current; otherwise
+        the next read reloads anyway."""
+        if self._by_id is None:
+            return
+        self._by_id[record.id] = record
+        if was_current:
+            self.written()
+
+    def put(self, record: Any) -> None:
+        self.by_id()[record.id] = record
+        self._gen += 1
+        self._dirty[record.id] = (self._gen, record)
+        self._deleted.pop(record.id, None)
+
+    def remove(self, record_id: int) -> bool:
+        if self.by_id().pop(record_id, None) is None:
+            return False
+        self._gen += 1
+        self._dirty.pop(record_id, None)
+        self._deleted[record_id] = self._gen
+        return True
+
+    def pending(self) -> Tuple[List[Any], List[int], int]:
+        """(records to write, ids to delete, generation they go up to)."""
+        return [r for _, r in self._dirty.values()], sorted(self._deleted), self._gen
+
+    def has_pending(self) -> bool:
+        return bool(self._dirty or self._deleted)
+
+    def clear_pending(self, upto: Optional[int] = None) -> None:
+        if upto is None:
+            self._dirty.clear()
+            self._deleted.clear()
+            return
+        self._dirty = {i: e for i, e in self._dirty.items() if e[0] > upto}
+        self._deleted = {i: g for i, g in self._deleted.items() if g > upto}
+
+    def replace(self, records: List[Any]) -> None:
+        self.clear_pending()
+        self._by_id = {r.id: r for r in records}
+        self.loads += 1
+        self.written()
+
+    def written(self) -> None:
+        self._stamp = file_stamp(self._paths())
+
+    def invalidate(self) -> None:
+        self._by_id = None
+        self._stamp = None
+
+
+class CachedBackend:
+    """Wraps a storage backend with per-process record caches.
+
+    Records handed out are the cached objects themselves, so read-only
+    commands after the first one don't parse anything. Code that changes a
+    record edits a copy (copy.copy) and saves that with upsert_*, like pkms
+    and task_manager do: a flush from another thread (the idle policy's
+    timer) could otherwise write the cached object half-edited.
+
+    upsert_*/delete_* only mark records dirty and then call `on_change`;
+    flush() writes everything dirty in one batch. By default on_change
+    flushes straight away - final/unit_of_work.py swaps in a policy that
+    defers it.
+
+    Flushes are group commits: one thread at a time writes, and whatever
+    other threads marked dirty while it waited goes out in the same write.
+    Each write holds the store's exclusive file lock and first reloads the
+    cache if another process changed the file, so their records are merged
+    rather than overwritten from a stale list.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.name = backend.name
+        self.notes = RecordCache(backend.load_notes, backend.note_paths)
+        self.tasks = RecordCache(backend.load_tasks, backend.task_paths)
+        self.on_change: Callable[[], None] = self.flush
+        self._lock = threading.RLock()      # guards the caches
+        self._commit = threading.Lock()     # one writer at a time
+        # Sorted date indexes, built on the first range query and kept up to
+        # date by upsert/delete until the cache reloads.
+        self._date_indexes: Dict[str, Tuple[RecordCache, SortedIndex, int]] = {}
+        self._date_keys = {
+            "task_due": (self.tasks, lambda t: t.due_ordinal),
+            "task_updated": (self.tasks, lambda t: t.updated_epoch),
+            "note_updated": (self.notes, lambda n: n.updated_epoch),
+        }
+
+    def _date_index(self, name: str) -> Tuple[SortedIndex, Dict[int, Any]]:
+        """The named date index and the id -> record map it points into."""
+        with self._lock:
+            cache, key_of = self._date_keys[name]
+            by_id = cache.by_id()
+            entry = self._date_indexes.get(name)
+            if entry is None or entry[2] != cache.loads:
+                index = SortedIndex(key_of)
+                index.build(by_id.values())
+                self._date_indexes[name] = (cache, index, cache.loads)
+            else:
+                index = entry[1]
+            return index, by_id
+
+    def _index_put(self, cache: RecordCache, record: Any) -> None:
+        for c, index, loads in self._date_indexes.values():
+            if c is cache and loads == cache.loads:
+                index.put(record)
+
+    def _index_remove(self, cache: RecordCache, record_id: int) -> None:
+        for c, index, loads in self._date_indexes.values():
+            if c is cache and loads == cache.loads:
+                index.remove(record_id)
+
+    def __getattr__(self, attr: str):
+        # Anything we don't cache (compact(), conn, ...) goes to the backend.
+        return getattr(self.backend, attr)
+
+    def has_pending(self) -> bool:
+        return self.notes.has_pending() or self.tasks.has_pending()
+
+    def flush(self) -> None:
+        with self._commit:
+            self._flush_one(
+                self.notes, self.backend.notes_lock(), self.backend.apply_notes, self.backend.save_notes
+            )
+            self._flush_one(
+                self.tasks, self.backend.tasks_lock(), self.backend.apply_tasks, self.backend.save_tasks
+            )
+
+    def _flush_one(self, cache: RecordCache, file_lock, apply_batch, save_all) -> None:
+        if not cache.has_pending():
+            return
+        with file_lock.exclusive():
+            with self._lock:
+                puts, deletes, upto = cache.pending()
+                if not self.backend.per_record_writes:
+                    # Reloads (and re-applies our pending changes) if another
+                    # process wrote since we last looked.
+                    records = cache.records()
+            if self.backend.per_record_writes:
+                apply_batch(puts, deletes)
+            else:
+                save_all(records)
+            with self._lock:
+                cache.clear_pending(upto)
+                cache.written()
+
+    def _insert(self, cache: RecordCache, file_lock, insert, record: Any, floor: int) -> None:
+        # A new record's id has to be picked against the store itself under
+        # its exclusive lock, so inserts write straight through rather than
+        # waiting in the dirty overlay for a flush.
+        with self._commit, file_lock.exclusive():
+            with self._lock:
+                was_current = cache.is_current()
+            insert(record, floor)
+            with self._lock:
+                cache.inserted(record, was_current)
+                self._index_put(cache, record)
+
+    # ---------- Notes ----------
+
+    def load_notes(self):
+        return self.notes.records()
+
+    def save_notes(self, notes) -> None:
+        with self._commit, self._lock:
+            self.backend.save_notes(notes)
+            self.notes.replace(notes)
+
+    def iter_notes(self):
+        # A cold cache stays cold: streaming from the backend keeps memory
+        # flat instead of loading the whole store just to walk it once.
+        if self.notes.is_warm():
+            return iter(self.notes.records())
+        return self.backend.iter_notes()
+
+    def get_note(self, note_id: int):
+        return self.notes.by_id().get(note_id)
+
+    def upsert_note(self, note) -> None:
+        with self._lock:
+            self.notes.put(note)
+            self._index_put(self.notes, note)
+        self.on_change()
+
+    def insert_note(self, note, floor: int = 0) -> None:
+        self._insert(self.notes, self.backend.notes_lock(), self.backend.insert_note, note, floor)
+
+    def delete_note(self, note_id: int) -> bool:
+        with self._lock:
+            removed = self.notes.remove(note_id)
+            self._index_remove(self.notes, note_id)
+        if removed:
+            self.on_change()
+        return removed
+
+    def apply_notes(self, puts, deletes) -> None:
+        with self._lock:
+            for note in puts:
+                self.notes.put(note)
+                self._index_put(self.notes, note)
+            for note_id in deletes:
+                self.notes.remove(note_id)
+                self._index_remove(self.notes, note_id)
+        self.on_change()
+
+    def notes_updated_since(self, since: float):
+        index, by_id = self._date_index("note_updated")
+        return [by_id[i] for i in index.range(since)]
+
+    def iter_note_summaries(self):
+        if self.notes.is_warm():
+            return iter(self.notes.records())
+        return self.backend.iter_note_summaries()
+
+    def iter_notes_with_tag(self, tag: str):
+        if not self.notes.is_warm():
+            return self.backend.iter_notes_with_tag(tag)
+        notes = self.notes.records()
+        code = VOCAB.find_folded(tag.strip())
+        return (n for n in notes if n.has_tag_code(code))
+
+    def notes_with_tag(self, tag: str):
+        notes = self.notes.records()
+        code = VOCAB.find_folded(tag.strip())
+        return [n for n in notes if n.has_tag_code(code)]
+
+    # ---------- Tasks ----------
+
+    def load_tasks(self):
+        return self.tasks.records()
+
+    def save_tasks(self, tasks) -> None:
+        with self._commit, self._lock:
+            self.backend.save_tasks(tasks)
+            self.tasks.replace(tasks)
+
+    def iter_tasks(self):
+        if self.tasks.is_warm():
+            return iter(self.tasks.records())
+        return self.backend.iter_tasks()
+
+    def get_task(self, task_id: int):
+        return self.tasks.by_id().get(task_id)
+
+    def upsert_task(self, task) -> None:
+        with self._lock:
+            self.tasks.put(task)
+            self._index_put(self.tasks, task)
+        self.on_change()
+
+    def insert_task(self, task, floor: int = 0) -> None:
+        self._insert(self.tasks, self.backend.tasks_lock(), self.backend.insert_task, task, floor)
+
+    def delete_task(self, task_id: int) -> bool:
+        with self._lock:
+            removed = self.tasks.remove(task_id)
+            self._index_remove(self.tasks, task_id)
+        if removed:
+            self.on_change()
+        return removed
+
+    def apply_tasks(self, puts, deletes) -> None:
+        with self._lock:
+            for task in puts:
+                self.tasks.put(task)
+                self._index_put(self.tasks, task)
+            for task_id in deletes:
+                self.tasks.remove(task_id)
+                self._index_remove(self.tasks, task_id)
+        self.on_change()
+
+    def tasks_with_status(self, status: str):
+        tasks = self.tasks.records()
+        code = VOCAB.find(status.lower().strip())
+        return [t for t in tasks if t.status_code == code]
+
+    def tasks_due_between(self, start: Optional[str], end: Optional[str]):
+        index, by_id = self._date_index("task_due")
+        return [by_id[i] for i in index.range(parse_ordinal(start), parse_ordinal(end))]
+
+    def tasks_updated_since(self, since: float):
+        index, by_id = self._date_index("task_updated")
+        return [by_id[i] for i in index.range(since)]
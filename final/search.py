@@ -0,0 +1,87 @@
+# final/search.py
+from __future__ import annotations
+from typing import Any, List, Optional, Tuple
+
+from .storage import embedding_store, get_note, get_task, search_index, search_index_handle, split_key
+
+
+def search_all(query: str, page: int = 1, size: Optional[int] = None) -> Tuple[List[Tuple[str, Any, float]], bool]:
+    """One page of the notes and tasks matching `query`, best BM25 score
+    first, as (kind, record, score), and whether there is another page.
+
+    Both come from the shared index (storage.search_index), so a word's
+    postings are read once for notes and tasks alike and the scores are
+    comparable. Archived tasks aren't in it; search-tasks finds those.
+    """
+    from .config import SEARCH_PAGE_SIZE
+
+    size = size or SEARCH_PAGE_SIZE
+    start = (page - 1) * size
+    hits = search_index().search(query, start + size + 1)
+    results = []
+    for key, score in hits[start:start + size]:
+        kind, record_id = split_key(key)
+        record = get_note(record_id) if kind == "notes" else get_task(record_id)
+        if record is not None:
+            results.append((kind, record, score))
+    return results, len(hits) > start + size
+
+
+def print_search(query: str, page: int = 1) -> None:
+    from .config import SEARCH_PAGE_SIZE
+
+    query = query.strip()
+    results, more = search_all(query, page)
+    if search_index_handle().rebuilding:
+        print("(Notes or tasks changed on disk; the search index is being rebuilt, so results may lag.)")
+    if not results:
+        print(f"Nothing matched '{query}'." if page == 1 else f"No page {page} for '{query}'.")
+        return
+
+    print(f"Notes and tasks matching '{query}' (page {page}):")
+    for n, (kind, r, score) in enumerate(results, (page - 1) * SEARCH_PAGE_SIZE + 1):
+        if kind == "notes":
+            tags = ", ".join(r.tags) if r.tags else "-"
+            print(f"{n:>4}. note [{r.id}] {r.title} (tags: {tags})")
+        else:
+            print(f"{n:>4}. task [{r.id}] ({r.status}) [{r.category or '-'}] {r.title}")
+    if more:
+        print(f"More: search {query} --page {page + 1}")
+
+
+def semantic_search(query: str, k: Optional[int] = None) -> List[Tuple[str, Any, float]]:
+    """The k notes and tasks whose embeddings are closest to the query's,
+    as (kind, record, cosine), closest first (final/embeddings.py)."""
+    from .config import SEARCH_TOP_K
+
+    k = k or SEARCH_TOP_K
+    notes, tasks = embedding_store("notes"), embedding_store("tasks")
+    vector = notes.embedder.embed([query])[0]
+    hits = [("notes", i, score) for i, score in notes.search(vector, k)]
+    hits += [("tasks", i, score) for i, score in tasks.search(vector, k)]
+    results = []
+    for kind, record_id, score in sorted(hits, key=lambda h: -h[2])[:k]:
+        record = get_note(record_id) if kind == "notes" else get_task(record_id)
+        if record is not None:
+            results.append((kind, record, score))
+    return results
+
+
+def print_semantic(query: str) -> None:
+    query = query.strip()
+    try:
+        results = semantic_search(query)
+    except Exception as e:
+        print(f"(Embeddings unavailable: {e})")
+        return
+    if not results:
+        print(f"Nothing matched '{query}'.")
+        return
+
+    print(f"Notes and tasks closest in meaning to '{query}':")
+    for n, (kind, r, score) in enumerate(results, 1):
+        if kind == "notes":
+            tags = ", ".join(r.tags) if r.tags else "-"
+            print(f"{n:>4}. note [{r.id}] {r.title} (tags: {tags}) {score:.2f}")
+        else:
+            print(f"{n:>4}. task [{r.id}] ({r.status}) [{r.category or '-'}] {r.title} {score:.2f}")
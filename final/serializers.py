@@ -0,0 +1,271 @@
+# final/serializers.py
+from __future__ import annotations
+import json
+import struct
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:  # optional speedups; the stdlib codecs work without them
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class JsonCodec:
+    """The current on-disk format: json.dump(..., indent=2)."""
+
+    name = "json-pretty"
+    indent: Optional[int] = 2
+
+    def dumps(self, data: Any) -> bytes:
+        separators = None if self.indent is not None else (",", ":")
+        return json.dumps(data, indent=self.indent, separators=separators, ensure_ascii=False).encode("utf-8")
+
+    def loads(self, raw: bytes) -> Any:
+        return json.loads(raw)
+
+
+class CompactJsonCodec(JsonCodec):
+    """Same JSON, no indentation or spaces after separators."""
+
+    name = "json-compact"
+    indent = None
+
+
+class FastJsonCodec(CompactJsonCodec):
+    """Compact JSON through orjson or ujson when one is installed.
+
+    Falls back to the stdlib encoder otherwise, so selecting it is always
+    safe; `backend` says which one is in use.
+    """
+
+    name = "json-fast"
+
+    @property
+    def backend(self) -> str:
+        if orjson is not None:
+            return "orjson"
+        if ujson is not None:
+            return "ujson"
+        return "json"
+
+    def dumps(self, data: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(data)
+        if ujson is not None:
+            return ujson.dumps(data, ensure_ascii=False).encode("utf-8")
+        return super().dumps(data)
+
+    def loads(self, raw: bytes) -> Any:
+        if orjson is not None:
+            return orjson.loads(raw)
+        if ujson is not None:
+            return ujson.loads(raw)
+        return super().loads(raw)
+
+
+# ---------- Binary records ----------
+#
+# MAGIC, then a key table (every dict key once), then one tagged value:
+#
+#   N / T / F        None / True / False
+#   i <varint>       int (zigzag)
+#   d <8 bytes>      float64
+#   s <len> <utf-8>  str
+#   S <len> <utf-8>  str, and remember it as the next string-table entry
+#   r <index>        str: an earlier S string
+#   l <n> items...   list
+#   m <n> (<key index> value)...   dict
+#
+# Lengths, counts and key indexes are unsigned LEB128 varints, so field
+# names cost one byte per record instead of their full spelling. Short
+# string values (statuses, priorities, categories, tags, dates) are written
+# once and referenced afterwards, the on-disk side of the interned
+# vocabulary in final/vocab.py.
+
+BINARY_MAGIC = b"AGB2"
+INTERN_MAX_BYTES = 32
+
+
+def is_binary(raw: bytes) -> bool:
+    return raw.startswith(BINARY_MAGIC)
+_DOUBLE = struct.Struct("<d")
+
+
+def _write_varint(out: bytearray, n: int) -> None:
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(buf: bytes, pos: int):
+    result = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+class BinaryCodec:
+    """Compact tagged binary records (see the format comment above)."""
+
+    name = "binary"
+
+    def dumps(self, data: Any) -> bytes:
+        keys: Dict[str, int] = {}
+        body = bytearray()
+        self._encode(data, body, keys, {})
+        out = bytearray(BINARY_MAGIC)
+        _write_varint(out, len(keys))
+        for k in keys:
+            raw = k.encode("utf-8")
+            _write_varint(out, len(raw))
+            out += raw
+        return bytes(out + body)
+
+    def _encode(self, v: Any, out: bytearray, keys: Dict[str, int], strings: Dict[str, int]) -> None:
+        if v is None:
+            out += b"N"
+        elif v is True:
+            out += b"T"
+        elif v is False:
+            out += b"F"
+        elif isinstance(v, int):
+            out += b"i"
+            _write_varint(out, (v << 1) if v >= 0 else ((-v << 1) - 1))
+        elif isinstance(v, float):
+            out += b"d"
+            out += _DOUBLE.pack(v)
+        elif isinstance(v, str):
+            idx = strings.get(v)
+            if idx is not None:
+                out += b"r"
+                _write_varint(out, idx)
+                return
+            raw = v.encode("utf-8")
+            if len(raw) <= INTERN_MAX_BYTES:
+                strings[v] = len(strings)
+                out += b"S"
+            else:
+                out += b"s"
+            _write_varint(out, len(raw))
+            out += raw
+        elif isinstance(v, (list, tuple)):
+            out += b"l"
+            _write_varint(out, len(v))
+            for item in v:
+                self._encode(item, out, keys, strings)
+        elif isinstance(v, dict):
+            out += b"m"
+            _write_varint(out, len(v))
+            for k, item in v.items():
+                idx = keys.setdefault(k, len(keys))
+                _write_varint(out, idx)
+                self._encode(item, out, keys, strings)
+        else:
+            raise TypeError(f"Cannot encode {type(v).__name__} in binary records")
+
+    def loads(self, raw: bytes) -> Any:
+        if not is_binary(raw):
+            raise ValueError("not a binary record file")
+        pos = len(BINARY_MAGIC)
+        count, pos = _read_varint(raw, pos)
+        keys: List[str] = []
+        for _ in range(count):
+            n, pos = _read_varint(raw, pos)
+            keys.append(raw[pos:pos + n].decode("utf-8"))
+            pos += n
+        value, _ = self._decode(raw, pos, keys, [])
+        return value
+
+    def _decode(self, buf: bytes, pos: int, keys: List[str], strings: List[str]):
+        tag = buf[pos]
+        pos += 1
+        if tag == 0x73:  # s
+            n, pos = _read_varint(buf, pos)
+            return buf[pos:pos + n].decode("utf-8"), pos + n
+        if tag == 0x72:  # r
+            idx, pos = _read_varint(buf, pos)
+            return strings[idx], pos
+        if tag == 0x53:  # S
+            n, pos = _read_varint(buf, pos)
+            value = buf[pos:pos + n].decode("utf-8")
+            strings.append(value)
+            return value, pos + n
+        if tag == 0x6D:  # m
+            n, pos = _read_varint(buf, pos)
+            d = {}
+            for _ in range(n):
+                idx, pos = _read_varint(buf, pos)
+                d[keys[idx]], pos = self._decode(buf, pos, keys, strings)
+            return d, pos
+        if tag == 0x69:  # i
+            z, pos = _read_varint(buf, pos)
+            return (z >> 1) if not z & 1 else -((z + 1) >> 1), pos
+        if tag == 0x4E:  # N
+            return None, pos
+        if tag == 0x6C:  # l
+            n, pos = _read_varint(buf, pos)
+            items = []
+            for _ in range(n):
+                item, pos = self._decode(buf, pos, keys, strings)
+                items.append(item)
+            return items, pos
+        if tag == 0x54:  # T
+            return True, pos
+        if tag == 0x46:  # F
+            return False, pos
+        if tag == 0x64:  # d
+            return _DOUBLE.unpack_from(buf, pos)[0], pos + 8
+        raise ValueError(f"bad tag {tag!r} at offset {pos - 1}")
+
+
+CODECS = {c.name: c for c in (JsonCodec(), CompactJsonCodec(), FastJsonCodec(), BinaryCodec())}
+
+
+def get_codec(name: str):
+    try:
+        return CODECS[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown codec {name!r}; expected one of {', '.join(CODECS)}") from None
+
+
+def detect_codec(raw: bytes):
+    """The codec that can read `raw`: binary by its magic, JSON otherwise."""
+    if is_binary(raw):
+        return CODECS["binary"]
+    return CODECS["json-fast"]
+
+
+def load_file(path: Path) -> Any:
+    raw = path.read_bytes()
+    return detect_codec(raw).loads(raw)
+
+
+def convert(src: Path, dst: Path, codec_name: str) -> int:
+    """Rewrite `src` (any codec) as `dst` in `codec_name`; returns bytes written."""
+    raw = src.read_bytes()
+    data = detect_codec(raw).loads(raw)
+    out = get_codec(codec_name).dumps(data)
+    dst.write_bytes(out)
+    return len(out)
+
+
+if __name__ == "__main__":
+    # python -m final.serializers convert <src> <dst> <codec>
+    if len(sys.argv) != 5 or sys.argv[1] != "convert":
+        print("Usage: python -m final.serializers convert <src> <dst> <codec>")
+        print(f"Codecs: {', '.join(CODECS)}")
+        sys.exit(2)
+    size = convert(Path(sys.argv[2]), Path(sys.argv[3]), sys.argv[4])
+    print(f"Wrote {sys.argv[3]} ({size} bytes, {sys.argv[4]})")
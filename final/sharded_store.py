@@ -0,0 +1,170 @@
+# final/sharded_store.py
+from __future__ import annotations
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .models import _UNLOADED, Note, NoteSummary, lazy_record
+from .locks import lock_for
+from .serializers import get_codec
+from .storage import JsonBackend, _load_json, _replace_json, _replace_text
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+class ShardedBackend(JsonBackend):
+    """Notes as one content file each plus a compact manifest.
+
+    Layout under final/data/notes/:
+
+        manifest.json   {"notes": [{id, title, tags, created_at, updated_at,
+                                    sha1, size}, ...]}
+        <id>.txt        the note's content
+
+    Editing a note rewrites only its shard (and only if the content hash
+    changed) plus the manifest; listing reads nothing but the manifest.
+    Tasks keep the plain tasks.json layout inherited from JsonBackend.
+    """
+
+    name = "sharded"
+    per_record_writes = True
+
+    def __init__(self, notes_dir: Path, manifest: Path):
+        self.notes_dir = notes_dir
+        self.manifest = manifest
+
+    def notes_lock(self):
+        return lock_for(self.manifest)
+
+    def note_paths(self) -> List[Path]:
+        # Every write rewrites the manifest, so its stamp covers the shards.
+        return [self.manifest]
+
+    def _shard(self, note_id: int) -> Path:
+        return self.notes_dir / f"{note_id}.txt"
+
+    def _read_manifest(self) -> Dict[int, Dict[str, Any]]:
+        return {e["id"]: e for e in _load_json(self.manifest).get("notes", [])}
+
+    def _write_manifest(self, entries: Dict[int, Dict[str, Any]]) -> None:
+        _replace_json(
+            self.manifest,
+            {"notes": [entries[i] for i in sorted(entries)]},
+            get_codec("json-compact"),
+        )
+
+    def _read_content(self, entry: Dict[str, Any]) -> str:
+        try:
+            return self._shard(entry["id"]).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return ""
+
+    def _note(self, entry: Dict[str, Any]) -> Note:
+        # The manifest is this layout's side index: the shard is only opened
+        # when something reads the note's content.
+        return lazy_record(
+            Note,
+            {
+                "id": entry["id"],
+                "title": entry["title"],
+                "tags": list(entry.get("tags", [])),
+                "created_at": entry["created_at"],
+                "updated_at": entry["updated_at"],
+            },
+            lambda: {"content": self._read_content(entry)},
+        )
+
+    def _put(self, entries: Dict[int, Dict[str, Any]], note: Note) -> None:
+        old = entries.get(note.id)
+        if note._content is _UNLOADED and old is not None:
+            # Content never read, so the shard on disk is still current.
+            digest, size = old["sha1"], old["size"]
+        else:
+            digest = content_hash(note.content)
+            size = len(note.content.encode("utf-8"))
+            if old is None or old.get("sha1") != digest or not self._shard(note.id).exists():
+                _replace_text(self._shard(note.id), note.content)
+        entries[note.id] = {
+            "id": note.id,
+            "title": note.title,
+            "tags": list(note.tags),
+            "created_at": note.created_at,
+            "updated_at": note.updated_at,
+            "sha1": digest,
+            "size": size,
+        }
+
+    # ---------- Notes ----------
+
+    def load_notes(self) -> List[Note]:
+        with self.notes_lock().shared():
+            return [self._note(e) for e in self._read_manifest().values()]
+
+    def iter_notes(self) -> Iterator[Note]:
+        for e in self._read_manifest().values():
+            yield self._note(e)
+
+    def iter_note_summaries(self) -> Iterator[NoteSummary]:
+        for e in self._read_manifest().values():
+            yield NoteSummary(
+                id=e["id"],
+                title=e["title"],
+                tags=list(e.get("tags", [])),
+                created_at=e["created_at"],
+                updated_at=e["updated_at"],
+            )
+
+    def save_notes(self, notes: List[Note]) -> None:
+        with self.notes_lock().exclusive():
+            entries = self._read_manifest()
+            keep = {n.id for n in notes}
+            for note_id in set(entries) - keep:
+                self._shard(note_id).unlink(missing_ok=True)
+                del entries[note_id]
+            for n in notes:
+                self._put(entries, n)
+            self._write_manifest(entries)
+
+    def apply_notes(self, puts: List[Note], deletes: List[int]) -> None:
+        with self.notes_lock().exclusive():
+            entries = self._read_manifest()
+            for note_id in deletes:
+                if entries.pop(note_id, None) is not None:
+                    self._shard(note_id).unlink(missing_ok=True)
+            for n in puts:
+                self._put(entries, n)
+            self._write_manifest(entries)
+
+    def get_note(self, note_id: int) -> Optional[Note]:
+        with self.notes_lock().shared():
+            entry = self._read_manifest().get(note_id)
+            return self._note(entry) if entry else None
+
+    def iter_notes_with_tag(self, tag: str) -> Iterator[Note]:
+        # Match on the manifest, then open only the matching shards.
+        tag = tag.lower().strip()
+        for e in self._read_manifest().values():
+            if any(tag == t.lower() for t in e.get("tags", [])):
+                yield self._note(e)
+
+
+# ---------- One-shot migration ----------
+
+def migrate_from_json(backend: Optional[ShardedBackend] = None) -> int:
+    """Split notes.json into per-note shards; notes.json itself is left as is."""
+    from . import storage
+
+    notes = storage.get_backend("json").load_notes()
+    dst = backend or ShardedBackend(storage.NOTES_DIR, storage.NOTES_MANIFEST)
+    dst.apply_notes(notes, [])
+    return len(notes)
+
+
+if __name__ == "__main__":
+    from .storage import NOTES_DIR
+
+    count = migrate_from_json()
+    print(f"Migrated {count} notes into {NOTES_DIR}")
+    print("Set ARTGROW_STORAGE=sharded to use it.")
@@ -0,0 +1,75 @@
+# final/sorted_index.py
+from __future__ import annotations
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+_LOW = float("-inf")
+_HIGH = float("inf")
+
+
+class SortedIndex:
+    """(key, id) pairs kept sorted so range queries are two bisects.
+
+    `key_of(record)` gives the sort key (an epoch or day ordinal); records
+    whose key is None are left out. put/remove keep the index current one
+    record at a time, so it only needs a full build once.
+    """
+
+    def __init__(self, key_of: Callable[[Any], Optional[float]]):
+        self.key_of = key_of
+        self._pairs: List[Tuple[float, int]] = []
+        self._key_by_id: Dict[int, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._pairs)
+
+    def build(self, records: Iterable[Any]) -> None:
+        key_by_id = {}
+        for r in records:
+            k = self.key_of(r)
+            if k is not None:
+                key_by_id[r.id] = k
+        self._key_by_id = key_by_id
+        self._pairs = sorted((k, i) for i, k in key_by_id.items())
+
+    def put(self, record: Any) -> None:
+        self.remove(record.id)
+        k = self.key_of(record)
+        if k is not None:
+            self._key_by_id[record.id] = k
+            insort(self._pairs, (k, record.id))
+
+    def remove(self, record_id: int) -> None:
+        k = self._key_by_id.pop(record_id, None)
+        if k is not None:
+            i = bisect_left(self._pairs, (k, record_id))
+            del self._pairs[i]
+
+    def range(
+        self, lo: Optional[float] = None, hi: Optional[float] = None, strict_lo: bool = False, strict_hi: bool = False
+    ) -> List[int]:
+        """Ids with lo <= key <= hi (either end open when None, `<` instead
+        of `<=` on a strict end), in key order."""
+        start, end = self._span(lo, hi, strict_lo, strict_hi)
+        return [i for _, i in self._pairs[start:end]]
+
+    def count(
+        self, lo: Optional[float] = None, hi: Optional[float] = None, strict_lo: bool = False, strict_hi: bool = False
+    ) -> int:
+        """len(self.range(...)) without building the list."""
+        start, end = self._span(lo, hi, strict_lo, strict_hi)
+        return max(end - start, 0)
+
+    def key(self, record_id: int) -> Optional[float]:
+        return self._key_by_id.get(record_id)
+
+    def _span(self, lo: Optional[float], hi: Optional[float], strict_lo: bool, strict_hi: bool) -> Tuple[int, int]:
+        if lo is None:
+            start = 0
+        else:
+            start = bisect_right(self._pairs, (lo, _HIGH)) if strict_lo else bisect_left(self._pairs, (lo, _LOW))
+        if hi is None:
+            end = len(self._pairs)
+        else:
+            end = bisect_left(self._pairs, (hi, _LOW)) if strict_hi else bisect_right(self._pairs, (hi, _HIGH))
+        return start, end
@@ -0,0 +1,381 @@
+# final/sqlite_store.py
+from __future__ import annotations
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Iterable, Iterator, Tuple
+
+from .dates import parse_ordinal
+from .locks import NullLock
+from .models import Note, NoteSummary, Task
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    id          INTEGER PRIMARY KEY,
+    title       TEXT NOT NULL,
+    content     TEXT NOT NULL,
+    created_at  TEXT NOT NULL,
+    updated_at  TEXT NOT NULL,
+    updated_epoch  REAL
+);
+
+CREATE TABLE IF NOT EXISTS note_tags (
+    note_id   INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE,
+    position  INTEGER NOT NULL,
+    tag       TEXT NOT NULL,
+    tag_key   TEXT NOT NULL,
+    PRIMARY KEY (note_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_note_tags_key ON note_tags(tag_key, note_id);
+
+CREATE TABLE IF NOT EXISTS tasks (
+    id            INTEGER PRIMARY KEY,
+    title         TEXT NOT NULL,
+    description   TEXT NOT NULL,
+    priority      TEXT NOT NULL,
+    status        TEXT NOT NULL,
+    category      TEXT,
+    due_date      TEXT,
+    created_at    TEXT NOT NULL,
+    completed_at  TEXT,
+    updated_at    TEXT NOT NULL,
+    tip           TEXT,
+    due_ordinal    INTEGER,
+    updated_epoch  REAL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status, id);
+
+-- Date queries run on values parsed at write time (final/dates.py), not on
+-- the ISO text, which only compares right when every row uses one format.
+CREATE INDEX IF NOT EXISTS idx_notes_updated_epoch ON notes(updated_epoch) WHERE updated_epoch IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_tasks_due_ordinal ON tasks(due_ordinal) WHERE due_ordinal IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_tasks_updated_epoch ON tasks(updated_epoch) WHERE updated_epoch IS NOT NULL;
+"""
+
+# Rows fetched per round trip by the iter_* readers.
+FETCH_SIZE = 500
+
+TASK_COLUMNS = (
+    "id", "title", "description", "priority", "status", "category",
+    "due_date", "created_at", "completed_at", "updated_at", "tip",
+)
+TASK_DATE_COLUMNS = ("due_ordinal", "updated_epoch")
+
+
+class SQLiteBackend:
+    """Single-file SQLite engine with per-record writes and indexed lookups."""
+
+    name = "sqlite"
+    per_record_writes = True
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA foreign_keys = ON")
+            _use_wal(conn)
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _paths(self) -> List[Path]:
+        # In WAL mode commits land in the -wal file before checkpointing.
+        return [self.path, self.path.with_name(self.path.name + "-wal")]
+
+    note_paths = task_paths = _paths
+
+    def _lock(self) -> NullLock:
+        # SQLite already gives us atomic transactions and cross-process locking.
+        return NullLock()
+
+    notes_lock = tasks_lock = _lock
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # ---------- Notes ----------
+
+    def _tags_of(self, ids: List[int]) -> Dict[int, List[str]]:
+        tags: Dict[int, List[str]] = {i: [] for i in ids}
+        placeholders = ",".join("?" * len(ids))
+        for tr in self.conn.execute(
+            f"SELECT note_id, tag FROM note_tags WHERE note_id IN ({placeholders}) "
+            "ORDER BY note_id, position",
+            ids,
+        ):
+            tags[tr["note_id"]].append(tr["tag"])
+        return tags
+
+    def _notes_from_rows(self, rows: Iterable[sqlite3.Row]) -> List[Note]:
+        rows = list(rows)
+        if not rows:
+            return []
+        tags = self._tags_of([r["id"] for r in rows])
+        return [
+            Note(
+                id=r["id"],
+                title=r["title"],
+                content=r["content"],
+                tags=tags[r["id"]],
+                created_at=r["created_at"],
+                updated_at=r["updated_at"],
+            )
+            for r in rows
+        ]
+
+    def _write_note(self, note: Note) -> None:
+        c = self.conn
+        c.execute(
+            "INSERT INTO notes (id, title, content, created_at, updated_at, updated_epoch) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET title=excluded.title, content=excluded.content, "
+            "created_at=excluded.created_at, updated_at=excluded.updated_at, "
+            "updated_epoch=excluded.updated_epoch",
+            (note.id, note.title, note.content, note.created_at, note.updated_at, note.updated_epoch),
+        )
+        c.execute("DELETE FROM note_tags WHERE note_id = ?", (note.id,))
+        self._write_tags(note)
+
+    def _write_tags(self, note: Note) -> None:
+        self.conn.executemany(
+            "INSERT INTO note_tags (note_id, position, tag, tag_key) VALUES (?, ?, ?, ?)",
+            [(note.id, i, t, t.lower()) for i, t in enumerate(note.tags)],
+        )
+
+    def load_notes(self) -> List[Note]:
+        return self._notes_from_rows(self.conn.execute("SELECT * FROM notes ORDER BY id"))
+
+    def iter_notes(self) -> Iterator[Note]:
+        cur = self.conn.execute("SELECT * FROM notes ORDER BY id")
+        while True:
+            rows = cur.fetchmany(FETCH_SIZE)
+            if not rows:
+                return
+            yield from self._notes_from_rows(rows)
+
+    def iter_note_summaries(self) -> Iterator[NoteSummary]:
+        # Listings never need the content column.
+        cur = self.conn.execute("SELECT id, title, created_at, updated_at FROM notes ORDER BY id")
+        while True:
+            rows = cur.fetchmany(FETCH_SIZE)
+            if not rows:
+                return
+            tags = self._tags_of([r["id"] for r in rows])
+            for r in rows:
+                yield NoteSummary(
+                    id=r["id"],
+                    title=r["title"],
+                    tags=tags[r["id"]],
+                    created_at=r["created_at"],
+                    updated_at=r["updated_at"],
+                )
+
+    def save_notes(self, notes: List[Note]) -> None:
+        with self.conn:
+            self.conn.execute("DELETE FROM notes")
+            for n in notes:
+                self._write_note(n)
+
+    def apply_notes(self, puts: List[Note], deletes: List[int]) -> None:
+        with self.conn:
+            self.conn.executemany("DELETE FROM notes WHERE id = ?", [(i,) for i in deletes])
+            for n in puts:
+                self._write_note(n)
+
+    def get_note(self, note_id: int) -> Optional[Note]:
+        found = self._notes_from_rows(
+            self.conn.execute("SELECT * FROM notes WHERE id = ?", (note_id,))
+        )
+        return found[0] if found else None
+
+    def upsert_note(self, note: Note) -> None:
+        with self.conn:
+            self._write_note(note)
+
+    # New rows take the id in the same INSERT that reads MAX(id), and a plain
+    # INSERT fails on a taken id instead of overwriting the row like the
+    # upsert would. Ids up to `floor` count as taken too.
+
+    def insert_note(self, note: Note, floor: int = 0) -> None:
+        with self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO notes (id, title, content, created_at, updated_at, updated_epoch) "
+                "SELECT MAX(COALESCE(MAX(id), 0), ?) + 1, ?, ?, ?, ?, ? FROM notes",
+                (floor, note.title, note.content, note.created_at, note.updated_at, note.updated_epoch),
+            )
+            note.id = cur.lastrowid
+            self._write_tags(note)
+
+    def delete_note(self, note_id: int) -> bool:
+        with self.conn:
+            cur = self.conn.execute("DELETE FROM notes WHERE id = ?", (note_id,))
+        return cur.rowcount > 0
+
+    def iter_notes_with_tag(self, tag: str) -> Iterator[Note]:
+        cur = self.conn.execute(
+            "SELECT * FROM notes WHERE id IN "
+            "(SELECT note_id FROM note_tags WHERE tag_key = ?) ORDER BY id",
+            (tag.lower().strip(),),
+        )
+        while True:
+            rows = cur.fetchmany(FETCH_SIZE)
+            if not rows:
+                return
+            yield from self._notes_from_rows(rows)
+
+    def notes_with_tag(self, tag: str) -> List[Note]:
+        return list(self.iter_notes_with_tag(tag))
+
+    def notes_updated_since(self, since: float) -> List[Note]:
+        return self._notes_from_rows(self.conn.execute(
+            "SELECT * FROM notes WHERE updated_epoch >= ? ORDER BY updated_epoch, id", (since,)
+        ))
+
+    # ---------- Tasks ----------
+
+    @staticmethod
+    def _task_from_row(r: sqlite3.Row) -> Task:
+        return Task(**{col: r[col] for col in TASK_COLUMNS})
+
+    def _write_task(self, task: Task) -> None:
+        columns = TASK_COLUMNS + TASK_DATE_COLUMNS
+        cols = ", ".join(columns)
+        marks = ", ".join("?" * len(columns))
+        updates = ", ".join(f"{c}=excluded.{c}" for c in columns if c != "id")
+        self.conn.execute(
+            f"INSERT INTO tasks ({cols}) VALUES ({marks}) "
+            f"ON CONFLICT(id) DO UPDATE SET {updates}",
+            tuple(getattr(task, c) for c in columns),
+        )
+
+    def load_tasks(self) -> List[Task]:
+        return [self._task_from_row(r) for r in self.conn.execute("SELECT * FROM tasks ORDER BY id")]
+
+    def iter_tasks(self) -> Iterator[Task]:
+        cur = self.conn.execute("SELECT * FROM tasks ORDER BY id")
+        while True:
+            rows = cur.fetchmany(FETCH_SIZE)
+            if not rows:
+                return
+            for r in rows:
+                yield self._task_from_row(r)
+
+    def save_tasks(self, tasks: List[Task]) -> None:
+        with self.conn:
+            self.conn.execute("DELETE FROM tasks")
+            for t in tasks:
+                self._write_task(t)
+
+    def apply_tasks(self, puts: List[Task], deletes: List[int]) -> None:
+        with self.conn:
+            self.conn.executemany("DELETE FROM tasks WHERE id = ?", [(i,) for i in deletes])
+            for t in puts:
+                self._write_task(t)
+
+    def get_task(self, task_id: int) -> Optional[Task]:
+        r = self.conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return self._task_from_row(r) if r else None
+
+    def upsert_task(self, task: Task) -> None:
+        with self.conn:
+            self._write_task(task)
+
+    def insert_task(self, task: Task, floor: int = 0) -> None:
+        cols = [c for c in TASK_COLUMNS + TASK_DATE_COLUMNS if c != "id"]
+        with self.conn:
+            cur = self.conn.execute(
+                f"INSERT INTO tasks (id, {', '.join(cols)}) "
+                f"SELECT MAX(COALESCE(MAX(id), 0), ?) + 1, {', '.join('?' * len(cols))} FROM tasks",
+                (floor, *(getattr(task, c) for c in cols)),
+            )
+            task.id = cur.lastrowid
+
+    def delete_task(self, task_id: int) -> bool:
+        with self.conn:
+            cur = self.conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+        return cur.rowcount > 0
+
+    def tasks_with_status(self, status: str) -> List[Task]:
+        rows = self.conn.execute(
+            "SELECT * FROM tasks WHERE status = ? ORDER BY id", (status.lower().strip(),)
+        )
+        return [self._task_from_row(r) for r in rows]
+
+    def tasks_due_between(self, start: Optional[str], end: Optional[str]) -> List[Task]:
+        sql = "SELECT * FROM tasks WHERE due_ordinal IS NOT NULL"
+        params: List[int] = []
+        lo, hi = parse_ordinal(start), parse_ordinal(end)
+        if lo is not None:
+            sql += " AND due_ordinal >= ?"
+            params.append(lo)
+        if hi is not None:
+            sql += " AND due_ordinal <= ?"
+            params.append(hi)
+        rows = self.conn.execute(sql + " ORDER BY due_ordinal, id", params)
+        return [self._task_from_row(r) for r in rows]
+
+    def tasks_updated_since(self, since: float) -> List[Task]:
+        rows = self.conn.execute(
+            "SELECT * FROM tasks WHERE updated_epoch >= ? ORDER BY updated_epoch, id", (since,)
+        )
+        return [self._task_from_row(r) for r in rows]
+
+
+def _use_wal(conn: sqlite3.Connection, timeout: float = 5.0) -> None:
+    """Switch the file to WAL mode (which sticks), once.
+
+    The switch needs the file to itself and SQLite reports "database is
+    locked" at once rather than waiting, so processes opening a new file
+    together retry until the first one has switched it."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+                return
+            if conn.execute("PRAGMA journal_mode = WAL").fetchone()[0] == "wal":
+                return
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e):
+                raise
+        if time.monotonic() > deadline:
+            raise sqlite3.OperationalError("database is locked: could not switch to WAL mode")
+        time.sleep(0.01)
+
+
+# ---------- One-shot migration ----------
+
+def migrate_from_json(backend: Optional[SQLiteBackend] = None) -> Tuple[int, int]:
+    """Copy notes.json / tasks.json into the SQLite database.
+
+    Existing rows with the same ids are overwritten; the JSON files are left
+    untouched so you can switch back by changing ARTGROW_STORAGE.
+    """
+    from . import storage
+
+    src = storage.get_backend("json")
+    dst = backend or SQLiteBackend(storage.SQLITE_FILE)
+    notes = src.load_notes()
+    tasks = src.load_tasks()
+    with dst.conn:
+        for n in notes:
+            dst._write_note(n)
+        for t in tasks:
+            dst._write_task(t)
+    return len(notes), len(tasks)
+
+
+if __name__ == "__main__":
+    from .storage import SQLITE_FILE
+
+    n_notes, n_tasks = migrate_from_json()
+    print(f"Migrated {n_notes} notes and {n_tasks} tasks into {SQLITE_FILE}")
+    print("Set ARTGROW_STORAGE=sqlite to use it.")
@@ -1,17 +1,48 @@
 # final/storage.py
 from __future__ import annotations
-import json
+import os
 from pathlib import Path
-from typing import List, Dict, Any
+from itertools import chain
+from typing import List, Dict, Any, Callable, Iterable, Optional, Iterator, Tuple
 from .models import now_iso
 
 
-from .models import Note, Task
+from .models import Note, NoteSummary, Task
+from .json_stream import iter_array
+from .dates import parse_ordinal
+from .locks import lock_for
+from .vocab import VOCAB
+from .serializers import BINARY_MAGIC, detect_codec, get_codec, is_binary
+from .config import (
+    STORAGE_BACKEND,
+    JOURNAL_COMPACT_BYTES,
+    CACHE_RECORDS,
+    FLUSH_POLICY,
+    FLUSH_IDLE_SECONDS,
+    NOTES_CODEC,
+    TASKS_CODEC,
+)
 
 BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR / "data"
 NOTES_FILE = DATA_DIR / "notes.json"
 TASKS_FILE = DATA_DIR / "tasks.json"
+SQLITE_FILE = DATA_DIR / "artgrow.db"
+NOTES_DIR = DATA_DIR / "notes"
+NOTES_MANIFEST = NOTES_DIR / "manifest.json"
+NOTES_JOURNAL = DATA_DIR / "notes.journal"
+TASKS_JOURNAL = DATA_DIR / "tasks.journal"
+TASKS_ARCHIVE = DATA_DIR / "tasks.archive.jsonl.gz"
+TASKS_TABLE = DATA_DIR / "tasks.columns.bin"
+NOTES_SEARCH_INDEX = DATA_DIR / "notes.search.idx"
+NOTES_TRIGRAM_INDEX = DATA_DIR / "notes.trigram.idx"
+TASKS_TRIGRAM_INDEX = DATA_DIR / "tasks.trigram.idx"
+SEARCH_INDEX = DATA_DIR / "search.idx"
+NOTES_EMBEDDINGS = DATA_DIR / "notes.vec"
+TASKS_EMBEDDINGS = DATA_DIR / "tasks.vec"
+NOTES_SIGNATURES = DATA_DIR / "notes.minhash"
+TASKS_SIGNATURES = DATA_DIR / "tasks.minhash"
+LINKS_FILE = DATA_DIR / "links.json"
 LOG_DIR = BASE_DIR / "logs"
 LOG_FILE = LOG_DIR / "commands.log"
 
@@ -22,59 +53,943 @@ def _ensure_data_dir() -> None:
 
 
 def _load_json(path: Path) -> Dict[str, Any]:
+    """Read a store document in whichever codec it was written with."""
     if not path.exists():
         return {}
+    raw = path.read_bytes()
+    if not raw.strip():
+        return {}
     try:
-        with path.open("r", encoding="utf-8") as f:
-            return json.load(f)
-    except json.JSONDecodeError:
+        return detect_codec(raw).loads(raw)
+    except (ValueError, IndexError):
         return {}
 
 
-def _save_json(path: Path, data: Dict[str, Any]) -> None:
-    with path.open("w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+def _save_json(path: Path, data: Dict[str, Any], codec=None) -> None:
+    _replace_json(path, data, codec)
+
+
+def _replace_bytes(path: Path, raw: bytes) -> None:
+    """Write to a temp file and rename it over `path` so readers never see a half-written file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with tmp.open("wb") as f:
+        f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _replace_text(path: Path, text: str) -> None:
+    _replace_bytes(path, text.encode("utf-8"))
+
+
+def _replace_json(path: Path, data: Dict[str, Any], codec=None) -> None:
+    _replace_bytes(path, (codec or get_codec("json-pretty")).dumps(data))
+
+
+def _streamable(path: Path) -> bool:
+    """False for files written by a codec json_stream can't read."""
+    try:
+        with path.open("rb") as f:
+            return not is_binary(f.read(len(BINARY_MAGIC)))
+    except FileNotFoundError:
+        return True
+
+
+# ---------- Backends ----------
+#
+# Every backend exposes the same methods, so the rest of the app only talks
+# to the module-level functions below and never cares where records live.
+
+class JsonBackend:
+    """The original layout: one JSON document per record type."""
+
+    name = "json"
+    per_record_writes = False
+
+    def note_paths(self) -> List[Path]:
+        return [NOTES_FILE]
+
+    def task_paths(self) -> List[Path]:
+        return [TASKS_FILE]
+
+    # Reads take the shared lock, read-modify-write cycles the exclusive one,
+    # so two processes can't interleave a load and a save on the same file.
+
+    def notes_lock(self):
+        return lock_for(NOTES_FILE)
+
+    def tasks_lock(self):
+        return lock_for(TASKS_FILE)
+
+    # Loads go through the side index (final/meta_index.py) when there is
+    # one: records come back lazy, with content/description read from disk
+    # only if something asks for it.
+
+    def notes_index(self):
+        from .meta_index import index_for
+        return index_for(NOTES_FILE, "notes")
+
+    def tasks_index(self):
+        from .meta_index import index_for
+        return index_for(TASKS_FILE, "tasks")
+
+    def load_notes(self) -> List[Note]:
+        _ensure_data_dir()
+        index = self.notes_index()
+        notes = index.records() if index is not None else None
+        if notes is not None:
+            return notes
+        with self.notes_lock().shared():
+            raw = _load_json(NOTES_FILE)
+        items = raw.get("notes", [])
+        return [Note.from_dict(d) for d in items]
+
+    def save_notes(self, notes: List[Note]) -> None:
+        _ensure_data_dir()
+        index = self.notes_index()
+        with self.notes_lock().exclusive():
+            if index is not None:
+                index.hydrate_all(notes)
+            data = {"notes": [n.to_dict() for n in notes]}
+            _save_json(NOTES_FILE, data, get_codec(NOTES_CODEC))
+
+    def load_tasks(self) -> List[Task]:
+        _ensure_data_dir()
+        index = self.tasks_index()
+        tasks = index.records() if index is not None else None
+        if tasks is not None:
+            return tasks
+        with self.tasks_lock().shared():
+            raw = _load_json(TASKS_FILE)
+        items = raw.get("tasks", [])
+        return [Task.from_dict(d) for d in items]
+
+    def save_tasks(self, tasks: List[Task]) -> None:
+        _ensure_data_dir()
+        index = self.tasks_index()
+        with self.tasks_lock().exclusive():
+            if index is not None:
+                index.hydrate_all(tasks)
+            data = {"tasks": [t.to_dict() for t in tasks]}
+            _save_json(TASKS_FILE, data, get_codec(TASKS_CODEC))
+
+    # Streaming readers: one record at a time instead of json.load on the
+    # whole file. A corrupt file stops the stream, like _load_json's {}.
+    # They run without the lock: saves rename a new file into place, so an
+    # open stream keeps reading the version it started on.
+
+    def iter_note_summaries(self) -> Iterator[NoteSummary]:
+        # A Note has every NoteSummary field, so without a side index the
+        # full stream does.
+        index = self.notes_index()
+        hot = index.hot_dicts() if index is not None else None
+        if hot is None:
+            return self.iter_notes()
+        return (NoteSummary(**d) for d in hot)
+
+    def iter_notes(self) -> Iterator[Note]:
+        if not _streamable(NOTES_FILE):
+            yield from self.load_notes()
+            return
+        try:
+            for d in iter_array(NOTES_FILE, "notes"):
+                yield Note.from_dict(d)
+        except ValueError:
+            return
+
+    def iter_tasks(self) -> Iterator[Task]:
+        if not _streamable(TASKS_FILE):
+            yield from self.load_tasks()
+            return
+        try:
+            for d in iter_array(TASKS_FILE, "tasks"):
+                yield Task.from_dict(d)
+        except ValueError:
+            return
+
+    # JSON has no random access, so the per-record helpers fall back to a
+    # full load (and a full save for writes).
+
+    def apply_notes(self, puts: List[Note], deletes: List[int]) -> None:
+        with self.notes_lock().exclusive():
+            by_id = {n.id: n for n in self.load_notes()}
+            for note_id in deletes:
+                by_id.pop(note_id, None)
+            by_id.update((n.id, n) for n in puts)
+            self.save_notes(list(by_id.values()))
+
+    def get_note(self, note_id: int) -> Optional[Note]:
+        return next((n for n in self.load_notes() if n.id == note_id), None)
+
+    def upsert_note(self, note: Note) -> None:
+        self.apply_notes([note], [])
+
+    # New records get their id here, picked under the exclusive lock so two
+    # processes adding at once can't both take max + 1. Ids up to `floor`
+    # count as taken too.
+
+    def insert_note(self, note: Note, floor: int = 0) -> None:
+        with self.notes_lock().exclusive():
+            note.id = max(max((n.id for n in self.iter_note_summaries()), default=0), floor) + 1
+            self.apply_notes([note], [])
+
+    def delete_note(self, note_id: int) -> bool:
+        with self.notes_lock().exclusive():
+            if self.get_note(note_id) is None:
+                return False
+            self.apply_notes([], [note_id])
+        return True
+
+    def iter_notes_with_tag(self, tag: str) -> Iterator[Note]:
+        index = self.notes_index()
+        notes = index.records() if index is not None else None
+        if notes is None:
+            return (n for n in self.iter_notes() if n.has_tag(tag))
+        code = VOCAB.find_folded(tag.strip())
+        return (n for n in notes if n.has_tag_code(code))
+
+    def notes_with_tag(self, tag: str) -> List[Note]:
+        return list(self.iter_notes_with_tag(tag))
+
+    def apply_tasks(self, puts: List[Task], deletes: List[int]) -> None:
+        with self.tasks_lock().exclusive():
+            by_id = {t.id: t for t in self.load_tasks()}
+            for task_id in deletes:
+                by_id.pop(task_id, None)
+            by_id.update((t.id, t) for t in puts)
+            self.save_tasks(list(by_id.values()))
+
+    def get_task(self, task_id: int) -> Optional[Task]:
+        return next((t for t in self.load_tasks() if t.id == task_id), None)
+
+    def upsert_task(self, task: Task) -> None:
+        self.apply_tasks([task], [])
+
+    def insert_task(self, task: Task, floor: int = 0) -> None:
+        with self.tasks_lock().exclusive():
+            task.id = max(max((t.id for t in self.iter_tasks()), default=0), floor) + 1
+            self.apply_tasks([task], [])
+
+    def delete_task(self, task_id: int) -> bool:
+        with self.tasks_lock().exclusive():
+            if self.get_task(task_id) is None:
+                return False
+            self.apply_tasks([], [task_id])
+        return True
+
+    def tasks_with_status(self, status: str) -> List[Task]:
+        tasks = self.load_tasks()  # interns the statuses it reads
+        code = VOCAB.find(status.lower().strip())
+        return [t for t in tasks if t.status_code == code]
+
+    # Date queries compare the parsed values (final/dates.py), so due dates
+    # and timestamps that aren't valid ISO never match. Results come back in
+    # date order.
+
+    def tasks_due_between(self, start: Optional[str], end: Optional[str]) -> List[Task]:
+        lo, hi = parse_ordinal(start), parse_ordinal(end)
+        due = [
+            t for t in self.load_tasks()
+            if t.due_ordinal is not None
+            and (lo is None or t.due_ordinal >= lo)
+            and (hi is None or t.due_ordinal <= hi)
+        ]
+        return sorted(due, key=lambda t: (t.due_ordinal, t.id))
+
+    def tasks_updated_since(self, since: float) -> List[Task]:
+        changed = [t for t in self.load_tasks() if t.updated_epoch is not None and t.updated_epoch >= since]
+        return sorted(changed, key=lambda t: (t.updated_epoch, t.id))
+
+    def notes_updated_since(self, since: float) -> List[Note]:
+        changed = [n for n in self.load_notes() if n.updated_epoch is not None and n.updated_epoch >= since]
+        return sorted(changed, key=lambda n: (n.updated_epoch, n.id))
+
+
+_backends: Dict[str, Any] = {}
+_units: Dict[str, Any] = {}
+
+
+def get_backend(name: Optional[str] = None):
+    """Return the storage engine selected in config (or the one named)."""
+    name = (name or STORAGE_BACKEND).lower()
+    if name not in _backends:
+        if name == "json":
+            _backends[name] = JsonBackend()
+        elif name == "sqlite":
+            from .sqlite_store import SQLiteBackend
+            _backends[name] = SQLiteBackend(SQLITE_FILE)
+        elif name == "sharded":
+            from .sharded_store import ShardedBackend
+            _backends[name] = ShardedBackend(NOTES_DIR, NOTES_MANIFEST)
+        elif name == "journal":
+            from .journal_store import JournalBackend
+            _backends[name] = JournalBackend(
+                NOTES_FILE, NOTES_JOURNAL, TASKS_FILE, TASKS_JOURNAL, JOURNAL_COMPACT_BYTES,
+                get_codec(NOTES_CODEC), get_codec(TASKS_CODEC),
+            )
+        else:
+            raise ValueError(f"Unknown storage backend: {name!r}")
+        if CACHE_RECORDS:
+            from .repository import CachedBackend
+            from .unit_of_work import UnitOfWork
+            _backends[name] = CachedBackend(_backends[name])
+            _units[name] = UnitOfWork(_backends[name], FLUSH_POLICY, FLUSH_IDLE_SECONDS)
+    return _backends[name]
+
+
+# ---------- Change listeners ----------
+
+# Indexes built over the stores subscribe here to hear about every write
+# made through this module: listener(puts, deletes) gets the records
+# written and the ids deleted, or (None, None) when a whole store was
+# replaced. They run before the change is flushed to disk.
+_listeners: Dict[str, List[Callable[[Optional[list], Optional[list]], None]]] = {"notes": [], "tasks": []}
+
+
+def add_listener(kind: str, listener: Callable[[Optional[list], Optional[list]], None]) -> None:
+    """Call `listener` on every change to the "notes" or "tasks" store."""
+    _listeners[kind].append(listener)
+
+
+def _notify(kind: str, puts: Optional[list], deletes: Optional[list]) -> None:
+    for listener in list(_listeners[kind]):
+        listener(puts, deletes)
+
+
+def _cache_generation(kind: str) -> Optional[int]:
+    """How many times the record cache has loaded `kind` from disk, None without a cache."""
+    from .repository import RecordCache
+
+    cache = getattr(get_backend(), kind, None)
+    return cache.generation() if isinstance(cache, RecordCache) else None
+
+
+def _cache_loaded_stamp(kind: str):
+    """The files' stamp when the record cache last loaded `kind`, None if it never did."""
+    from .repository import RecordCache
+
+    cache = getattr(get_backend(), kind, None)
+    return cache.loaded_stamp if isinstance(cache, RecordCache) else None
+
+
+def unit_of_work():
+    """The write-behind unit of work of the current backend.
+
+    Use it as `with unit_of_work(): ...` to batch many edits into one write.
+    Without the record cache every write goes straight to disk, so there is
+    nothing to defer and the returned unit only forwards flush().
+    """
+    backend = get_backend()
+    if backend.name not in _units:
+        from .unit_of_work import UnitOfWork
+        _units[backend.name] = UnitOfWork(backend, "immediate")
+    return _units[backend.name]
+
+
+def flush() -> None:
+    unit_of_work().flush()
+
+
+def command_finished() -> None:
+    unit_of_work().command_finished()
 
 
 # ---------- Notes ----------
 
 def load_notes() -> List[Note]:
-    _ensure_data_dir()
-    raw = _load_json(NOTES_FILE)
-    items = raw.get("notes", [])
-    return [Note.from_dict(d) for d in items]
+    return get_backend().load_notes()
 
 
 def save_notes(notes: List[Note]) -> None:
-    _ensure_data_dir()
-    data = {"notes": [n.to_dict() for n in notes]}
-    _save_json(NOTES_FILE, data)
+    get_backend().save_notes(notes)
+    _notify("notes", None, None)
 
 
 def next_note_id(notes: List[Note]) -> int:
+    """One past the highest id in `notes`. Another process can take it
+    before it is written; insert_note picks and writes the id in one go."""
     return max((n.id for n in notes), default=0) + 1
 
 
+def get_note(note_id: int) -> Optional[Note]:
+    return get_backend().get_note(note_id)
+
+
+def upsert_note(note: Note) -> None:
+    get_backend().upsert_note(note)
+    _notify("notes", [note], [])
+
+
+def insert_note(note: Note) -> Note:
+    """Store a new note under the next free id, which is set on `note`.
+
+    The id is picked and written under the store's exclusive lock, not
+    from a list loaded earlier, so concurrent adds never collide.
+    """
+    get_backend().insert_note(note)
+    _notify("notes", [note], [])
+    return note
+
+
+def delete_note(note_id: int) -> bool:
+    removed = get_backend().delete_note(note_id)
+    if removed:
+        _notify("notes", [], [note_id])
+    return removed
+
+
+def notes_with_tag(tag: str) -> List[Note]:
+    return get_backend().notes_with_tag(tag)
+
+
+def iter_notes() -> Iterator[Note]:
+    """Yield notes one at a time without materializing the whole store."""
+    return get_backend().iter_notes()
+
+
+def iter_note_summaries() -> Iterator[NoteSummary]:
+    """Listing fields only; the sharded layout never opens a content file for these."""
+    return get_backend().iter_note_summaries()
+
+
+def iter_notes_with_tag(tag: str) -> Iterator[Note]:
+    return get_backend().iter_notes_with_tag(tag)
+
+
+def notes_updated_since(since: float) -> List[Note]:
+    """Notes whose updated_at is at or after the epoch `since`, oldest change first."""
+    return get_backend().notes_updated_since(since)
+
+
 # ---------- Tasks ----------
 
 def load_tasks() -> List[Task]:
-    _ensure_data_dir()
-    raw = _load_json(TASKS_FILE)
-    items = raw.get("tasks", [])
-    return [Task.from_dict(d) for d in items]
+    return get_backend().load_tasks()
 
 
 def save_tasks(tasks: List[Task]) -> None:
-    _ensure_data_dir()
-    data = {"tasks": [t.to_dict() for t in tasks]}
-    _save_json(TASKS_FILE, data)
+    get_backend().save_tasks(tasks)
+    _notify("tasks", None, None)
 
 
 def next_task_id(tasks: List[Task]) -> int:
-    return max((t.id for t in tasks), default=0) + 1
+    """One past the highest id in `tasks` or the archive (see next_note_id;
+    insert_task is the race-free path)."""
+    return max(max((t.id for t in tasks), default=0), task_archive().max_id()) + 1
+
+
+def get_task(task_id: int) -> Optional[Task]:
+    return get_backend().get_task(task_id)
+
+
+def upsert_task(task: Task) -> None:
+    get_backend().upsert_task(task)
+    _notify("tasks", [task], [])
+
+
+def insert_task(task: Task) -> Task:
+    """Store a new task under the next free id (see insert_note); archived ids stay taken."""
+    get_backend().insert_task(task, task_archive().max_id())
+    _notify("tasks", [task], [])
+    return task
+
+
+def delete_task(task_id: int) -> bool:
+    removed = get_backend().delete_task(task_id)
+    if removed:
+        _notify("tasks", [], [task_id])
+    return removed
+
+
+def iter_tasks() -> Iterator[Task]:
+    """Yield tasks one at a time without materializing the whole store."""
+    return get_backend().iter_tasks()
+
+
+def tasks_with_status(status: str) -> List[Task]:
+    return get_backend().tasks_with_status(status)
+
+
+def tasks_due_between(start: Optional[str], end: Optional[str]) -> List[Task]:
+    """Tasks due from `start` to `end` (ISO dates, inclusive, None = open), by due date."""
+    return get_backend().tasks_due_between(start, end)
+
+
+def tasks_updated_since(since: float) -> List[Task]:
+    """Tasks whose updated_at is at or after the epoch `since`, oldest change first."""
+    return get_backend().tasks_updated_since(since)
+
+
+# ---------- Archived tasks ----------
+
+_archive = None
+
+
+def task_archive():
+    global _archive
+    if _archive is None:
+        from .archive import TaskArchive
+        _archive = TaskArchive(TASKS_ARCHIVE)
+    return _archive
+
+
+def archive_done_tasks(older_than_days: int) -> int:
+    """Move tasks done more than `older_than_days` ago into the archive.
+
+    The archive is appended (and synced) before the tasks leave the hot
+    store, so a crash in between leaves a task in both tiers, never in
+    neither; readers prefer the hot copy. Returns how many moved.
+    """
+    from .archive import archive_cutoff, is_archivable
+    from .repository import file_stamp
+
+    backend = get_backend()
+    cutoff = archive_cutoff(older_than_days)
+    old = [t for t in backend.load_tasks() if is_archivable(t, cutoff)]
+    if not old:
+        return 0
+    before = file_stamp([TASKS_ARCHIVE])
+    task_archive().append(old)
+    backend.apply_tasks([], [t.id for t in old])
+    _notify("tasks", [], [t.id for t in old])
+    for handle in _task_tables.values():
+        handle.archived(old, before)
+    flush()
+    return len(old)
+
+
+def iter_archived_tasks() -> Iterator[Task]:
+    """Stream the archive; opens it only when iterated."""
+    return task_archive().iter_tasks()
+
+
+# ---------- Analytics ----------
+
+_task_tables: Dict[Path, Any] = {}
+
+
+def _all_tasks() -> Iterator[Task]:
+    """Hot tasks, then archived ones not also still hot."""
+    hot_ids = set()
+    for t in iter_tasks():
+        hot_ids.add(t.id)
+        yield t
+    for t in iter_archived_tasks():
+        if t.id not in hot_ids:
+            yield t
+
+
+def task_table():
+    """Columnar snapshot of every task, hot and archived (final/task_table.py).
+
+    Saved next to the store and patched by id as tasks change through this
+    module, so `stats` after an edit costs a file write, not a pass over
+    every task; only a change from elsewhere builds it again.
+    """
+    handle = _task_tables.get(TASKS_TABLE)
+    if handle is None:
+        from .task_table import TableHandle
+
+        handle = _task_tables[TASKS_TABLE] = TableHandle(
+            TASKS_TABLE,
+            sources=lambda: get_backend().task_paths(),
+            archive=TASKS_ARCHIVE,
+            records=_all_tasks,
+            generation=lambda: _cache_generation("tasks"),
+            loaded_stamp=lambda: _cache_loaded_stamp("tasks"),
+        )
+        add_listener("tasks", handle.changed)
+    flush()  # the table is checked against the files, so pending edits go first
+    return handle.get()
+
+
+# ---------- Search ----------
+
+def _note_version(n) -> int:
+    # Notes and NoteSummaries both have these, so checking an index
+    # against the store never opens note content.
+    from .text_index import record_version
+
+    return record_version(n.updated_at, n.title, *n.tags)
+
+
+def _task_version(t) -> int:
+    from .text_index import record_version
+
+    return record_version(t.updated_at, t.title, t.status, t.priority, t.category)
+
+
+def _note_text(n) -> tuple:
+    return (n.title, " ".join(n.tags), n.content)
+
+
+def _task_text(t) -> tuple:
+    return (t.title, t.category or "", t.description)
+
+
+_index_handles: Dict[Path, Any] = {}
+
+
+def _index_handle(kind: str, path: Path, analyzer):
+    """The IndexHandle (final/text_index.py) of the index at `path`, subscribed to `kind` changes."""
+    handle = _index_handles.get(path)
+    if handle is None:
+        from .text_index import IndexHandle
+
+        if kind == "notes":
+            handle = IndexHandle(
+                path,
+                sources=lambda: get_backend().note_paths(),
+                records=iter_notes,
+                summaries=iter_note_summaries,
+                fetch=get_note,
+                doc_of=_note_text,
+                version_of=_note_version,
+                generation=lambda: _cache_generation("notes"),
+                analyzer=analyzer,
+            )
+        else:
+            handle = IndexHandle(
+                path,
+                sources=lambda: get_backend().task_paths(),
+                records=iter_tasks,
+                summaries=load_tasks,  # lazy records: hot fields only
+                fetch=get_task,
+                doc_of=_task_text,
+                version_of=_task_version,
+                generation=lambda: _cache_generation("tasks"),
+                analyzer=analyzer,
+            )
+        _index_handles[path] = handle
+        add_listener(kind, handle.changed)
+    return handle
+
+
+def note_index_handle():
+    from .text_index import default_analyzer
+
+    return _index_handle("notes", NOTES_SEARCH_INDEX, default_analyzer)
+
+
+def note_trigram_handle():
+    from .text_index import TrigramAnalyzer
+
+    return _index_handle("notes", NOTES_TRIGRAM_INDEX, TrigramAnalyzer)
+
+
+def task_trigram_handle():
+    from .text_index import TrigramAnalyzer
+
+    return _index_handle("tasks", TASKS_TRIGRAM_INDEX, TrigramAnalyzer)
+
+
+# The shared index behind `search` holds notes and tasks under one key
+# space: note #n is key 2n, task #n is key 2n + 1.
+
+def note_key(note_id: int) -> int:
+    return note_id * 2
+
+
+def task_key(task_id: int) -> int:
+    return task_id * 2 + 1
+
+
+def split_key(key: int) -> Tuple[str, int]:
+    """("notes" or "tasks", id) for a shared-index key."""
+    return ("tasks" if key & 1 else "notes"), key >> 1
+
+
+class _Keyed:
+    """A note or task (or its summary) under its shared-index key."""
+    __slots__ = ("id", "record")
+
+    def __init__(self, key: int, record: Any):
+        self.id = key
+        self.record = record
+
+
+def _keyed_text(doc: _Keyed) -> tuple:
+    return _task_text(doc.record) if doc.id & 1 else _note_text(doc.record)
+
+
+def _keyed_version(doc: _Keyed) -> int:
+    return _task_version(doc.record) if doc.id & 1 else _note_version(doc.record)
+
+
+def _fetch_keyed(key: int) -> Optional[_Keyed]:
+    kind, record_id = split_key(key)
+    record = get_task(record_id) if kind == "tasks" else get_note(record_id)
+    return _Keyed(key, record) if record is not None else None
+
+
+def _keyed_records(notes: Iterable[Any], tasks: Iterable[Any]) -> Iterator[_Keyed]:
+    return chain((_Keyed(note_key(n.id), n) for n in notes), (_Keyed(task_key(t.id), t) for t in tasks))
+
+
+def _both_generations():
+    notes, tasks = _cache_generation("notes"), _cache_generation("tasks")
+    return None if notes is None or tasks is None else (notes, tasks)
+
+
+def search_index_handle():
+    handle = _index_handles.get(SEARCH_INDEX)
+    if handle is None:
+        from .text_index import IndexHandle, default_analyzer
+
+        handle = IndexHandle(
+            SEARCH_INDEX,
+            sources=lambda: get_backend().note_paths() + get_backend().task_paths(),
+            records=lambda: _keyed_records(iter_notes(), iter_tasks()),
+            summaries=lambda: _keyed_records(iter_note_summaries(), load_tasks()),
+            fetch=_fetch_keyed,
+            doc_of=_keyed_text,
+            version_of=_keyed_version,
+            generation=_both_generations,
+            analyzer=default_analyzer,
+        )
+        _index_handles[SEARCH_INDEX] = handle
+
+        def listener(key_of):
+            def changed(puts: Optional[list], deletes: Optional[list]) -> None:
+                if puts is None:
+                    handle.changed(None, None)
+                else:
+                    handle.changed([_Keyed(key_of(r.id), r) for r in puts], [key_of(i) for i in deletes])
+            return changed
+
+        add_listener("notes", listener(note_key))
+        add_listener("tasks", listener(task_key))
+    return handle
+
+
+def search_index():
+    """BM25 index over notes and hot tasks together, for `search`: one
+    postings list per word covers both, so their scores compare."""
+    handle = search_index_handle()
+    flush()
+    return handle.get()
+
+
+def related_index(kind: str):
+    """TF-IDF neighbours among the notes or the hot tasks (final/related.py).
+
+    Built from the shared search index's postings, so no record is read,
+    and kept current by changes of that kind.
+    """
+    from .config import RELATED_DIMS
+    from .related import RelatedIndex
+
+    tasks = kind == "tasks"
+
+    def build():
+        return RelatedIndex.from_index(
+            search_index(),
+            lambda key: key >> 1 if bool(key & 1) == tasks else None,
+            _task_text if tasks else _note_text,
+            RELATED_DIMS,
+        )
+
+    return _live_index(f"{kind}_related", kind, build)
+
+
+_embedding_stores: Dict[Path, Any] = {}
+
+
+def embedding_store(kind: str):
+    """The saved embeddings of the notes or the hot tasks (final/embeddings.py),
+    brought up to date first: only records whose updated_at changed since,
+    or that were written through this module, are embedded again."""
+    from .embeddings import EmbeddingStore, get_embedder
+
+    path = TASKS_EMBEDDINGS if kind == "tasks" else NOTES_EMBEDDINGS
+    store = _embedding_stores.get(path)
+    if store is None:
+        store = _embedding_stores[path] = EmbeddingStore(path, get_embedder())
+        add_listener(kind, lambda puts, deletes: store.changed(r.id for r in puts or ()))
+    flush()
+
+    def text_of(record_id: int) -> Optional[str]:
+        record = get_task(record_id) if kind == "tasks" else get_note(record_id)
+        if record is None:
+            return None
+        return "\n".join(_task_text(record) if kind == "tasks" else _note_text(record))
+
+    records = load_tasks() if kind == "tasks" else iter_note_summaries()
+    store.sync(((r.id, r.updated_at or r.created_at) for r in records), text_of)
+    return store
+
+
+_signature_stores: Dict[Path, Any] = {}
+
+
+def signature_store(kind: str, titles: bool = False):
+    """MinHash signatures of the notes or the hot tasks for `dedupe`
+    (final/dedupe.py), of their whole text or only their titles, brought
+    up to date first: only records whose updated_at changed, or that were
+    written through this module, are re-signed."""
+    from .dedupe import SignatureStore
+
+    path = TASKS_SIGNATURES if kind == "tasks" else NOTES_SIGNATURES
+    if titles:
+        path = path.with_name(path.stem + ".titles" + path.suffix)
+    store = _signature_stores.get(path)
+    if store is None:
+        store = _signature_stores[path] = SignatureStore(path)
+        add_listener(kind, lambda puts, deletes: store.changed(r.id for r in puts or ()))
+    flush()
+
+    def text_of(record_id: int) -> Optional[str]:
+        record = get_task(record_id) if kind == "tasks" else get_note(record_id)
+        if record is None:
+            return None
+        if titles:
+            return record.title
+        return "\n".join(_task_text(record) if kind == "tasks" else _note_text(record))
+
+    records = load_tasks() if kind == "tasks" else iter_note_summaries()
+    store.sync(((r.id, r.updated_at or r.created_at) for r in records), text_of)
+    return store
+
+
+_link_graphs: Dict[Path, Any] = {}
+
+
+def link_graph():
+    """The [[wikilink]] / #task-12 graph over notes and hot tasks
+    (final/link_graph.py), brought up to date first: only records whose
+    updated_at changed have their content read again."""
+    from .link_graph import LinkGraph
+
+    graph = _link_graphs.get(LINKS_FILE)
+    if graph is None:
+        graph = _link_graphs[LINKS_FILE] = LinkGraph(LINKS_FILE)
+        add_listener("notes", lambda puts, deletes: graph.changed(note_key(n.id) for n in puts or ()))
+        add_listener("tasks", lambda puts, deletes: graph.changed(task_key(t.id) for t in puts or ()))
+    flush()
+
+    def text_of(key: int) -> Optional[str]:
+        kind, record_id = split_key(key)
+        record = get_task(record_id) if kind == "tasks" else get_note(record_id)
+        if record is None:
+            return None
+        return record.description if kind == "tasks" else record.content
+
+    graph.sync(iter_note_summaries(), load_tasks(), text_of)
+    return graph
+
+
+def note_search_index():
+    """BM25 inverted index over note title, tags and content (final/text_index.py).
+
+    Edits through this module update it in place; edits from elsewhere are
+    found by comparing versions and repaired, or rebuilt in the background.
+    """
+    handle = note_index_handle()
+    flush()  # the index is checked against the files, so pending edits go first
+    return handle.get()
+
+
+def note_trigram_index():
+    """Trigram index over note title, tags and content, for substrings and typos."""
+    handle = note_trigram_handle()
+    flush()
+    return handle.get()
+
+
+def task_trigram_index():
+    """Trigram index over task title, category and description (hot tasks only)."""
+    handle = task_trigram_handle()
+    flush()
+    return handle.get()
+
+
+class _LiveIndex:
+    """An in-memory index over one kind of record (anything with put() and
+    remove()), kept current by change notifications. A store changed by
+    anyone else rebuilds it on the next lookup."""
+
+    def __init__(self, kind: str, build: Callable[[], Any]):
+        self.kind = kind
+        self.build = build
+        self.index = None
+        self.stamp = None
+        self.generation = None
+        self.local = False  # changed by our own writes since `stamp`
+        add_listener(kind, self.changed)
+
+    def changed(self, puts: Optional[list], deletes: Optional[list]) -> None:
+        if self.index is None:
+            return
+        if puts is None:
+            self.generation = None  # whole store replaced: rebuild on the next lookup
+            return
+        for r in puts:
+            self.index.put(r)
+        for record_id in deletes:
+            self.index.remove(record_id)
+        self.local = True
+
+    def get(self):
+        from .repository import file_stamp
+
+        flush()
+        backend = get_backend()
+        stamp = file_stamp(backend.note_paths() if self.kind == "notes" else backend.task_paths())
+        generation = _cache_generation(self.kind)
+        if self.index is None or not (
+            self.stamp == stamp
+            or (self.local and generation is not None and self.generation == generation)
+            # built before the cache first loaded, and it loaded what we built from
+            or (self.local and self.generation == 0 and _cache_loaded_stamp(self.kind) == self.stamp)
+        ):
+            self.index = self.build()
+        self.stamp, self.generation, self.local = stamp, generation, False
+        return self.index
+
+
+_live_indexes: Dict[str, _LiveIndex] = {}
+
+
+def _live_index(name: str, kind: str, build: Callable[[], Any]):
+    live = _live_indexes.get(name)
+    if live is None:
+        live = _live_indexes[name] = _LiveIndex(kind, build)
+    return live.get()
+
+
+def note_tag_index():
+    """Tag -> note-id bitmaps over every note (final/tag_index.py).
+
+    Built from the listing fields alone (the side index is enough) and kept
+    current by note changes; a store changed by anyone else rebuilds it.
+    """
+    from .tag_index import TagIndex
+
+    return _live_index("note_tags", "notes", lambda: TagIndex.build(iter_note_summaries()))
+
+
+def note_field_index():
+    """Note dates (created, updated) as sorted indexes, kept current like note_tag_index()."""
+    from .field_index import FieldIndex
+    from .query import NOTE_RANGES
+
+    return _live_index("note_fields", "notes", lambda: FieldIndex.build(iter_note_summaries(), {}, NOTE_RANGES))
+
+
+def task_field_index():
+    """Hot tasks by status, priority and category, and their dates as
+    sorted indexes (final/field_index.py), kept current by task changes."""
+    from .field_index import FieldIndex
+    from .query import TASK_RANGES, TASK_VALUES
+
+    return _live_index("task_fields", "tasks", lambda: FieldIndex.build(load_tasks(), TASK_VALUES, TASK_RANGES))
+
 
 def log_command(command: str) -> None:
     LOG_DIR.mkdir(parents=True, exist_ok=True)
     timestamp = now_iso()
     with LOG_FILE.open("a", encoding="utf-8") as f:
         f.write(f"[{timestamp}] {command}\n")
+
@@ -0,0 +1,234 @@
+# final/tag_index.py
+from __future__ import annotations
+import re
+from bisect import bisect_left
+from fnmatch import fnmatchcase
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Tags nest with "/": `anatomy/hips` is under `anatomy`, and a query for
+# `anatomy` matches both.
+SEP = "/"
+
+_TOKEN = re.compile(r'"([^"]*)"|([()])|([^\s()"]+)')
+OPERATORS = ("AND", "OR", "NOT")
+
+
+try:
+    popcount = int.bit_count  # Python 3.10+
+except AttributeError:
+    def popcount(bits: int) -> int:
+        return bin(bits).count("1")
+
+
+def bit_ids(bits: int) -> List[int]:
+    """The set bits of `bits`, ascending."""
+    return [i for i, c in enumerate(reversed(bin(bits)[2:])) if c == "1"]
+
+
+class TagIndex:
+    """Tag -> bitmap of notes (bit n set = the note in slot n has the tag).
+
+    Each indexed note gets a slot, and a removed note's slot goes to the
+    next one put, so bitmaps stay as long as the number of notes however
+    large (or negative) the ids are. Tags are casefolded. Boolean queries
+    are integer AND/OR/AND-NOT over the bitmaps, and a tag's count is the
+    popcount of its bitmap. put() and remove() keep it current one note
+    at a time.
+    """
+
+    def __init__(self):
+        self._bits: Dict[str, int] = {}
+        self._tags_of: Dict[int, Tuple[str, ...]] = {}
+        self._slot_of: Dict[int, int] = {}   # note id -> slot
+        self._id_at: List[int] = []          # slot -> note id (stale for free slots)
+        self._free: List[int] = []
+        self.all_bits = 0   # every indexed note
+        self._sorted: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return len(self._tags_of)
+
+    @classmethod
+    def build(cls, notes: Iterable[Any]) -> "TagIndex":
+        index = cls()
+        for n in notes:
+            index.put(n)
+        return index
+
+    def put(self, note: Any) -> None:
+        self.remove(note.id)
+        tags = tuple(sorted({t.strip().casefold() for t in note.tags if t.strip()}))
+        if self._free:
+            slot = self._free.pop()
+            self._id_at[slot] = note.id
+        else:
+            slot = len(self._id_at)
+            self._id_at.append(note.id)
+        self._slot_of[note.id] = slot
+        bit = 1 << slot
+        for t in tags:
+            if t not in self._bits:
+                self._sorted = None
+            self._bits[t] = self._bits.get(t, 0) | bit
+        self._tags_of[note.id] = tags
+        self.all_bits |= bit
+
+    def remove(self, note_id: int) -> None:
+        tags = self._tags_of.pop(note_id, None)
+        if tags is None:
+            return
+        slot = self._slot_of.pop(note_id)
+        self._free.append(slot)
+        mask = ~(1 << slot)
+        for t in tags:
+            bits = self._bits[t] & mask
+            if bits:
+                self._bits[t] = bits
+            else:
+                del self._bits[t]
+                self._sorted = None
+        self.all_bits &= mask
+
+    # ---------- Lookups ----------
+
+    def ids(self, bits: int) -> List[int]:
+        """The ids of the notes in a bitmap, ascending."""
+        id_at = self._id_at
+        return sorted(id_at[slot] for slot in bit_ids(bits))
+
+    def has(self, bits: int, note_id: int) -> bool:
+        """Whether the note is in a bitmap."""
+        slot = self._slot_of.get(note_id)
+        return slot is not None and bool(bits >> slot & 1)
+
+    def tags(self) -> List[str]:
+        if self._sorted is None:
+            self._sorted = sorted(self._bits)
+        return self._sorted
+
+    def bits(self, tag: str) -> int:
+        """Notes with `tag` or any tag under it."""
+        tag = tag.strip().casefold().rstrip(SEP)
+        bits = self._bits.get(tag, 0)
+        tags = self.tags()
+        prefix = tag + SEP
+        i = bisect_left(tags, prefix)
+        while i < len(tags) and tags[i].startswith(prefix):
+            bits |= self._bits[tags[i]]
+            i += 1
+        return bits
+
+    def matching(self, pattern: str) -> int:
+        """bits() of every tag matching a glob such as `anat*`; a pattern
+        without wildcards is just bits(pattern)."""
+        pattern = pattern.strip().casefold()
+        if not any(c in pattern for c in "*?["):
+            return self.bits(pattern)
+        bits = 0
+        for t in self.tags():
+            if fnmatchcase(t, pattern):
+                bits |= self._bits[t]
+        return bits
+
+    def counts(self) -> List[Tuple[str, int, int]]:
+        """(tag, notes with exactly this tag, notes under it including nested tags)
+        for every tag and every parent of one, sorted by tag."""
+        names = set(self._bits)
+        for t in self._bits:
+            parts = t.split(SEP)
+            names.update(SEP.join(parts[:i]) for i in range(1, len(parts)))
+        return [(t, popcount(self._bits.get(t, 0)), popcount(self.bits(t))) for t in sorted(names)]
+
+    def query(self, expr: str) -> List[int]:
+        """Ids of the notes matching a tag expression, ascending.
+
+            anatomy AND gesture NOT hands
+            (color OR value) AND NOT study/old
+            anatomy/hips
+
+        Operators are the uppercase words AND, OR and NOT (NOT binds
+        tightest, then AND, then OR); NOT after a tag means AND NOT.
+        Adjacent words form one tag name, so `color theory` is the tag
+        "color theory"; quote a tag that is spelled like an operator.
+        A tag matches itself and everything nested under it.
+        Raises ValueError for a malformed expression.
+        """
+        return self.ids(_Parser(self, expr).parse())
+
+
+class _Parser:
+    """Recursive descent over the tokens of a tag expression."""
+
+    def __init__(self, index: TagIndex, expr: str):
+        self.index = index
+        self.tokens = self._tokenize(expr)
+        self.pos = 0
+
+    @staticmethod
+    def _tokenize(expr: str) -> List[Tuple[str, str]]:
+        tokens: List[Tuple[str, str]] = []
+        for quoted, paren, word in _TOKEN.findall(expr):
+            if paren:
+                tokens.append(("op", paren))
+            elif word in OPERATORS:
+                tokens.append(("op", word))
+            elif not word:
+                tokens.append(("quoted", quoted))
+            elif tokens and tokens[-1][0] == "word":
+                tokens[-1] = ("word", f"{tokens[-1][1]} {word}")  # adjacent words: one tag
+            else:
+                tokens.append(("word", word))
+        return tokens
+
+    def _peek(self) -> Optional[Tuple[str, str]]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _is_op(self, op: str) -> bool:
+        return self._peek() == ("op", op)
+
+    def parse(self) -> int:
+        if not self.tokens:
+            raise ValueError("empty tag expression")
+        bits = self._or()
+        if self._peek() is not None:
+            raise ValueError(f"unexpected {self._peek()[1]!r}")
+        return bits
+
+    def _or(self) -> int:
+        bits = self._and()
+        while self._is_op("OR"):
+            self.pos += 1
+            bits |= self._and()
+        return bits
+
+    def _and(self) -> int:
+        bits = self._not()
+        while True:
+            if self._is_op("AND"):
+                self.pos += 1
+                bits &= self._not()
+            elif self._is_op("NOT"):  # `a NOT b` reads as `a AND NOT b`
+                bits &= self._not()
+            else:
+                return bits
+
+    def _not(self) -> int:
+        if self._is_op("NOT"):
+            self.pos += 1
+            return self.index.all_bits & ~self._not()
+        return self._atom()
+
+    def _atom(self) -> int:
+        token = self._peek()
+        if token is None:
+            raise ValueError("expression ends too early")
+        self.pos += 1
+        if token == ("op", "("):
+            bits = self._or()
+            if not self._is_op(")"):
+                raise ValueError("missing ')'")
+            self.pos += 1
+            return bits
+        if token[0] == "op":
+            raise ValueError(f"unexpected {token[1]!r}")
+        return self.index.bits(token[1])
@@ -1,16 +1,25 @@
 
 from __future__ import annotations
-from typing import Optional
+from copy import copy
+from typing import List, Optional, Tuple
 
+from .dates import epoch_iso, ordinal_iso
 from .models import Task
-from .storage import load_tasks, save_tasks, next_task_id
+from .storage import (
+    load_tasks,
+    get_task,
+    insert_task,
+    upsert_task,
+    delete_task as remove_task,
+    tasks_due_between,
+    tasks_updated_since,
+    iter_archived_tasks,
+    archive_done_tasks,
+)
 
 
 
 def add_task_interactive() -> Task:
-    tasks = load_tasks()
-    tid = next_task_id(tasks)
-
     print(">>> Creating a new task")
     title = input("Title: ").strip()
     description = input("Description: ").strip()
@@ -33,8 +42,9 @@ def add_task_interactive() -> Task:
     category = suggestions.get("category")
     due_date = suggestions.get("due_date")
 
+    # The id is assigned when the task is stored.
     task = Task.create(
-        task_id=tid,
+        task_id=0,
         title=title,
         description=description,
         priority=priority,
@@ -42,18 +52,25 @@ def add_task_interactive() -> Task:
         due_date=due_date,
     )
 
-    tasks.append(task)
-    save_tasks(tasks)
+    insert_task(task)
     print(f"Saved task #{task.id}")
 
     return task
 
 
 def list_tasks(status_filter: Optional[str] = None) -> None:
-    tasks = load_tasks()
     if status_filter:
-        status_filter = status_filter.lower().strip()
-        tasks = [t for t in tasks if t.status == status_filter]
+        # A bare word is a status; anything else is a query (see query_tasks).
+        words = status_filter.split()
+        if len(words) == 1 and ":" not in status_filter and "<" not in status_filter and ">" not in status_filter:
+            status_filter = f"status:{status_filter}"
+        try:
+            tasks, _ = query_tasks(status_filter)
+        except ValueError as e:
+            print(f"Invalid query: {e}")
+            return
+    else:
+        tasks = load_tasks()
 
     if not tasks:
         print("No tasks. Add one with `add-task`.")
@@ -67,114 +84,228 @@ def list_tasks(status_filter: Optional[str] = None) -> None:
 
 
 def find_task_by_id(task_id: int) -> Optional[Task]:
-    tasks = load_tasks()
-    for t in tasks:
-        if t.id == task_id:
-            return t
-    return None
+    return get_task(task_id)
 
 
 def mark_task_done(task_id: int) -> None:
-    tasks = load_tasks()
-    found = False
-    for t in tasks:
-        if t.id == task_id:
-            t.mark_done()
-            found = True
-            break
-
-    if not found:
+    t = get_task(task_id)
+    if not t:
         print(f"No task found with id {task_id}.")
         return
 
-    save_tasks(tasks)
+    # Change a copy and store that: with the record cache the stored object
+    # can be flushed (idle policy) at any moment, and must never be half-edited.
+    t = copy(t)
+    t.mark_done()
+    upsert_task(t)
     print(f"Task #{task_id} marked as done.")
 
 
 def start_task(task_id: int) -> None:
-    tasks = load_tasks()
-    found = False
-    for t in tasks:
-        if t.id == task_id:
-            t.mark_in_progress()
-            found = True
-            break
-
-    if not found:
+    t = get_task(task_id)
+    if not t:
         print(f"No task found with id {task_id}.")
         return
 
-    save_tasks(tasks)
+    t = copy(t)  # see mark_task_done
+    t.mark_in_progress()
+    upsert_task(t)
     print(f"Task #{task_id} marked as in-progress.")
 
 
 def delete_task(task_id: int) -> None:
-    tasks = load_tasks()
-    new_tasks = [t for t in tasks if t.id != task_id]
-    if len(new_tasks) == len(tasks):
+    if not remove_task(task_id):
         print(f"No task found with id {task_id}.")
         return
 
-    save_tasks(new_tasks)
     print(f"Deleted task #{task_id}.")
 
 
-def search_tasks(query: str) -> None:
-    query = query.lower().strip()
-    tasks = load_tasks()
-    matches = [
-        t for t in tasks
-        if query in t.title.lower()
-        or query in t.description.lower()
-        or (t.category and query in t.category.lower())
-    ]
+def query_tasks(query: str) -> Tuple[List[Task], list]:
+    """Tasks matching a structured query, hot ones first, and the plan
+    steps (final/query.py) that found them:
+
+        status:todo priority:high category:"Anatomy*" due<2025-12-01 gesture
+
+    Fields are status, priority, category (values, `*` wildcards, `a,b`
+    alternatives) and due, created, updated, completed (`:`, `<`, `<=`,
+    `>`, `>=` a date; the timestamps also take `3d`, `12h`, `today`); a
+    leading `-` negates a clause. Every other word, or "quoted phrase",
+    has to appear in the title, category or description. Raises
+    ValueError for a clause that doesn't make sense.
+    """
+    from .query import TASK_FIELDS, TASK_RANGES, TASK_VALUES, Step, SubstringPredicate, ValuePredicate, field_predicates, parse, run
+    from .storage import _task_text, task_field_index, task_trigram_index
+
+    q = parse(query, TASK_FIELDS)
+    index = task_field_index()
+    preds = field_predicates(q.clauses, index, TASK_VALUES, TASK_RANGES)
+    if q.words or q.phrases:
+        trigrams = task_trigram_index()
+        preds += [SubstringPredicate(text, trigrams, _task_text) for text in q.words + q.phrases]
+
+    ids, steps = run(preds, index.ids, get_task)
+    tasks = [t for t in map(get_task, sorted(ids)) if t is not None]
+
+    # The archive is the cold tier and has no indexes: it is streamed, and
+    # only when the query can match a finished task (only those are archived).
+    if not any(isinstance(p, ValuePredicate) and p.field == "status" and p.accepts("done") == p.negated for p in preds):
+        scanned, hot = 0, len(tasks)
+        for t in iter_archived_tasks():
+            scanned += 1
+            if get_task(t.id) is None and all(p.test(t) != p.negated for p in preds):
+                tasks.append(t)
+        steps.append(Step("archive", "scan", scanned, len(tasks) - hot))
+    return tasks, steps
+
+
+def search_tasks(query: str, explain: bool = False) -> None:
+    from .query import TASK_FIELDS, parse, print_plan
+    from .storage import _task_text, task_trigram_index
+    from .text_index import fuzzy_docs
+
+    query = query.strip()
+    try:
+        matches, steps = query_tasks(query)
+    except ValueError as e:
+        print(f"Invalid query: {e}")
+        return
+    if explain:
+        print_plan(query, steps)
+        print()
+
+    header = f"Tasks matching '{query}':"
+    if not matches and not parse(query, TASK_FIELDS).clauses:
+        # Plain text found nothing: try it as a misspelling.
+        def text_of(task_id: int) -> Optional[str]:
+            t = get_task(task_id)
+            return " ".join(_task_text(t)) if t is not None else None
+
+        fuzzy = fuzzy_docs(task_trigram_index(), query, text_of)
+        matches = [t for t in (get_task(i) for i, _, _ in fuzzy) if t is not None]
+        if matches:
+            header = f"No exact matches for '{query}'. Did you mean '{' '.join(fuzzy[0][2])}'?"
     if not matches:
         print(f"No tasks matched '{query}'.")
         return
 
-    print(f"Tasks matching '{query}':")
+    print(header)
     for t in matches:
         cat = t.category or "-"
         print(f"- [{t.id}] ({t.status}) [{cat}] {t.title}")
 
+
+def related_tasks(task_id: int, k: int = 10) -> None:
+    """The active tasks most like this one, by TF-IDF cosine similarity."""
+    from .storage import related_index
+
+    task = get_task(task_id)
+    if not task:
+        print(f"No task found with id {task_id}.")
+        return
+    related = [(get_task(i), score) for i, score in related_index("tasks").related(task_id, k)]
+    related = [(t, score) for t, score in related if t is not None]
+    if not related:
+        print(f"No tasks related to #{task_id} ({task.title}).")
+        return
+    print(f"Tasks related to #{task_id} ({task.title}):")
+    for t, score in related:
+        cat = t.category or "-"
+        print(f"- [{t.id}] ({t.status}) [{cat}] {t.title} {score:.0%}")
+
+
 def edit_task(task_id: int) -> None:
-    tasks = load_tasks()
     from .models import now_iso
-    found = False
 
-    for t in tasks:
-        if t.id == task_id:
-            found = True
-            print("Editing Task...")
+    t = get_task(task_id)
+    if not t:
+        print(f"No task found with id {task_id}.")
+        return
+    t = copy(t)  # see mark_task_done
 
-            new_title = input(f"Title [{t.title}]: ").strip()
-            if new_title:
-                t.title = new_title
+    print("Editing Task...")
 
-            new_desc = input(f"Description [{t.description}]: ").strip()
-            if new_desc:
-                t.description = new_desc
+    new_title = input(f"Title [{t.title}]: ").strip()
+    if new_title:
+        t.title = new_title
 
-            new_priority = input(f"Priority (low/medium/high) [{t.priority}]: ").strip().lower()
-            if new_priority in ("low", "medium", "high"):
-                t.priority = new_priority
+    new_desc = input(f"Description [{t.description}]: ").strip()
+    if new_desc:
+        t.description = new_desc
 
-            new_category = input(f"Category [{t.category}]: ").strip()
-            if new_category:
-                t.category = new_category
+    new_priority = input(f"Priority (low/medium/high) [{t.priority}]: ").strip().lower()
+    if new_priority in ("low", "medium", "high"):
+        t.priority = new_priority
 
-            new_due = input(f"Due date (YYYY-MM-DD) [{t.due_date}]: ").strip()
-            if new_due:
-                t.due_date = new_due
+    new_category = input(f"Category [{t.category}]: ").strip()
+    if new_category:
+        t.category = new_category
 
-            t.updated_at = now_iso()
+    new_due = input(f"Due date (YYYY-MM-DD) [{t.due_date}]: ").strip()
+    if new_due:
+        t.due_date = new_due
 
-            break
+    t.updated_at = now_iso()
 
-    if not found:
-        print(f"No task found with id {task_id}.")
+    upsert_task(t)
+    print(f"Task #{task_id} edited successfully.")
+
+
+def list_due(start: Optional[int], end: Optional[int], label: str) -> None:
+    """Open tasks due between two day ordinals (inclusive, None = open)."""
+    due = [
+        t for t in tasks_due_between(
+            ordinal_iso(start) if start is not None else None,
+            ordinal_iso(end) if end is not None else None,
+        )
+        if t.status != "done"
+    ]
+    if not due:
+        print(f"Nothing due {label}.")
         return
+    print(f"Tasks due {label}:")
+    for t in due:
+        cat = t.category or "-"
+        print(f"- [{t.id}] {t.due_date} ({t.status}/{t.priority}) [{cat}] {t.title}")
 
-    save_tasks(tasks)
-    print(f"Task #{task_id} edited successfully.")
 
+def list_tasks_since(since: float) -> None:
+    changed = tasks_updated_since(since)
+    if not changed:
+        print(f"No tasks changed since {epoch_iso(since)}.")
+        return
+    print(f"Tasks changed since {epoch_iso(since)}:")
+    for t in changed:
+        print(f"- [{t.id}] ({t.status}) {t.title} (updated: {t.updated_at})")
+
+
+def show_stats(weeks: int = 8) -> None:
+    from .storage import task_table
+    from .task_table import compute_stats
+
+    s = compute_stats(task_table(), weeks)
+    if not s["total"]:
+        print("No tasks yet.")
+        return
+    print(f"Tasks: {s['total']} ({s['open']} open, {s['done']} done)")
+    print(f"Completion rate: {s['completion_rate']:.0%}")
+    if s["median_days_to_done"] is not None:
+        print(f"Median time to done: {s['median_days_to_done']:.1f} days")
+
+    for title, rows in (("category", s["open_by_category"]), ("priority", s["open_by_priority"])):
+        if rows:
+            print(f"\nOpen by {title}:")
+            for name, count in rows:
+                print(f"  {name:<20} {count}")
+
+    print("\nWeek of       created  completed  backlog")
+    for w in s["weeks"]:
+        print(f"  {w['week']}  {w['created']:>7}  {w['completed']:>9}  {w['backlog']:>7}")
+
+
+def archive_tasks(older_than_days: int) -> None:
+    moved = archive_done_tasks(older_than_days)
+    if not moved:
+        print(f"No tasks done more than {older_than_days} days ago.")
+        return
+    print(f"Archived {moved} task(s) done more than {older_than_days} days ago.")
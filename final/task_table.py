@@ -0,0 +1,357 @@
+# final/task_table.py
+from __future__ import annotations
+import json
+import math
+import statistics
+import sys
+from array import array
+from collections import Counter
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .dates import parse_epoch
+from .repository import Stamp, file_stamp
+from .storage import _replace_bytes
+
+try:  # optional: vectorized stats; the array fallback gives the same numbers
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b"AGTC1\n"
+NAN = float("nan")
+
+# name -> array typecode; numpy views the columns with the matching dtype.
+COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("id", "i"),
+    ("status", "i"),       # code into `strings`
+    ("priority", "i"),     # code into `strings`
+    ("category", "i"),     # code into `strings`, -1 for none
+    ("created", "d"),      # epoch seconds, NaN when missing or invalid
+    ("completed", "d"),    # epoch seconds, NaN when not done / invalid
+)
+
+
+class TaskTable:
+    """A column-per-field snapshot of the tasks, for `stats`.
+
+    Strings are dictionary-encoded into `strings`; the codes are local to
+    the table (the in-memory vocabulary in final/vocab.py is per process).
+    Columns are array.array, so put() and remove() can patch rows by id in
+    place; compute_stats reads them through numpy views when numpy is
+    installed. Row order means nothing: a removed row takes the last one.
+    """
+
+    def __init__(self, strings: List[str], columns: Dict[str, array]):
+        self.strings = strings
+        self.columns = columns
+        self._codes = {s: i for i, s in enumerate(strings)}
+        self._cols = [columns[name] for name, _ in COLUMNS]
+        self._row_of: Optional[Dict[int, int]] = None  # id -> row, made on the first edit
+
+    def __len__(self) -> int:
+        return len(self.columns["status"])
+
+    def code(self, s: str) -> int:
+        return self._codes.get(s, -2)
+
+    def _intern(self, s: Optional[str]) -> int:
+        if s is None:
+            return -1
+        c = self._codes.get(s)
+        if c is None:
+            c = self._codes[s] = len(self.strings)
+            self.strings.append(s)
+        return c
+
+    def _values(self, t: Any) -> tuple:
+        created = t.created_epoch
+        completed = t.completed_epoch if t.status == "done" else None
+        return (
+            t.id, self._intern(t.status), self._intern(t.priority), self._intern(t.category),
+            NAN if created is None else created, NAN if completed is None else completed,
+        )
+
+    @classmethod
+    def build(cls, tasks: Iterable[Any]) -> "TaskTable":
+        table = cls([], {name: array(tc) for name, tc in COLUMNS})
+        for t in tasks:
+            for col, value in zip(table._cols, table._values(t)):
+                col.append(value)
+        return table
+
+    def _rows(self) -> Dict[int, int]:
+        if self._row_of is None:
+            self._row_of = {task_id: row for row, task_id in enumerate(self.columns["id"])}
+        return self._row_of
+
+    def put(self, task: Any) -> None:
+        """Overwrite the row of `task`'s id, or add one."""
+        rows = self._rows()
+        row = rows.get(task.id)
+        if row is None:
+            rows[task.id] = len(self)
+            for col, value in zip(self._cols, self._values(task)):
+                col.append(value)
+        else:
+            for col, value in zip(self._cols, self._values(task)):
+                col[row] = value
+
+    def remove(self, task_id: int) -> None:
+        rows = self._rows()
+        row = rows.pop(task_id, None)
+        if row is None:
+            return
+        for col in self._cols:
+            col[row] = col[-1]
+            col.pop()
+        if row < len(self):
+            rows[self.columns["id"][row]] = row
+
+    # ---------- Persistence ----------
+
+    def to_bytes(self, stamp: Any) -> bytes:
+        header = {"stamp": stamp, "n": len(self), "strings": self.strings, "columns": [n for n, _ in COLUMNS]}
+        parts = [MAGIC, json.dumps(header).encode("utf-8"), b"\n"]
+        parts += [_little_endian(col).tobytes() for col in self._cols]
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, raw: bytes, stamp: Any) -> Optional["TaskTable"]:
+        """The saved table, or None if it's missing, stale or unreadable."""
+        if not raw.startswith(MAGIC):
+            return None
+        end = raw.find(b"\n", len(MAGIC))
+        try:
+            header = json.loads(raw[len(MAGIC):end])
+        except ValueError:
+            return None
+        if header.get("stamp") != stamp or header.get("columns") != [n for n, _ in COLUMNS]:
+            return None
+        n, pos, cols = header["n"], end + 1, {}
+        for name, tc in COLUMNS:
+            size = n * array(tc).itemsize
+            chunk = raw[pos:pos + size]
+            if len(chunk) != size:
+                return None
+            col = array(tc)
+            col.frombytes(chunk)
+            cols[name] = _little_endian(col)
+            pos += size
+        return cls(header["strings"], cols)
+
+
+def _little_endian(col: array) -> array:
+    """The saved format is little-endian; byteswap is its own inverse."""
+    if sys.byteorder == "big":
+        col = array(col.typecode, col)
+        col.byteswap()
+    return col
+
+
+def _saved_stamp(sources: List[Path]) -> List[Any]:
+    return [list(s) if s else None for s in file_stamp(sources)]
+
+
+def load_table(path: Path, sources: List[Path], tasks: Iterable[Any]) -> TaskTable:
+    """The saved table at `path` if `sources` haven't changed, else build and save one."""
+    stamp = _saved_stamp(sources)
+    try:
+        table = TaskTable.from_bytes(path.read_bytes(), stamp)
+    except FileNotFoundError:
+        table = None
+    if table is None:
+        table = TaskTable.build(tasks)
+        _replace_bytes(path, table.to_bytes(stamp))
+    return table
+
+
+class TableHandle:
+    """The saved TaskTable of the hot tasks and the archive, kept current
+    as tasks change.
+
+    Writes through final/storage.py report the tasks they touch to
+    changed(), and archiving reports the tasks it moved to archived();
+    both patch the table's rows by id. get() saves a patched table for the
+    next process and only builds one from every task again when the files
+    changed some other way. As for IndexHandle, `generation()` (the record
+    cache's, None without one) holding still means a new stamp of the
+    tasks files after our own changes is our own write; `loaded_stamp()`
+    is the files' stamp when the cache last loaded them.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        sources: Callable[[], List[Path]],
+        archive: Path,
+        records: Callable[[], Iterable[Any]],
+        generation: Callable[[], Optional[int]] = lambda: None,
+        loaded_stamp: Callable[[], Optional[Stamp]] = lambda: None,
+    ):
+        self.path = path
+        self.archive = archive
+        self._sources = sources
+        self._records = records
+        self._generation = generation
+        self._loaded_stamp = loaded_stamp
+        self.table: Optional[TaskTable] = None
+        self.stamp: Optional[Stamp] = None          # tasks files' stamp the table matches
+        self.archive_stamp: Optional[Stamp] = None  # and the archive's
+        self._gen: Optional[int] = None
+        self._local = False   # changed() ran since `stamp`
+        self._saved = True    # the file at `path` matches the table
+
+    def changed(self, puts: Optional[list], deletes: Optional[list]) -> None:
+        """Tasks written and ids deleted; (None, None) when the whole store was replaced."""
+        if self.table is None:
+            return
+        if puts is None:
+            self._gen = None  # can't tell what changed: build again on the next get()
+            return
+        for t in puts:
+            self.table.put(t)
+        for task_id in deletes:
+            self.table.remove(task_id)
+        self._local = True
+        self._saved = False
+
+    def archived(self, tasks: List[Any], before: Optional[Stamp]) -> None:
+        """`tasks` were appended to the archive, whose stamp was `before`;
+        they left the hot store (changed() heard that) but still count."""
+        if self.table is None:
+            return
+        for t in tasks:
+            self.table.put(t)
+        if before == self.archive_stamp:
+            self.archive_stamp = file_stamp([self.archive])
+        self._saved = False
+
+    def get(self) -> TaskTable:
+        """The table, current as far as the files are concerned: call it
+        after pending writes were flushed."""
+        stamp, archive = file_stamp(self._sources()), file_stamp([self.archive])
+        gen = self._generation()
+        if self.table is None or archive != self.archive_stamp or not (
+            stamp == self.stamp
+            or (self._local and gen is not None and gen == self._gen)
+            # loaded before the cache first loaded, and it loaded what we had
+            or (self._local and self._gen == 0 and self._loaded_stamp() == self.stamp)
+        ):
+            self.table = load_table(self.path, self._sources() + [self.archive], self._records())
+            self._saved = True
+        elif not self._saved:
+            _replace_bytes(self.path, self.table.to_bytes(_saved_stamp(self._sources() + [self.archive])))
+            self._saved = True
+        self.stamp, self.archive_stamp, self._gen, self._local = stamp, archive, gen, False
+        return self.table
+
+
+# ---------- Stats ----------
+
+WEEK = 7 * 86400
+
+
+def _week_start(now: datetime) -> float:
+    monday = now.date() - timedelta(days=now.weekday())
+    return datetime.combine(monday, datetime.min.time()).timestamp()
+
+
+def compute_stats(table: TaskTable, weeks: int = 8, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Completion rate, time to done, open backlog by category and priority,
+    and created/completed/backlog for each of the last `weeks` weeks.
+
+    A week's backlog is the tasks created before its end minus those
+    completed before it (tasks without a valid created_at aren't counted).
+    """
+    first_week = _week_start(now or datetime.now()) - (weeks - 1) * WEEK
+    edges = [first_week + i * WEEK for i in range(weeks + 1)]
+    if np is not None:
+        return _stats_numpy(table, edges)
+    return _stats_python(table, edges)
+
+
+def _stats_numpy(table: TaskTable, edges: List[float]) -> Dict[str, Any]:
+    c = {name: np.frombuffer(col, dtype=col.typecode) for name, col in table.columns.items()}
+    total = len(table)
+    done_mask = c["status"] == table.code("done")
+    done = int(done_mask.sum())
+    open_mask = ~done_mask
+
+    durations = c["completed"][done_mask] - c["created"][done_mask]
+    durations = durations[~np.isnan(durations)]
+    median_days = float(np.median(durations)) / 86400 if durations.size else None
+
+    def open_by(column: str) -> List[Tuple[str, int]]:
+        codes = c[column][open_mask]
+        counts = np.bincount(codes + 1, minlength=len(table.strings) + 1)  # +1: -1 means none
+        rows = [(table.strings[i - 1] if i else "-", int(n)) for i, n in enumerate(counts) if n]
+        return sorted(rows, key=lambda r: (-r[1], r[0]))
+
+    created = np.sort(c["created"][~np.isnan(c["created"])])
+    completed = np.sort(c["completed"][~np.isnan(c["completed"])])
+    e = np.asarray(edges)
+    created_before = np.searchsorted(created, e)
+    completed_before = np.searchsorted(completed, e)
+    weeks = [
+        (
+            edges[i],
+            int(created_before[i + 1] - created_before[i]),
+            int(completed_before[i + 1] - completed_before[i]),
+            int(created_before[i + 1] - completed_before[i + 1]),
+        )
+        for i in range(len(edges) - 1)
+    ]
+    return _result(total, done, median_days, open_by("category"), open_by("priority"), weeks)
+
+
+def _stats_python(table: TaskTable, edges: List[float]) -> Dict[str, Any]:
+    from bisect import bisect_left
+
+    c = table.columns
+    total = len(table)
+    done_code = table.code("done")
+    status, created_col, completed_col = c["status"], c["created"], c["completed"]
+    done_rows = [i for i, s in enumerate(status) if s == done_code]
+    durations = [
+        completed_col[i] - created_col[i] for i in done_rows
+        if not math.isnan(completed_col[i]) and not math.isnan(created_col[i])
+    ]
+    median_days = statistics.median(durations) / 86400 if durations else None
+
+    def open_by(column: str) -> List[Tuple[str, int]]:
+        counts = Counter(code for code, s in zip(c[column], status) if s != done_code)
+        rows = [(table.strings[code] if code >= 0 else "-", n) for code, n in counts.items()]
+        return sorted(rows, key=lambda r: (-r[1], r[0]))
+
+    created = sorted(x for x in created_col if not math.isnan(x))
+    completed = sorted(x for x in completed_col if not math.isnan(x))
+    created_before = [bisect_left(created, e) for e in edges]
+    completed_before = [bisect_left(completed, e) for e in edges]
+    weeks = [
+        (
+            edges[i],
+            created_before[i + 1] - created_before[i],
+            completed_before[i + 1] - completed_before[i],
+            created_before[i + 1] - completed_before[i + 1],
+        )
+        for i in range(len(edges) - 1)
+    ]
+    return _result(total, len(done_rows), median_days, open_by("category"), open_by("priority"), weeks)
+
+
+def _result(total, done, median_days, by_category, by_priority, weeks) -> Dict[str, Any]:
+    return {
+        "total": total,
+        "done": done,
+        "open": total - done,
+        "completion_rate": done / total if total else None,
+        "median_days_to_done": median_days,
+        "open_by_category": by_category,
+        "open_by_priority": by_priority,
+        "weeks": [
+            {"week": date.fromtimestamp(start).isoformat(), "created": cr, "completed": co, "backlog": bl}
+            for start, cr, co, bl in weeks
+        ],
+    }
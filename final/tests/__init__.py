@@ -0,0 +1 @@
+# final/tests/__init__.py
@@ -0,0 +1,78 @@
+# final/tests/conftest.py
+from __future__ import annotations
+from pathlib import Path
+
+import pytest
+
+from final import meta_index, storage
+
+BACKENDS = ("json", "sqlite", "sharded", "journal")
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Every store and side file under tmp_path, with none of the module
+    state (backends, indexes, listeners) of a previous test."""
+    for name, value in list(vars(storage).items()):
+        if isinstance(value, Path) and storage.DATA_DIR in value.parents:
+            monkeypatch.setattr(storage, name, tmp_path / value.relative_to(storage.DATA_DIR))
+    monkeypatch.setattr(storage, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(storage, "CACHE_RECORDS", False)
+    for name in ("_backends", "_units", "_index_handles", "_embedding_stores",
+                 "_signature_stores", "_link_graphs", "_live_indexes", "_task_tables"):
+        monkeypatch.setattr(storage, name, {})
+    monkeypatch.setattr(storage, "_listeners", {"notes": [], "tasks": []})
+    monkeypatch.setattr(storage, "_archive", None)
+    monkeypatch.setattr(meta_index, "_indexes", {})
+    yield tmp_path
+    for backend in list(storage._backends.values()):
+        close_backend(backend)
+
+
+def close_backend(backend) -> None:
+    if hasattr(backend, "flush"):
+        backend.flush()
+    backend = getattr(backend, "backend", backend)
+    for collection in (getattr(backend, "notes", None), getattr(backend, "tasks", None)):
+        if hasattr(collection, "wait"):
+            collection.wait()
+    if hasattr(backend, "close"):
+        backend.close()
+
+
+@pytest.fixture(params=BACKENDS)
+def backend_name(request, data_dir, monkeypatch):
+    """Run the test once per storage backend, selected as config would."""
+    monkeypatch.setattr(storage, "STORAGE_BACKEND", request.param)
+    return request.param
+
+
+@pytest.fixture(params=[False, True], ids=["nocache", "cache"])
+def cached(request, backend_name, monkeypatch):
+    """Run the test with and without the per-process record cache."""
+    monkeypatch.setattr(storage, "CACHE_RECORDS", request.param)
+    return request.param
+
+
+@pytest.fixture
+def reopen(data_dir):
+    """reopen(name): a fresh, uncached backend of that kind reading what is
+    on disk, as another process would (after flushing ours, unless told not to)."""
+    opened = []
+
+    def reopen(name: str, flush: bool = True):
+        if flush:
+            storage.flush()
+        old, storage._backends = storage._backends, {}
+        cache, storage.CACHE_RECORDS = storage.CACHE_RECORDS, False
+        try:
+            backend = storage.get_backend(name)
+        finally:
+            storage._backends, storage.CACHE_RECORDS = old, cache
+        opened.append(backend)
+        return backend
+
+    yield reopen
+    for backend in opened:
+        close_backend(backend)
+
@@ -0,0 +1,17 @@
+# final/tests/helpers.py
+from __future__ import annotations
+
+from final.models import Note, Task
+
+
+def note(note_id: int, title: str = "", content: str = "", tags=(), updated_at: str = "2025-06-01T10:00:00"):
+    return Note(note_id, title or f"Note {note_id}", content, list(tags), "2025-05-01T09:00:00", updated_at)
+
+
+def task(task_id: int, title: str = "", description: str = "", status: str = "todo", priority: str = "medium",
+         category=None, due_date=None, updated_at: str = "2025-06-01T10:00:00", completed_at=None):
+    return Task(
+        id=task_id, title=title or f"Task {task_id}", description=description, priority=priority,
+        status=status, category=category, due_date=due_date, created_at="2025-05-01T09:00:00",
+        completed_at=completed_at, updated_at=updated_at,
+    )
@@ -0,0 +1,112 @@
+# final/tests/test_archive.py
+from __future__ import annotations
+from datetime import datetime
+
+from final import storage
+from final.archive import TaskArchive, archive_cutoff, is_archivable
+from final.models import Task
+from final.tests.helpers import task
+
+
+def _done(task_id, completed_at="2025-05-02T10:00:00"):
+    return task(task_id, status="done", completed_at=completed_at)
+
+
+def test_append_and_iterate(tmp_path):
+    archive = TaskArchive(tmp_path / "tasks.archive.jsonl.gz")
+    assert list(archive.iter_tasks()) == []
+    assert (archive.count(), archive.max_id()) == (0, 0)
+
+    archive.append([_done(3), _done(1)])
+    archive.append([])
+    archive.append([_done(2, "2025-05-03T10:00:00")])
+
+    assert [t.id for t in archive.iter_tasks()] == [3, 1, 2]
+    assert list(archive.iter_tasks())[2] == _done(2, "2025-05-03T10:00:00")
+    assert (archive.count(), archive.max_id()) == (3, 3)
+    assert archive.meta()["bytes"] == archive.path.stat().st_size
+
+
+def test_a_torn_tail_is_cut_off_before_the_next_append(tmp_path):
+    import gzip
+
+    archive = TaskArchive(tmp_path / "tasks.archive.jsonl.gz")
+    archive.append([_done(1)])
+    archive.append([_done(2)])
+    # A crash mid-append: half a member on disk, the metadata not updated.
+    torn = gzip.compress(b'{"id": 9, "title": "torn"}\n' * 50)
+    with archive.path.open("ab") as f:
+        f.write(torn[: len(torn) // 2])
+    assert [t.id for t in archive.iter_tasks()] == [1, 2]
+    assert archive.count() == 2
+
+    archive.append([_done(3)])
+    assert [t.id for t in archive.iter_tasks()] == [1, 2, 3]
+    assert archive.path.stat().st_size == archive.meta()["bytes"]
+    assert (archive.count(), archive.max_id()) == (3, 3)
+
+
+def test_a_lost_sidecar_is_rebuilt_from_the_archive(tmp_path, monkeypatch):
+    import gzip
+
+    from final import archive as archive_module
+
+    monkeypatch.setattr(archive_module, "CHUNK_SIZE", 7)
+    archive = TaskArchive(tmp_path / "tasks.archive.jsonl.gz")
+    archive.append([_done(4), _done(1)])
+    archive.append([_done(2)])
+    saved = archive.meta()
+    archive.meta_path.unlink()
+    assert archive.meta() == saved and archive.meta_path.exists()
+
+    # Lost again, this time with a torn member after the good ones.
+    archive.meta_path.unlink()
+    torn = gzip.compress(b'{"id": 9, "title": "torn"}\n' * 50)
+    with archive.path.open("ab") as f:
+        f.write(torn[: len(torn) // 2])
+    archive.append([_done(5)])
+    assert [t.id for t in archive.iter_tasks()] == [4, 1, 2, 5]
+    assert (archive.count(), archive.max_id()) == (4, 5)
+    assert archive.meta()["bytes"] == archive.path.stat().st_size
+
+
+def test_a_sidecar_longer_than_the_archive_is_not_trusted(tmp_path):
+    archive = TaskArchive(tmp_path / "tasks.archive.jsonl.gz")
+    archive.append([_done(1)])
+    meta = archive.meta()
+    archive.meta_path.write_text(f'{{"bytes": {meta["bytes"] + 100}, "count": 1, "max_id": 1}}', encoding="utf-8")
+
+    archive.append([_done(2)])
+    assert [t.id for t in archive.iter_tasks()] == [1, 2]
+    assert archive.meta()["bytes"] == archive.path.stat().st_size
+    assert bytes(100) not in archive.path.read_bytes()  # not padded out to the claimed length
+
+
+def test_is_archivable():
+    cutoff = datetime(2025, 6, 1)
+    assert is_archivable(_done(1, "2025-05-31T23:59:59"), cutoff)
+    assert not is_archivable(_done(1, "2025-06-01T00:00:01"), cutoff)
+    assert not is_archivable(task(1, completed_at="2025-05-01T00:00:00"), cutoff)
+    assert not is_archivable(_done(1, None), cutoff)
+    assert not is_archivable(_done(1, "yesterday"), cutoff)
+    assert not is_archivable(_done(1, "2025-05-01T00:00:00+02:00"), cutoff)
+    assert archive_cutoff(30, datetime(2025, 7, 1)) == datetime(2025, 6, 1)
+
+
+def test_archiving_moves_old_done_tasks(cached, backend_name, reopen):
+    now = datetime.now().isoformat(timespec="seconds")
+    storage.save_tasks([_done(1), task(2), _done(3, now), _done(4)])
+
+    assert storage.archive_done_tasks(30) == 2
+    assert storage.archive_done_tasks(30) == 0
+    assert sorted(t.id for t in reopen(backend_name).load_tasks()) == [2, 3]
+    assert [t.id for t in storage.iter_archived_tasks()] == [1, 4]
+
+
+def test_archived_ids_are_not_reused(cached, backend_name):
+    storage.save_tasks([task(1), _done(7)])
+    storage.archive_done_tasks(0)
+
+    assert storage.next_task_id(storage.load_tasks()) == 8
+    added = storage.insert_task(Task.create(0, "New", ""))
+    assert added.id == 8
@@ -0,0 +1,72 @@
+# final/tests/test_compression.py
+from __future__ import annotations
+
+import pytest
+
+from final import compression, storage
+from final.compression import METHODS, pack_text, unpack_text
+from final.models import Note
+from final.tests.helpers import note
+
+LONG = "Gesture first, then structure. Ünïcode ✔ " * 40
+
+
+@pytest.fixture(params=list(METHODS))
+def method(request, monkeypatch):
+    monkeypatch.setattr(compression, "METHOD", request.param)
+    monkeypatch.setattr(compression, "MIN_BYTES", 64)
+    return request.param
+
+
+def test_pack_round_trips(method):
+    packed = pack_text(LONG)
+    assert packed is not None and packed[0] == method
+    assert len(packed[1]) < len(LONG.encode("utf-8"))
+    assert unpack_text(*packed) == LONG
+
+
+def test_short_text_stays_plain(method):
+    assert pack_text("short") is None
+    assert pack_text("x" * 63) is None
+    assert pack_text("x" * 400) is not None
+
+
+def test_off_by_default(monkeypatch):
+    monkeypatch.setattr(compression, "METHOD", None)
+    assert pack_text(LONG) is None
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        unpack_text("brotli", "")
+
+
+def test_content_is_inflated_on_first_read(method):
+    d = note(1, content=LONG).to_dict()
+    assert "content" not in d and d["content_codec"] == method
+
+    loaded = Note.from_dict(d)
+    assert not loaded.content_is_loaded()
+    assert loaded.title == "Note 1"
+    assert loaded.content == LONG
+    assert loaded.content_is_loaded()
+
+
+def test_unread_content_is_written_back_as_is(method, monkeypatch):
+    d = note(1, content=LONG).to_dict()
+    loaded = Note.from_dict(d)
+    monkeypatch.setattr(compression, "pack_text", lambda text: pytest.fail("recompressed"))
+    assert loaded.to_dict() == d
+    assert not loaded.content_is_loaded()
+
+
+def test_turning_compression_off_writes_content_back_plain(method, data_dir, monkeypatch, reopen):
+    storage.save_notes([note(1, content=LONG), note(2, content="short")])
+    raw = storage._load_json(storage.NOTES_FILE)["notes"]
+    assert ["content_z" in d for d in raw] == [True, False]
+
+    monkeypatch.setattr(compression, "METHOD", None)
+    storage.upsert_note(note(3, content=LONG))
+    raw = storage._load_json(storage.NOTES_FILE)["notes"]
+    assert ["content_z" in d for d in raw] == [False, False, False]
+    assert [n.content for n in reopen("json").load_notes()] == [LONG, "short", LONG]
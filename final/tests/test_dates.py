@@ -0,0 +1,132 @@
+# final/tests/test_dates.py
+from __future__ import annotations
+import random
+from datetime import date, datetime
+
+import pytest
+
+from final import storage
+from final.dates import due_range, epoch_iso, ordinal_iso, parse_epoch, parse_ordinal, parse_since
+from final.sorted_index import SortedIndex
+from final.tests.helpers import note, task
+
+
+def test_parse_epoch():
+    assert parse_epoch("2025-06-01T10:00:00") == datetime(2025, 6, 1, 10).timestamp()
+    assert parse_epoch(" 2025-06-01 ") == datetime(2025, 6, 1).timestamp()
+    assert epoch_iso(parse_epoch("2025-06-01T10:00:00")) == "2025-06-01T10:00:00"
+    for bad in (None, "", "soon", "2025-13-01"):
+        assert parse_epoch(bad) is None
+
+
+def test_parse_ordinal():
+    day = date(2025, 7, 1).toordinal()
+    assert parse_ordinal("2025-07-01") == day
+    assert parse_ordinal("2025-07-01T23:30") == day
+    assert parse_ordinal("2025-07-01 09:00:00") == day
+    assert ordinal_iso(day) == "2025-07-01"
+    for bad in (None, "", "tomorrow", "2025-02-30"):
+        assert parse_ordinal(bad) is None
+
+
+def test_parse_since():
+    now = datetime(2025, 6, 10, 15, 30)
+    assert parse_since("today", now) == datetime(2025, 6, 10).timestamp()
+    assert parse_since("Yesterday", now) == datetime(2025, 6, 9).timestamp()
+    assert parse_since("3d", now) == datetime(2025, 6, 7, 15, 30).timestamp()
+    assert parse_since("2 w", now) == datetime(2025, 5, 27, 15, 30).timestamp()
+    assert parse_since("90m", now) == datetime(2025, 6, 10, 14).timestamp()
+    assert parse_since("2025-06-01", now) == datetime(2025, 6, 1).timestamp()
+    assert parse_since("3y", now) is None
+
+
+def test_due_range():
+    today = date(2025, 6, 10)
+    t = today.toordinal()
+    assert due_range([], today) == (t, t + 6, "in the next 7 days")
+    assert due_range(["today"], today)[:2] == (t, t)
+    assert due_range(["month"], today)[:2] == (t, t + 29)
+    assert due_range(["overdue"], today)[:2] == (None, t - 1)
+    assert due_range(["2025-06-20"], today) == (None, t + 10, "by 2025-06-20")
+    assert due_range(["2025-06-01", "2025-06-30"], today)[:2] == (t - 9, t + 20)
+    for bad in (["someday"], ["2025-06-01", "later"]):
+        with pytest.raises(ValueError):
+            due_range(bad, today)
+
+
+def test_sorted_index_ranges():
+    index = SortedIndex(lambda r: r.key)
+
+    class R:
+        def __init__(self, id, key):
+            self.id, self.key = id, key
+
+    index.build([R(1, 5), R(2, 3), R(3, None), R(4, 5), R(5, 9)])
+    assert index.range() == [2, 1, 4, 5]
+    assert index.range(5, 5) == [1, 4]
+    assert index.range(3, 9, strict_lo=True, strict_hi=True) == [1, 4]
+    assert index.count(hi=5) == 3
+    index.put(R(1, 10))
+    index.remove(2)
+    index.put(R(3, 0))
+    assert index.range() == [3, 4, 5, 1]
+    assert (index.key(1), index.key(2)) == (10, None)
+    assert len(index) == 4
+
+
+def _random_tasks(n, seed=7):
+    rnd = random.Random(seed)
+    dues = [None, "not a date", "2025-06-30", "2025-07-01", "2025-07-01T18:00", "2025-07-15", "2025-08-02"]
+    return [
+        task(
+            i,
+            due_date=rnd.choice(dues),
+            updated_at=rnd.choice(["2025-06-01T10:00:00", "2025-06-02T08:00:00", "2025-06-02T08:00:00", "bad", "2025-06-05"]),
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+def test_due_and_since_match_a_brute_force_filter(cached, backend_name):
+    tasks = _random_tasks(60)
+    storage.save_tasks(tasks[:50])
+    for t in tasks[50:]:
+        storage.upsert_task(t)
+    storage.delete_task(3)
+    storage.upsert_task(task(4, due_date="2025-07-01", updated_at="2025-06-09T10:00:00"))
+    live = [t for t in tasks if t.id != 3 and t.id != 4] + [task(4, due_date="2025-07-01", updated_at="2025-06-09T10:00:00")]
+
+    for start, end in [(None, None), ("2025-07-01", "2025-07-01"), ("2025-07-01", None), (None, "2025-07-14")]:
+        lo, hi = parse_ordinal(start), parse_ordinal(end)
+        expected = sorted(
+            (t for t in live if t.due_ordinal is not None
+             and (lo is None or t.due_ordinal >= lo) and (hi is None or t.due_ordinal <= hi)),
+            key=lambda t: (t.due_ordinal, t.id),
+        )
+        assert [t.id for t in storage.tasks_due_between(start, end)] == [t.id for t in expected]
+
+    for since in ("2025-06-02T08:00:00", "2025-06-03"):
+        epoch = parse_epoch(since)
+        expected = sorted(
+            (t for t in live if t.updated_epoch is not None and t.updated_epoch >= epoch),
+            key=lambda t: (t.updated_epoch, t.id),
+        )
+        assert [t.id for t in storage.tasks_updated_since(epoch)] == [t.id for t in expected]
+
+
+def test_notes_updated_since(cached, backend_name):
+    storage.save_notes([note(1, updated_at="2025-06-01T10:00:00"), note(2, updated_at="2025-06-03T10:00:00")])
+    storage.upsert_note(note(3, updated_at="2025-06-02T10:00:00"))
+    storage.upsert_note(note(1, updated_at="2025-06-04T10:00:00"))
+
+    assert [n.id for n in storage.notes_updated_since(parse_epoch("2025-06-02"))] == [3, 2, 1]
+    assert [n.id for n in storage.notes_updated_since(parse_epoch("2025-06-05"))] == []
+
+
+def test_parsed_dates_follow_their_strings():
+    t = task(1, due_date="2025-07-01")
+    assert t.due_ordinal == date(2025, 7, 1).toordinal()
+    t.due_date = "2025-07-02"
+    assert t.due_ordinal == date(2025, 7, 2).toordinal()
+    t.updated_at = "2025-06-02T00:00:00"
+    assert t.updated_epoch == datetime(2025, 6, 2).timestamp()
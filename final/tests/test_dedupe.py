@@ -0,0 +1,162 @@
+# final/tests/test_dedupe.py
+from __future__ import annotations
+import random
+import string
+
+import pytest
+
+from final import dedupe, storage
+from final.dedupe import SignatureStore, clusters, merge_notes, merge_tasks, shingles, signature, similarity
+from final.tests.helpers import note, task
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b)
+
+
+def _typo(rnd, text):
+    i = rnd.randrange(len(text))
+    return text[:i] + rnd.choice(string.ascii_lowercase) + text[i + 1:]
+
+
+def _sentence(rnd, n=8):
+    return " ".join("".join(rnd.choices(string.ascii_lowercase, k=rnd.randint(3, 8))) for _ in range(n))
+
+
+def test_shingles():
+    assert shingles("Tutorial!") == {"tuto", "utor", "tori", "oria", "rial"}
+    assert shingles("abc") == {"abc"}
+    assert shingles("  ,, ") == set()
+    assert shingles("Hips, HIPS") == shingles("hips hips")
+
+
+def test_signatures_estimate_jaccard():
+    rnd = random.Random(1)
+    assert signature(set()) is None
+    errors = []
+    for _ in range(200):
+        a = _sentence(rnd)
+        b = " ".join(w if rnd.random() < 0.7 else _sentence(rnd, 1) for w in a.split())
+        sa, sb = shingles(a), shingles(b)
+        assert signature(sa) == signature(set(sa))
+        errors.append(abs(similarity(signature(sa), signature(sb)) - _jaccard(sa, sb)))
+    assert sum(errors) / len(errors) < 0.05
+    assert similarity(signature({"ab"}), signature({"ab"})) == 1.0
+
+
+def test_clusters_find_every_group_of_copies():
+    rnd = random.Random(2)
+    signatures, groups = {}, []
+    next_id = 1
+    for _ in range(40):
+        base = _sentence(rnd, 10)
+        members = []
+        for _ in range(rnd.choice([1, 1, 2, 3, 5])):
+            text = base if not members else _typo(rnd, base)
+            signatures[next_id] = signature(shingles(text))
+            members.append(next_id)
+            next_id += 1
+        if len(members) > 1:
+            groups.append(members)
+
+    found = clusters(signatures, 0.7)
+    assert sorted([i for i, _ in g] for g in found) == sorted(groups)
+    assert [len(g) for g in found] == sorted((len(g) for g in found), reverse=True)
+    for g in found:
+        first = signatures[g[0][0]]
+        assert g[0][1] == 1.0
+        assert all(score == similarity(first, signatures[i]) for i, score in g)
+
+
+def test_clusters_only_join_similar_records(monkeypatch):
+    """Every record of a cluster is linked to it by a pair at or above the
+    threshold, however the buckets and representatives fell."""
+    monkeypatch.setattr(dedupe, "REPRESENTATIVES", 2)
+    rnd = random.Random(3)
+    bases = [_sentence(rnd, 4) for _ in range(5)]
+    signatures = {}
+    for i in range(1, 121):
+        words = rnd.choice(bases).split()
+        words[rnd.randrange(len(words))] = _sentence(rnd, 1)
+        signatures[i] = signature(shingles(" ".join(words)))
+
+    for threshold in (0.5, 0.7, 0.9):
+        for group in clusters(signatures, threshold):
+            ids = [i for i, _ in group]
+            linked, frontier = {ids[0]}, [ids[0]]
+            while frontier:
+                i = frontier.pop()
+                for j in ids:
+                    if j not in linked and similarity(signatures[i], signatures[j]) >= threshold:
+                        linked.add(j)
+                        frontier.append(j)
+            assert linked == set(ids)
+
+
+def test_the_signature_store_only_signs_changes(tmp_path, monkeypatch):
+    texts = {1: "Hips study", 2: "hips study", 3: "", 4: "Colour theory"}
+    signed = []
+    monkeypatch.setattr(dedupe, "signature", lambda pieces: signed.append(1) or signature(pieces))
+    path = tmp_path / "sig.bin"
+    store = SignatureStore(path)
+    assert store.sync(((i, "v1") for i in texts), texts.get) == 4
+    assert sorted(store.signatures) == [1, 2, 4]
+
+    reopened = SignatureStore(path)
+    assert reopened.signatures == store.signatures
+    assert reopened.sync(((i, "v1") for i in texts), texts.get) == 0
+
+    texts[3] = "Hips study!"
+    reopened.changed([3])
+    assert reopened.sync([(1, "v1"), (3, "v1"), (4, "v2")], texts.get) == 2
+    assert sorted(SignatureStore(path).signatures) == [1, 3, 4]
+    assert [[i for i, _ in g] for g in clusters(reopened.signatures, 0.7)] == [[1, 3]]
+
+    path.write_bytes(path.read_bytes()[:-10])
+    assert SignatureStore(path).signatures == {}
+
+
+def test_merging():
+    notes = [
+        note(3, "Hips", "short", ["anatomy"]),
+        note(5, "Hips", "the longest content of all", ["anatomy", "hips"]),
+    ]
+    merged = merge_notes(notes)
+    assert (merged.id, merged.tags, merged.content) == (3, ["anatomy", "hips"], "the longest content of all")
+    assert notes[0].tags == ["anatomy"]
+
+    tasks = [
+        task(2, "abc", status="todo", priority="low", due_date="2025-07-09"),
+        task(4, "abc", "more words", status="done", priority="high", category="misc",
+             due_date="2025-07-01", completed_at="2025-06-01T10:00:00"),
+        task(6, "abc", priority="medium"),
+    ]
+    merged = merge_tasks(tasks)
+    assert (merged.id, merged.status, merged.priority, merged.category, merged.due_date, merged.description) == (
+        2, "done", "high", "misc", "2025-07-01", "more words",
+    )
+    assert merged.completed_at == "2025-06-01T10:00:00"
+    assert tasks[0].status == "todo"
+
+
+def test_dedupe_reports_and_merges(cached, backend_name, capsys, monkeypatch):
+    storage.save_tasks([task(1, "abc"), task(2, "abc", priority="high"), task(3, "Colour study"), task(4, "abc")])
+    answers = iter(["y"])
+    monkeypatch.setattr("builtins.input", lambda *a: next(answers))
+
+    dedupe.print_dedupe("tasks", titles=True, merge=True)
+    out = capsys.readouterr().out
+    assert "[1] (todo) abc 100%" in out and "[4] (todo) abc 100%" in out
+    assert "Merged into #1." in out
+    assert [(t.id, t.priority) for t in storage.load_tasks()] == [(1, "high"), (3, "medium")]
+
+    # The merged record is re-signed even within the same second.
+    dedupe.print_dedupe("tasks", titles=True)
+    assert capsys.readouterr().out.startswith("No near-duplicate task titles")
+
+
+def test_title_and_text_signatures_are_kept_apart(data_dir):
+    storage.save_notes([note(1, "Hips", "one text entirely"), note(2, "Hips", "something else again")])
+    assert [[i for i, _ in g] for g in clusters(storage.signature_store("notes", titles=True).signatures, 0.7)] == [[1, 2]]
+    assert clusters(storage.signature_store("notes").signatures, 0.7) == []
+    assert len({p.name for p in storage._signature_stores}) == 2
@@ -0,0 +1,188 @@
+# final/tests/test_embeddings.py
+from __future__ import annotations
+import math
+import random
+
+import pytest
+
+from final import embeddings, search, storage
+from final.embeddings import EmbeddingStore, HashingEmbedder, get_embedder
+from final.tests.helpers import note, task
+
+WORDS = ["hand", "box", "light", "shadow", "gesture", "pelvis", "ribcage", "colour", "warm", "cool", "perspective"]
+
+
+class Counting(HashingEmbedder):
+    """The hashing embedder, remembering every text it was asked for."""
+
+    def __init__(self, dims=32):
+        super().__init__(dims)
+        self.seen = []
+
+    def embed(self, texts):
+        self.seen.extend(texts)
+        return super().embed(texts)
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    return dot / math.sqrt(sum(x * x for x in a) * sum(y * y for y in b))
+
+
+def _brute_force(texts, query, k, embedder):
+    q = embedder.embed([query])[0]
+    scored = [(i, _cosine(v, q)) for i, v in zip(texts, embedder.embed(list(texts.values()))) if any(v)]
+    scored = [(i, s) for i, s in scored if s > 0]
+    return sorted(scored, key=lambda e: -e[1])[:k]
+
+
+def _texts(rnd, n):
+    return {i: " ".join(rnd.choices(WORDS, k=rnd.randint(1, 5))) for i in range(1, n + 1)}
+
+
+def test_the_hashing_embedder_is_deterministic():
+    a, b = HashingEmbedder(64), HashingEmbedder(64)
+    assert a.embed(["Warm light, cool shadows"]) == b.embed(["warm lights cool shadow"])
+    assert len(a.embed(["x"])[0]) == 64
+    assert a.embed(["the of"]) == [[0.0] * 64]
+    assert a.key != HashingEmbedder(32).key
+    assert isinstance(get_embedder("HASHING"), HashingEmbedder)
+    with pytest.raises(ValueError):
+        get_embedder("word2vec")
+
+
+def test_search_matches_brute_force_cosine(tmp_path):
+    texts = _texts(random.Random(1), 40)
+    store = EmbeddingStore(tmp_path / "e.vec", Counting())
+    assert store.sync(((i, "v1") for i in texts), texts.get) == 40
+    assert len(store) == 40
+    for query in ("warm light", "pelvis ribcage box", "gesture"):
+        got = store.search(store.embedder.embed([query])[0], 10)
+        expected = _brute_force(texts, query, 10, store.embedder)
+        assert [s for _, s in got] == pytest.approx([s for _, s in expected], abs=1e-5)
+        assert {i for i, _ in got} <= set(texts)
+
+    assert store.search(store.embedder.embed(["the"])[0]) == []
+    assert store.search(store.embedder.embed(["box"])[0], 0) == []
+    with pytest.raises(ValueError):
+        store.search([1.0] * 8)
+
+
+def test_only_changed_records_are_embedded_again(tmp_path):
+    texts = {1: "warm light", 2: "cool shadow", 3: "box"}
+    store = EmbeddingStore(tmp_path / "e.vec", Counting())
+    store.sync(((i, "v1") for i in texts), texts.get)
+
+    store.embedder.seen.clear()
+    texts[2] = "pelvis"
+    assert store.sync([(1, "v1"), (2, "v2"), (3, "v1")], texts.get) == 1
+    assert store.embedder.seen == ["pelvis"]
+
+    store.changed([3])  # same updated_at, but written by us
+    texts[3] = "ribcage"
+    assert store.sync([(1, "v1"), (2, "v2"), (3, "v1")], texts.get) == 1
+    assert store.sync([(1, "v1"), (2, "v2"), (3, "v1")], texts.get) == 0
+    assert store.search(store.embedder.embed(["ribcage"])[0])[0][0] == 3
+
+    # A deleted record's row is reused by the next new one.
+    assert store.sync([(1, "v1"), (3, "v1")], texts.get) == 0
+    assert len(store) == 2
+    texts[4] = "gesture"
+    store.sync([(1, "v1"), (3, "v1"), (4, "v1")], texts.get)
+    assert len(store._ids) == 3
+    assert [i for i, _ in store.search(store.embedder.embed(["gesture"])[0])] == [4]
+    assert store.search(store.embedder.embed(["pelvis"])[0]) == []
+
+
+def test_the_store_persists(tmp_path):
+    texts = _texts(random.Random(2), 30)
+    path = tmp_path / "e.vec"
+    store = EmbeddingStore(path, Counting())
+    store.sync(((i, "v1") for i in texts), texts.get)
+    store.sync(((i, "v1") for i in texts if i != 7), texts.get)
+    query = store.embedder.embed(["warm shadow"])[0]
+    before = store.search(query)
+    store._close()
+
+    reopened = EmbeddingStore(path, Counting())
+    assert len(reopened) == 29
+    assert reopened.search(query) == before
+    assert reopened.sync(((i, "v1") for i in texts if i != 7), texts.get) == 0
+    assert reopened.embedder.seen == []
+    reopened._close()
+
+    # Another embedder's vectors mean nothing to this one: start over.
+    other = EmbeddingStore(path, Counting(16))
+    assert len(other) == 0
+    assert other.sync(((i, "v1") for i in texts), texts.get) == 30
+
+
+def test_a_torn_map_starts_over(tmp_path):
+    path = tmp_path / "e.vec"
+    store = EmbeddingStore(path, Counting())
+    store.sync([(1, "v1")], {1: "box"}.get)
+    store._close()
+    path.with_name("e.vec.json").write_text('{"embedder": "hash', encoding="utf-8")
+    assert len(EmbeddingStore(path, Counting())) == 0
+
+
+def test_storage_keeps_the_store_current(cached, backend_name, reopen, monkeypatch):
+    monkeypatch.setattr("final.config.EMBEDDER", "hashing")
+    storage.save_notes([note(1, "Warm light", "on the box"), note(2, "Gesture", "line of action")])
+    storage.save_tasks([task(1, "Paint warm light")])
+    assert [(kind, r.id) for kind, r, _ in search.semantic_search("warm light")][:2] in (
+        [("notes", 1), ("tasks", 1)], [("tasks", 1), ("notes", 1)],
+    )
+
+    # Same second as the first write: only the listener tells the store.
+    storage.upsert_note(note(2, "Pelvis", "a bucket"))
+    assert search.semantic_search("pelvis bucket")[0][1].id == 2
+    reopen(backend_name).apply_notes([], [1])
+    assert ("notes", 1) not in [(kind, r.id) for kind, r, _ in search.semantic_search("warm light")]
+    assert search.semantic_search("the") == []
+
+
+def test_print_semantic(data_dir, capsys, monkeypatch):
+    monkeypatch.setattr("final.config.EMBEDDER", "hashing")
+    storage.save_notes([note(1, "Warm light", "box")])
+    search.print_semantic("warm light")
+    out = capsys.readouterr().out.splitlines()
+    assert out[0] == "Notes and tasks closest in meaning to 'warm light':"
+    assert out[1].startswith("   1. note [1] Warm light (tags: -) ")
+    search.print_semantic("zebra")
+    assert capsys.readouterr().out == "Nothing matched 'zebra'.\n"
+
+    monkeypatch.setattr("final.config.EMBEDDER", "word2vec")
+    monkeypatch.setattr(storage, "_embedding_stores", {})
+    search.print_semantic("warm")
+    assert capsys.readouterr().out.startswith("(Embeddings unavailable: Unknown embedder")
+
+
+def test_the_ivf_index(tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    monkeypatch.setattr(embeddings, "IVF_MIN_ROWS", 50)
+    texts = _texts(random.Random(3), 200)
+    path = tmp_path / "e.vec"
+    store = EmbeddingStore(path, Counting())
+    store.sync(((i, "v1") for i in texts), texts.get)
+    assert store._ivf is not None and path.with_name("e.vec.ivf").exists()
+
+    # Probing every cluster is exact.
+    monkeypatch.setattr(embeddings, "PROBE_FRACTION", 1.0)
+    for query in ("warm light", "gesture box"):
+        got = store.search(store.embedder.embed([query])[0], 10)
+        expected = _brute_force(texts, query, 10, store.embedder)
+        assert [s for _, s in got] == pytest.approx([s for _, s in expected], abs=1e-5)
+
+    # Fewer probes only ever lose neighbours, and the index reloads with the store.
+    query = store.embedder.embed(["warm light"])[0]
+    exact = dict(store.search(query, 200))
+    monkeypatch.setattr(embeddings, "PROBE_FRACTION", 0.1)
+    approx = store.search(query, 10)
+    assert approx and all(exact[i] == pytest.approx(s) for i, s in approx)
+    store._close()
+    assert EmbeddingStore(path, Counting())._ivf is not None
+
+    store = EmbeddingStore(path, Counting())
+    store.sync(((i, "v1") for i in range(1, 21)), texts.get)
+    assert store._ivf is None and not path.with_name("e.vec.ivf").exists()
@@ -0,0 +1,130 @@
+# final/tests/test_index_handle.py
+from __future__ import annotations
+
+import pytest
+
+from final import storage, text_index
+from final.text_index import InvertedIndex, default_analyzer
+from final.tests.helpers import note
+
+QUERIES = ("hand", "box light", "gesture", '"line of action"', "zebra")
+
+
+def _notes():
+    return [
+        note(1, "Drawing hands", "Draw the hand as a box first.", ["anatomy"]),
+        note(2, "Gesture drawing", "Quick gestures along the line of action.", ["gesture"]),
+        note(3, "Colour", "Warm light, cool shadows on a box.", ["colour"]),
+    ]
+
+
+def _rebuilt(query):
+    docs = ((n.id, storage._note_text(n), storage._note_version(n)) for n in storage.load_notes())
+    return dict(InvertedIndex.build(docs, default_analyzer()).search(query))
+
+
+def _assert_current(index):
+    for query in QUERIES:
+        assert dict(index.search(query)) == pytest.approx(_rebuilt(query), rel=0.05)
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    """How many times an index was built from every record."""
+    count = []
+    build = InvertedIndex.build.__func__
+    monkeypatch.setattr(InvertedIndex, "build", classmethod(lambda cls, *a: count.append(1) or build(cls, *a)))
+    return count
+
+
+def test_our_own_edits_update_the_index_in_place(cached, backend_name, builds):
+    storage.save_notes(_notes())
+    storage.note_search_index()
+    assert len(builds) == 1
+
+    storage.upsert_note(note(2, "Gesture", "Boxes and more boxes, then a hand.", ["gesture"], updated_at="2025-06-02T10:00:00"))
+    storage.insert_note(note(0, "New", "Light on a box."))
+    storage.delete_note(3)
+    index = storage.note_search_index()
+
+    assert len(builds) == 1
+    assert index.pending == 3
+    _assert_current(index)
+
+
+def test_another_processes_edit_is_repaired(cached, backend_name, reopen, builds):
+    storage.save_notes(_notes())
+    storage.note_search_index()
+    reopen(backend_name).apply_notes([note(1, "Drawing feet", "Feet are wedges.", updated_at="2025-06-03T10:00:00")], [3])
+
+    index = storage.note_search_index()
+    assert len(builds) == 1
+    assert [d for d, _ in index.search("feet")] == [1]
+    _assert_current(index)
+
+
+def test_an_edit_the_versions_miss_rebuilds_in_the_background(data_dir, reopen, builds):
+    storage.save_notes(_notes())
+    storage.note_search_index()
+    # Same title, tags and updated_at: only the content differs.
+    reopen("json").apply_notes([note(3, "Colour", "Complementary zebra stripes.", ["colour"])], [])
+
+    handle = storage.note_index_handle()
+    storage.note_search_index()
+    handle.wait(10)
+    assert len(builds) == 2
+    _assert_current(storage.note_search_index())
+
+
+def test_the_delta_survives_a_restart(data_dir, monkeypatch, builds):
+    storage.save_notes(_notes())
+    storage.note_search_index()
+    storage.upsert_note(note(1, "Drawing feet", "Feet are wedges.", updated_at="2025-06-03T10:00:00"))
+    storage.note_search_index()
+    assert storage.NOTES_SEARCH_INDEX.with_name(storage.NOTES_SEARCH_INDEX.name + ".delta").exists()
+
+    monkeypatch.setattr(storage, "_index_handles", {})
+    monkeypatch.setattr(storage, "_listeners", {"notes": [], "tasks": []})
+    index = storage.note_search_index()
+    assert len(builds) == 1
+    assert index.pending == 1
+    _assert_current(index)
+
+
+def test_a_large_delta_is_merged_into_a_new_segment(data_dir, monkeypatch, builds):
+    monkeypatch.setattr(text_index, "MERGE_MIN", 2)
+    monkeypatch.setattr(text_index, "MERGE_FRACTION", 0.1)
+    storage.save_notes(_notes())
+    storage.note_search_index()
+    for n in range(4, 8):
+        storage.upsert_note(note(n, f"Box {n}", "light"))
+
+    handle = storage.note_index_handle()
+    storage.note_search_index()
+    handle.wait(10)
+    index = storage.note_search_index()
+    assert len(builds) == 2
+    assert index.pending == 0
+    _assert_current(index)
+
+
+def test_replacing_the_whole_store(cached, backend_name):
+    storage.save_notes(_notes())
+    storage.note_search_index()
+    storage.save_notes([note(9, "Only box", "a box")])
+
+    handle = storage.note_index_handle()
+    storage.note_search_index()
+    handle.wait(10)
+    assert [d for d, _ in storage.note_search_index().search("box")] == [9]
+
+
+def test_another_processes_edit_right_after_ours(cached, backend_name, reopen):
+    storage.save_notes(_notes())
+    storage.note_search_index()
+    storage.upsert_note(note(4, "Feet", "Feet are wedges."))
+    reopen(backend_name).apply_notes([], [1])  # after our flush, before our next lookup
+
+    index = storage.note_search_index()
+    assert [d for d, _ in index.search("hand")] == []
+    _assert_current(index)
@@ -0,0 +1,91 @@
+# final/tests/test_journal_store.py
+from __future__ import annotations
+import json
+
+from final.journal_store import JournaledCollection
+from final.models import Note
+from final.storage import _load_json
+from final.tests.helpers import note
+
+
+def _collection(tmp_path, compact_bytes=1 << 20):
+    return JournaledCollection("notes", tmp_path / "notes.json", tmp_path / "notes.journal", Note.from_dict, compact_bytes)
+
+
+def test_writes_append_and_replay(tmp_path):
+    c = _collection(tmp_path)
+    c.apply([note(1), note(2), note(3)], [])
+    c.put(note(2, "Renamed"))
+    assert c.delete(3) is True
+    assert c.delete(3) is False
+
+    assert not (tmp_path / "notes.json").exists()
+    ops = [json.loads(line)["op"] for line in (tmp_path / "notes.journal").read_text().splitlines()]
+    assert ops == ["put", "put", "put", "put", "del"]
+    assert [(n.id, n.title) for n in _collection(tmp_path).load()] == [(1, "Note 1"), (2, "Renamed")]
+
+
+def test_replay_skips_a_torn_line(tmp_path):
+    c = _collection(tmp_path)
+    c.put(note(1))
+    with (tmp_path / "notes.journal").open("a", encoding="utf-8") as f:
+        f.write('{"op": "put", "data": {"id": 2, "tit')  # crash mid-append
+        f.write("\n")
+    c.put(note(3))
+
+    assert [n.id for n in _collection(tmp_path).load()] == [1, 3]
+    assert _collection(tmp_path).get(2) is None
+
+
+def test_compaction_folds_the_journal_into_the_snapshot(tmp_path):
+    c = _collection(tmp_path)
+    c.apply([note(1), note(2)], [])
+    c.apply([note(1, "Edited")], [2])
+    c.compact()
+
+    assert not (tmp_path / "notes.journal").exists()
+    snapshot = _load_json(tmp_path / "notes.json")
+    assert [(d["id"], d["title"]) for d in snapshot["notes"]] == [(1, "Edited")]
+    assert [n.title for n in _collection(tmp_path).load()] == ["Edited"]
+
+
+def test_background_compaction_past_the_threshold(tmp_path):
+    c = _collection(tmp_path, compact_bytes=200)
+    for i in range(1, 11):
+        c.put(note(i, content="x" * 50))
+    c.wait()
+
+    assert c.journal_size() < 200
+    assert [n.id for n in _collection(tmp_path).load()] == list(range(1, 11))
+
+
+def test_old_journal_over_a_new_snapshot_is_harmless(tmp_path):
+    c = _collection(tmp_path)
+    c.apply([note(1), note(2)], [])
+    c.apply([], [2])
+    journal = (tmp_path / "notes.journal").read_text()
+    c.compact()
+    # A crash between writing the snapshot and dropping the journal.
+    (tmp_path / "notes.journal").write_text(journal)
+
+    assert [n.id for n in _collection(tmp_path).load()] == [1]
+
+
+def test_a_journal_left_behind_by_save_all_is_skipped(tmp_path):
+    c = _collection(tmp_path)
+    c.apply([note(1), note(2), note(3)], [])
+    journal = (tmp_path / "notes.journal").read_text()
+    c.save_all([note(1, "Kept")])
+    # A crash between writing the snapshot and dropping the journal.
+    (tmp_path / "notes.journal").write_text(journal)
+
+    assert [(n.id, n.title) for n in _collection(tmp_path).load()] == [(1, "Kept")]
+    assert _collection(tmp_path).get(2) is None
+
+    # New writes go on top of the new snapshot, in this process and others.
+    c.put(note(4))
+    _collection(tmp_path).put(note(5))
+    assert [n.id for n in c.load()] == [1, 4, 5]
+    c.compact()
+    assert _load_json(tmp_path / "notes.json")["generation"] == 2
+    assert [n.id for n in _collection(tmp_path).load()] == [1, 4, 5]
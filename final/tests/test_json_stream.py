@@ -0,0 +1,63 @@
+# final/tests/test_json_stream.py
+from __future__ import annotations
+import json
+
+import pytest
+
+from final.json_stream import iter_array, iter_array_spans
+
+DOC = {
+    "version": 3,
+    "meta": {"notes": [{"id": -1}], "s": "a ] } , \" tricky"},
+    "notes": [
+        {"id": 1, "title": "Ünïcode ✔", "tags": ["a", "b"]},
+        {"id": 2, "n": 12345678901234567890, "f": -1.5e-3, "x": None},
+        {"id": 3, "nested": {"deep": [[1, 2], {"k": "v"}]}, "crlf": "a\r\nb"},
+    ],
+    "tail": 7,
+}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 64 * 1024])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_items_match_json_load(tmp_path, chunk_size, indent):
+    path = tmp_path / "notes.json"
+    path.write_text(json.dumps(DOC, ensure_ascii=False, indent=indent), encoding="utf-8")
+
+    assert list(iter_array(path, "notes", chunk_size)) == DOC["notes"]
+    assert list(iter_array(path, "tasks", chunk_size)) == []
+
+
+@pytest.mark.parametrize("chunk_size", [3, 64 * 1024])
+def test_spans_point_at_each_items_bytes(tmp_path, chunk_size):
+    path = tmp_path / "notes.json"
+    path.write_text(json.dumps(DOC, ensure_ascii=False, indent=2), encoding="utf-8")
+    raw = path.read_bytes()
+
+    spans = list(iter_array_spans(path, "notes", chunk_size))
+    assert [item for item, _, _ in spans] == DOC["notes"]
+    assert [json.loads(raw[start:end]) for _, start, end in spans] == DOC["notes"]
+
+
+def test_missing_empty_and_bare_files(tmp_path):
+    path = tmp_path / "notes.json"
+    assert list(iter_array(path, "notes")) == []
+    path.write_text("")
+    assert list(iter_array(path, "notes")) == []
+    path.write_text("{}")
+    assert list(iter_array(path, "notes")) == []
+    path.write_text('{"notes": []}')
+    assert list(iter_array(path, "notes")) == []
+
+
+@pytest.mark.parametrize("text", [
+    '{"notes": [{"id": 1}, {"id": 2',
+    '{"notes": [{"id": 1} {"id": 2}]}',
+    '["notes"]',
+    '{"notes": [{"id": 1},]}',
+])
+def test_malformed_json_raises_value_error(tmp_path, text):
+    path = tmp_path / "notes.json"
+    path.write_text(text)
+    with pytest.raises(ValueError):
+        list(iter_array(path, "notes", chunk_size=4))
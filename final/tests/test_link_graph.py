@@ -0,0 +1,164 @@
+# final/tests/test_link_graph.py
+from __future__ import annotations
+import random
+from collections import deque
+
+import pytest
+
+from final import link_graph, storage
+from final.link_graph import LinkGraph, parse_node, references, title_key
+from final.storage import note_key, task_key
+from final.tests.helpers import note, task
+
+
+def test_references():
+    titles, tasks = references(
+        "See [[Drawing  Hands]], [[gesture#Line of action]] and [[Colour|the colour note]]; "
+        "do #task-3 and #TASK-12 but not abc#task-4, #task-5x or ##task-6. [[]] [[unclosed"
+    )
+    assert titles == {"drawing hands", "gesture", "colour"}
+    assert tasks == {3, 12}
+    assert title_key("  Drawing\tHANDS ") == "drawing hands"
+
+
+@pytest.mark.parametrize("text, key", [
+    ("12", note_key(12)), ("note-12", note_key(12)), ("task-12", task_key(12)),
+    ("#task-12", task_key(12)), ("Task12", task_key(12)), ("hips", None), ("task-", None),
+])
+def test_parse_node(text, key):
+    assert parse_node(text) == key
+
+
+def _random_store(rnd, notes=30, tasks=15):
+    def refs():
+        out = [f"[[Note {rnd.randint(1, notes + 5)}]]" for _ in range(rnd.randint(0, 2))]
+        out += [f"#task-{rnd.randint(1, tasks + 3)}" for _ in range(rnd.randint(0, 1))]
+        return " and ".join(out)
+
+    storage.save_notes([note(i, f"Note {i}", refs()) for i in range(1, notes + 1)])
+    storage.save_tasks([task(i, f"Task {i}", refs()) for i in range(1, tasks + 1)])
+    return refs
+
+
+def _brute_edges():
+    notes, tasks = storage.load_notes(), storage.load_tasks()
+    by_title = {}
+    for n in notes:
+        by_title.setdefault(title_key(n.title), set()).add(note_key(n.id))
+    task_keys = {task_key(t.id) for t in tasks}
+    edges = {}
+    for key, text in [(note_key(n.id), n.content) for n in notes] + [(task_key(t.id), t.description) for t in tasks]:
+        titles, ids = references(text)
+        out = set().union(*(by_title.get(t, set()) for t in titles)) | {task_key(i) for i in ids} & task_keys
+        edges[key] = out - {key}
+    return edges
+
+
+def _distances(edges, start):
+    undirected = {k: set(v) for k, v in edges.items()}
+    for k, out in edges.items():
+        for o in out:
+            undirected[o].add(k)
+    seen, queue = {start: 0}, deque([start])
+    while queue:
+        k = queue.popleft()
+        for o in undirected[k]:
+            if o not in seen:
+                seen[o] = seen[k] + 1
+                queue.append(o)
+    return seen, undirected
+
+
+def _assert_matches(graph):
+    edges = _brute_edges()
+    for key, out in edges.items():
+        assert graph.links(key) == out, key
+        assert graph.backlinks(key) == {k for k, o in edges.items() if key in o}, key
+    orphans = sorted(k >> 1 for k in edges if not k & 1 and not _distances(edges, k)[1][k])
+    assert graph.orphans() == orphans
+
+    keys = sorted(edges)
+    rnd = random.Random(len(keys))
+    for start in rnd.sample(keys, 5):
+        distances, undirected = _distances(edges, start)
+        near = graph.neighbourhood(start, 2)
+        assert near == {k: d for k, d in distances.items() if 0 < d <= 2}
+        for goal in rnd.sample(keys, 5):
+            path = graph.shortest_path(start, goal)
+            if goal not in distances:
+                assert path is None
+                continue
+            assert path[0] == start and path[-1] == goal and len(path) - 1 == distances[goal]
+            assert all(b in undirected[a] for a, b in zip(path, path[1:]))
+
+
+def test_the_graph_matches_the_records(cached, backend_name, reopen):
+    rnd = random.Random(1)
+    refs = _random_store(rnd)
+    _assert_matches(storage.link_graph())
+
+    storage.upsert_note(note(3, "Renamed", refs()))          # backlinks to "Note 3" go nowhere now
+    storage.upsert_note(note(31, "Note 33", "[[renamed]]"))  # a link that waited for its note
+    storage.delete_task(2)
+    storage.upsert_task(task(4, "Task 4", "#task-4 [[note 1]]"))
+    reopen(backend_name).apply_notes([note(5, "Note 5", "[[Note 6]] #task-1", updated_at="2025-06-02T10:00:00")], [7])
+    graph = storage.link_graph()
+    _assert_matches(graph)
+
+    # Ours are the same as a graph read from scratch.
+    fresh = LinkGraph(storage.LINKS_FILE.with_name("fresh.json"))
+    storage._link_graphs[storage.LINKS_FILE] = fresh
+    storage.link_graph()
+    for key in _brute_edges():
+        assert graph.links(key) == fresh.links(key)
+
+
+def test_only_changed_records_are_read_again(data_dir, monkeypatch):
+    _random_store(random.Random(2))
+    storage.link_graph()
+
+    read = []
+    monkeypatch.setattr(link_graph, "references", lambda text: read.append(text) or references(text))
+    monkeypatch.setattr(storage, "_link_graphs", {})
+    reopened = storage.link_graph()
+    assert read == []
+
+    storage.upsert_note(note(1, "Note 1", "[[Note 2]]"))  # within the same second as the first write
+    storage.link_graph()
+    assert read == ["[[Note 2]]"]
+    assert reopened.links(note_key(1)) == {note_key(2)}
+
+
+def test_commands(data_dir, capsys):
+    storage.save_notes([
+        note(1, "Hands", "Box them first, see [[Boxes]] and #task-1."),
+        note(2, "Boxes", "Perspective."),
+        note(3, "Alone", "Nothing here."),
+    ])
+    storage.save_tasks([task(1, "Draw hands", "Ten pages")])
+
+    link_graph.print_links("1")
+    assert capsys.readouterr().out.splitlines() == [
+        "Links from note [1] Hands:", "- task [1] (todo) Draw hands", "- note [2] Boxes",
+    ]
+    link_graph.print_links("task-1", backlinks=True)
+    assert capsys.readouterr().out.splitlines() == ["Links to task [1] (todo) Draw hands:", "- note [1] Hands"]
+    link_graph.print_links("2")
+    assert capsys.readouterr().out == "Links from note [2] Boxes: none.\n"
+
+    link_graph.print_path("2", "task-1")
+    assert capsys.readouterr().out.splitlines() == [
+        "2 link(s):", "  note [2] Boxes", "  note [1] Hands", "  task [1] (todo) Draw hands",
+    ]
+    link_graph.print_path("3", "1")
+    assert capsys.readouterr().out == "No chain of links between note [3] Alone and note [1] Hands.\n"
+
+    link_graph.print_neighbourhood("2", 1)
+    assert capsys.readouterr().out.splitlines() == ["Within 1 link(s) of note [2] Boxes:", "  1  note [1] Hands"]
+    link_graph.print_orphans()
+    assert capsys.readouterr().out.splitlines() == ["Notes with no links in or out (1):", "- [3] Alone"]
+
+    link_graph.print_links("task-9")
+    assert capsys.readouterr().out == "No task found with id 9.\n"
+    link_graph.print_links("hips")
+    assert capsys.readouterr().out.startswith("Not a note or task: 'hips'")
@@ -0,0 +1,172 @@
+# final/tests/test_locks.py
+from __future__ import annotations
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from final import locks, storage
+from final.locks import RWFileLock, lock_for
+from final.models import Note, Task
+
+WAIT = 5
+
+
+def _run(fn):
+    t = threading.Thread(target=fn, daemon=True)
+    t.start()
+    return t
+
+
+def test_readers_share_the_lock(tmp_path):
+    lock = RWFileLock(tmp_path / "x.lock")
+    both_in = threading.Barrier(2, timeout=WAIT)
+
+    def read():
+        with lock.shared():
+            both_in.wait()
+
+    threads = [_run(read), _run(read)]
+    for t in threads:
+        t.join(WAIT)
+    assert not both_in.broken
+    assert lock._fd is None
+
+
+def test_a_writer_keeps_readers_and_writers_out(tmp_path):
+    lock = RWFileLock(tmp_path / "x.lock")
+    events = []
+    holding = threading.Event()
+    release = threading.Event()
+
+    def write():
+        with lock.exclusive():
+            holding.set()
+            release.wait(WAIT)
+            events.append("writer done")
+
+    def read():
+        with lock.shared():
+            events.append("read")
+
+    def write_again():
+        with lock.exclusive():
+            events.append("write")
+
+    writer = _run(write)
+    holding.wait(WAIT)
+    others = [_run(read), _run(write_again)]
+    time.sleep(0.1)
+    assert events == []
+    release.set()
+    for t in [writer] + others:
+        t.join(WAIT)
+    assert events[0] == "writer done"
+    assert sorted(events[1:]) == ["read", "write"]
+
+
+def test_a_waiting_writer_goes_before_new_readers(tmp_path):
+    lock = RWFileLock(tmp_path / "x.lock")
+    events = []
+    reading = threading.Event()
+    release = threading.Event()
+
+    def first_reader():
+        with lock.shared():
+            reading.set()
+            release.wait(WAIT)
+
+    def writer():
+        with lock.exclusive():
+            events.append("write")
+
+    def late_reader():
+        with lock.shared():
+            events.append("read")
+
+    threads = [_run(first_reader)]
+    reading.wait(WAIT)
+    threads.append(_run(writer))
+    while not lock._writers_waiting:
+        time.sleep(0.01)
+    threads.append(_run(late_reader))
+    time.sleep(0.1)
+    release.set()
+    for t in threads:
+        t.join(WAIT)
+    assert events == ["write", "read"]
+
+
+def test_nesting_and_upgrade_in_one_thread(tmp_path):
+    lock = RWFileLock(tmp_path / "x.lock")
+    with lock.exclusive():
+        with lock.exclusive():
+            with lock.shared():
+                assert lock._mode == "ex"
+    assert lock._fd is None
+
+    with lock.shared():
+        with lock.shared():
+            assert lock._mode == "sh"
+            with lock.exclusive():
+                assert lock._mode == "ex"
+            assert lock._mode == "sh"
+    assert lock._fd is None
+
+
+@pytest.mark.skipif(locks.fcntl is None, reason="shared mode needs flock()")
+def test_the_file_lock_is_seen_by_other_processes(tmp_path):
+    import fcntl
+    import os
+
+    lock = RWFileLock(tmp_path / "x.lock")
+
+    def try_lock(mode):
+        fd = os.open(tmp_path / "x.lock", os.O_RDWR | os.O_CREAT)
+        try:
+            fcntl.flock(fd, mode | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+        finally:
+            os.close(fd)
+
+    with lock.shared():
+        assert try_lock(fcntl.LOCK_SH)
+        assert not try_lock(fcntl.LOCK_EX)
+    with lock.exclusive():
+        assert not try_lock(fcntl.LOCK_SH)
+    assert try_lock(fcntl.LOCK_EX)
+
+
+def test_one_lock_per_file(tmp_path):
+    assert lock_for(tmp_path / "notes.json") is lock_for(tmp_path / "notes.json")
+    assert lock_for(tmp_path / "notes.json") is not lock_for(tmp_path / "tasks.json")
+
+
+def _add_records(worker: int, count: int) -> None:
+    # A forked child starts with the parent's (patched) paths and settings,
+    # but opens its own backend.
+    storage._backends, storage._units = {}, {}
+    for i in range(count):
+        storage.insert_note(Note.create(0, f"w{worker}-{i}", "", []))
+        storage.insert_task(Task.create(0, f"w{worker}-{i}", ""))
+    storage.flush()
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_concurrent_inserts_get_distinct_ids(cached, backend_name, reopen):
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=_add_records, args=(w, 15)) for w in range(3)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join(60)
+    assert [p.exitcode for p in workers] == [0, 0, 0]
+
+    disk = reopen(backend_name)
+    notes, tasks = disk.load_notes(), disk.load_tasks()
+    assert sorted(n.id for n in notes) == list(range(1, 46))
+    assert sorted(t.id for t in tasks) == list(range(1, 46))
+    assert len({n.title for n in notes}) == 45
@@ -0,0 +1,93 @@
+# final/tests/test_meta_index.py
+from __future__ import annotations
+
+from final import storage
+from final.meta_index import MetaIndex
+from final.models import Note, Task, is_loaded
+from final.tests.helpers import note, task
+
+
+def _store(tmp_path, notes):
+    path = tmp_path / "notes.json"
+    storage._replace_json(path, {"notes": [n.to_dict() for n in notes]})
+    return path
+
+
+def test_lazy_records_equal_a_full_load(tmp_path):
+    notes = [note(1, "Ünïcode ✔", "line\r\nbreak ✔", ["a"]), note(2, content="x" * 1000), note(3)]
+    path = _store(tmp_path, notes)
+
+    lazy = MetaIndex(path, "notes").records()
+    assert not any(is_loaded(n) for n in lazy)
+    assert [n.title for n in lazy] == [n.title for n in notes]
+    assert not any(is_loaded(n) for n in lazy)
+    assert lazy == notes
+    assert (tmp_path / "notes.meta.json").exists()
+
+
+def test_tasks_keep_description_and_tip_cold(tmp_path):
+    tasks = [task(1, description="cold", due_date="2025-07-01"), task(2, status="done")]
+    tasks[0].tip = "a tip"
+    path = tmp_path / "tasks.json"
+    storage._replace_json(path, {"tasks": [t.to_dict() for t in tasks]})
+
+    lazy = MetaIndex(path, "tasks").records()
+    assert [(t.status, t.due_date) for t in lazy] == [("todo", "2025-07-01"), ("done", None)]
+    assert not any(is_loaded(t) for t in lazy)
+    assert [(t.description, t.tip) for t in lazy] == [("cold", "a tip"), ("", None)]
+
+
+def test_a_saved_index_is_reused(tmp_path, monkeypatch):
+    path = _store(tmp_path, [note(1), note(2)])
+    MetaIndex(path, "notes").records()
+
+    monkeypatch.setattr(MetaIndex, "_build", lambda self: (_ for _ in ()).throw(AssertionError("rebuilt")))
+    assert [n.id for n in MetaIndex(path, "notes").records()] == [1, 2]
+
+
+def test_a_changed_store_rebuilds_the_index(tmp_path):
+    path = _store(tmp_path, [note(1), note(2)])
+    index = MetaIndex(path, "notes")
+    index.records()
+    _store(tmp_path, [note(2, "Changed", "much longer content than before"), note(5)])
+
+    assert [(n.id, n.title) for n in index.records()] == [(2, "Changed"), (5, "Note 5")]
+    assert MetaIndex(path, "notes").records() == [note(2, "Changed", "much longer content than before"), note(5)]
+
+
+def test_records_taken_before_a_rewrite_still_read_their_content(tmp_path):
+    path = _store(tmp_path, [note(1, content="one"), note(2, content="two")])
+    lazy = MetaIndex(path, "notes").records()
+    _store(tmp_path, [note(0, content="new first"), note(2, content="two"), note(1, content="one")])
+
+    assert [n.content for n in lazy] == ["one", "two"]
+
+
+def test_hydrate_all_loads_in_one_pass(tmp_path):
+    path = _store(tmp_path, [note(1, content="a"), note(2, content="b")])
+    index = MetaIndex(path, "notes")
+    lazy = index.records()
+    index.hydrate_all(lazy)
+    assert all(is_loaded(n) for n in lazy)
+    assert [n.content for n in lazy] == ["a", "b"]
+
+
+def test_binary_stores_are_not_indexed(tmp_path):
+    from final.serializers import get_codec
+
+    path = tmp_path / "notes.json"
+    storage._replace_json(path, {"notes": [note(1).to_dict()]}, get_codec("binary"))
+    assert MetaIndex(path, "notes").records() is None
+
+
+def test_json_backend_loads_through_the_index(data_dir, reopen):
+    storage.save_notes([note(1, content="a"), note(2, content="b")])
+    storage.save_tasks([task(1)])
+    storage.upsert_note(note(2, content="b, edited"))
+
+    disk = reopen("json")
+    notes = disk.load_notes()
+    assert isinstance(notes[0], Note) and not is_loaded(notes[0])
+    assert [n.content for n in notes] == ["a", "b, edited"]
+    assert isinstance(disk.load_tasks()[0], Task)
+    assert [s.id for s in disk.iter_note_summaries()] == [1, 2]
@@ -0,0 +1,114 @@
+# final/tests/test_models.py
+from __future__ import annotations
+import copy
+
+import pytest
+
+from final.models import Note, NoteSummary, Task, hydrate, is_loaded, lazy_record
+from final.tests.helpers import note, task
+
+
+def test_note_dict_round_trip():
+    n = note(1, "Title", "Body ✔", ["a", "B"])
+    d = n.to_dict()
+    assert d == {
+        "id": 1, "title": "Title", "content": "Body ✔", "tags": ["a", "B"],
+        "created_at": "2025-05-01T09:00:00", "updated_at": "2025-06-01T10:00:00",
+    }
+    assert Note.from_dict(d) == n
+    assert Note.from_dict(d).to_dict() == d
+
+
+def test_task_dict_round_trip():
+    t = task(1, "Title", "Body", status="done", category="anatomy", due_date="2025-07-01",
+             completed_at="2025-06-02T10:00:00")
+    t.tip = "Use a mirror"
+    d = t.to_dict()
+    assert list(d) == [
+        "id", "title", "description", "priority", "status", "category", "due_date",
+        "created_at", "completed_at", "updated_at", "tip",
+    ]
+    assert Task.from_dict(d) == t
+    assert Task.from_dict(d).to_dict() == d
+
+
+def test_missing_fields_get_defaults():
+    n = Note.from_dict({"id": 1, "title": "Old"})
+    assert (n.content, n.tags) == ("", [])
+    assert n.created_at == n.updated_at and n.created_at
+    t = Task.from_dict({"id": 2, "title": "Old", "created_at": "c", "updated_at": "u"})
+    assert (t.description, t.priority, t.status, t.category, t.tip) == ("", "medium", "todo", None, None)
+    assert (t.created_at, t.updated_at) == ("c", "u")
+
+
+def test_records_are_slotted():
+    with pytest.raises(AttributeError):
+        note(1).colour = "red"
+    assert not hasattr(task(1), "__dict__")
+
+
+def test_equality_repr_and_hash_match_the_old_dataclasses():
+    assert note(1) == note(1)
+    assert note(1) != note(1, "Other")
+    assert note(1) != task(1)
+    assert task(1) != task(1, status="done")
+    assert repr(note(1, tags=["a"])).startswith("Note(id=1, title='Note 1', content='', tags=['a'],")
+    assert repr(task(1)).startswith("Task(id=1, title='Task 1', description='', priority='medium'")
+    with pytest.raises(TypeError):
+        hash(note(1))
+
+
+def test_create_cleans_its_input():
+    n = Note.create(5, "  Title ", " body ", ["a ", "  ", "b"])
+    assert (n.id, n.title, n.content, n.tags) == (5, "Title", "body", ["a", "b"])
+    assert n.created_at == n.updated_at
+
+    t = Task.create(6, " T ", " d ", priority="URGENT", category=" c ", due_date=" 2025-07-01 ")
+    assert (t.title, t.description, t.priority, t.category, t.due_date) == ("T", "d", "medium", "c", "2025-07-01")
+    assert (t.status, t.completed_at) == ("todo", None)
+
+
+def test_status_changes():
+    t = task(1)
+    t.mark_in_progress()
+    assert t.status == "in-progress" and t.completed_at is None
+    t.mark_done()
+    assert t.status == "done" and t.completed_at
+
+
+def test_copies_are_independent():
+    n = note(1, tags=["a"])
+    c = copy.copy(n)
+    c.title, c.tags, c.content = "Changed", ["b"], "new"
+    assert (n.title, n.tags, n.content) == ("Note 1", ["a"], "")
+
+
+def test_lazy_records_load_cold_fields_once():
+    calls = []
+    full = note(1, "Title", "cold content", ["a"]).to_dict()
+
+    def source():
+        calls.append(1)
+        return full
+
+    n = lazy_record(Note, {k: full[k] for k in ("id", "title", "tags", "created_at", "updated_at")}, source)
+    assert not is_loaded(n) and n.title == "Title" and calls == []
+    assert n.content == "cold content"
+    assert is_loaded(n) and calls == [1]
+    assert n.to_dict() == full and calls == [1]
+
+
+def test_hydrate_keeps_fields_set_on_a_lazy_record():
+    t = lazy_record(Task, {"id": 1, "title": "T", "created_at": "c", "updated_at": "u"}, lambda: None)
+    t.tip = "set before loading"
+    hydrate(t, {"id": 1, "title": "T", "description": "from disk", "tip": "old tip"})
+    assert (t.description, t.tip) == ("from disk", "set before loading")
+
+    gone = lazy_record(Task, {"id": 2, "title": "T", "created_at": "c", "updated_at": "u"}, lambda: None)
+    assert (gone.description, gone.tip) == ("", None)
+
+
+def test_note_summary_has_the_listing_fields():
+    n = note(1, tags=["a"])
+    s = NoteSummary(n.id, n.title, n.tags, n.created_at, n.updated_at)
+    assert s.tags == ["a"] and not hasattr(s, "content")
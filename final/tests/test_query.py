@@ -0,0 +1,202 @@
+# final/tests/test_query.py
+from __future__ import annotations
+import random
+from datetime import datetime
+
+import pytest
+
+from final import pkms, query, storage, task_manager
+from final.query import Clause, Predicate, TagPredicate, parse, run
+from final.tests.helpers import note, task
+
+WORDS = ["boxes", "light", "shadow", "gesture", "hands", "perspective", "colour", "value"]
+
+
+def _epoch(s):
+    return datetime.fromisoformat(s).timestamp()
+
+
+def test_parse_splits_clauses_and_text():
+    q = parse('status:todo,done -category:"Anatomy*" due<2025-12-01 gesture "line of action" http://x.org tag:a', query.TASK_FIELDS)
+    assert q.clauses == [
+        Clause("status", ":", "todo,done"),
+        Clause("category", ":", "Anatomy*", True),
+        Clause("due", "<", "2025-12-01"),
+    ]
+    assert q.words == ["gesture", "http://x.org", "tag:a"]
+    assert q.phrases == ["line of action"]
+    assert q.text == 'gesture http://x.org tag:a "line of action"'
+    assert str(q.clauses[1]) == "-category:Anatomy*"
+    assert str(Clause("category", ":", "colour theory")) == 'category:"colour theory"'
+
+
+def test_predicate_is_abstract():
+    with pytest.raises(TypeError):
+        Predicate("x")
+
+    class NoTest(Predicate):
+        def estimate(self):
+            return 0
+
+        def ids(self):
+            return set()
+
+    with pytest.raises(TypeError):
+        NoTest("x")
+
+
+@pytest.mark.parametrize("bad", ['priority<high', 'due<someday', 'updated>=whenever', 'status:""', 'tag<a'])
+def test_invalid_clauses(data_dir, bad):
+    with pytest.raises(ValueError):
+        if bad.startswith("tag"):
+            pkms.query_notes(bad)
+        else:
+            task_manager.query_tasks(bad)
+
+
+# ---------- Tasks: the planner against a brute-force filter ----------
+
+def _in_day(key, day):
+    return key is not None and _epoch(day) <= key < _epoch(day) + 86400
+
+
+CLAUSES = [
+    ("status:todo", lambda t: t.status == "todo"),
+    ("status:todo,done", lambda t: t.status in ("todo", "done")),
+    ("-status:done", lambda t: t.status != "done"),
+    ("priority:h*", lambda t: t.priority == "high"),
+    ("-priority:low", lambda t: t.priority != "low"),
+    ("category:anat*", lambda t: (t.category or "").casefold().startswith("anat")),
+    ("-category:colour", lambda t: (t.category or "").casefold() != "colour"),
+    ("due<2025-07-05", lambda t: t.due_ordinal is not None and t.due_ordinal < datetime(2025, 7, 5).toordinal()),
+    ("due>=2025-07-05", lambda t: t.due_ordinal is not None and t.due_ordinal >= datetime(2025, 7, 5).toordinal()),
+    ("due:2025-07-03", lambda t: t.due_ordinal == datetime(2025, 7, 3).toordinal()),
+    ("-due<=2025-07-03", lambda t: not (t.due_ordinal is not None and t.due_ordinal <= datetime(2025, 7, 3).toordinal())),
+    ("updated>=2025-06-03", lambda t: t.updated_epoch is not None and t.updated_epoch >= _epoch("2025-06-03")),
+    ("updated>2025-06-03", lambda t: t.updated_epoch is not None and t.updated_epoch >= _epoch("2025-06-04")),
+    ("updated:2025-06-02", lambda t: _in_day(t.updated_epoch, "2025-06-02")),
+    ("completed<2025-06-03", lambda t: t.completed_epoch is not None and t.completed_epoch < _epoch("2025-06-03")),
+    ("boxes", lambda t: "boxes" in " ".join((t.title, t.category or "", t.description)).casefold()),
+    ("sha", lambda t: "sha" in " ".join((t.title, t.category or "", t.description)).casefold()),
+    ('"light shadow"', lambda t: any("light shadow" in f.casefold() for f in (t.title, t.description))),
+]
+
+
+def _random_tasks(rnd, ids):
+    out = []
+    for i in ids:
+        status = rnd.choice(["todo", "in-progress", "done"])
+        t = task(
+            i,
+            title=" ".join(rnd.sample(WORDS, 2)),
+            description=" ".join(rnd.choices(WORDS, k=4)),
+            status=status,
+            priority=rnd.choice(["low", "medium", "high"]),
+            category=rnd.choice([None, "Anatomy", "anatomy/hips", "Colour"]),
+            due_date=rnd.choice([None, "2025-07-01", "2025-07-03", "2025-07-05", "2025-07-09T10:00"]),
+            updated_at=rnd.choice(["2025-06-01T10:00:00", "2025-06-02T23:59:59", "2025-06-03T00:00:00", "2025-06-04T12:00:00"]),
+            completed_at=rnd.choice(["2025-06-02T10:00:00", "2025-06-03T10:00:00"]) if status == "done" else None,
+        )
+        out.append(t)
+    return out
+
+
+def test_task_queries_match_a_brute_force_filter(cached, backend_name):
+    rnd = random.Random(17)
+    first = _random_tasks(rnd, range(1, 21))
+    storage.save_tasks(first)
+    storage.archive_done_tasks(0)
+    hot = _random_tasks(rnd, range(21, 81))
+    for t in hot:
+        storage.upsert_task(t)
+    storage.delete_task(21)
+    everything = first + hot[1:]
+
+    for _ in range(80):
+        chosen = rnd.sample(CLAUSES, rnd.randint(1, 3))
+        text = " ".join(c for c, _ in chosen)
+        expected = sorted(t.id for t in everything if all(f(t) for _, f in chosen))
+        tasks, steps = task_manager.query_tasks(text)
+        assert sorted(t.id for t in tasks) == expected, text
+        assert steps
+
+
+def test_task_explain_lists_each_step(data_dir, monkeypatch):
+    storage.save_tasks([task(i, status="done" if i % 2 else "todo", priority="high" if i < 4 else "low") for i in range(1, 61)])
+    _, steps = task_manager.query_tasks("priority:high status:todo")
+    assert [(s.label, s.method) for s in steps] == [
+        ("priority:high", "index"), ("status:todo", "filter"),
+    ]
+    assert [s.left for s in steps] == [3, 1]
+
+    monkeypatch.setattr(query, "FILTER_COST", 100)
+    _, steps = task_manager.query_tasks("priority:high status:todo")
+    assert [s.method for s in steps] == ["index", "index"]
+
+    _, steps = task_manager.query_tasks("-status:done")
+    assert [(s.method, s.left) for s in steps] == [("scan", 60), ("index", 30)]
+
+    # Only a clause that rules out finished tasks skips the archive.
+    _, steps = task_manager.query_tasks("priority:high")
+    assert [(s.label, s.method) for s in steps] == [("priority:high", "index"), ("archive", "scan")]
+
+
+# ---------- Notes ----------
+
+def test_note_queries_match_a_brute_force_filter(cached, backend_name):
+    rnd = random.Random(23)
+    notes = {}
+    for i in range(1, 61):
+        notes[i] = note(
+            i,
+            title=" ".join(rnd.sample(WORDS, 2)),
+            content=" ".join(rnd.choices(WORDS, k=6)),
+            tags=rnd.sample(["anatomy", "anatomy/hips", "gesture", "colour"], rnd.randint(0, 2)),
+            updated_at=rnd.choice(["2025-06-01T10:00:00", "2025-06-02T10:00:00", "2025-06-03T10:00:00"]),
+        )
+    storage.save_notes(list(notes.values()))
+    storage.upsert_note(note(5, "Replaced", "shadow only", ["colour"], updated_at="2025-06-05T10:00:00"))
+    notes[5] = storage.get_note(5)
+
+    def has_tag(n, tag):
+        return any(t == tag or t.startswith(tag + "/") for t in n.tags)
+
+    filters = [
+        ("tag:anatomy", lambda n: has_tag(n, "anatomy")),
+        ("-tag:gesture", lambda n: not has_tag(n, "gesture")),
+        ("tag:col*,gesture", lambda n: has_tag(n, "colour") or has_tag(n, "gesture")),
+        ("updated>=2025-06-02", lambda n: n.updated_epoch >= _epoch("2025-06-02")),
+        ("-updated:2025-06-03", lambda n: not _in_day(n.updated_epoch, "2025-06-03")),
+    ]
+    words = [("shadow", ["shadow"]), ("gestures boxes", ["gesture", "boxes"]), ('"light shadow"', None)]
+
+    for _ in range(60):
+        chosen = rnd.sample(filters, rnd.randint(1, 2))
+        word, terms = rnd.choice(words + [("", [])])
+        text = " ".join([c for c, _ in chosen] + [word])
+
+        def matches(n):
+            body = " ".join((n.title, " ".join(n.tags), n.content)).casefold()
+            if terms is None and "light shadow" not in n.title.casefold() and "light shadow" not in n.content.casefold():
+                return False
+            if terms and not any(t in body.split() for t in terms):
+                return False
+            return all(f(n) for _, f in chosen)
+
+        expected = sorted(i for i, n in notes.items() if matches(n))
+        hits, _ = pkms.query_notes(text, k=1000)
+        assert sorted(n.id for n, _ in hits) == expected, text
+        scores = [s for _, s in hits]
+        if word:
+            assert scores == sorted(scores, reverse=True)
+        else:
+            assert set(scores) <= {None}
+
+
+def test_tag_predicates_answer_from_the_bitmaps(data_dir):
+    storage.save_notes([note(1, tags=["a"]), note(2, tags=["a/b"]), note(3)])
+    p = TagPredicate(Clause("tag", ":", "a"), storage.note_tag_index())
+    assert (p.estimate(), p.ids()) == (2, {1, 2})
+    assert p.matches(2, lambda i: pytest.fail("fetched a record"))
+    ids, steps = run([p], lambda: {1, 2, 3}, storage.get_note)
+    assert ids == {1, 2} and steps[0].method == "index"
@@ -0,0 +1,164 @@
+# final/tests/test_related.py
+from __future__ import annotations
+import math
+import random
+from collections import Counter
+
+import pytest
+
+from final import pkms, related, storage
+from final.related import RelatedIndex
+from final.text_index import default_analyzer
+from final.tests.helpers import note, task
+
+WORDS = ["hand", "hands", "box", "light", "shadow", "gesture", "pelvis", "ribcage", "colour", "warm", "cool"]
+
+
+class Doc:
+    def __init__(self, id, text):
+        self.id = id
+        self.text = text
+
+
+def _text(doc):
+    return (doc.text,)
+
+
+def _random_docs(rnd, n):
+    return {i: Doc(i, " ".join(rnd.choices(WORDS, k=rnd.randint(1, 6)))) for i in range(1, n + 1)}
+
+
+def _index(docs, dims=0):
+    index = RelatedIndex(default_analyzer(), _text, dims)
+    for doc in docs.values():
+        index.put(doc)
+    return index
+
+
+def _brute_force(docs):
+    """Every pair's cosine of (1 + log tf) * idf vectors, from the definition."""
+    analyzer = default_analyzer()
+    bags = {i: Counter(t for _, t in analyzer.fields(_text(d))) for i, d in docs.items()}
+    n = len(bags)
+    df = Counter(t for bag in bags.values() for t in bag)
+    vectors = {}
+    for i, bag in bags.items():
+        vec = {t: (1 + math.log(tf)) * (math.log((1 + n) / (1 + df[t])) + 1) for t, tf in bag.items()}
+        norm = math.sqrt(sum(w * w for w in vec.values()))
+        vectors[i] = {t: w / norm for t, w in vec.items()}
+    return {
+        i: {j: s for j in vectors if j != i and (s := sum(w * vectors[j].get(t, 0.0) for t, w in vectors[i].items())) > 0}
+        for i in vectors
+    }
+
+
+def test_neighbours_match_the_definition():
+    docs = _random_docs(random.Random(1), 15)
+    index = _index(docs)
+    index._stale()  # fresh IDFs over all of them, as a rebuild has
+    expected = _brute_force(docs)
+    for i in docs:
+        got = index.related(i, 100)
+        assert dict(got) == pytest.approx(expected[i]), i
+        assert [s for _, s in got] == sorted((s for _, s in got), reverse=True)
+
+
+def test_small_stores_and_unknown_ids():
+    index = _index({1: Doc(1, "box light")})
+    assert index.related(1) == []
+    assert index.related(99) == []
+    assert _index({}).related(1) == []
+
+
+def test_cached_lists_follow_changes(monkeypatch):
+    """After puts and removes, every cached neighbour list is what
+    computing it again from the current vectors gives."""
+    monkeypatch.setattr(related, "NEIGHBOURS", 5)
+    monkeypatch.setattr(related, "REWEIGHT_FRACTION", 1e9)  # keep the lists cached throughout
+    rnd = random.Random(3)
+    docs = _random_docs(rnd, 40)
+    index = _index(docs)
+    for i in docs:
+        index.related(i)
+
+    for step in range(150):
+        i = rnd.randint(1, 50)
+        if rnd.random() < 0.3:
+            docs.pop(i, None)
+            index.remove(i)
+        else:
+            docs[i] = Doc(i, " ".join(rnd.choices(WORDS, k=rnd.randint(1, 6))))
+            index.put(docs[i])
+        if step % 10:
+            continue
+        for j in docs:
+            cached = index.related(j, 5)
+            fresh = sorted(index._similar(j).items(), key=lambda e: (-e[1], e[0]))[:5]
+            assert [s for _, s in cached] == pytest.approx([s for _, s in fresh]), j
+            assert all(k in docs for k, _ in cached)
+
+
+def test_reweighting_after_many_changes_matches_a_rebuild(monkeypatch):
+    monkeypatch.setattr(related, "NEIGHBOURS", 100)
+    monkeypatch.setattr(related, "REWEIGHT_FRACTION", 0)
+    rnd = random.Random(4)
+    docs = _random_docs(rnd, 30)
+    index = _index(docs)
+    monkeypatch.setattr(related, "REWEIGHT_FRACTION", 0.3)
+    for i in docs:
+        index.related(i)
+    for i in rnd.sample(sorted(docs), 10):  # the tenth is more than 0.3 of 30
+        docs[i] = Doc(i, " ".join(rnd.choices(WORDS, k=4)))
+        index.put(docs[i])
+    assert index._changes == 0
+    expected = _brute_force(docs)
+    for i in docs:
+        assert dict(index.related(i, 100)) == pytest.approx(expected[i])
+
+
+def test_the_storage_index_comes_from_the_search_postings(cached, backend_name, reopen):
+    notes = [note(i, f"Note {i}", " ".join(random.Random(i).choices(WORDS, k=5))) for i in range(1, 13)]
+    storage.save_notes(notes)
+    storage.save_tasks([task(1, "Warm light"), task(2, "Cool shadow light")])
+    from_postings = storage.related_index("notes")
+    from_records = RelatedIndex(default_analyzer(), storage._note_text)
+    for n in storage.load_notes():
+        from_records.put(n)
+    from_records._stale()
+    assert len(from_postings) == 12
+    for n in notes:
+        assert dict(from_postings.related(n.id, 100)) == pytest.approx(dict(from_records.related(n.id, 100)))
+
+    assert [i for i, _ in storage.related_index("tasks").related(1)] == [2]
+    storage.upsert_note(note(13, "Pelvis", "pelvis ribcage pelvis"))
+    reopen(backend_name).apply_notes([note(14, "Ribcage", "ribcage pelvis")], [])
+    assert [i for i, _ in storage.related_index("notes").related(13)][0] == 14
+
+
+def test_related_notes_output(data_dir, capsys):
+    notes = [note(1, "Hands", "hand box"), note(2, "Boxes", "box light"), note(3, "Colour", "warm")]
+    storage.save_notes(notes)
+    score = _brute_force({n.id: Doc(n.id, " ".join(storage._note_text(n))) for n in notes})[1][2]
+    pkms.related_notes(1)
+    assert capsys.readouterr().out.splitlines() == ["Notes related to #1 (Hands):", f"- [2] Boxes (tags: -) {score:.0%}"]
+    pkms.related_notes(3)
+    assert capsys.readouterr().out == "No notes related to #3 (Colour).\n"
+    pkms.related_notes(9)
+    assert capsys.readouterr().out == "No note found with id 9\n"
+
+
+def test_numpy_paths_agree_with_plain_python(monkeypatch):
+    np = pytest.importorskip("numpy")
+    docs = _random_docs(random.Random(6), 25)
+    with_np = _index(docs)
+    monkeypatch.setattr(related, "np", None)
+    plain = _index(docs)
+    monkeypatch.setattr(related, "np", np)
+    for i in docs:
+        assert dict(with_np.related(i, 100)) == pytest.approx(dict(plain.related(i, 100)))
+
+    lsa = _index(docs, dims=4)
+    assert lsa.dims == 4
+    for i in docs:
+        scores = [s for _, s in lsa.related(i, 100)]
+        assert all(0 < s <= 1 + 1e-5 for s in scores)
@@ -0,0 +1,75 @@
+# final/tests/test_repository.py
+from __future__ import annotations
+
+import pytest
+
+from final import storage
+from final.tests.helpers import note, task
+
+
+@pytest.fixture
+def cached_json(data_dir, monkeypatch):
+    monkeypatch.setattr(storage, "STORAGE_BACKEND", "json")
+    monkeypatch.setattr(storage, "CACHE_RECORDS", True)
+    storage.save_notes([note(1), note(2)])
+    return storage.get_backend()
+
+
+def test_reads_are_served_from_memory(cached_json):
+    first = storage.get_note(1)
+    assert storage.get_note(1) is first
+    assert any(n is first for n in storage.load_notes())
+    loads = cached_json.notes.loads
+    storage.load_notes()
+    list(storage.iter_notes())
+    assert cached_json.notes.loads == loads
+
+
+def test_another_process_writing_invalidates(cached_json, reopen):
+    storage.get_note(1)
+    other = reopen("json")
+    other.save_notes([note(1, "Changed elsewhere"), note(2), note(3)])
+
+    assert storage.get_note(1).title == "Changed elsewhere"
+    assert sorted(n.id for n in storage.load_notes()) == [1, 2, 3]
+
+
+def test_pending_changes_survive_a_reload(cached_json, reopen):
+    from final.unit_of_work import UnitOfWork
+
+    UnitOfWork(cached_json, "exit")
+    storage.upsert_note(note(1, "Mine, not flushed"))
+    reopen("json", flush=False).apply_notes([note(4)], [])  # another process adds a note
+
+    assert storage.get_note(1).title == "Mine, not flushed"
+    assert storage.get_note(4) is not None
+    storage.flush()
+    assert {n.id: n.title for n in reopen("json").load_notes()} == {1: "Mine, not flushed", 2: "Note 2", 4: "Note 4"}
+
+
+def test_flush_merges_with_another_processes_writes(cached_json, reopen):
+    from final.unit_of_work import UnitOfWork
+
+    UnitOfWork(cached_json, "exit")
+    storage.upsert_note(note(5))
+    reopen("json", flush=False).apply_notes([note(6)], [])
+    storage.flush()
+
+    assert sorted(n.id for n in reopen("json").load_notes()) == [1, 2, 5, 6]
+
+
+def test_date_queries_match_the_uncached_backend(cached_json, reopen):
+    tasks = [
+        task(1, due_date="2025-07-01", updated_at="2025-06-01T10:00:00"),
+        task(2, due_date="2025-07-15T09:00", updated_at="2025-06-03T10:00:00"),
+        task(3, due_date="not a date"),
+        task(4, due_date="2025-08-01", updated_at="2025-06-02T10:00:00"),
+    ]
+    storage.save_tasks(tasks)
+    storage.upsert_task(task(5, due_date="2025-07-10", updated_at="2025-06-04T10:00:00"))
+    raw = reopen("json")
+
+    for start, end in [(None, None), ("2025-07-01", "2025-07-15"), ("2025-07-02", None)]:
+        assert [t.id for t in storage.tasks_due_between(start, end)] == [t.id for t in raw.tasks_due_between(start, end)]
+    since = tasks[3].updated_epoch
+    assert [t.id for t in storage.tasks_updated_since(since)] == [t.id for t in raw.tasks_updated_since(since)]
@@ -0,0 +1,96 @@
+# final/tests/test_search.py
+from __future__ import annotations
+
+import pytest
+
+from final import search, storage
+from final.storage import note_key, split_key, task_key
+from final.text_index import InvertedIndex, default_analyzer
+from final.tests.helpers import note, task
+
+
+def _fill():
+    storage.save_notes([
+        note(1, "Drawing hips", "The pelvis is a bucket; hips tilt.", ["anatomy"]),
+        note(2, "Gesture", "Hips lead the gesture.", ["gesture"]),
+        note(3, "Colour", "Warm light, cool shadows."),
+    ])
+    storage.save_tasks([
+        task(1, "Hips study", "Ten pages of hips from life", category="anatomy"),
+        task(2, "Buy paint", "cadmium red"),
+    ])
+
+
+def _rebuilt(query):
+    docs = [(note_key(n.id), storage._note_text(n), 1) for n in storage.load_notes()]
+    docs += [(task_key(t.id), storage._task_text(t), 1) for t in storage.load_tasks()]
+    return dict(InvertedIndex.build(docs, default_analyzer()).search(query, 100))
+
+
+def test_keys_keep_notes_and_tasks_apart():
+    assert {note_key(7), task_key(7)} == {14, 15}
+    assert split_key(note_key(7)) == ("notes", 7)
+    assert split_key(task_key(7)) == ("tasks", 7)
+    assert split_key(task_key(0)) == ("tasks", 0)
+
+
+def test_notes_and_tasks_are_ranked_together(cached, backend_name):
+    _fill()
+    results, more = search.search_all("hips")
+    assert not more
+    assert {(kind, r.id) for kind, r, _ in results} == {("notes", 1), ("notes", 2), ("tasks", 1)}
+    scores = [s for _, _, s in results]
+    assert scores == sorted(scores, reverse=True)
+
+    expected = _rebuilt("hips")
+    got = {(note_key if kind == "notes" else task_key)(r.id): s for kind, r, s in results}
+    assert got == pytest.approx(expected)
+
+
+def test_pages(data_dir):
+    storage.save_notes([note(i, f"Box {i}", "box " * (i % 4 + 1)) for i in range(1, 8)])
+    storage.save_tasks([task(i, f"Box {i}") for i in range(1, 4)])
+    everything, _ = search.search_all("box", size=100)
+    assert len(everything) == 10
+
+    pages, page, more = [], 1, True
+    while more:
+        results, more = search.search_all("box", page, size=3)
+        pages.append(results)
+        page += 1
+    assert [len(p) for p in pages] == [3, 3, 3, 1]
+    assert [(k, r.id) for p in pages for k, r, _ in p] == [(k, r.id) for k, r, _ in everything]
+    assert search.search_all("box", 5, size=3) == ([], False)
+
+
+def test_the_index_follows_edits_of_either_kind(cached, backend_name, reopen):
+    _fill()
+    search.search_all("hips")
+    storage.upsert_task(task(2, "Hips again", "buy paint, draw hips", updated_at="2025-06-02T10:00:00"))
+    storage.delete_note(2)
+    storage.insert_note(note(0, "Hip bones", "hips and more hips"))
+    reopen(backend_name).apply_tasks([], [1])
+
+    for query in ("hips", "paint", "gesture", "shadows"):
+        results, _ = search.search_all(query, size=100)
+        got = {(note_key if kind == "notes" else task_key)(r.id): s for kind, r, s in results}
+        assert got == pytest.approx(_rebuilt(query), rel=0.05), query
+    assert storage.search_index_handle().rebuilding is False
+
+
+def test_print_search(data_dir, capsys, monkeypatch):
+    monkeypatch.setattr("final.config.SEARCH_PAGE_SIZE", 2)
+    _fill()
+    search.print_search("hips")
+    out = capsys.readouterr().out
+    assert out.startswith("Notes and tasks matching 'hips' (page 1):")
+    assert out.count("\n") == 4 and "More: search hips --page 2" in out
+    assert [line[:6] for line in out.splitlines()[1:3]] == ["   1. ", "   2. "]
+
+    search.print_search("hips", 2)
+    out = capsys.readouterr().out
+    assert "   3. " in out and "More:" not in out
+    search.print_search("zebra")
+    assert capsys.readouterr().out == "Nothing matched 'zebra'.\n"
+    search.print_search("hips", 9)
+    assert capsys.readouterr().out == "No page 9 for 'hips'.\n"
@@ -0,0 +1,80 @@
+# final/tests/test_serializers.py
+from __future__ import annotations
+
+import pytest
+
+from final import storage
+from final.serializers import CODECS, convert, detect_codec, get_codec, load_file
+from final.tests.helpers import note, task
+
+DATA = {
+    "notes": [
+        {"id": 1, "title": "Ünïcode ✔", "tags": ["a", "a", "b"], "deleted": None},
+        {"id": -7, "big": 2 ** 62, "neg": -(2 ** 40), "f": 0.1, "z": 0, "ok": True, "no": False},
+        {"id": 3, "content": "x" * 500, "empty": "", "list": [], "map": {}, "nested": [[1, {"k": "v"}]]},
+    ],
+    "version": 2,
+}
+
+
+@pytest.mark.parametrize("name", list(CODECS))
+def test_every_codec_round_trips(name):
+    codec = get_codec(name)
+    raw = codec.dumps(DATA)
+    assert isinstance(raw, bytes)
+    assert codec.loads(raw) == DATA
+    assert detect_codec(raw).loads(raw) == DATA
+
+
+def test_codec_names_are_case_insensitive_and_checked():
+    assert get_codec("BINARY") is CODECS["binary"]
+    with pytest.raises(ValueError):
+        get_codec("yaml")
+
+
+def test_binary_strings_repeat_by_reference():
+    codec = get_codec("binary")
+    one = len(codec.dumps({"tasks": [{"status": "in-progress"}]}))
+    many = len(codec.dumps({"tasks": [{"status": "in-progress"}] * 100}))
+    assert many - one < 99 * len("in-progress")
+    assert len(codec.dumps(DATA)) < len(get_codec("json-compact").dumps(DATA))
+
+
+def test_binary_rejects_other_input():
+    with pytest.raises(ValueError):
+        get_codec("binary").loads(b'{"notes": []}')
+    with pytest.raises(ValueError):
+        get_codec("binary").loads(b"AGB1" + get_codec("binary").dumps(DATA)[4:])
+    with pytest.raises(TypeError):
+        get_codec("binary").dumps({"when": object()})
+
+
+def test_convert_between_codecs(tmp_path):
+    src, dst = tmp_path / "notes.json", tmp_path / "notes.bin"
+    src.write_bytes(get_codec("json-pretty").dumps(DATA))
+
+    assert convert(src, dst, "binary") == dst.stat().st_size
+    assert load_file(dst) == DATA
+    convert(dst, src, "json-compact")
+    assert load_file(src) == DATA
+
+
+@pytest.mark.parametrize("backend", ["json", "journal"])
+@pytest.mark.parametrize("name", list(CODECS))
+def test_stores_round_trip_in_every_codec(data_dir, reopen, monkeypatch, backend, name):
+    monkeypatch.setattr(storage, "NOTES_CODEC", name)
+    monkeypatch.setattr(storage, "TASKS_CODEC", name)
+    monkeypatch.setattr(storage, "STORAGE_BACKEND", backend)
+    notes = [note(1, "Ünïcode ✔", "body", ["a"]), note(2)]
+    tasks = [task(1, due_date="2025-07-01"), task(2, status="done")]
+    storage.save_notes(notes)
+    storage.save_tasks(tasks)
+    storage.upsert_note(note(3))
+    if backend == "journal":
+        storage.get_backend().notes.compact()
+
+    disk = reopen(backend)
+    assert [n.to_dict() for n in disk.load_notes()] == [n.to_dict() for n in notes + [note(3)]]
+    assert [n.id for n in disk.iter_notes()] == [1, 2, 3]
+    assert [t.to_dict() for t in disk.iter_tasks()] == [t.to_dict() for t in tasks]
+    assert storage.NOTES_FILE.read_bytes().startswith(b"AGB2") == (name == "binary")
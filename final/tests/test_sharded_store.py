@@ -0,0 +1,91 @@
+# final/tests/test_sharded_store.py
+from __future__ import annotations
+import copy
+
+import pytest
+
+from final import sharded_store, storage
+from final.sharded_store import ShardedBackend, content_hash
+from final.tests.helpers import note
+
+
+@pytest.fixture
+def sharded(data_dir, monkeypatch):
+    monkeypatch.setattr(storage, "STORAGE_BACKEND", "sharded")
+    backend = storage.get_backend()
+    written = []
+    replace = sharded_store._replace_text
+    monkeypatch.setattr(sharded_store, "_replace_text", lambda path, text: (written.append(path.name), replace(path, text)))
+    backend.written = written
+    return backend
+
+
+def test_layout_is_a_manifest_plus_one_file_per_note(sharded):
+    sharded.save_notes([note(1, "One", "first"), note(2, "Two", "second ✔", ["x"])])
+
+    assert sorted(p.name for p in storage.NOTES_DIR.glob("*.txt")) == ["1.txt", "2.txt"]
+    assert storage.NOTES_MANIFEST.exists()
+    assert (storage.NOTES_DIR / "2.txt").read_text(encoding="utf-8") == "second ✔"
+    entry = storage._load_json(storage.NOTES_MANIFEST)["notes"][1]
+    assert entry["sha1"] == content_hash("second ✔")
+    assert entry["size"] == len("second ✔".encode("utf-8"))
+    assert "content" not in entry
+
+
+def test_only_changed_content_is_rewritten(sharded):
+    sharded.save_notes([note(1, content="a"), note(2, content="b")])
+    sharded.written.clear()
+
+    sharded.apply_notes([note(1, "Retitled", content="a"), note(2, content="b, edited")], [])
+    assert sharded.written == ["2.txt"]
+    assert [n.title for n in sharded.load_notes()] == ["Retitled", "Note 2"]
+
+
+def test_listing_does_not_open_content_files(sharded, monkeypatch):
+    sharded.save_notes([note(1, content="a"), note(2, content="b")])
+    opened = []
+    monkeypatch.setattr(ShardedBackend, "_read_content", lambda self, e: opened.append(e["id"]) or "")
+
+    notes = sharded.load_notes()
+    assert [s.title for s in sharded.iter_note_summaries()] == ["Note 1", "Note 2"]
+    assert [n.title for n in notes] == ["Note 1", "Note 2"]
+    assert opened == []
+    notes[1].content
+    assert opened == [2]
+
+
+def test_editing_an_unread_note_keeps_its_content(sharded):
+    sharded.save_notes([note(1, content="kept")])
+    edited = copy.copy(sharded.get_note(1))
+    edited.title = "New title"
+    sharded.written.clear()
+
+    sharded.apply_notes([edited], [])
+    assert sharded.written == []
+    assert sharded.get_note(1).content == "kept"
+
+
+def test_edited_content_is_not_masked_by_the_old_shard(sharded):
+    sharded.save_notes([note(1, content="old")])
+    edited = copy.copy(sharded.get_note(1))
+    edited.content = "new"
+
+    sharded.apply_notes([edited], [])
+    assert sharded.get_note(1).content == "new"
+
+
+def test_deletes_remove_the_shard(sharded):
+    sharded.save_notes([note(1), note(2), note(3)])
+    sharded.apply_notes([], [2])
+    sharded.save_notes([sharded.get_note(1)])
+
+    assert sorted(p.name for p in storage.NOTES_DIR.glob("*.txt")) == ["1.txt"]
+    assert [n.id for n in sharded.load_notes()] == [1]
+
+
+def test_migration_from_json(data_dir, reopen):
+    storage.get_backend("json").save_notes([note(1, content="a"), note(2, content="b", tags=["t"])])
+
+    assert sharded_store.migrate_from_json(reopen("sharded")) == 2
+    notes = reopen("sharded").load_notes()
+    assert [(n.id, n.content, n.tags) for n in notes] == [(1, "a", []), (2, "b", ["t"])]
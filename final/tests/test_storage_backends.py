@@ -0,0 +1,112 @@
+# final/tests/test_storage_backends.py
+from __future__ import annotations
+
+from final import storage
+from final.tests.helpers import note, task
+
+
+def _notes():
+    return [
+        note(1, "Drawing legs", "Knees are boxes.\nAnkles taper.", ["anatomy", "gesture"]),
+        note(2, "Ünïcode ✔", "Ribcage — egg shape, «quotes»", ["anatomy/ribs"]),
+        note(3, "Empty", "", []),
+    ]
+
+
+def _tasks():
+    return [
+        task(1, "Study hands", "50 gestures", priority="high", category="anatomy", due_date="2025-07-01"),
+        task(2, "Perspective", "two-point boxes", status="in-progress"),
+        task(3, "Old one", "done long ago", status="done", completed_at="2025-05-02T10:00:00"),
+    ]
+
+
+def _dicts(records):
+    return sorted((r.to_dict() for r in records), key=lambda d: d["id"])
+
+
+def test_upserts_round_trip(cached, backend_name, reopen):
+    for n in _notes():
+        storage.upsert_note(n)
+    for t in _tasks():
+        storage.upsert_task(t)
+
+    disk = reopen(backend_name)
+    assert _dicts(disk.load_notes()) == _dicts(_notes())
+    assert _dicts(disk.load_tasks()) == _dicts(_tasks())
+    assert _dicts(storage.load_notes()) == _dicts(_notes())
+
+
+def test_save_replaces_the_whole_store(cached, backend_name, reopen):
+    storage.save_notes(_notes())
+    storage.save_tasks(_tasks())
+    storage.save_notes(_notes()[:1])
+    storage.save_tasks(_tasks()[1:])
+
+    disk = reopen(backend_name)
+    assert [n.id for n in disk.load_notes()] == [1]
+    assert sorted(t.id for t in disk.load_tasks()) == [2, 3]
+
+
+def test_next_ids():
+    assert storage.next_note_id([]) == 1
+    assert storage.next_note_id(_notes()) == 4
+
+
+def test_get_and_delete(cached, backend_name, reopen):
+    storage.save_notes(_notes())
+    storage.save_tasks(_tasks())
+
+    assert storage.get_note(2).title == "Ünïcode ✔"
+    assert storage.get_note(99) is None
+    assert storage.delete_note(2) is True
+    assert storage.delete_note(2) is False
+    assert storage.delete_task(1) is True
+    assert storage.get_task(1) is None
+
+    disk = reopen(backend_name)
+    assert sorted(n.id for n in disk.load_notes()) == [1, 3]
+    assert sorted(t.id for t in disk.load_tasks()) == [2, 3]
+
+
+def test_streams_and_lookups_agree_with_load(cached, backend_name):
+    storage.save_notes(_notes())
+    storage.save_tasks(_tasks())
+
+    assert _dicts(storage.iter_notes()) == _dicts(_notes())
+    assert _dicts(storage.iter_tasks()) == _dicts(_tasks())
+    assert sorted(s.id for s in storage.iter_note_summaries()) == [1, 2, 3]
+    assert sorted(n.id for n in storage.notes_with_tag("ANATOMY")) == [1]
+    assert [t.id for t in storage.tasks_with_status("in-progress")] == [2]
+
+
+def test_sqlite_migration_copies_the_json_store(data_dir, reopen):
+    from final.sqlite_store import migrate_from_json
+
+    json_backend = storage.get_backend("json")
+    json_backend.save_notes(_notes())
+    json_backend.save_tasks(_tasks())
+
+    assert migrate_from_json(reopen("sqlite")) == (3, 3)
+    disk = reopen("sqlite")
+    assert _dicts(disk.load_notes()) == _dicts(_notes())
+    assert _dicts(disk.load_tasks()) == _dicts(_tasks())
+
+
+def test_sqlite_waits_for_the_switch_to_wal(tmp_path):
+    import sqlite3
+    import threading
+
+    from final.sqlite_store import SQLiteBackend
+
+    # Another process still writing the new file in rollback mode, as one
+    # creating the schema would be: the switch fails at once until it is done.
+    other = sqlite3.connect(tmp_path / "x.db", check_same_thread=False)
+    other.execute("CREATE TABLE t (x)")
+    other.execute("INSERT INTO t VALUES (1)")
+    threading.Timer(0.2, other.rollback).start()
+
+    backend = SQLiteBackend(tmp_path / "x.db")
+    assert backend.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    backend.close()
+    other.close()
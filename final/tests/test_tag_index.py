@@ -0,0 +1,137 @@
+# final/tests/test_tag_index.py
+from __future__ import annotations
+import random
+
+import pytest
+
+from final import storage
+from final.tag_index import TagIndex
+from final.tests.helpers import note
+
+TAGS = ["anatomy", "anatomy/hips", "anatomy/hands", "gesture", "colour", "colour theory", "AND"]
+
+
+def _index():
+    return TagIndex.build([
+        note(1, tags=["anatomy", "gesture"]),
+        note(2, tags=["anatomy/hips"]),
+        note(3, tags=["Gesture", "colour"]),
+        note(4, tags=["colour theory"]),
+        note(5, tags=[]),
+        note(6, tags=["AND", " anatomy/hands "]),
+    ])
+
+
+@pytest.mark.parametrize("expr, ids", [
+    ("anatomy", [1, 2, 6]),
+    ("ANATOMY/", [1, 2, 6]),
+    ("anatomy/hips", [2]),
+    ("anatomy AND gesture", [1]),
+    ("anatomy OR colour", [1, 2, 3, 6]),
+    ("NOT anatomy", [3, 4, 5]),
+    ("anatomy NOT gesture", [2, 6]),
+    ("gesture OR anatomy AND NOT anatomy/hips", [1, 3, 6]),
+    ("(gesture OR anatomy) AND NOT anatomy/hips", [1, 3, 6]),
+    ("gesture OR (anatomy AND colour)", [1, 3]),
+    ("NOT NOT gesture", [1, 3]),
+    ("colour theory", [4]),
+    ('"AND"', [6]),
+    ("missing OR gesture", [1, 3]),
+])
+def test_queries(expr, ids):
+    assert _index().query(expr) == ids
+
+
+@pytest.mark.parametrize("expr", ["", "AND", "anatomy AND", "(anatomy", "anatomy)", "anatomy OR OR gesture", "()"])
+def test_malformed_expressions(expr):
+    with pytest.raises(ValueError):
+        _index().query(expr)
+
+
+def test_globs_and_counts():
+    index = _index()
+    assert index.ids(index.matching("anat*")) == [1, 2, 6]
+    assert index.ids(index.matching("colour*")) == [3, 4]
+    assert index.ids(index.matching("gesture")) == [1, 3]
+    assert index.counts() == [
+        ("anatomy", 1, 3), ("anatomy/hands", 1, 1), ("anatomy/hips", 1, 1), ("and", 1, 1),
+        ("colour", 1, 1), ("colour theory", 1, 1), ("gesture", 2, 2),
+    ]
+
+
+def test_slots_are_reused_and_ids_can_be_anything():
+    index = TagIndex()
+    for i in (-5, 10 ** 12, 3):
+        index.put(note(i, tags=["a"]))
+    assert index.query("a") == [-5, 3, 10 ** 12]
+    index.remove(10 ** 12)
+    index.put(note(-7, tags=["a", "b"]))
+    assert index.all_bits.bit_length() == 3
+    assert index.query("a") == [-7, -5, 3]
+    assert index.has(index.bits("b"), -7) and not index.has(index.bits("b"), -5)
+    assert not index.has(index.bits("a"), 10 ** 12)
+
+
+class _Expr:
+    """A random tag expression, rendered for the parser and evaluated on sets."""
+
+    def __init__(self, rnd, depth=0):
+        kind = rnd.choice(["tag", "tag", "not", "and", "or"] if depth < 3 else ["tag"])
+        self.kind = kind
+        if kind == "tag":
+            self.tag = rnd.choice(TAGS[:-1])
+        elif kind == "not":
+            self.a = _Expr(rnd, depth + 1)
+        else:
+            self.a, self.b = _Expr(rnd, depth + 1), _Expr(rnd, depth + 1)
+
+    def text(self):
+        if self.kind == "tag":
+            return f'"{self.tag}"'
+        if self.kind == "not":
+            return f"NOT ({self.a.text()})"
+        return f"({self.a.text()}) {self.kind.upper()} ({self.b.text()})"
+
+    def eval(self, notes):
+        if self.kind == "tag":
+            t = self.tag.casefold()
+            return {n.id for n in notes if any(x.casefold() == t or x.casefold().startswith(t + "/") for x in n.tags)}
+        if self.kind == "not":
+            return {n.id for n in notes} - self.a.eval(notes)
+        a, b = self.a.eval(notes), self.b.eval(notes)
+        return a & b if self.kind == "and" else a | b
+
+
+def test_incremental_updates_match_a_rebuild_and_brute_force():
+    rnd = random.Random(11)
+    index, notes = TagIndex(), {}
+    for step in range(400):
+        note_id = rnd.randint(-20, 60)
+        if rnd.random() < 0.3:
+            index.remove(note_id)
+            notes.pop(note_id, None)
+        else:
+            n = note(note_id, tags=rnd.sample(TAGS[:-1], rnd.randint(0, 3)))
+            index.put(n)
+            notes[note_id] = n
+        if step % 50 == 0:
+            rebuilt = TagIndex.build(notes.values())
+            for _ in range(20):
+                expr = _Expr(rnd)
+                expected = sorted(expr.eval(notes.values()))
+                assert index.query(expr.text()) == expected
+                assert rebuilt.query(expr.text()) == expected
+            assert index.counts() == rebuilt.counts()
+    assert len(index) == len(notes)
+
+
+def test_the_live_index_follows_storage(cached, backend_name, reopen):
+    storage.save_notes([note(1, tags=["a"]), note(2, tags=["a/b"])])
+    assert storage.note_tag_index().query("a") == [1, 2]
+
+    storage.upsert_note(note(3, tags=["a"]))
+    storage.delete_note(1)
+    assert storage.note_tag_index().query("a") == [2, 3]
+
+    reopen(backend_name).apply_notes([note(4, tags=["a/c"])], [2])
+    assert storage.note_tag_index().query("a") == [3, 4]
@@ -0,0 +1,170 @@
+# final/tests/test_task_table.py
+from __future__ import annotations
+import random
+import statistics
+from datetime import datetime, timedelta
+
+import pytest
+
+from final import storage, task_table
+from final.task_table import TaskTable, compute_stats, load_table
+from final.tests.helpers import task
+
+NOW = datetime(2025, 6, 18, 12, 0)
+
+
+def _tasks(n=200, seed=3):
+    rnd = random.Random(seed)
+    out = []
+    for i in range(1, n + 1):
+        created = NOW - timedelta(days=rnd.uniform(0, 80))
+        status = rnd.choice(["todo", "in-progress", "done", "done"])
+        completed = None
+        if status == "done" and rnd.random() < 0.9:
+            completed = (created + timedelta(days=rnd.uniform(0, 20))).isoformat(timespec="seconds")
+        t = task(i, status=status, priority=rnd.choice(["low", "medium", "high"]),
+                 category=rnd.choice([None, "anatomy", "colour"]), completed_at=completed)
+        t.created_at = "garbage" if i % 37 == 0 else created.isoformat(timespec="seconds")
+        out.append(t)
+    return out
+
+
+def _brute_force(tasks, weeks=8):
+    done = [t for t in tasks if t.status == "done"]
+    open_ = [t for t in tasks if t.status != "done"]
+    durations = [t.completed_epoch - t.created_epoch for t in done
+                 if t.completed_epoch is not None and t.created_epoch is not None]
+
+    def by(field):
+        counts = {}
+        for t in open_:
+            key = getattr(t, field) or "-"
+            counts[key] = counts.get(key, 0) + 1
+        return sorted(counts.items(), key=lambda r: (-r[1], r[0]))
+
+    monday = datetime.combine(NOW.date() - timedelta(days=NOW.weekday()), datetime.min.time())
+    created = [t.created_epoch for t in tasks if t.created_epoch is not None]
+    completed = [t.completed_epoch for t in done if t.completed_epoch is not None]
+    rows = []
+    for w in range(weeks):
+        start = monday - timedelta(weeks=weeks - 1 - w)
+        lo, hi = start.timestamp(), (start + timedelta(weeks=1)).timestamp()
+        rows.append({
+            "week": start.date().isoformat(),
+            "created": sum(lo <= x < hi for x in created),
+            "completed": sum(lo <= x < hi for x in completed),
+            "backlog": sum(x < hi for x in created) - sum(x < hi for x in completed),
+        })
+    return {
+        "total": len(tasks), "done": len(done), "open": len(open_),
+        "completion_rate": len(done) / len(tasks),
+        "median_days_to_done": statistics.median(durations) / 86400,
+        "open_by_category": by("category"), "open_by_priority": by("priority"),
+        "weeks": rows,
+    }
+
+
+def test_stats_match_a_brute_force_count(monkeypatch):
+    monkeypatch.setattr(task_table, "np", None)
+    tasks = _tasks()
+    assert compute_stats(TaskTable.build(tasks), now=NOW) == pytest.approx(_brute_force(tasks))
+
+
+def test_numpy_and_array_columns_agree(monkeypatch):
+    pytest.importorskip("numpy")
+    tasks = _tasks()
+    with_numpy = compute_stats(TaskTable.build(tasks), now=NOW)
+    monkeypatch.setattr(task_table, "np", None)
+    assert with_numpy == pytest.approx(compute_stats(TaskTable.build(tasks), now=NOW))
+
+
+def test_empty_table():
+    stats = compute_stats(TaskTable.build([]), weeks=2, now=NOW)
+    assert (stats["total"], stats["completion_rate"], stats["median_days_to_done"]) == (0, None, None)
+    assert [w["backlog"] for w in stats["weeks"]] == [0, 0]
+
+
+def test_saved_table_is_reused_until_the_store_changes(tmp_path):
+    store, path = tmp_path / "tasks.json", tmp_path / "tasks.table"
+    store.write_text("v1")
+    tasks = _tasks(20)
+    table = load_table(path, [store], tasks)
+
+    reread = load_table(path, [store], iter(()))
+    assert len(reread) == 20 and reread.strings == table.strings
+    assert compute_stats(reread, now=NOW) == compute_stats(table, now=NOW)
+
+    store.write_text("v2, longer")
+    assert len(load_table(path, [store], tasks[:5])) == 5
+    assert TaskTable.from_bytes(b"junk", None) is None
+
+
+def test_stats_include_archived_tasks(data_dir):
+    storage.save_tasks([task(1), task(2, status="done", completed_at="2025-05-02T10:00:00")])
+    storage.archive_done_tasks(0)
+    storage.upsert_task(task(3, category="colour"))
+
+    table = storage.task_table()
+    assert len(table) == 3
+    stats = compute_stats(table, now=NOW)
+    assert (stats["done"], stats["open"]) == (1, 2)
+    assert stats["open_by_category"] == [("-", 1), ("colour", 1)]
+
+
+def test_put_and_remove_match_a_fresh_build():
+    rnd = random.Random(4)
+    tasks = {t.id: t for t in _tasks(60)}
+    table = TaskTable.build(tasks.values())
+    for t in _tasks(90, seed=5)[::3]:
+        if rnd.random() < 0.4 and tasks:
+            task_id = rnd.choice(sorted(tasks))
+            del tasks[task_id]
+            table.remove(task_id)
+        else:
+            t.category = rnd.choice([t.category, "perspective"])
+            tasks[t.id] = t
+            table.put(t)
+    table.remove(999)
+
+    assert sorted(table.columns["id"]) == sorted(tasks)
+    assert compute_stats(table, now=NOW) == pytest.approx(compute_stats(TaskTable.build(tasks.values()), now=NOW))
+
+
+def test_own_edits_patch_the_table_in_place(backend_name, reopen, monkeypatch):
+    monkeypatch.setattr(storage, "CACHE_RECORDS", True)
+    all_tasks, built = storage._all_tasks, []
+
+    def counted():
+        built.append(1)
+        yield from all_tasks()
+
+    monkeypatch.setattr(storage, "_all_tasks", counted)
+
+    def assert_current():
+        expected = compute_stats(TaskTable.build(all_tasks()), now=NOW)
+        assert compute_stats(storage.task_table(), now=NOW) == pytest.approx(expected)
+
+    storage.save_tasks(_tasks(40))
+    assert_current()
+    assert built == [1]
+
+    done = storage.get_task(1)
+    done.status, done.completed_at = "done", "2025-06-17T09:00:00"
+    storage.upsert_task(done)
+    storage.insert_task(task(0, category="perspective"))
+    storage.delete_task(2)
+    assert_current()
+    storage.archive_done_tasks(0)
+    storage.delete_task(3)
+    assert_current()
+    assert built == [1]
+
+    # Another process starts from the saved, patched table.
+    monkeypatch.setattr(storage, "_task_tables", {})
+    assert_current()
+    assert built == [1]
+
+    # A change from elsewhere builds it again.
+    reopen(backend_name).apply_tasks([task(4, status="done", completed_at="2025-06-10T10:00:00")], [5])
+    assert_current()
+    assert built == [1, 1]
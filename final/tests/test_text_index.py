@@ -0,0 +1,131 @@
+# final/tests/test_text_index.py
+from __future__ import annotations
+import math
+
+import pytest
+
+from final.text_index import B, K1, Analyzer, InvertedIndex, parse_query
+
+DOCS = {
+    1: ("Drawing hands", "anatomy", "Hands are hard. Draw the hand as a box first, then the fingers."),
+    2: ("Gesture drawing", "gesture", "Quick gesture drawings: thirty seconds each, focus on the line of action."),
+    3: ("Colour theory", "colour", "Warm light, cool shadows. The box in the light."),
+    4: ("Perspective boxes", "perspective", "Draw a hundred boxes in two-point perspective."),
+    5: ("Ribcage", "anatomy", "The ribcage is an egg; the pelvis is a bucket."),
+    6: ("Empty", "", ""),
+}
+
+
+def _analyzer():
+    return Analyzer(stem=True, stopwords=True)
+
+
+def _build(docs=DOCS):
+    return InvertedIndex.build(((i, f, 1) for i, f in docs.items()), _analyzer())
+
+
+def _brute_force(query, docs=DOCS):
+    """BM25 straight from its definition."""
+    analyzer = _analyzer()
+    terms, _ = parse_query(query, analyzer)
+    tokens = {i: [t for _, t in analyzer.fields(f)] for i, f in docs.items()}
+    avgdl = sum(map(len, tokens.values())) / len(tokens)
+    scores = {}
+    for i, toks in tokens.items():
+        score = 0.0
+        for term in set(terms):
+            df = sum(term in t for t in tokens.values())
+            tf = toks.count(term)
+            if tf:
+                idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+                score += terms.count(term) * idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * len(toks) / avgdl))
+        if score > 0:
+            scores[i] = score
+    return scores
+
+
+def test_analyzer_stems_and_drops_stopwords():
+    a = _analyzer()
+    assert [t for _, t in a.tokens("The drawings of hands")] == ["draw", "hand"]
+    assert [p for p, _ in a.tokens("The drawings of hands")] == [1, 3]
+    assert [t for _, t in Analyzer(stem=False, stopwords=False).tokens("The Drawings")] == ["the", "drawings"]
+    assert a.name != Analyzer(stem=False).name
+
+
+def test_parse_query_splits_terms_and_phrases():
+    terms, phrases = parse_query('hands "line of action" box', _analyzer())
+    assert terms == ["hand", "line", "action", "box"]
+    assert [[t for _, t in p] for p in phrases] == [["line", "action"]]
+    assert [p for p, _ in phrases[0]] == [0, 2]
+
+
+@pytest.mark.parametrize("query", ["hand", "draw box", "box box light", "anatomy ribcage", "zebra", "the"])
+def test_scores_match_the_bm25_formula(query):
+    expected = _brute_force(query)
+    results = _build().search(query, k=10)
+    assert dict(results) == pytest.approx(expected)
+    assert [s for _, s in results] == sorted((s for _, s in results), reverse=True)
+
+
+def test_top_k_is_exact():
+    docs = {i: (f"doc {i}", "", "common " * (i % 5 + 1) + ("rare" if i % 7 == 0 else "")) for i in range(1, 200)}
+    expected = _brute_force("common rare", docs)
+    best = sorted(expected.items(), key=lambda e: (-e[1], e[0]))[:5]
+    results = _build(docs).search("common rare", k=5)
+    assert [s for _, s in results] == pytest.approx([s for _, s in best])
+
+
+def test_phrases_must_match_word_for_word():
+    index = _build()
+    assert [d for d, _ in index.search('"line of action"')] == [2]
+    assert index.search('"action line"') == []
+    # Fields are kept apart: a title's last word and the content's first don't make a phrase.
+    assert index.search('"hands hands"') == []
+    assert [d for d, _ in index.search('"draw the hand"')] == [1]
+
+
+def test_among_restricts_the_candidates():
+    index = _build()
+    assert [d for d, _ in index.search("box", among={3, 5})] == [3]
+
+
+def test_saved_segment_round_trips():
+    index = _build()
+    loaded, stamp = InvertedIndex.from_bytes(index.to_bytes([[1, 2]]), _analyzer())
+    assert stamp == [[1, 2]]
+    assert loaded.segment == index.segment
+    for query in ("hand", "draw box", '"line of action"'):
+        assert loaded.search(query) == index.search(query)
+    assert InvertedIndex.from_bytes(index.to_bytes(None), Analyzer(stem=False)) is None
+    assert InvertedIndex.from_bytes(b"junk", _analyzer()) is None
+
+
+def test_changes_match_a_rebuild():
+    index = _build()
+    changed = dict(DOCS)
+    changed[2] = ("Gesture", "gesture", "Boxes and more boxes, then a hand.")
+    changed[7] = ("New note", "light", "Light on a box.")
+    del changed[5]
+    index.add(2, changed[2], 2)
+    index.add(7, changed[7], 1)
+    index.remove(5)
+    index.remove(99)
+
+    assert len(index) == len(changed)
+    assert index.pending == 3
+    for query in ("box", "hand light", "ribcage", '"more boxes"'):
+        assert dict(index.search(query)) == pytest.approx(dict(_build(changed).search(query)), rel=0.05)
+
+
+def test_delta_state_replays_onto_the_segment():
+    index = _build()
+    index.add(2, ("Gesture", "", "only boxes now"), 2)
+    index.remove(3)
+    raw, state = index.to_bytes(None), index.delta_state()
+
+    loaded, _ = InvertedIndex.from_bytes(raw, _analyzer())
+    assert loaded.load_delta_state(state)
+    assert loaded.search("box") == index.search("box")
+    assert loaded.versions == index.versions
+    other, _ = InvertedIndex.from_bytes(_build().to_bytes(None), _analyzer())
+    assert not other.load_delta_state(state)
@@ -0,0 +1,105 @@
+# final/tests/test_trigram_index.py
+from __future__ import annotations
+import random
+
+import pytest
+
+from final import pkms, storage
+from final.text_index import (
+    InvertedIndex, TrigramAnalyzer, edit_distance, fuzzy_docs, max_typos, similar_docs, substring_docs,
+)
+from final.tests.helpers import note
+
+DOCS = {
+    1: ("Foreshortening", "anatomy", "Foreshortened arms point at the viewer."),
+    2: ("Perspective", "", "Two-point   perspective\nboxes"),
+    3: ("Ab", "", "x"),
+    4: ("Colour", "colour", "Complementary colours vibrate."),
+}
+
+
+def _build(docs=DOCS):
+    return InvertedIndex.build(((i, f, 1) for i, f in docs.items()), TrigramAnalyzer())
+
+
+def _brute_substring(docs, text):
+    # Fields shorter than a trigram aren't indexed at all.
+    needle = TrigramAnalyzer.normalize(text)
+    fields = {i: [TrigramAnalyzer.normalize(f) for f in fs] for i, fs in docs.items()}
+    return {i for i, fs in fields.items() if any(len(f) >= 3 and needle in f for f in fs)}
+
+
+@pytest.mark.parametrize("text", ["foreshort", "SHORTEN", "point pers", "point  perspective", "colours vib", "ab", "ol", "x", "zzz"])
+def test_substrings_match_a_scan(text):
+    assert substring_docs(_build(), text) == _brute_substring(DOCS, text)
+
+
+def test_substrings_never_span_fields():
+    assert substring_docs(_build(), "foreshorteninganatomy") == set()
+    assert substring_docs(_build(), "ening anat") == set()
+
+
+def test_edit_distance():
+    assert edit_distance("perspective", "perspective") == 0
+    assert edit_distance("perspecitve", "perspective") == 1   # one swap
+    assert edit_distance("colour", "color") == 1
+    assert edit_distance("kitten", "sitting") == 3
+    assert edit_distance("kitten", "sitting", limit=1) == 2
+    assert edit_distance("a", "abcdef", limit=2) == 3
+    assert [max_typos(w) for w in ("ab", "hands", "gesture")] == [0, 1, 2]
+
+
+def test_similar_and_fuzzy_docs():
+    index = _build()
+    assert similar_docs(index, "perspecitve")[0][0] == 2
+
+    def text_of(doc_id):
+        return " ".join(DOCS[doc_id])
+
+    assert fuzzy_docs(index, "perspecitve boxs", text_of) == [(2, 2, ["perspective", "boxes"])]
+    assert fuzzy_docs(index, "foreshortning", text_of)[0][:2] == (1, 1)
+    assert fuzzy_docs(index, "xylophone", text_of) == []
+
+
+def test_incremental_updates_match_a_rebuild():
+    rnd = random.Random(5)
+    words = ["box", "boxes", "light", "shadow", "gesture", "foreshortening", "hand", "hands"]
+    docs = dict(DOCS)
+    index = _build()
+    for step in range(200):
+        doc_id = rnd.randint(1, 30)
+        if rnd.random() < 0.3:
+            docs.pop(doc_id, None)
+            index.remove(doc_id)
+        else:
+            docs[doc_id] = (rnd.choice(words), "", " ".join(rnd.choices(words, k=5)))
+            index.add(doc_id, docs[doc_id], step)
+        if step % 40 == 0:
+            rebuilt = _build(docs)
+            for text in ("box", "hands", "es ges", "ow li", "foreshortening"):
+                assert substring_docs(index, text) == substring_docs(rebuilt, text) == _brute_substring(docs, text)
+
+
+def test_search_notes_falls_back_to_fragments_and_typos(data_dir):
+    storage.save_notes([
+        note(1, "Foreshortening", "Arms toward the viewer."),
+        note(2, "Perspective", "Two-point perspective boxes."),
+    ])
+    notes, header = pkms._fragment_or_typo_notes("foreshort", None)
+    assert [n.id for n in notes] == [1] and "containing" in header
+
+    storage.upsert_note(note(3, "More perspective", "boxes again"))
+    notes, header = pkms._fragment_or_typo_notes("perspecitve", None)
+    assert sorted(n.id for n in notes) == [2, 3]
+    assert header.endswith("Did you mean 'perspective'?")
+    assert pkms._fragment_or_typo_notes("xylophone", None) == ([], "")
+
+
+def test_task_trigram_index_follows_storage(cached, backend_name, reopen):
+    from final.tests.helpers import task
+
+    storage.save_tasks([task(1, "Foreshortening drills"), task(2, "Boxes")])
+    assert substring_docs(storage.task_trigram_index(), "shorten") == {1}
+    storage.upsert_task(task(3, "Shortened poses", updated_at="2025-06-02T10:00:00"))
+    reopen(backend_name).apply_tasks([], [1])
+    assert substring_docs(storage.task_trigram_index(), "shorten") == {3}
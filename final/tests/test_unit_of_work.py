@@ -0,0 +1,103 @@
+# final/tests/test_unit_of_work.py
+from __future__ import annotations
+import time
+
+import pytest
+
+from final import storage
+from final.unit_of_work import UnitOfWork
+from final.tests.helpers import note, task
+
+
+@pytest.fixture
+def cached_backend(data_dir, monkeypatch):
+    monkeypatch.setattr(storage, "STORAGE_BACKEND", "json")
+    monkeypatch.setattr(storage, "CACHE_RECORDS", True)
+    backend = storage.get_backend()
+    writes = []
+    save = backend.backend.save_notes
+    monkeypatch.setattr(backend.backend, "save_notes", lambda notes: (writes.append(len(notes)), save(notes)))
+    backend.writes = writes
+    return backend
+
+
+def _use(backend, policy, idle=2.0):
+    storage._units[backend.name] = UnitOfWork(backend, policy, idle)
+    return storage._units[backend.name]
+
+
+def _on_disk(reopen):
+    return sorted(n.id for n in reopen("json", flush=False).load_notes())
+
+
+def test_immediate_writes_every_change(cached_backend, reopen):
+    _use(cached_backend, "immediate")
+    storage.upsert_note(note(1))
+    storage.upsert_note(note(2))
+    assert cached_backend.writes == [1, 2]
+    assert _on_disk(reopen) == [1, 2]
+
+
+def test_command_policy_writes_when_the_command_ends(cached_backend, reopen):
+    _use(cached_backend, "command")
+    storage.upsert_note(note(1))
+    storage.upsert_note(note(2))
+    assert _on_disk(reopen) == []
+    storage.command_finished()
+    assert cached_backend.writes == [2]
+    assert _on_disk(reopen) == [1, 2]
+
+
+def test_exit_policy_waits_for_flush(cached_backend, reopen):
+    _use(cached_backend, "exit")
+    storage.upsert_note(note(1))
+    storage.command_finished()
+    assert _on_disk(reopen) == []
+    storage.flush()
+    assert _on_disk(reopen) == [1]
+
+
+def test_idle_policy_writes_after_a_pause(cached_backend, reopen):
+    _use(cached_backend, "idle", idle=0.05)
+    storage.upsert_note(note(1))
+    storage.upsert_note(note(2))
+    deadline = time.monotonic() + 5
+    while not cached_backend.writes and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cached_backend.writes == [2]
+    assert _on_disk(reopen) == [1, 2]
+
+
+def test_a_unit_of_work_batches_its_block(cached_backend, reopen):
+    unit = _use(cached_backend, "immediate")
+    with unit:
+        for i in range(1, 51):
+            storage.upsert_note(note(i))
+        storage.delete_note(50)
+        assert cached_backend.writes == []
+    assert cached_backend.writes == [49]
+    assert _on_disk(reopen) == list(range(1, 50))
+
+
+def test_unknown_policy(cached_backend):
+    with pytest.raises(ValueError):
+        UnitOfWork(cached_backend, "sometimes")
+
+
+def test_edits_change_a_copy_of_the_cached_record(cached_backend, monkeypatch, capsys):
+    from final import pkms, task_manager
+
+    _use(cached_backend, "exit")
+    storage.upsert_note(note(1, "Before", "old content", ["a"]))
+    storage.upsert_task(task(1))
+    cached_note, cached_task = storage.get_note(1), storage.get_task(1)
+
+    answers = iter(["After", "new content", "b"])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+    pkms.edit_note(1)
+    task_manager.mark_task_done(1)
+
+    assert (cached_note.title, cached_note.content, cached_note.tags) == ("Before", "old content", ["a"])
+    assert cached_task.status == "todo"
+    assert (storage.get_note(1).title, storage.get_note(1).tags) == ("After", ["b"])
+    assert storage.get_task(1).status == "done"
@@ -0,0 +1,71 @@
+# final/tests/test_vocab.py
+from __future__ import annotations
+import threading
+
+from final import storage
+from final.models import Note, Task
+from final.tests.helpers import note, task
+from final.vocab import VOCAB, Vocabulary
+
+
+def test_codes_are_assigned_once():
+    v = Vocabulary()
+    a = v.code("todo")
+    assert v.code("todo") == a
+    assert v.code("done") != a
+    assert v.strings[a] == "todo"
+    assert v.find("todo") == a
+    assert v.find("never seen") is None
+
+
+def test_folded_codes_match_case_insensitively():
+    v = Vocabulary()
+    upper, lower = v.code("Anatomy"), v.code("anatomy")
+    assert upper != lower
+    assert v.folded[upper] == v.folded[lower] == lower
+    assert v.find_folded("ANATOMY") == lower
+    assert v.find_folded("Figure") is None
+    assert v.strings == ["anatomy", "Anatomy"]
+
+
+def test_concurrent_code_assignment():
+    v = Vocabulary()
+    words = [f"tag{i % 50}" for i in range(2000)]
+    results = {}
+
+    def assign(n):
+        results[n] = [v.code(w) for w in words]
+
+    threads = [threading.Thread(target=assign, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(v) == 50
+    assert all(r == results[0] for r in results.values())
+    assert [v.strings[c] for c in results[0]] == words
+
+
+def test_records_share_one_code_per_string():
+    a, b = task(1, status="in-progress", category="Figure"), task(2, status="in-progress", category="Figure")
+    assert a.status_code == b.status_code == VOCAB.find("in-progress")
+    assert a.category_code == b.category_code
+    assert a.status is b.status
+    assert task(3).category_code is None
+
+    n = note(1, tags=["Gesture", "gesture"])
+    assert n.tags == ["Gesture", "gesture"]
+    assert n.has_tag("GESTURE") and not n.has_tag("pose")
+
+
+def test_stores_keep_the_strings(data_dir, reopen):
+    storage.save_notes([note(1, tags=["Gesture"])])
+    storage.save_tasks([task(1, status="in-progress", priority="high", category="Figure")])
+
+    raw = storage._load_json(storage.TASKS_FILE)["tasks"][0]
+    assert (raw["status"], raw["priority"], raw["category"]) == ("in-progress", "high", "Figure")
+    assert storage._load_json(storage.NOTES_FILE)["notes"][0]["tags"] == ["Gesture"]
+    assert [t.id for t in reopen("json").tasks_with_status("In-Progress ")] == [1]
+    assert [n.id for n in reopen("json").notes_with_tag(" gesture")] == [1]
+    assert Note.from_dict(note(1).to_dict()).tags == []
+    assert Task.from_dict(task(1).to_dict()).priority == "medium"
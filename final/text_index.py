@@ -0,0 +1,919 @@
+# final/text_index.py
+from __future__ import annotations
+import heapq
+import json
+import math
+import operator
+import re
+import sys
+import threading
+import uuid
+import zlib
+from array import array
+from collections import Counter
+from itertools import accumulate, chain
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .repository import file_stamp
+from .serializers import get_codec
+from .storage import _load_json, _replace_bytes, _replace_json
+
+try:  # optional: a real Snowball stemmer; the suffix stripper below works without it
+    import snowballstemmer
+except ImportError:
+    snowballstemmer = None
+
+MAGIC = b"AGIX3\n"
+
+# Positions jump by this much between fields (title, tags, content), so a
+# phrase never matches across a field boundary.
+FIELD_GAP = 1 << 16
+
+# BM25 parameters (the usual defaults).
+K1 = 1.2
+B = 0.75
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or "
+    "that the this to was were will with".split()
+)
+
+_WORD = re.compile(r"\w+")
+_QUERY = re.compile(r'"([^"]*)"|(\S+)')
+_MISSING = object()
+
+
+# ---------- Analysis ----------
+
+def _strip_suffix(word: str) -> str:
+    """A small English suffix stripper: plurals first, then -ing/-ed/-ly, so
+    `drawings`, `drawing` and `drawed` all become `draw`."""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        word = word[:-3] + "y"
+    elif word.endswith(("sses", "ches", "shes", "xes", "zes")):
+        word = word[:-2]
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    for suffix in ("ingly", "edly", "ing", "ed", "ly"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[: -len(suffix)]
+    return word
+
+
+class Analyzer:
+    """Text -> [(position, term)]: \\w+ words, casefolded, optionally
+    without stopwords and stemmed. Stopwords keep their positions, so a
+    phrase with one in the middle still lines up."""
+
+    def __init__(self, stem: bool = True, stopwords: bool = True):
+        self.stopwords = STOPWORDS if stopwords else frozenset()
+        self._stem: Optional[Callable[[str], str]] = None
+        stemmer = "none"
+        if stem and snowballstemmer is not None:
+            self._stem = snowballstemmer.stemmer("english").stemWord
+            stemmer = "snowball"
+        elif stem:
+            self._stem = _strip_suffix
+            stemmer = "suffix"
+        # Saved with the index: terms built by one analyzer mean nothing to another.
+        self.name = f"stem={stemmer},stop={int(bool(self.stopwords))}"
+        self._cache: Dict[str, Optional[str]] = {}
+
+    def term(self, word: str) -> Optional[str]:
+        """The indexed form of `word`, or None for a stopword."""
+        try:
+            return self._cache[word]
+        except KeyError:
+            pass
+        t = word.casefold()
+        if t in self.stopwords:
+            t = None
+        elif self._stem is not None:
+            t = self._stem(t)
+        if len(self._cache) < 200_000:
+            self._cache[word] = t
+        return t
+
+    def tokens(self, text: str, start: int = 0) -> List[Tuple[int, str]]:
+        cache, term = self._cache, self.term
+        out = []
+        for pos, word in enumerate(_WORD.findall(text), start):
+            t = cache.get(word, _MISSING)
+            if t is _MISSING:
+                t = term(word)
+            if t is not None:
+                out.append((pos, t))
+        return out
+
+    def fields(self, fields: Sequence[str]) -> List[Tuple[int, str]]:
+        out = []
+        for i, text in enumerate(fields):
+            if text:
+                out.extend(self.tokens(text, i * FIELD_GAP))
+        return out
+
+
+def default_analyzer() -> Analyzer:
+    from .config import SEARCH_STEMMING, SEARCH_STOPWORDS
+
+    return Analyzer(SEARCH_STEMMING, SEARCH_STOPWORDS)
+
+
+def parse_query(query: str, analyzer: Analyzer) -> Tuple[List[str], List[List[Tuple[int, str]]]]:
+    """(terms, phrases) of a query: bare words are ranked with BM25,
+    "quoted phrases" must appear word for word (and rank like their words)."""
+    terms: List[str] = []
+    phrases: List[List[Tuple[int, str]]] = []
+    for m in _QUERY.finditer(query):
+        phrase, word = m.groups()
+        tokens = analyzer.tokens(phrase if phrase is not None else word)
+        terms.extend(t for _, t in tokens)
+        if phrase is not None and len(tokens) > 1:
+            phrases.append(tokens)
+    return terms, phrases
+
+
+class TrigramAnalyzer:
+    """Text -> [(char offset, trigram)] of the casefolded text with runs of
+    whitespace squeezed to one space.
+
+    Indexed with positions, a substring query is the phrase of its own
+    trigrams at consecutive offsets, so InvertedIndex.phrase_docs answers
+    it exactly without reading any record.
+    """
+
+    name = "trigram"
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.casefold().split())
+
+    def tokens(self, text: str, start: int = 0) -> List[Tuple[int, str]]:
+        text = self.normalize(text)
+        return [(start + i, text[i:i + 3]) for i in range(len(text) - 2)]
+
+    def fields(self, fields: Sequence[str]) -> List[Tuple[int, str]]:
+        out = []
+        for i, text in enumerate(fields):
+            if text:
+                out.extend(self.tokens(text, i * FIELD_GAP))
+        return out
+
+
+# ---------- Index ----------
+
+class Postings:
+    """One term's postings: doc ids, term frequency per doc, and
+    the positions of every occurrence (doc after doc, ascending within one)."""
+
+    __slots__ = ("docs", "tfs", "positions", "_starts", "_tf_of")
+
+    def __init__(self, docs: array, tfs: array, positions: array):
+        self.docs = docs
+        self.tfs = tfs
+        self.positions = positions
+        self._starts: Optional[Dict[int, Tuple[int, int]]] = None
+        self._tf_of: Optional[Dict[int, int]] = None
+
+    def tf_of(self) -> Dict[int, int]:
+        if self._tf_of is None:
+            self._tf_of = dict(zip(self.docs, self.tfs))
+        return self._tf_of
+
+    def positions_of(self, doc_id: int) -> Sequence[int]:
+        if self._starts is None:
+            self._starts = dict(zip(self.docs, zip(accumulate(self.tfs, initial=0), self.tfs)))
+        entry = self._starts.get(doc_id)
+        if entry is None:
+            return ()
+        start, tf = entry
+        return self.positions[start:start + tf]
+
+
+class _MergedPostings(Postings):
+    """A saved term's postings minus tombstoned documents, plus the
+    documents added or changed since the segment was written."""
+
+    __slots__ = ("_base", "_delta")
+
+    def __init__(self, base: Optional[Postings], delta: Dict[int, List[int]], tombstones: Set[int]):
+        docs, tfs = array("I"), array("I")
+        if base is not None:
+            for d, tf in zip(base.docs, base.tfs):
+                if d not in tombstones:
+                    docs.append(d)
+                    tfs.append(tf)
+        for d, positions in delta.items():
+            docs.append(d)
+            tfs.append(len(positions))
+        super().__init__(docs, tfs, array("I"))
+        self._base = base
+        self._delta = delta
+
+    def positions_of(self, doc_id: int) -> Sequence[int]:
+        positions = self._delta.get(doc_id)
+        if positions is not None:
+            return positions
+        return self._base.positions_of(doc_id) if self._base is not None else ()
+
+
+class InvertedIndex:
+    """Term -> postings over a set of documents, ranked with BM25.
+
+    A document is an id, a few text fields (for notes: title, tags,
+    content) and a version number that changes whenever the record does.
+    The index is a saved segment plus changes made since:
+
+        MAGIC
+        {"segment": ..., "stamp": ..., "analyzer": ..., "docs": n,
+         "terms": {term: [offset, size, df, npos]}}
+        doc ids, doc lengths, doc versions (n each, little-endian uint32)
+        per term, `size` bytes at `offset`: zlib of doc id gaps (df),
+        term frequencies (df) and position gaps (npos), little-endian int32
+
+    Gaps keep the numbers small, so a term costs a byte or two per
+    posting instead of four. Only the header is parsed on load; a term's
+    postings are decoded from the blob the first time a query asks for it,
+    so a query touches its own terms and nothing else.
+
+    add()/remove() never touch the segment: a changed or deleted document
+    gets a tombstone there, and its new postings go to an in-memory delta
+    that queries merge in. delta_state() is what needs saving to keep them;
+    the tombstones are merged away when the segment is next rebuilt.
+    """
+
+    def __init__(
+        self,
+        analyzer: Analyzer,
+        doc_lengths: Dict[int, int],
+        versions: Dict[int, int],
+        terms: Dict[str, List[int]],
+        blob: bytes,
+        segment: Optional[str] = None,
+    ):
+        self.analyzer = analyzer
+        self.segment = segment or uuid.uuid4().hex
+        self.doc_lengths = doc_lengths    # live documents only
+        self.versions = versions
+        self._terms = terms
+        self._blob = memoryview(blob)
+        self._base_docs = frozenset(doc_lengths)
+        self._total = sum(doc_lengths.values())
+        self._decoded: Dict[str, Postings] = {}
+        self._merged: Dict[str, Postings] = {}
+        self._norms: Optional[Dict[int, float]] = None
+        self._norms_avgdl = 0.0
+        # Changes since the segment was written.
+        self.tombstones: Set[int] = set()
+        self._delta: Dict[str, Dict[int, List[int]]] = {}
+        self._delta_docs: Dict[int, Tuple[List[str], List[str]]] = {}   # id -> (terms, fields)
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    @property
+    def avgdl(self) -> float:
+        return self._total / len(self.doc_lengths) if self.doc_lengths else 0.0
+
+    @property
+    def pending(self) -> int:
+        """Documents changed or deleted since the segment was written."""
+        return len(self.tombstones | self._delta_docs.keys())
+
+    # ---------- Building ----------
+
+    @classmethod
+    def build(cls, docs: Iterable[Tuple[int, Sequence[str], int]], analyzer: Analyzer) -> "InvertedIndex":
+        postings: Dict[str, Tuple[array, array, array]] = {}
+        doc_lengths: Dict[int, int] = {}
+        versions: Dict[int, int] = {}
+        for doc_id, fields, version in docs:
+            tokens = analyzer.fields(fields)
+            doc_lengths[doc_id] = len(tokens)
+            versions[doc_id] = version
+            for t, positions in _group(tokens).items():
+                p = postings.get(t)
+                if p is None:
+                    p = postings[t] = (array("I"), array("I"), array("I"))
+                p[0].append(doc_id)
+                p[1].append(len(positions))
+                p[2].extend(positions)
+
+        n = len(doc_lengths)
+        parts = [
+            _le(array("I", doc_lengths.keys())),
+            _le(array("I", doc_lengths.values())),
+            _le(array("I", (versions[d] for d in doc_lengths))),
+        ]
+        blocks = [p.tobytes() for p in parts]
+        offset = 12 * n
+        terms: Dict[str, List[int]] = {}
+        for t, (d, tf, pos) in postings.items():
+            block = _pack(d, tf, pos)
+            terms[t] = [offset, len(block), len(d), len(pos)]
+            blocks.append(block)
+            offset += len(block)
+        return cls(analyzer, doc_lengths, versions, terms, b"".join(blocks))
+
+    # ---------- Changes ----------
+
+    def add(self, doc_id: int, fields: Sequence[str], version: int) -> None:
+        """Index a new document, or the new text of a changed one."""
+        with self._lock:
+            self._drop(doc_id)
+            tokens = self.analyzer.fields(fields)
+            by_term = _group(tokens)
+            for t, positions in by_term.items():
+                self._delta.setdefault(t, {})[doc_id] = positions
+            self._delta_docs[doc_id] = (list(by_term), list(fields))
+            self.doc_lengths[doc_id] = len(tokens)
+            self.versions[doc_id] = version
+            self._total += len(tokens)
+            self._changed()
+
+    def remove(self, doc_id: int) -> None:
+        with self._lock:
+            self._drop(doc_id)
+            self._changed()
+
+    def _drop(self, doc_id: int) -> None:
+        if doc_id in self._base_docs:
+            self.tombstones.add(doc_id)
+        entry = self._delta_docs.pop(doc_id, None)
+        if entry is not None:
+            for t in entry[0]:
+                postings = self._delta[t]
+                del postings[doc_id]
+                if not postings:
+                    del self._delta[t]
+        self._total -= self.doc_lengths.pop(doc_id, 0)
+        self.versions.pop(doc_id, None)
+        if self._norms is not None:
+            self._norms.pop(doc_id, None)
+
+    def _changed(self) -> None:
+        self._merged.clear()
+        if self._norms is not None and abs(self.avgdl - self._norms_avgdl) > 0.02 * self._norms_avgdl:
+            self._norms = None  # the average length drifted: renormalize everything on the next query
+
+    # ---------- Persistence ----------
+
+    def to_bytes(self, stamp) -> bytes:
+        """The segment. Changes since it was written are saved by delta_state()."""
+        header = {
+            "segment": self.segment, "stamp": stamp, "analyzer": self.analyzer.name,
+            "docs": len(self._base_docs), "terms": self._terms,
+        }
+        return b"".join((MAGIC, json.dumps(header, ensure_ascii=False).encode("utf-8"), b"\n", self._blob))
+
+    @classmethod
+    def from_bytes(cls, raw: bytes, analyzer: Analyzer) -> Optional[Tuple["InvertedIndex", object]]:
+        """(index, stamp it was saved with), or None if it was built by
+        another analyzer or is unreadable."""
+        if not raw.startswith(MAGIC):
+            return None
+        end = raw.find(b"\n", len(MAGIC))
+        try:
+            header = json.loads(raw[len(MAGIC):end])
+        except ValueError:
+            return None
+        if header.get("analyzer") != analyzer.name:
+            return None
+        blob = raw[end + 1:]
+        n = header["docs"]
+        ids, lengths, versions = _read(blob, 0, n), _read(blob, n, n), _read(blob, 2 * n, n)
+        if len(versions) != n:
+            return None
+        index = cls(analyzer, dict(zip(ids, lengths)), dict(zip(ids, versions)), header["terms"], blob, header["segment"])
+        return index, header["stamp"]
+
+    def delta_state(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "segment": self.segment,
+                "tombstones": sorted(self.tombstones),
+                "docs": [[d, self.versions[d], fields] for d, (_, fields) in self._delta_docs.items()],
+            }
+
+    def load_delta_state(self, state: Dict[str, object]) -> bool:
+        """Replay a saved delta_state(); False if it belongs to another segment."""
+        if state.get("segment") != self.segment:
+            return False
+        for doc_id in state["tombstones"]:
+            self.remove(doc_id)
+        for doc_id, version, fields in state["docs"]:
+            self.add(doc_id, fields, version)
+        return True
+
+    # ---------- Queries ----------
+
+    def terms(self) -> Set[str]:
+        """Every term with postings (a saved term may have only tombstoned ones)."""
+        with self._lock:
+            return set(self._terms) | set(self._delta)
+
+    def _saved_postings(self, term: str) -> Optional[Postings]:
+        p = self._decoded.get(term)
+        if p is not None:
+            return p
+        entry = self._terms.get(term)
+        if entry is None:
+            return None
+        offset, size, df, npos = entry
+        p = Postings(*_unpack(self._blob[offset:offset + size], df, npos))
+        self._decoded[term] = p
+        return p
+
+    def postings(self, term: str) -> Optional[Postings]:
+        p = self._merged.get(term)
+        if p is not None:
+            return p
+        with self._lock:
+            saved = self._saved_postings(term)
+            delta = self._delta.get(term)
+            if delta or (saved is not None and self.tombstones):
+                p = _MergedPostings(saved, dict(delta or {}), self.tombstones)
+            else:
+                p = saved
+            if p is not None:
+                self._merged[term] = p
+            return p
+
+    def _doc_norms(self) -> Dict[int, float]:
+        """K1 * (1 - B + B * dl / avgdl) per document, the BM25 length normalization."""
+        with self._lock:
+            norms = self._norms
+            if norms is None:
+                avgdl = self._norms_avgdl = self.avgdl or 1.0
+                norms = self._norms = {d: K1 * (1 - B + B * dl / avgdl) for d, dl in self.doc_lengths.items()}
+            elif len(norms) != len(self.doc_lengths):
+                avgdl = self._norms_avgdl
+                for d, dl in self.doc_lengths.items():
+                    if d not in norms:
+                        norms[d] = K1 * (1 - B + B * dl / avgdl)
+            return norms
+
+    def doc_freq(self, term: str) -> int:
+        """About how many documents contain `term`, without decoding its
+        postings: the saved count plus changed documents (a tombstoned one
+        still counts)."""
+        with self._lock:
+            entry = self._terms.get(term)
+            return (entry[2] if entry else 0) + len(self._delta.get(term, ()))
+
+    def search(self, query: str, k: int = 20, among: Optional[Set[int]] = None) -> List[Tuple[int, float]]:
+        """The top `k` (doc id, BM25 score) pairs for `query`, best first,
+        optionally only from the documents `among`."""
+        terms, phrases = parse_query(query, self.analyzer)
+        if not terms:
+            return []
+        allowed = among
+        for phrase in phrases:
+            matched = self.phrase_docs(phrase)
+            allowed = matched if allowed is None else allowed & matched
+            if not allowed:
+                return []
+        scores = self._bm25(terms, k, allowed)
+        # a document `among` the allowed ones may have none of the terms
+        return [(d, scores[d]) for d in heapq.nlargest(k, scores, key=scores.get) if scores[d] > 0]
+
+    def _bm25(self, terms: List[str], k: int, allowed: Optional[set] = None) -> Dict[int, float]:
+        """BM25 scores, exact for every document that can make the top `k`.
+
+        Terms go from the largest possible contribution (rarest) down. Once
+        what the remaining terms could add together can't lift a document
+        with no score yet past the k-th best, they only re-score the
+        documents already found (MaxScore) - so a common word next to a
+        rare one costs a dict lookup per candidate, not a pass over its
+        postings.
+        """
+        n = len(self)
+        norms = self._doc_norms()
+        plan = []
+        for term in set(terms):
+            p = self.postings(term)
+            if p is not None:
+                df = len(p.docs)
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                # tf / (tf + norm) < 1, so `weight` bounds what the term can add
+                plan.append((idf * (K1 + 1) * terms.count(term), p))
+        plan.sort(key=lambda e: e[0], reverse=True)
+
+        remaining = sum(weight for weight, _ in plan)
+        # With a phrase the candidates are known up front: every term only
+        # scores those.
+        scores: Dict[int, float] = dict.fromkeys(allowed, 0.0) if allowed is not None else {}
+        get = scores.get
+        for weight, p in plan:
+            if allowed is not None or (len(scores) >= k and remaining < heapq.nlargest(k, scores.values())[-1]):
+                tf_of = p.tf_of()
+                for d, score in scores.items():
+                    tf = tf_of.get(d)
+                    if tf:
+                        scores[d] = score + weight * tf / (tf + norms[d])
+            else:
+                for d, tf in zip(p.docs, p.tfs):
+                    scores[d] = get(d, 0.0) + weight * tf / (tf + norms[d])
+            remaining -= weight
+        return scores
+
+    def phrase_docs(self, phrase: List[Tuple[int, str]]) -> Set[int]:
+        """Ids of documents containing the phrase's terms at the phrase's relative positions."""
+        base = phrase[0][0]
+        plist = []
+        for pos, term in phrase:
+            p = self.postings(term)
+            if p is None:
+                return set()
+            plist.append((pos - base, p))
+        plist.sort(key=lambda e: len(e[1].docs))  # intersect from the rarest term
+        docs = set(plist[0][1].docs)
+        if len(plist) == 1:
+            return docs
+        for _, p in plist[1:]:
+            tf_of = p.tf_of()
+            docs = {d for d in docs if d in tf_of}
+            if not docs:
+                return docs
+        matched = set()
+        for d in docs:
+            (off0, p0), rest = plist[0], plist[1:]
+            others = [(off, set(p.positions_of(d))) for off, p in rest]
+            for start in p0.positions_of(d):
+                origin = start - off0
+                if all(origin + off in positions for off, positions in others):
+                    matched.add(d)
+                    break
+        return matched
+
+
+def _le(a: array) -> array:
+    """The saved format is little-endian; byteswap is its own inverse."""
+    if sys.byteorder == "big":
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a
+
+
+def _read(blob, offset: int, count: int) -> array:
+    a = array("I")
+    a.frombytes(blob[offset * 4:(offset + count) * 4])
+    return _le(a)
+
+
+def _gaps(a: array) -> array:
+    return array("i", map(operator.sub, a, chain((0,), a)))
+
+
+def _pack(docs: array, tfs: array, positions: array) -> bytes:
+    """One term's postings as saved: see InvertedIndex."""
+    return zlib.compress(b"".join(_le(a).tobytes() for a in (_gaps(docs), array("i", tfs), _gaps(positions))), 1)
+
+
+def _unpack(block, df: int, npos: int) -> Tuple[array, array, array]:
+    a = array("i")
+    a.frombytes(zlib.decompress(block))
+    a = _le(a)
+    if len(a) != 2 * df + npos:
+        raise ValueError("corrupt postings")
+    return array("I", accumulate(a[:df])), array("I", a[df:2 * df]), array("I", accumulate(a[2 * df:]))
+
+
+def _group(tokens: List[Tuple[int, str]]) -> Dict[str, List[int]]:
+    by_term: Dict[str, List[int]] = {}
+    for pos, t in tokens:
+        by_term.setdefault(t, []).append(pos)
+    return by_term
+
+
+def record_version(*parts: object) -> int:
+    """A 32-bit fingerprint of the fields that identify a record's revision."""
+    return zlib.crc32("\x1f".join(map(str, parts)).encode("utf-8"))
+
+
+# ---------- Substrings and typos (trigram indexes) ----------
+
+def substring_docs(index: InvertedIndex, text: str) -> Set[int]:
+    """Documents of a TrigramAnalyzer index that contain `text` (casefolded,
+    whitespace squeezed). One or two characters are looked up through the
+    trigrams that contain them, so a field shorter than three characters
+    can't match those."""
+    analyzer = index.analyzer
+    needle = analyzer.normalize(text)
+    if len(needle) >= 3:
+        return index.phrase_docs(analyzer.tokens(needle))
+    docs: Set[int] = set()
+    if needle:
+        for term in index.terms():
+            if needle in term:
+                p = index.postings(term)
+                if p is not None:
+                    docs.update(p.docs)
+    return docs
+
+
+def similar_docs(index: InvertedIndex, text: str, limit: int = 50, min_share: float = 0.5) -> List[Tuple[int, float]]:
+    """The documents sharing most of `text`'s trigrams, as (id, share of
+    them found), best first - candidates for a typo-tolerant match."""
+    grams = {t for _, t in index.analyzer.tokens(text)}
+    if not grams:
+        return []
+    counts: Counter = Counter()
+    for g in grams:
+        p = index.postings(g)
+        if p is not None:
+            counts.update(p.docs)
+    need = math.ceil(min_share * len(grams))
+    return [(d, c / len(grams)) for d, c in counts.most_common(limit) if c >= need]
+
+
+def edit_distance(a: str, b: str, limit: Optional[int] = None) -> int:
+    """Levenshtein distance counting a swap of two neighbours as one edit
+    (optimal string alignment). Gives up with `limit + 1` once the
+    distance is sure to exceed `limit`."""
+    if a == b:
+        return 0
+    if limit is not None and abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cost = ca != cb
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if limit is not None and min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+def max_typos(word: str) -> int:
+    return 0 if len(word) <= 2 else 1 if len(word) <= 5 else 2
+
+
+def fuzzy_docs(
+    index: InvertedIndex, query: str, text_of: Callable[[int], Optional[str]], limit: int = 20
+) -> List[Tuple[int, int, List[str]]]:
+    """Documents whose words are each within max_typos() of a query word,
+    as (id, total edits, the words they matched), fewest edits first.
+
+    Only the trigram candidates from similar_docs() are read (through
+    `text_of`) to measure the edits; nothing else is scanned.
+    """
+    words = _WORD.findall(query.casefold())
+    if not words:
+        return []
+    ranked = []
+    for doc_id, share in similar_docs(index, query):
+        text = text_of(doc_id)
+        if text is None:
+            continue
+        vocabulary = set(_WORD.findall(text.casefold()))
+        total, matched = 0, []
+        for w in words:
+            allowed = max_typos(w)
+            best = min(((edit_distance(w, v, allowed), v) for v in vocabulary), default=(allowed + 1, ""))
+            if best[0] > allowed:
+                break
+            total += best[0]
+            matched.append(best[1])
+        else:
+            ranked.append((total, -share, doc_id, matched))
+    ranked.sort()
+    return [(doc_id, total, matched) for total, _, doc_id, matched in ranked[:limit]]
+
+
+# ---------- Keeping an index current ----------
+
+# Changed records up to this many are re-indexed in place when the store
+# changed behind our back; more than that rebuilds in the background.
+REPAIR_LIMIT = 1000
+# Rebuild the segment once this share of it is tombstoned or re-added.
+MERGE_FRACTION = 0.05
+MERGE_MIN = 256
+
+
+class IndexHandle:
+    """One saved InvertedIndex, kept current as its records change.
+
+    Writes through final/storage.py report the records they touch to
+    changed(), which updates the index in memory straight away. get()
+    then sorts out what happened to the store files since the index last
+    looked at them:
+
+    - nothing, or only our own writes: the index already has them;
+    - an edit from elsewhere (another process, the JSON edited by hand):
+      every record's version is compared with the index's, and up to
+      REPAIR_LIMIT changed records are re-indexed in place;
+    - more than that, or a change the versions can't see: the index is
+      rebuilt on a background thread while the current one keeps
+      answering, and swapped in when done.
+
+    Changes not yet merged into the segment are saved to a small
+    `<index>.delta` file next to it; the segment itself is only rewritten
+    by a rebuild, which a growing delta triggers too.
+
+    `records()` streams every record, `summaries()` every record's id and
+    versioned fields (cheaply - the side index is enough), `fetch(id)`
+    reads one record, `doc_of(record)` gives its text fields and
+    `version_of(record or summary)` its version, and `analyzer()` makes
+    the Analyzer (words by default, TrigramAnalyzer for substrings).
+    `generation()` changes
+    whenever the record cache had to reload the store from disk (None
+    without a cache); while it holds still, a new store stamp after our
+    own changes is our own write.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        sources: Callable[[], List[Path]],
+        records: Callable[[], Iterable[object]],
+        summaries: Callable[[], Iterable[object]],
+        fetch: Callable[[int], Optional[object]],
+        doc_of: Callable[[object], Sequence[str]],
+        version_of: Callable[[object], int],
+        generation: Callable[[], Optional[int]] = lambda: None,
+        analyzer: Callable[[], "Analyzer"] = default_analyzer,
+    ):
+        self.path = path
+        self.delta_path = path.with_name(path.name + ".delta")
+        self._sources = sources
+        self._records = records
+        self._summaries = summaries
+        self._fetch = fetch
+        self._doc_of = doc_of
+        self._version_of = version_of
+        self._generation = generation
+        self._analyzer = analyzer
+        self.index: Optional[InvertedIndex] = None
+        self.stamp = None           # store stamp the index matches
+        self._gen: Optional[int] = None
+        self._local = False         # changed() ran since `stamp`
+        self._saved = True          # the delta file matches the index
+        self._replay: Optional[List[Tuple[Optional[list], Optional[list]]]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.RLock()
+
+    @property
+    def rebuilding(self) -> bool:
+        return self._thread is not None
+
+    def _stamp_now(self):
+        return [list(s) if s else None for s in file_stamp(self._sources())]
+
+    # ---------- Changes ----------
+
+    def changed(self, puts: Optional[list], deletes: Optional[list]) -> None:
+        """Records written and ids deleted; (None, None) when a whole store was replaced."""
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((puts, deletes))
+            if self.index is None:
+                return
+            if puts is None:
+                self._gen = None  # can't tell what changed: check every record on the next get()
+                return
+            self._apply(self.index, puts, deletes)
+            self._local = True
+            self._saved = False
+
+    def _apply(self, index: InvertedIndex, puts: Optional[list], deletes: Optional[list]) -> None:
+        if puts is None:
+            return
+        for r in puts:
+            index.add(r.id, self._doc_of(r), self._version_of(r))
+        for doc_id in deletes:
+            index.remove(doc_id)
+
+    # ---------- Access ----------
+
+    def get(self) -> InvertedIndex:
+        """The index, current as far as the store files are concerned.
+
+        Call it after pending writes were flushed, so the files are the truth.
+        """
+        with self._lock:
+            stamp = self._stamp_now()
+            if self.index is None:
+                self._load(stamp)
+            elif stamp != self.stamp and not self.rebuilding:
+                gen = self._generation()
+                if self._local and gen is not None and gen == self._gen:
+                    self.stamp = stamp  # our own write, already applied
+                else:
+                    self._check(stamp)
+            self._local = False
+            self._gen = self._generation()
+            index = self.index
+            if not self.rebuilding and index.pending > max(MERGE_MIN, MERGE_FRACTION * len(index)):
+                self._start_rebuild()
+            if not self._saved:
+                self._save_delta()
+            return index
+
+    def _load(self, stamp) -> None:
+        try:
+            loaded = InvertedIndex.from_bytes(self.path.read_bytes(), self._analyzer())
+        except FileNotFoundError:
+            loaded = None
+        if loaded is None:
+            self.index = self._build()
+            self.stamp = stamp
+            _replace_bytes(self.path, self.index.to_bytes(stamp))
+            self._drop_delta()
+            return
+        self.index, self.stamp = loaded
+        delta = _load_json(self.delta_path)
+        if self.index.load_delta_state(delta):
+            self.stamp = delta["stamp"]
+        if self.stamp != stamp:
+            self._check(stamp)
+
+    def _build(self) -> InvertedIndex:
+        docs = ((r.id, self._doc_of(r), self._version_of(r)) for r in self._records())
+        return InvertedIndex.build(docs, self._analyzer())
+
+    def _check(self, stamp) -> None:
+        """Compare every record's version with the index and repair or rebuild."""
+        index = self.index
+        store = {s.id: self._version_of(s) for s in self._summaries()}
+        stale = [i for i, v in store.items() if index.versions.get(i) != v]
+        gone = [i for i in index.versions if i not in store]
+        if not stale and not gone and not self._local:
+            # The files changed in a way the versions don't show (say,
+            # content edited by hand): only a rebuild can tell.
+            self._start_rebuild()
+            return
+        if len(stale) + len(gone) > REPAIR_LIMIT:
+            self._start_rebuild()
+            return
+        for doc_id in gone:
+            index.remove(doc_id)
+        for doc_id in stale:
+            r = self._fetch(doc_id)
+            if r is None:
+                index.remove(doc_id)
+            else:
+                index.add(doc_id, self._doc_of(r), self._version_of(r))
+        self.stamp = stamp
+        self._saved = self._saved and not (stale or gone)
+
+    # ---------- Background rebuild ----------
+
+    def _start_rebuild(self) -> None:
+        self._replay = []
+        self._thread = threading.Thread(target=self._rebuild, name=f"rebuild {self.path.name}", daemon=True)
+        self._thread.start()
+
+    def _rebuild(self) -> None:
+        try:
+            stamp = self._stamp_now()
+            index = self._build()
+            raw = index.to_bytes(stamp)
+        except Exception:
+            # Keep serving the current index; the next get() tries again.
+            with self._lock:
+                self._replay = None
+                self._thread = None
+            return
+        with self._lock:
+            # Changes made while we were reading the store, in order.
+            for puts, deletes in self._replay:
+                self._apply(index, puts, deletes)
+            _replace_bytes(self.path, raw)
+            self._drop_delta()
+            self.index, self.stamp = index, stamp
+            self._saved = not index.pending
+            self._replay = None
+            self._thread = None
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Wait for a background rebuild to finish (if one is running)."""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    # ---------- Delta file ----------
+
+    def _save_delta(self) -> None:
+        if self.index.pending:
+            state = self.index.delta_state()
+            state["stamp"] = self.stamp
+            _replace_json(self.delta_path, state, get_codec("json-compact"))
+        else:
+            self._drop_delta()
+        self._saved = True
+
+    def _drop_delta(self) -> None:
+        try:
+            self.delta_path.unlink()
+        except FileNotFoundError:
+            pass
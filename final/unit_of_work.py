@@ -0,0 +1,73 @@
+# final/unit_of_work.py
+from __future__ import annotations
+import atexit
+import threading
+from typing import Optional
+
+
+FLUSH_POLICIES = ("immediate", "command", "idle", "exit")
+
+
+class UnitOfWork:
+    """Decides when the dirty records of a CachedBackend get written.
+
+    Policies (config.FLUSH_POLICY):
+      immediate - write on every change (the old behaviour)
+      command   - write once at the end of each REPL command
+      idle      - write after `idle_seconds` without further changes
+      exit      - write only when the program exits
+
+    Whatever the policy, pending changes are flushed at exit. Wrapping code
+    in `with unit_of_work():` defers writes until the block ends, which lets
+    scripts batch hundreds of edits into one write.
+    """
+
+    def __init__(self, backend, policy: str = "command", idle_seconds: float = 2.0):
+        if policy not in FLUSH_POLICIES:
+            raise ValueError(f"Unknown flush policy {policy!r}; expected one of {FLUSH_POLICIES}")
+        self.backend = backend
+        self.policy = policy
+        self.idle_seconds = idle_seconds
+        self._depth = 0
+        self._timer: Optional[threading.Timer] = None
+        backend.on_change = self.changed
+        atexit.register(self.flush)
+
+    def changed(self) -> None:
+        if self._depth:
+            return
+        if self.policy == "immediate":
+            self.flush()
+        elif self.policy == "idle":
+            self._schedule()
+
+    def command_finished(self) -> None:
+        if self.policy == "command" and not self._depth:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        flush = getattr(self.backend, "flush", None)
+        if flush is not None:
+            flush()
+
+    def _schedule(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.idle_seconds, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def __enter__(self) -> "UnitOfWork":
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._depth -= 1
+        if self._depth == 0 and self.policy != "exit":
+            if self.policy == "idle":
+                self._schedule()
+            else:
+                self.flush()
@@ -0,0 +1,53 @@
+# final/vocab.py
+from __future__ import annotations
+import threading
+from typing import Dict, List, Optional
+
+
+class Vocabulary:
+    """Interned strings <-> small integer codes, shared by every record.
+
+    Statuses, priorities, categories and tags come from a handful of
+    distinct values, so records keep codes and each distinct string exists
+    once per process. `folded[code]` is the code of the lowercased string,
+    which makes case-insensitive matching an integer comparison.
+
+    Codes are handed out in order of first appearance and are only
+    meaningful within one process; stores keep the strings.
+    """
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self.folded: List[int] = []
+        self._codes: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def code(self, s: str) -> int:
+        """The code of `s`, assigning one on first sight."""
+        c = self._codes.get(s)
+        if c is not None:
+            return c
+        with self._lock:
+            c = self._codes.get(s)
+            if c is None:
+                lower = s.lower()
+                fc = self.code(lower) if lower != s else None
+                c = len(self.strings)
+                self.strings.append(s)
+                self.folded.append(c if fc is None else fc)
+                self._codes[s] = c
+            return c
+
+    def find(self, s: str) -> Optional[int]:
+        """The code of `s`, or None if no record has ever used it."""
+        return self._codes.get(s)
+
+    def find_folded(self, s: str) -> Optional[int]:
+        """The code to compare `folded[...]` against for a case-insensitive match."""
+        return self._codes.get(s.lower())
+
+
+VOCAB = Vocabulary()